@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import session, chat, submission, content, config, progress, knowledge_graph, behavior,websocket
+from app.api.endpoints import session, chat, submission, content, config, progress, knowledge_graph, behavior,websocket, health
 
 api_router = APIRouter()
 api_router.include_router(session.router, prefix="/session", tags=["session"])
@@ -12,4 +12,5 @@ api_router.include_router(knowledge_graph.router, prefix="/knowledge-graph", tag
 api_router.include_router(behavior.router, prefix="/behavior", tags=["behavior"])
 
 
-api_router.include_router(websocket.router, prefix="/ws", tags=["websocket"])
\ No newline at end of file
+api_router.include_router(websocket.router, prefix="/ws", tags=["websocket"])
+api_router.include_router(health.router, prefix="/health", tags=["health"])
\ No newline at end of file
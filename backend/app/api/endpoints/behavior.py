@@ -3,11 +3,13 @@
 API端点，用于接收和处理前端发送的行为事件。
 """
 import logging
-from fastapi import APIRouter, status
+from typing import List
+from fastapi import APIRouter, HTTPException, status
 
+from app.core.config import settings
 from app.schemas.behavior import BehaviorEvent
-from app.tasks.db_tasks import save_behavior_task
-from app.tasks.behavior_tasks import interpret_behavior_task
+from app.tasks.db_tasks import save_behavior_task, save_behavior_batch_task
+from app.tasks.behavior_tasks import interpret_behavior_task, interpret_behavior_batch_task
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -43,3 +45,54 @@ def log_behavior(
 
     logger.info(f"[log_behavior] 参与者 {event_in.participant_id} 的事件处理已分派")
     return {"status": "事件已接收并正在处理"}
+
+
+@router.post("/log/batch", status_code=status.HTTP_202_ACCEPTED, summary="批量记录行为事件")
+def log_behavior_batch(
+    events_in: List[BehaviorEvent],
+):
+    """
+    接收一批行为事件（前端追踪器每隔几秒合并发送），按批异步持久化并解释。
+
+    - **批量持久化**: 整批事件只分派一个`db_writer_queue`任务，一次写入。
+    - **批量解释**: 每个参与者分派一个`behavior_queue`任务，按原顺序解释，档案只读写一次。
+    - **快速响应**: 立即返回 `202 Accepted`，不等待后台任务完成。
+    """
+    return {"status": "事件已接收并正在处理", "count": dispatch_behavior_events(events_in)}
+
+
+def dispatch_behavior_events(events_in: List[BehaviorEvent]) -> int:
+    """
+    分派一批行为事件的持久化与解释任务，返回接收的事件数。
+
+    HTTP 端点 /log/batch 与 WebSocket 的 behavior_batch 消息共用。
+    """
+    if len(events_in) > settings.BEHAVIOR_BATCH_MAX_EVENTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"单次最多提交 {settings.BEHAVIOR_BATCH_MAX_EVENTS} 条事件"
+        )
+    if not events_in:
+        return 0
+
+    events_data = [event_in.model_dump() for event_in in events_in]
+    logger.info(f"[log_behavior_batch] 接收到 {len(events_data)} 条事件")
+
+    # 任务1: 整批持久化 (fire-and-forget)
+    save_behavior_batch_task.apply_async(
+        args=[events_data],
+        queue='db_writer_queue'
+    )
+
+    # 任务2: 按参与者分组后顺序解释 (fire-and-forget)
+    events_by_participant = {}
+    for event_data in events_data:
+        events_by_participant.setdefault(event_data["participant_id"], []).append(event_data)
+    for participant_events in events_by_participant.values():
+        interpret_behavior_batch_task.apply_async(
+            args=[participant_events],
+            queue='behavior_queue'
+        )
+
+    logger.info(f"[log_behavior_batch] {len(events_by_participant)} 个参与者的 {len(events_data)} 条事件处理已分派")
+    return len(events_data)
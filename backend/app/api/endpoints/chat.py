@@ -1,11 +1,15 @@
+import uuid
+
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from celery.result import AsyncResult
 
-from app.config.dependency_injection import get_db
+from app.config.dependency_injection import get_db, get_chat_scheduler
+from app.core.config import settings
 from app.schemas.chat import ChatRequest, ChatResponse
 from app.schemas.response import StandardResponse
-from app.tasks.chat_tasks import process_chat_request
+from app.tasks.chat_tasks import dispatch_chat_task, process_chat_request
 from app.celery_app import celery_app
 
 router = APIRouter()
@@ -39,8 +43,8 @@ async def chat_with_ai(
         # 直接调用controller处理（保持原有逻辑）
         from app.config.dependency_injection import get_dynamic_controller
         controller = get_dynamic_controller()
-        
-        # 调用生成回复
+
+        # 调用生成回复（controller 在线程池中执行档案读取等同步的数据库/Redis 操作）
         response = await controller.generate_adaptive_response(
             request=request,
             db=db,
@@ -80,6 +84,22 @@ async def chat_with_ai2(
     Returns:
         StandardResponse[dict]: 包含任务ID的响应
     """
+    # 调度器同步访问 Redis，放到线程池中执行，避免阻塞事件循环
+    task_id = await run_in_threadpool(dispatch_chat_request, request)
+    # 立即返回任务ID
+    return StandardResponse(
+        code=202,
+        message="Task submitted successfully",
+        data={"task_id": task_id}
+    )
+
+
+def dispatch_chat_request(request: ChatRequest) -> str:
+    """
+    校验聊天请求并分派到 chat_queue，返回任务ID。
+
+    HTTP 端点 /ai/chat2 与 WebSocket 的 chat 消息共用。
+    """
     # 验证请求
     if not request.participant_id:
         raise HTTPException(status_code=400, detail="participant_id is required")
@@ -87,18 +107,22 @@ async def chat_with_ai2(
     if not request.user_message:
         raise HTTPException(status_code=400, detail="user_message is required")
     
+    # 经公平调度器分派：按参与者轮转，限制每个参与者同时进行的生成数
+    if settings.CHAT_SCHEDULER_ENABLED:
+        return get_chat_scheduler().submit(request.dict())
+
+    # asyncio 执行模式：由 async_chat_worker 消费，任务ID在这里生成
+    if settings.CHAT_EXECUTION_MODE == "asyncio":
+        task_id = str(uuid.uuid4())
+        dispatch_chat_task(task_id, request.dict())
+        return task_id
+
     # 将任务分派到 Celery 队列
     task = process_chat_request.apply_async(
         args=[request.dict()], 
         queue='chat_queue'
     )
-    
-    # 立即返回任务ID
-    return StandardResponse(
-        code=202,
-        message="Task submitted successfully",
-        data={"task_id": task.id}
-    )
+    return task.id
 
 
 @router.get("/ai/chat2/result/{task_id}", response_model=StandardResponse[ChatResponse])
@@ -1,20 +1,22 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from app.core.prerendered_response import prerendered_response
 from app.schemas.response import StandardResponse
 from app.schemas.content import LearningContent, TestTask
-from app.services.content_loader import load_json_content
+from app.services.content_loader import content_registry
 
 # 使用前缀统一版本管理,可修改
 router = APIRouter()
 
 
 @router.get("/learning-content/{topic_id}", response_model=StandardResponse[LearningContent])
-def get_learning_content(topic_id: str):
+def get_learning_content(topic_id: str, request: Request):
     """
     获取指定主题的学习材料。
     """
     try:
-        content_data = load_json_content("learning_content", topic_id)
-        return StandardResponse(data=content_data)
+        # 直接返回注册表中预先序列化好的响应体，不再逐次校验与序列化；ETag 相符时返回 304
+        entry = content_registry.get("learning_content", topic_id)
+        return prerendered_response(request, entry.rendered)
     except HTTPException:
         raise
     except Exception as e:
@@ -22,13 +24,14 @@ def get_learning_content(topic_id: str):
 
 
 @router.get("/test-tasks/{topic_id}", response_model=StandardResponse[TestTask])
-def get_test_task(topic_id: str):
+def get_test_task(topic_id: str, request: Request):
     """
     获取指定主题的测试任务。
     """
     try:
-        content_data = load_json_content("test_tasks", topic_id)
-        return StandardResponse(data=content_data)
+        # 直接返回注册表中预先序列化好的响应体，不再逐次校验与序列化；ETag 相符时返回 304
+        entry = content_registry.get("test_tasks", topic_id)
+        return prerendered_response(request, entry.rendered)
     except HTTPException:
         raise
     except Exception as e:
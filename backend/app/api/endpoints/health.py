@@ -0,0 +1,16 @@
+# backend/app/api/endpoints/health.py
+from fastapi import APIRouter
+from app.core.redis_connections import redis_connections
+
+router = APIRouter()
+
+
+@router.get("/redis")
+async def redis_health():
+    """
+    本进程 Redis 连接的健康状况与连接池使用情况。
+    """
+    return {
+        "health": await redis_connections.check_health_async(),
+        "pools": redis_connections.get_metrics(),
+    }
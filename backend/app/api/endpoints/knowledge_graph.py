@@ -1,69 +1,80 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Request
 import json
+import logging
 import os
+from typing import Optional, Tuple
 from app.schemas.knowledge_graph import KnowledgeGraph
 from app.core.config import settings
+from app.core.prerendered_response import PrerenderedJSON, prerender_json, prerendered_response
 from app.schemas.response import StandardResponse
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 # 使用配置中的DATA_DIR确保路径正确
 GRAPH_FILE_PATH = os.path.join(settings.DATA_DIR, "knowledge_graph.json")
 
 _knowledge_graph_cache = None # 全局缓存
-_last_loaded_path = None   # 最后一次加载的缓存路径
+# (文件路径, mtime_ns, 大小) -> 预先序列化的响应；路径或文件变化时重新加载
+_knowledge_graph_response: Optional[Tuple[tuple, PrerenderedJSON]] = None
+
+
+def _file_signature(path: str) -> tuple:
+    """文件路径加上 mtime 和大小，文件不存在时只有路径"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (path,)
+    return (path, stat.st_mtime_ns, stat.st_size)
 
-@router.get("", response_model=StandardResponse[KnowledgeGraph])  # 空路径，因为路由前缀会在api.py中定义
-def get_knowledge_graph():
-    global _knowledge_graph_cache, _last_loaded_path
 
-    # 如果缓存存在并且路径没变，直接用缓存
-    if _knowledge_graph_cache is not None and _last_loaded_path == GRAPH_FILE_PATH:
-        print(f"_knowledge_graph_cache: {_knowledge_graph_cache} ")
-        print(f"_last_loaded_path: {_last_loaded_path} ")
-        return StandardResponse(data=_knowledge_graph_cache)
-        
+def _load_knowledge_graph(path: str) -> KnowledgeGraph:
+    """读取知识图谱文件；文件不存在或读取失败时返回空数据，JSON 无效时返回默认节点"""
+    # 文件不存在情况
+    if not os.path.exists(path):
+        logger.warning(f"文件 {path} 不存在，返回空数据")
+        return KnowledgeGraph(nodes=[], edges=[], dependent_edges=[], metadata=None)
+
     try:
-        print(f"_knowledge_graph_cache={_knowledge_graph_cache} ")
-        print(f"_last_loaded_path={_last_loaded_path} ")
-        # 文件不存在情况
-        if not os.path.exists(GRAPH_FILE_PATH):
-            print(f"warning: 文件 {GRAPH_FILE_PATH} 不存在，返回空数据")
-            _knowledge_graph_cache = KnowledgeGraph(nodes=[], edges=[], dependent_edges=[], metadata=None)
-            _last_loaded_path = GRAPH_FILE_PATH
-            return StandardResponse(data=_knowledge_graph_cache)  # 返回空数据
-            
-        # 读取并解析文件
-        with open(GRAPH_FILE_PATH, encoding='utf-8-sig') as f:  # 使用 utf-8-sig 自动处理 BOM 编码
-            try:
-                print(f"读取文件 {GRAPH_FILE_PATH}成功，正在解析...")
-                raw_content = f.read()  # 先读取原始内容
-                print(f"文件内容前100字符: {raw_content[:100]}")  # 检查内容是否被正确读取
-                data = json.loads(raw_content)   # 尝试解析JSON
-                validated_data = KnowledgeGraph(**data)
-                _knowledge_graph_cache = validated_data
-                _last_loaded_path = GRAPH_FILE_PATH
-                return StandardResponse(data=validated_data)
-            except json.JSONDecodeError:
-                print(f"error: 文件 {GRAPH_FILE_PATH} 内容不是有效的 JSON 格式，返回默认节点")
-                # JSON 无效时返回 default_node
-                _knowledge_graph_cache = KnowledgeGraph(
-                    nodes=[{"data": {
-                        "id": "default_node",
-                        "label": "默认节点",
-                        "type": None,
-                        "description": None,
-                        "difficulty": None
-                    }}],
-                    edges=[],
-                    dependent_edges=[],
-                    metadata=None
-                )
-                _last_loaded_path = GRAPH_FILE_PATH
-                return StandardResponse(data=_knowledge_graph_cache)
+        # 使用 utf-8-sig 自动处理 BOM 编码
+        with open(path, encoding='utf-8-sig') as f:
+            data = json.loads(f.read())
+        return KnowledgeGraph(**data)
+    except json.JSONDecodeError:
+        logger.error(f"文件 {path} 内容不是有效的 JSON 格式，返回默认节点")
+        # JSON 无效时返回 default_node
+        return KnowledgeGraph(
+            nodes=[{"data": {
+                "id": "default_node",
+                "label": "默认节点",
+                "type": None,
+                "description": None,
+                "difficulty": None
+            }}],
+            edges=[],
+            dependent_edges=[],
+            metadata=None
+        )
     except Exception as e:
         # 其他异常
-        print(f"error: 文件 {GRAPH_FILE_PATH} 读取失败: {str(e)}")
-        _knowledge_graph_cache = KnowledgeGraph(nodes=[], edges=[], dependent_edges=[], metadata=None)
-        _last_loaded_path = GRAPH_FILE_PATH
-        return StandardResponse(data=_knowledge_graph_cache)  # 返回空数据
+        logger.error(f"文件 {path} 读取失败: {str(e)}")
+        return KnowledgeGraph(nodes=[], edges=[], dependent_edges=[], metadata=None)
+
+
+@router.get("", response_model=StandardResponse[KnowledgeGraph])  # 空路径，因为路由前缀会在api.py中定义
+def get_knowledge_graph(request: Request):
+    """
+    获取知识图谱。响应体只在文件变化时重新序列化，ETag 相符时返回 304。
+    """
+    global _knowledge_graph_cache, _knowledge_graph_response
+
+    signature = _file_signature(GRAPH_FILE_PATH)
+    cached = _knowledge_graph_response
+    if cached is None or cached[0] != signature:
+        graph = _load_knowledge_graph(GRAPH_FILE_PATH)
+        body = StandardResponse[KnowledgeGraph](data=graph).model_dump_json().encode("utf-8")
+        cached = (signature, prerender_json(body))
+        _knowledge_graph_cache = graph
+        _knowledge_graph_response = cached
+    return prerendered_response(request, cached[1])
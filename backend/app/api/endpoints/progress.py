@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.config.dependency_injection import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.dependency_injection import get_async_db
 from app.schemas.response import StandardResponse
 from app.schemas.user_progress import UserProgressResponse
 from app.crud.crud_progress import progress
@@ -13,15 +13,14 @@ logger.setLevel(logging.DEBUG)  # 确保设置为DEBUG级别
 router = APIRouter()
 
 @router.get("/participants/{participant_id}/progress", response_model=StandardResponse[UserProgressResponse])
-def get_user_progress(participant_id: str, db: Session = Depends(get_db)):
+async def get_user_progress(participant_id: str, db: AsyncSession = Depends(get_async_db)):
     try:
         logger.info(f"获取用户进度请求: participant_id={participant_id}")
-        print("当前数据库文件:", db.bind.url)
-        logger.debug("准备调用 get_completed_topics_by_user 方法")
-        completed_topics = progress.get_completed_topics_by_user(
+        logger.debug("准备调用 get_completed_topics_by_user_async 方法")
+        completed_topics = await progress.get_completed_topics_by_user_async(
             db, participant_id=participant_id
         )
-        logger.debug(f"get_completed_topics_by_user 方法调用完成")
+        logger.debug(f"get_completed_topics_by_user_async 方法调用完成")
         # 正确包装响应数据，确保符合TDD要求的格式
         response_data = UserProgressResponse(completed_topics=completed_topics)
         logger.info(f"用户 {participant_id} 的完成主题: {completed_topics}")
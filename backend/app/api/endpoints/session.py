@@ -1,19 +1,49 @@
 from fastapi import APIRouter, Depends, status, Response
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
 from app.schemas.response import StandardResponse
+from app.schemas.participant import ParticipantCreate
 from app.schemas.session import SessionInitiateRequest, SessionInitiateResponse
-from app.config.dependency_injection import get_user_state_service, get_db, get_redis_client
+from app.config.dependency_injection import get_user_state_service, get_redis_client, get_participant_cache
+from app.crud.crud_participant import participant as crud_participant
+from app.db.database import SessionLocal
 from app.services.user_state_service import UserStateService
 
 router = APIRouter()
 
 
+def _initiate(user_state_service: UserStateService, participant_id: str, group: str):
+    """
+    在线程池中执行：补录参与者，再获取或创建用户配置（Redis 未命中时需要用同步会话回放历史事件）
+
+    参与者缓存已确认存在时不访问数据库；否则用一条幂等 INSERT 补录，created 取自插入结果，
+    并发的首次登录只有一个请求得到 True，也不会因主键冲突失败。
+
+    Returns:
+        tuple: (profile, 本次是否插入了参与者, 用户配置是否新建)
+    """
+    participant_cache = get_participant_cache()
+    participant_known = participant_cache.is_known(participant_id)
+    db = SessionLocal()
+    try:
+        created = False
+        if not participant_known:
+            created = crud_participant.create_if_not_exists(
+                db, obj_in=ParticipantCreate(id=participant_id, group=group)
+            )
+        profile, profile_is_new = user_state_service.get_or_create_profile(participant_id, db, group)
+    finally:
+        db.close()
+    # 参与者已确认存在，后续请求与任务的补录检查直接命中缓存
+    if not participant_known:
+        participant_cache.mark_known(participant_id)
+    return profile, created, profile_is_new
+
+
 @router.post("/initiate", response_model=StandardResponse[SessionInitiateResponse])
-def initiate_session(
+async def initiate_session(
         response: Response,
         session_in: SessionInitiateRequest,
-        user_state_service: UserStateService = Depends(lambda: get_user_state_service(get_redis_client())),
-        db: Session = Depends(get_db)
+        user_state_service: UserStateService = Depends(lambda: get_user_state_service(get_redis_client()))
 ):
     """
     初始化用户会话
@@ -22,13 +52,15 @@ def initiate_session(
         response: HTTP响应对象
         session_in: 会话初始化请求数据
         user_state_service: 用户状态服务
-        db: 数据库会话
         
     Returns:
         StandardResponse[SessionInitiateResponse]: 会话初始化响应
     """
-    # 获取或创建用户配置
-    profile, is_new_user = user_state_service.get_or_create_profile(session_in.participant_id, db, session_in.group)
+    # 参与者补录与用户配置获取（可能触发历史回放）都放到线程池中执行
+    profile, created, profile_is_new = await run_in_threadpool(
+        _initiate, user_state_service, session_in.participant_id, session_in.group
+    )
+    is_new_user = created or profile_is_new
 
     if is_new_user:
         response.status_code = status.HTTP_201_CREATED
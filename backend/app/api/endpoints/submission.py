@@ -6,10 +6,9 @@ from app.schemas.submission import TestSubmissionRequest, TestSubmissionResponse
 from app.tasks.submission_tasks import process_submission_task
 from app.celery_app import celery_app
 from celery.result import AsyncResult
-from app.services.sandbox_service import sandbox_service
 from app.services.user_state_service import UserStateService
 from app.services.content_loader import load_json_content
-from app.config.dependency_injection import get_user_state_service, get_db, get_redis_client
+from app.config.dependency_injection import get_user_state_service, get_db, get_redis_client, get_submission_cache, get_submission_sandbox_service
 from app.crud.crud_progress import progress as crud_progress
 from app.schemas.user_progress import UserProgressCreate
 from app.schemas.response import StandardResponse
@@ -25,6 +24,15 @@ def submit_test2(
     """
     接收用户代码提交，异步进行评测，并返回任务ID。
     """
+    return StandardResponse(data={"task_id": dispatch_submission(submission_in)})
+
+
+def dispatch_submission(submission_in: TestSubmissionRequest) -> str:
+    """
+    分派代码保存与评测任务，返回评测任务ID。
+
+    HTTP 端点 /submit-test2 与 WebSocket 的 submit_test 消息共用。
+    """
     # 使用Celery队列异步保存用户提交的代码到数据库
     submission_data = {
         "participant_id": submission_in.participant_id,
@@ -42,7 +50,7 @@ def submit_test2(
         args=[submission_in.model_dump()],
         queue='submit_queue'
     )
-    return StandardResponse(data={"task_id": task.id})
+    return task.id
 
 @router.get("/submit-test2/result/{task_id}", response_model=StandardResponse[TestSubmissionResponse])
 def get_submission_result(task_id: str) -> Any:
@@ -98,12 +106,17 @@ def submit_test(
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
     # 2. 执行代码评测
-    # 注意：这里的sandbox_service是直接导入的单例，如果未来需要更复杂的依赖管理，
-    # 也可以像user_state_service一样通过Depends注入。
-    evaluation_result = sandbox_service.run_evaluation(
-        user_code=submission_in.code.model_dump(),
-        checkpoints=checkpoints,
+    # 沙箱服务由 get_submission_sandbox_service 按 SANDBOX_ENGINE 选择（同步引擎或进程内共用的异步引擎）
+    user_code = submission_in.code.model_dump()
+    evaluation_result, _ = get_submission_cache().get_or_evaluate(
         topic_id=submission_in.topic_id,
+        checkpoints=checkpoints,
+        user_code=user_code,
+        evaluate=lambda: get_submission_sandbox_service().run_evaluation(
+            user_code=user_code,
+            checkpoints=checkpoints,
+            topic_id=submission_in.topic_id,
+        ),
     )
 
     # 3. 更新学生模型
@@ -1,18 +1,139 @@
 #backend/app/api/endpoints/websocket.py
 # backend/app/api/endpoints/websocket.py
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+import logging
+from typing import Any, List, Optional
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Depends
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter, ValidationError
+from app.api.endpoints.behavior import dispatch_behavior_events
+from app.api.endpoints.chat import dispatch_chat_request
+from app.api.endpoints.submission import dispatch_submission
+from app.config.dependency_injection import get_aioredis
+from app.core.chat_stream_replay import load_missed_frames
 from app.core.websocket_manager import ws_manager
+from app.core.redis_subscriber import channel_router
+from app.schemas.behavior import BehaviorEvent
+from app.schemas.chat import ChatRequest
+from app.schemas.submission import TestSubmissionRequest
+from app.schemas.websocket import ClientMessage, ServerAck
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
+
+_behavior_events_adapter = TypeAdapter(List[BehaviorEvent])
+
+
+def _with_participant(payload: Any, participant_id: str) -> dict:
+    # 请求体中的 participant_id 一律以连接所属的参与者为准
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=422, detail="payload must be an object")
+    return {**payload, "participant_id": participant_id}
+
+
+async def _handle_chat(participant_id: str, payload: Any) -> dict:
+    request = ChatRequest.model_validate(_with_participant(payload, participant_id))
+    return {"task_id": await run_in_threadpool(dispatch_chat_request, request)}
+
+
+async def _handle_submit_test(participant_id: str, payload: Any) -> dict:
+    submission_in = TestSubmissionRequest.model_validate(_with_participant(payload, participant_id))
+    return {"task_id": await run_in_threadpool(dispatch_submission, submission_in)}
+
+
+async def _handle_behavior_batch(participant_id: str, payload: Any) -> dict:
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=422, detail="payload must be a list of events")
+    events_in = _behavior_events_adapter.validate_python(
+        [_with_participant(event, participant_id) for event in payload]
+    )
+    return {"count": await run_in_threadpool(dispatch_behavior_events, events_in)}
+
+
+async def _handle_ping(participant_id: str, payload: Any) -> dict:
+    return {}
+
+
+_MESSAGE_HANDLERS = {
+    "chat": _handle_chat,
+    "submit_test": _handle_submit_test,
+    "behavior_batch": _handle_behavior_batch,
+    "ping": _handle_ping,
+}
+
+
+async def handle_client_message(participant_id: str, raw: str) -> ServerAck:
+    """
+    处理客户端通过 WebSocket 发送的一条请求，返回对应的 ack。
+
+    校验与分派逻辑与 HTTP 端点共用，错误码与 HTTP 端点一致。
+    """
+    request_id = None
+    try:
+        message = ClientMessage.model_validate_json(raw)
+        request_id = message.request_id
+        data = await _MESSAGE_HANDLERS[message.type](participant_id, message.payload)
+        return ServerAck(request_id=request_id, data=data)
+    except HTTPException as e:
+        return ServerAck(request_id=request_id, code=e.status_code, message=str(e.detail))
+    except ValidationError as e:
+        return ServerAck(request_id=request_id, code=422, message=str(e))
+    except Exception as e:
+        logger.error(f"处理参与者 {participant_id} 的 WebSocket 请求失败: {e}", exc_info=True)
+        return ServerAck(request_id=request_id, code=500, message=f"Internal server error: {str(e)}")
+
 @router.websocket("/user/{participant_id}")
-async def websocket_endpoint(websocket: WebSocket, participant_id: str, token: str = None):
-   
+async def websocket_endpoint(
+    websocket: WebSocket,
+    participant_id: str,
+    token: str = None,
+    last_seq: Optional[int] = None,
+    taskid: Optional[str] = None,
+):
+    """
+    用户 WebSocket 连接。
+
+    除了推送流式回复和评测结果，客户端也可以在这条连接上发送聊天、代码提交和批量行为事件请求
+    （见 ClientMessage），每个请求都会收到带相同 request_id 的 ack（见 ServerAck）。
+    请求按到达顺序逐个处理，ack 与推送消息经同一个发送队列发出。
+
+    重连时客户端可带上最后收到的 taskid 与 last_seq：先补发错过的帧，再继续推送实时消息，
+    回答中途断线不再需要重新提问。
+    """
     await ws_manager.connect(participant_id, websocket)
+    resuming = last_seq is not None
+    if resuming:
+        # 先暂存实时消息再订阅，补发与实时推送之间不会漏帧或乱序
+        ws_manager.hold(participant_id)
+    # 只有连接在本进程上的参与者才订阅其频道
+    await channel_router.add_participant(participant_id)
 
     try:
+        if resuming:
+            frames, replayed = [], {}
+            try:
+                frames, replayed = await load_missed_frames(get_aioredis(), participant_id, last_seq, taskid)
+            except Exception as e:
+                logger.error(f"为参与者 {participant_id} 读取历史帧失败: {e}")
+            # 发送队列处于暂停状态，这里直接发送不会与写任务交错
+            for frame in frames:
+                await websocket.send_text(frame)
+            logger.info(f"为参与者 {participant_id} 补发 {len(frames)} 帧")
+            await ws_manager.release(participant_id, replayed)
+
         while True:
-            # WebSocket 这里只是保持连接，不接收客户端主动消息,后面没问题了这边可以换成等待ping信息的逻辑
-            data = await websocket.receive_text()
-           
+            raw = await websocket.receive_text()
+            ack = await handle_client_message(participant_id, raw)
+            await ws_manager.send_to_user(participant_id, ack.model_dump_json())
+
     except WebSocketDisconnect:
-        await ws_manager.disconnect(participant_id)
+        pass
+    finally:
+        await channel_router.remove_participant(participant_id)
+        await ws_manager.disconnect(participant_id, websocket)
+
+
+@router.get("/stats")
+async def websocket_stats():
+    """本进程 WebSocket 发送队列的深度与合并/丢弃统计"""
+    return ws_manager.get_metrics()
@@ -2,6 +2,8 @@ import logging
 from celery import Celery, signals
 from app.core.config import settings
 from app.config.dependency_injection import create_dynamic_controller, get_redis_client, get_user_state_service as create_user_state_service
+from app.core.redis_connections import redis_connections, role_for_queues
+from app.core.worker_warmup import clear_ready, mark_ready, preload_chat_dependencies, warm_inference
 import os
 
 # 配置日志记录器
@@ -26,21 +28,8 @@ celery_app = Celery(
 _dynamic_controller_instance = None
 _user_state_service_instance = None
 
-@signals.worker_process_init.connect
-def init_worker_process(sender=None, **kwargs):
-    """
-    在 Worker 进程启动时，根据其监听的队列有条件地初始化依赖。
-    """
-    global _dynamic_controller_instance, _user_state_service_instance
-    
-    # 1. 初始化所有 Worker 都需要的轻量级服务
-    if _user_state_service_instance is None:
-        logger.info(f"Initializing UserStateService for Worker (PID: {os.getpid()})...")
-        redis_client = get_redis_client()
-        _user_state_service_instance = create_user_state_service(redis_client=redis_client)
-        logger.info("UserStateService initialized.")
-
-    # 2. 获取 Worker 实例正在监听的队列名称集合
+def _detect_worker_queues(sender=None) -> set:
+    """获取 Worker 实例正在监听的队列名称集合"""
     # 通过检查当前进程的命令行参数来确定队列
     import sys
     queues = set()
@@ -63,7 +52,97 @@ def init_worker_process(sender=None, **kwargs):
         queue_env = os.environ.get('CELERY_QUEUES')
         if queue_env:
             queues.update(q.strip() for q in queue_env.split(','))
-    
+    return queues
+
+
+def _uses_prefork_pool(sender=None) -> bool:
+    """Worker 是否使用 prefork 池（只有 prefork 会触发 worker_process_init）"""
+    from celery.concurrency import get_implementation
+    pool_cls = getattr(sender, "pool_cls", None)
+    if pool_cls is None:
+        return True
+    if isinstance(pool_cls, str):
+        pool_cls = get_implementation(pool_cls)
+    return pool_cls.__module__.endswith(".prefork")
+
+
+@signals.worker_init.connect
+def configure_worker_redis(sender=None, **kwargs):
+    """
+    在 Worker 主进程启动时设置 Redis 连接池角色。
+
+    gevent 池（db_writer_queue）不会触发 worker_process_init，需要在这里设置；
+    prefork 子进程继承该角色，连接池在 fork 后按 pid 自动重建。
+    """
+    redis_connections.configure_role(role_for_queues(_detect_worker_queues(sender)))
+
+
+@signals.worker_init.connect
+def preload_chat_worker(sender=None, **kwargs):
+    """
+    在 chat Worker 主进程 fork 子进程之前预加载 DynamicController 和只读模型。
+
+    prefork 子进程继承已加载的模型（写时复制共享），init_worker_process 中直接复用；
+    预加载失败时子进程按原方式各自初始化。
+    """
+    global _dynamic_controller_instance
+
+    if 'chat_queue' not in _detect_worker_queues(sender):
+        return
+    clear_ready(settings.CHAT_WORKER_READY_FILE)
+    if not settings.CHAT_WORKER_PRELOAD or _dynamic_controller_instance is not None:
+        return
+    try:
+        _dynamic_controller_instance, _ = preload_chat_dependencies(
+            lambda: create_dynamic_controller(redis_client=get_redis_client())
+        )
+    except Exception as e:
+        logger.error(f"chat 依赖预加载失败，子进程将各自初始化: {e}", exc_info=True)
+
+
+@signals.worker_init.connect
+def preload_submit_worker(sender=None, **kwargs):
+    """
+    在 submit Worker 主进程 fork 之前加载并编译全部测试任务，子进程直接继承编译好的检查点计划。
+    """
+    global _user_state_service_instance
+    if 'submit_queue' not in _detect_worker_queues(sender):
+        return
+    from app.services.content_loader import preload_test_tasks
+    logger.info(f"预加载测试任务 {preload_test_tasks()} 个")
+
+    # threads 池（SANDBOX_ENGINE=async 时推荐）不会触发 worker_process_init，任务线程共用主进程的依赖
+    if not _uses_prefork_pool(sender) and _user_state_service_instance is None:
+        _user_state_service_instance = create_user_state_service(redis_client=get_redis_client())
+        logger.info("UserStateService initialized for non-prefork submit worker.")
+
+
+@signals.worker_shutdown.connect
+@signals.worker_process_shutdown.connect
+def close_submit_sandbox(sender=None, **kwargs):
+    """Worker（或 prefork 子进程）退出时关闭进程内共用的异步沙箱引擎"""
+    from app.config.dependency_injection import shutdown_sandbox_service
+    shutdown_sandbox_service()
+
+
+@signals.worker_process_init.connect
+def init_worker_process(sender=None, **kwargs):
+    """
+    在 Worker 进程启动时，根据其监听的队列有条件地初始化依赖。
+    """
+    global _dynamic_controller_instance, _user_state_service_instance
+
+    # 1. 获取 Worker 实例正在监听的队列名称集合，并据此设置 Redis 连接池角色
+    queues = _detect_worker_queues(sender)
+    redis_connections.configure_role(role_for_queues(queues))
+
+    # 2. 初始化所有 Worker 都需要的轻量级服务
+    if _user_state_service_instance is None:
+        logger.info(f"Initializing UserStateService for Worker (PID: {os.getpid()})...")
+        redis_client = get_redis_client()
+        _user_state_service_instance = create_user_state_service(redis_client=redis_client)
+        logger.info("UserStateService initialized.")
+
     # 3. 只有当 Worker 明确服务于 'chat_queue' 时，才初始化重量级依赖
     if 'chat_queue' in queues:
         if _dynamic_controller_instance is None:
@@ -73,7 +152,6 @@ def init_worker_process(sender=None, **kwargs):
             redis_client = get_redis_client()
             _dynamic_controller_instance = create_dynamic_controller(redis_client=redis_client)
             logger.info("DynamicController initialized.")
-
             # 预加载RAG服务（如果启用）现在不需要，因为我们有一个专门的beat来完成这个
             # try:
             #     from app.config.dependency_injection import get_rag_service
@@ -89,6 +167,13 @@ def init_worker_process(sender=None, **kwargs):
             #             logger.warning(f"Failed to warm up embedding model: {warmup_error}")
             # except Exception as e:
             #     logger.error(f"Failed to preload RAG service: {e}")
+        else:
+            logger.info(f"Reusing preloaded DynamicController in Chat Worker (PID: {os.getpid()}).")
+
+        # 预热推理：第一个聊天任务不再承担首次推理的开销，完成后标记就绪
+        warmup_timings = warm_inference(_dynamic_controller_instance)
+        logger.info(f"Chat Worker (PID: {os.getpid()}) warmed up: {warmup_timings}")
+        mark_ready(settings.CHAT_WORKER_READY_FILE, {"warmup_ms": warmup_timings})
 
     else:
         logger.info(f"Worker (PID: {os.getpid()}) is not serving 'chat_queue'. Skipping DynamicController initialization.")
@@ -131,15 +216,27 @@ celery_app.conf.update(
     task_routes={
         'app.tasks.chat_tasks.process_chat_request': {'queue': 'chat_queue'},
         'app.tasks.behavior_tasks.interpret_behavior_task': {'queue': 'behavior_queue'},
+        'app.tasks.behavior_tasks.interpret_behavior_batch_task': {'queue': 'behavior_queue'},
         'app.tasks.submission_tasks.process_submission_task': {'queue': 'submit_queue'},
         'app.tasks.db_tasks.save_submission_task': {'queue': 'db_writer_queue'},
+        'app.tasks.db_tasks.save_code_submission_task': {'queue': 'db_writer_queue'},
         'app.tasks.db_tasks.save_behavior_task': {'queue': 'db_writer_queue'},
+        'app.tasks.db_tasks.save_behavior_batch_task': {'queue': 'db_writer_queue'},
         'app.tasks.db_tasks.log_ai_event_task': {'queue': 'db_writer_queue'},
         'app.tasks.db_tasks.save_chat_message_task': {'queue': 'db_writer_queue'},
         'app.tasks.wakeup_embedding_task.wakeup_embedding_model': {'queue': 'db_writer_queue'},
         'app.tasks.db_tasks.save_progress_task': {'queue': 'db_writer_queue'},
     },
     task_default_queue='default',
+
+    # broker / 结果后端的 Redis 连接：TCP keepalive 与定期健康检查，Redis 重启后及时发现死连接
+    broker_transport_options={
+        'socket_keepalive': True,
+        'health_check_interval': settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
+    },
+    redis_socket_keepalive=True,
+    redis_retry_on_timeout=True,
+    redis_backend_health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
     
     # 定时任务配置
     beat_schedule={
@@ -1,18 +1,25 @@
 import redis
 
 from app.core.config import settings
-from app.services.sandbox_service import SandboxService, DefaultPlaywrightManager
+from app.services.sandbox_service import SandboxService, DefaultPlaywrightManager, sandbox_service
+from app.services.async_sandbox_service import AsyncSandboxService
 from app.services.user_state_service import UserStateService
+from app.services.participant_cache import ParticipantCache, database_identity
+from app.services.submission_cache import SubmissionResultCache
+from app.services.chat_scheduler import FairChatScheduler
 from app.services.sentiment_analysis_service import sentiment_analysis_service
 from app.services.llm_gateway import llm_gateway
 from app.services.prompt_generator import prompt_generator
-from app.db.database import get_db
+from app.db.database import get_db, get_async_db
+from app.core.redis_connections import redis_connections
 from redis.asyncio import Redis
 
 class ProductionConfig:
     """生产环境配置"""
     @staticmethod
     def create_sandbox_service():
+        if settings.SANDBOX_ENGINE == "async":
+            return AsyncSandboxService(headless=True)
         return SandboxService(
             playwright_manager=DefaultPlaywrightManager(),
             headless=True
@@ -23,6 +30,8 @@ class DevelopmentConfig:
     """开发环境配置"""
     @staticmethod
     def create_sandbox_service():
+        if settings.SANDBOX_ENGINE == "async":
+            return AsyncSandboxService(headless=False)
         return SandboxService(
             playwright_manager=DefaultPlaywrightManager(),
             headless=False  # 开发环境使用有头模式便于调试
@@ -42,45 +51,106 @@ class TestingConfig:
 # 应用启动时根据环境选择配置
 import os
 
+_async_sandbox_service_instance = None
 def get_sandbox_service():
-    """根据环境变量获取合适的沙箱服务实例"""
+    """
+    根据环境变量获取合适的沙箱服务实例
+
+    SANDBOX_ENGINE=async 时返回进程内共用的 AsyncSandboxService（多个评测共用同一个浏览器，
+    因此每个进程只创建一个）
+    """
+    global _async_sandbox_service_instance
     env = os.getenv('APP_ENV', 'production')
-    
-    if env == 'development':
-        return DevelopmentConfig.create_sandbox_service()
-    elif env == 'testing':
+
+    if env == 'testing':
         # 在测试环境中，会传入模拟的 Playwright 管理器
         return None  # 实际测试中会传入模拟对象
+    if settings.SANDBOX_ENGINE == "async":
+        if _async_sandbox_service_instance is None:
+            config = DevelopmentConfig if env == 'development' else ProductionConfig
+            _async_sandbox_service_instance = config.create_sandbox_service()
+        return _async_sandbox_service_instance
+    if env == 'development':
+        return DevelopmentConfig.create_sandbox_service()
     else:
         return ProductionConfig.create_sandbox_service()
 
 
-_redis_client_instance = None
-_redis_async_instance = None
+def get_submission_sandbox_service():
+    """
+    获取提交评测（/submit-test 与 submit_queue）使用的沙箱服务
+
+    SANDBOX_ENGINE=async 时为 get_sandbox_service() 返回的进程内异步引擎，它的同步 run_evaluation
+    在后台事件循环上执行，可以被多个任务线程同时调用；否则为 sandbox_service 默认实例
+    """
+    if settings.SANDBOX_ENGINE == "async" and os.getenv('APP_ENV', 'production') != 'testing':
+        return get_sandbox_service()
+    return sandbox_service
+def shutdown_sandbox_service() -> None:
+    """关闭进程内共用的异步沙箱引擎（如果已创建）"""
+    if _async_sandbox_service_instance is not None:
+        _async_sandbox_service_instance.shutdown()
+
+
 def get_redis_client() -> redis.Redis:
     """
-    获取 Redis 客户端单例实例
+    获取 Redis 客户端单例实例（连接池按进程角色配置，见 app.core.redis_connections）
     """
-    global _redis_client_instance
-    if _redis_client_instance is None:
-        # 确保 decode_responses=False，以便 redis-py 返回字节
-        # redis-py 的 JSON 命令需要字节作为输入
-        _redis_client_instance = redis.from_url(
-            settings.REDIS_URL,
-            decode_responses=False
-        )
-    return _redis_client_instance
+    # decode_responses=False，以便 redis-py 返回字节
+    # redis-py 的 JSON 命令需要字节作为输入
+    return redis_connections.get_client()
 def get_aioredis() -> Redis:
     """
     获取异步 Redis 客户端 (用于 FastAPI WebSocket 订阅)
     """
-    global _redis_async_instance
-    if _redis_async_instance is None:
-        _redis_async_instance = Redis.from_url(
-            settings.REDIS_URL,
-            decode_responses=True  # 建议 True，避免 json.loads 出错
+    # decode_responses=True，避免 json.loads 出错
+    return redis_connections.get_async_client()
+_participant_cache_instance = None
+def get_participant_cache() -> ParticipantCache:
+    """
+    获取参与者存在性缓存单例（每个进程一个，进程内 LRU + 共享的 Redis 集合，按数据库标识和时间窗口分版本）
+    """
+    global _participant_cache_instance
+    if _participant_cache_instance is None:
+        _participant_cache_instance = ParticipantCache(
+            redis_client=get_redis_client(),
+            ttl_seconds=settings.PARTICIPANT_CACHE_TTL_SECONDS,
+            identity=lambda: database_identity(settings.DATABASE_URL),
+        )
+    return _participant_cache_instance
+_submission_cache_instance = None
+def get_submission_cache() -> SubmissionResultCache:
+    """
+    获取提交评测结果缓存单例（未启用时不连接 Redis，每次都直接评测）
+    """
+    global _submission_cache_instance
+    if _submission_cache_instance is None:
+        _submission_cache_instance = SubmissionResultCache(
+            redis_client=get_redis_client() if settings.SUBMISSION_RESULT_CACHE_ENABLED else None,
+            ttl_seconds=settings.SUBMISSION_RESULT_CACHE_TTL_SECONDS,
+        )
+    return _submission_cache_instance
+_chat_scheduler_instance = None
+def get_chat_scheduler() -> FairChatScheduler:
+    """
+    获取 chat 公平调度器单例（API 进程提交请求，chat Worker 续期与释放名额）
+    """
+    global _chat_scheduler_instance
+    if _chat_scheduler_instance is None:
+        # 延迟导入，避免 celery_app -> dependency_injection -> chat_tasks 的循环导入
+        from app.tasks.chat_tasks import dispatch_chat_task, publish_superseded_chat
+        _chat_scheduler_instance = FairChatScheduler(
+            redis_client=get_redis_client(),
+            dispatch=dispatch_chat_task,
+            max_inflight=settings.CHAT_SCHEDULER_MAX_INFLIGHT,
+            per_participant_limit=settings.CHAT_SCHEDULER_PER_PARTICIPANT_LIMIT,
+            supersede=settings.CHAT_SCHEDULER_SUPERSEDE,
+            lease_seconds=settings.CHAT_SCHEDULER_LEASE_SECONDS,
+            dispatch_grace_seconds=settings.CHAT_SCHEDULER_DISPATCH_GRACE_SECONDS,
+            mode_weights=settings.CHAT_SCHEDULER_MODE_WEIGHTS,
+            on_superseded=publish_superseded_chat,
         )
-    return _redis_async_instance
+    return _chat_scheduler_instance
 def get_user_state_service(redis_client: redis.Redis) -> UserStateService:
     """
     获取 UserStateService 实例
@@ -150,7 +220,8 @@ def get_clustering_service():
     
     try:
         from app.services.distance_based_clustering_service import DistanceBasedClusteringService
-        service = DistanceBasedClusteringService()
+        from app.services.model_server_client import get_model_server_client
+        service = DistanceBasedClusteringService(model_client=get_model_server_client())
         if service.is_loaded:
             return service
         else:
@@ -184,12 +255,9 @@ def get_dynamic_controller():
     """
     获取动态控制器实例（单例模式）
     """
-    global _dynamic_controller_instance, _redis_client_instance
+    global _dynamic_controller_instance
     if _dynamic_controller_instance is None:
-        # 获取Redis客户端实例
-        if _redis_client_instance is None:
-            _redis_client_instance = get_redis_client()
-        _dynamic_controller_instance = create_dynamic_controller(redis_client=_redis_client_instance)
+        _dynamic_controller_instance = create_dynamic_controller(redis_client=get_redis_client())
     return _dynamic_controller_instance
 
 
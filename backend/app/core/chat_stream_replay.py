@@ -0,0 +1,55 @@
+"""
+流式回复断线续传
+
+chat worker 把每一帧同时写入 chat_stream:{taskid}（见 ChatStreamPublisher）。
+WebSocket 重连时客户端带上最后收到的 taskid 与 last_seq，这里从 Stream 中取出缺失的帧：
+- 客户端指定的任务中 seq > last_seq 的帧
+- 如果参与者之后又开始了新的回复，新任务的全部帧
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from redis.asyncio import Redis
+
+from app.services.chat_stream_publisher import chat_stream_key, latest_chat_stream_key
+
+logger = logging.getLogger(__name__)
+
+
+async def load_missed_frames(
+    redis: Redis,
+    participant_id: str,
+    last_seq: int,
+    taskid: Optional[str] = None,
+) -> Tuple[List[str], Dict[str, int]]:
+    """
+    读取重连期间错过的帧。
+
+    Args:
+        redis: 异步 Redis 客户端（decode_responses=True）
+        participant_id: 参与者ID
+        last_seq: 客户端在 taskid 中收到的最后一帧的 seq
+        taskid: 客户端最后收到的任务ID，None 表示参与者最近一次回复
+
+    Returns:
+        Tuple[List[str], Dict[str, int]]: 按顺序需要补发的帧，以及每个任务补发到的最大 seq
+    """
+    latest_taskid = await redis.get(latest_chat_stream_key(participant_id))
+    if taskid is None:
+        taskid = latest_taskid
+
+    plan: List[Tuple[str, int]] = []
+    if taskid:
+        plan.append((taskid, last_seq))
+    if latest_taskid and latest_taskid != taskid:
+        plan.append((latest_taskid, -1))
+
+    frames: List[str] = []
+    replayed: Dict[str, int] = {}
+    for stream_taskid, after_seq in plan:
+        for _, fields in await redis.xrange(chat_stream_key(stream_taskid)):
+            seq = int(fields["seq"])
+            if seq > after_seq:
+                frames.append(fields["frame"])
+                replayed[stream_taskid] = seq
+    return frames, replayed
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import Dict, List
 
 class Settings(BaseSettings):
     """
@@ -45,8 +45,84 @@ class Settings(BaseSettings):
 
     DATABASE_URL: str = "sqlite:///./app/db/database.db"
 
+    # db_writer_queue 批量写入：缓冲区达到 N 行或等待 T 毫秒后一次性提交
+    DB_BATCH_MAX_SIZE: int = 200
+    DB_BATCH_MAX_LATENCY_MS: int = 50
+
+    # 参与者存在性缓存的有效期（秒）：Redis 集合按数据库标识与该长度的时间窗口分版本，过期后重新确认一次
+    PARTICIPANT_CACHE_TTL_SECONDS: int = 86400
+
+    # /behavior/log/batch 单次请求允许的最大事件数
+    BEHAVIOR_BATCH_MAX_EVENTS: int = 500
+
+    # 流式回复合并：缓冲文本等待 N 毫秒或累计 M 个字符后作为一帧发布
+    CHAT_STREAM_FLUSH_INTERVAL_MS: int = 50
+    CHAT_STREAM_FLUSH_CHARS: int = 64
+    # 可续传的流式回复：每个任务的帧同时写入一个有上限的 Redis Stream，断线重连后按 last_seq 补发
+    CHAT_STREAM_MAXLEN: int = 2000
+    CHAT_STREAM_TTL_SECONDS: int = 600
+    # chat 公平调度：全局最多 N 个生成任务在 chat_queue 中排队或执行，每个参与者最多 M 个；
+    # 同一参与者的新消息取代尚未开始的旧消息并提前结束正在生成的旧回答；租约到期后回收崩溃任务的名额
+    CHAT_SCHEDULER_ENABLED: bool = True
+    CHAT_SCHEDULER_MAX_INFLIGHT: int = 4
+    CHAT_SCHEDULER_PER_PARTICIPANT_LIMIT: int = 1
+    CHAT_SCHEDULER_SUPERSEDE: bool = True
+    # 租约：Worker 开始执行后每 N/3 秒续期一次，N 秒未续期视为崩溃；分派后 M 秒内 Worker 须开始执行
+    CHAT_SCHEDULER_LEASE_SECONDS: int = 30
+    CHAT_SCHEDULER_DISPATCH_GRACE_SECONDS: int = 120
+    # 加权轮转：按请求模式设置参与者每轮可连续分派的请求数
+    CHAT_SCHEDULER_MODE_WEIGHTS: Dict[str, int] = {"test": 2, "learning": 1}
+    # chat 执行模式：celery（prefork Worker，每个进程同时只执行一个生成）/
+    # asyncio（python -m app.tasks.async_chat_worker，一个进程的事件循环中同时执行最多 N 个生成，
+    # 情感分析、聚类等阻塞步骤交给 M 个线程的线程池）；asyncio 模式下请求经 Redis 列表分派，
+    # 启用公平调度时应同时把 CHAT_SCHEDULER_MAX_INFLIGHT 调到与并发数相当
+    CHAT_EXECUTION_MODE: str = "celery"
+    CHAT_ASYNC_QUEUE_KEY: str = "chat_async:queue"
+    CHAT_ASYNC_CONCURRENCY: int = 32
+    CHAT_ASYNC_CPU_WORKERS: int = 4
+    # chat Worker 启动：主进程在 fork 之前预加载模型（子进程写时复制共享），
+    # 子进程预热推理完成后写入就绪文件，供容器健康检查使用
+    CHAT_WORKER_PRELOAD: bool = True
+    CHAT_WORKER_READY_FILE: str = "/tmp/chat_worker_ready"
+    # WebSocket 每个连接的发送队列：最多排队 N 条消息，单条发送超时秒数，
+    # 合并后仍溢出时的策略（close 关闭连接让客户端续传 / drop 丢弃新消息）
+    WS_SEND_QUEUE_MAX_SIZE: int = 256
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0
+    WS_SEND_OVERFLOW_POLICY: str = "close"
+
+    # 沙箱静态预检：无 JS 且只有元素/文本/属性检查点的提交直接解析 HTML 判定，不启动浏览器
+    SANDBOX_STATIC_PRECHECK: bool = True
+    # 沙箱并行交互：按检查点的 depends_on 划分执行链，互不依赖的交互检查点在各自的页面上执行，wait 动作相互重叠
+    SANDBOX_PARALLEL_INTERACTIONS: bool = True
+    # 沙箱引擎："sync" 为基于 sync_playwright 的 SandboxService（每次评测独占进程并启动浏览器），
+    # "async" 为基于 async_playwright 的 AsyncSandboxService（一个进程内共用浏览器并发评测）
+    SANDBOX_ENGINE: str = "sync"
+    # 沙箱单次评测的总时限（秒）：异步引擎超时后取消评测并关闭其浏览器上下文；
+    # 同步引擎把它作为页面操作的默认超时，并在检查点之间检查是否超时
+    SANDBOX_EVALUATION_TIMEOUT_SECONDS: float = 30.0
+    # 沙箱页面网络：拦截对外请求（教室离线网络中 CDN 字体、图片、远程脚本会一直挂起直到超时），
+    # URL 前缀命中 SANDBOX_LOCAL_ASSETS 的请求改由本地目录中的同名文件响应，例如
+    # {"https://cdn.jsdelivr.net/": "/srv/sandbox_assets/jsdelivr/"}
+    SANDBOX_BLOCK_EXTERNAL_REQUESTS: bool = True
+    SANDBOX_LOCAL_ASSETS: Dict[str, str] = {}
+    # 沙箱页面加载：set_content 等待的事件（load / domcontentloaded / commit）与最长等待毫秒数，
+    # 超时后不再等待剩余资源，直接在已有的 DOM 上评估检查点
+    SANDBOX_WAIT_UNTIL: str = "load"
+    SANDBOX_PAGE_LOAD_TIMEOUT_MS: int = 5000
+    # 异步沙箱引擎在一个进程内同时进行的评测数上限
+    SANDBOX_ASYNC_MAX_CONCURRENCY: int = 8
+    # 提交评测结果缓存：相同主题、相同检查点定义、相同（规范化后）代码的评测结果在 Redis 中保留 N 秒
+    SUBMISSION_RESULT_CACHE_ENABLED: bool = True
+    SUBMISSION_RESULT_CACHE_TTL_SECONDS: int = 3600
+
     # File paths
     DATA_DIR: str = "./app/data"
+    # 学习内容/测试任务文件的变更检查间隔（秒）：超过间隔后下一次访问会比较文件 mtime，变化则重新加载；0 表示每次访问都检查
+    CONTENT_RELOAD_INTERVAL_SECONDS: float = 2.0
+    # 知识图谱/学习内容/测试任务响应的 Cache-Control：默认 no-cache，浏览器每次带 ETag 重新验证，内容未变时得到 304
+    CONTENT_CACHE_CONTROL: str = "no-cache"
+    # 是否为上述响应预先生成 gzip 版本（客户端 Accept-Encoding 含 gzip 时返回）
+    CONTENT_GZIP_ENABLED: bool = True
     DOCUMENTS_DIR: str = "./app/data/documents"
     VECTOR_STORE_DIR: str = "./app/data/vector_store"
     KB_ANN_FILENAME: str = "kb.ann"
@@ -55,6 +131,13 @@ class Settings(BaseSettings):
     # ML Models paths
     MODELS_BASE_DIR: str = "./models"
     PROGRESS_CLUSTERING_MODEL_DIR: str = "./models/progress_clustering"
+    # 本机模型服务（可选）：情感分析与句向量模型只在 python -m app.services.model_server 进程中加载一份，
+    # 各 Worker 进程经 Unix socket 调用；服务端把 N 毫秒内到达的请求合并为一批推理，每批最多 M 条文本
+    MODEL_SERVER_ENABLED: bool = False
+    MODEL_SERVER_SOCKET_PATH: str = "/tmp/ats_model_server.sock"
+    MODEL_SERVER_TIMEOUT_SECONDS: float = 10.0
+    MODEL_SERVER_BATCH_WINDOW_MS: int = 5
+    MODEL_SERVER_MAX_BATCH_SIZE: int = 64
 
     # LLM Settings
     LLM_MAX_TOKENS: int = 65536
@@ -71,6 +154,25 @@ class Settings(BaseSettings):
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6380
     # REDIS_PASSWORD: str = ""
+    # Redis 连接池：按进程角色设置最大连接数，连接用满时最多等待 N 秒
+    REDIS_POOL_MAX_CONNECTIONS: Dict[str, int] = {
+        "api": 64,
+        "chat_worker": 16,
+        "chat_async_worker": 64,
+        "submit_worker": 8,
+        "db_writer": 64,
+        "behavior_worker": 8,
+        "default": 16,
+    }
+    REDIS_POOL_TIMEOUT_SECONDS: float = 5.0
+    # Redis 连接：socket 超时、建连超时，空闲超过 N 秒的连接使用前先 PING
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 5.0
+    REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS: float = 3.0
+    REDIS_HEALTH_CHECK_INTERVAL_SECONDS: int = 30
+    # 连接错误与超时的重试次数，退避时间带随机抖动（毫秒）
+    REDIS_RETRY_ATTEMPTS: int = 3
+    REDIS_RETRY_BACKOFF_BASE_MS: int = 50
+    REDIS_RETRY_BACKOFF_CAP_MS: int = 1000
 
 # Create a single, globally accessible instance of the settings.
 # This will raise a validation error on startup if required settings are missing.
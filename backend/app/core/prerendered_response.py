@@ -0,0 +1,105 @@
+"""
+预渲染的只读 JSON 响应
+
+知识图谱、学习内容、测试任务这类接口的响应只在数据文件变化时才改变。响应体在加载时序列化一次，
+同时计算强 ETag 和 gzip 压缩后的版本；请求到来时只需比较 If-None-Match 并选择编码，
+命中时返回不带响应体的 304。
+
+gzip 版本使用独立的 ETag（同一资源的不同编码字节不同，强 ETag 不能相同），
+If-None-Match 与两个 ETag 中任意一个相符都视为客户端缓存仍然有效。
+"""
+
+import gzip
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Request, Response
+
+from app.core.config import settings
+
+# 小于该字节数的响应体不压缩（压缩收益抵不上解压开销）
+GZIP_MIN_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class PrerenderedJSON:
+    """
+    预先序列化的 JSON 响应体
+
+    Attributes:
+        body: 未压缩的响应体
+        etag: 未压缩响应体的强 ETag（带引号）
+        gzip_body: gzip 压缩后的响应体，未启用压缩或响应体过小时为 None
+        gzip_etag: gzip 响应体的强 ETag
+    """
+    body: bytes
+    etag: str
+    gzip_body: Optional[bytes] = None
+    gzip_etag: Optional[str] = None
+
+
+def prerender_json(body: bytes, compress: Optional[bool] = None) -> PrerenderedJSON:
+    """计算响应体的 ETag，并按配置生成 gzip 版本"""
+    if compress is None:
+        compress = settings.CONTENT_GZIP_ENABLED
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    if not compress or len(body) < GZIP_MIN_SIZE:
+        return PrerenderedJSON(body=body, etag=f'"{digest}"')
+    # mtime=0 保证同样的内容压缩结果一致
+    return PrerenderedJSON(
+        body=body,
+        etag=f'"{digest}"',
+        gzip_body=gzip.compress(body, compresslevel=9, mtime=0),
+        gzip_etag=f'"{digest}-gzip"',
+    )
+
+
+def _etag_matches(if_none_match: str, payload: PrerenderedJSON) -> bool:
+    """If-None-Match 使用弱比较：忽略 W/ 前缀，* 匹配任意版本"""
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag in (payload.etag, payload.gzip_etag):
+            return True
+    return False
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Accept-Encoding 中包含 gzip 且 q 值大于 0"""
+    for coding in accept_encoding.split(","):
+        name, *params = coding.split(";")
+        if name.strip().lower() != "gzip":
+            continue
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def prerendered_response(request: Request, payload: PrerenderedJSON) -> Response:
+    """根据请求头返回 304、gzip 响应或未压缩的响应"""
+    use_gzip = payload.gzip_body is not None and _accepts_gzip(request.headers.get("accept-encoding", ""))
+    headers = {
+        "ETag": payload.gzip_etag if use_gzip else payload.etag,
+        "Cache-Control": settings.CONTENT_CACHE_CONTROL,
+    }
+    if payload.gzip_body is not None:
+        headers["Vary"] = "Accept-Encoding"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, payload):
+        return Response(status_code=304, headers=headers)
+
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=payload.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
@@ -0,0 +1,180 @@
+"""
+Redis 连接工厂
+
+原来 get_redis_client() 直接 redis.from_url，没有显式的连接池大小、超时和健康检查；
+gevent 的 db_writer（-c 200）里所有 greenlet 共用一个无上限的连接池，
+Redis 重启后连接风暴和半开的死连接都要等到命令失败才暴露。get_aioredis() 又另建一套。
+
+RedisConnectionFactory 统一创建同步 / 异步客户端：
+- 按进程角色（api / chat_worker / submit_worker / db_writer / behavior_worker）设置连接池上限，
+  使用阻塞式连接池：连接用满时等待空闲连接，而不是继续新建
+- TCP keepalive + socket 超时 + health_check_interval，空闲连接在使用前先 PING
+- 连接错误与超时按带抖动的指数退避重试，Redis 重启时各进程不会同时重连
+- get_metrics 提供连接池使用情况，check_health 测量 PING 延迟
+连接池在 fork 后由 redis-py 自动按 pid 重建，Celery prefork 子进程不会共享父进程的 socket。
+"""
+import logging
+import os
+import socket
+import time
+from typing import Dict, Iterable, Optional
+
+import redis
+from redis.asyncio import BlockingConnectionPool as AsyncBlockingConnectionPool
+from redis.asyncio import Redis as AsyncRedis
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.backoff import EqualJitterBackoff
+from redis.retry import Retry
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROLE = "api"
+
+# Celery 队列 -> 进程角色
+_QUEUE_ROLES = {
+    "chat_queue": "chat_worker",
+    "submit_queue": "submit_worker",
+    "db_writer_queue": "db_writer",
+    "behavior_queue": "behavior_worker",
+}
+
+
+def role_for_queues(queues: Iterable[str]) -> str:
+    """根据 Celery Worker 监听的队列确定进程角色，监听多个队列时取连接池最大的角色"""
+    roles = [_QUEUE_ROLES[queue] for queue in queues if queue in _QUEUE_ROLES]
+    if not roles:
+        return "default"
+    return max(roles, key=lambda role: settings.REDIS_POOL_MAX_CONNECTIONS.get(role, 0))
+
+
+def _keepalive_options() -> Dict[int, int]:
+    # 各平台支持的 TCP keepalive 参数不同，只设置存在的项
+    options = {}
+    for name, value in (("TCP_KEEPIDLE", 60), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3)):
+        if hasattr(socket, name):
+            options[getattr(socket, name)] = value
+    return options
+
+
+class RedisConnectionFactory:
+    def __init__(self, url: str = settings.REDIS_URL, role: Optional[str] = None):
+        """
+        Args:
+            url: Redis 连接地址
+            role: 进程角色，决定连接池大小；None 时读取环境变量 REDIS_CLIENT_ROLE，默认 api
+        """
+        self.url = url
+        self.role = role or os.getenv("REDIS_CLIENT_ROLE", DEFAULT_ROLE)
+        self._pool: Optional[redis.BlockingConnectionPool] = None
+        self._client: Optional[redis.Redis] = None
+        self._async_pool: Optional[AsyncBlockingConnectionPool] = None
+        self._async_client: Optional[AsyncRedis] = None
+
+    @property
+    def max_connections(self) -> int:
+        pool_sizes = settings.REDIS_POOL_MAX_CONNECTIONS
+        return pool_sizes.get(self.role, pool_sizes.get("default", 16))
+
+    def configure_role(self, role: str) -> None:
+        """设置进程角色（Worker 启动时调用），角色变化时丢弃已有连接池"""
+        if role == self.role:
+            return
+        logger.info(f"Redis 连接池角色: {self.role} -> {role}")
+        self.reset()
+        self.role = role
+
+    def _connection_kwargs(self) -> dict:
+        return {
+            "socket_timeout": settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+            "socket_connect_timeout": settings.REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS,
+            "socket_keepalive": True,
+            "socket_keepalive_options": _keepalive_options(),
+            "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
+        }
+
+    def _backoff(self) -> EqualJitterBackoff:
+        return EqualJitterBackoff(
+            cap=settings.REDIS_RETRY_BACKOFF_CAP_MS / 1000.0,
+            base=settings.REDIS_RETRY_BACKOFF_BASE_MS / 1000.0,
+        )
+
+    def get_client(self) -> redis.Redis:
+        """
+        同步客户端（decode_responses=False，redis-py 的 JSON 命令需要字节）
+        """
+        if self._client is None:
+            self._pool = redis.BlockingConnectionPool.from_url(
+                self.url,
+                max_connections=self.max_connections,
+                timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+                decode_responses=False,
+                retry=Retry(self._backoff(), settings.REDIS_RETRY_ATTEMPTS),
+                **self._connection_kwargs(),
+            )
+            self._client = redis.Redis(connection_pool=self._pool)
+        return self._client
+
+    def get_async_client(self) -> AsyncRedis:
+        """
+        异步客户端（decode_responses=True，用于 FastAPI 进程内的订阅与读取）
+        """
+        if self._async_client is None:
+            self._async_pool = AsyncBlockingConnectionPool.from_url(
+                self.url,
+                max_connections=self.max_connections,
+                timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+                decode_responses=True,
+                retry=AsyncRetry(self._backoff(), settings.REDIS_RETRY_ATTEMPTS),
+                **self._connection_kwargs(),
+            )
+            self._async_client = AsyncRedis(connection_pool=self._async_pool)
+        return self._async_client
+
+    def get_metrics(self) -> dict:
+        """连接池使用情况：已建立、使用中、空闲的连接数"""
+        metrics = {"role": self.role, "max_connections": self.max_connections}
+        if self._pool is not None:
+            created = len(self._pool._connections)
+            idle = sum(1 for connection in list(self._pool.pool.queue) if connection is not None)
+            metrics["sync"] = {"created": created, "in_use": created - idle, "idle": idle}
+        if self._async_pool is not None:
+            in_use = len(self._async_pool._in_use_connections)
+            idle = len(self._async_pool._available_connections)
+            metrics["async"] = {"created": in_use + idle, "in_use": in_use, "idle": idle}
+        return metrics
+
+    def check_health(self) -> dict:
+        """用同步客户端 PING 一次，返回是否可用与延迟"""
+        start = time.perf_counter()
+        try:
+            self.get_client().ping()
+            return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+        except redis.RedisError as e:
+            return {"ok": False, "error": str(e)}
+
+    async def check_health_async(self) -> dict:
+        """用异步客户端 PING 一次，返回是否可用与延迟"""
+        start = time.perf_counter()
+        try:
+            await self.get_async_client().ping()
+            return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+        except redis.RedisError as e:
+            return {"ok": False, "error": str(e)}
+
+    def reset(self) -> None:
+        """丢弃已有的客户端与连接池，下次获取时按当前配置重建"""
+        if self._pool is not None:
+            try:
+                self._pool.disconnect()
+            except Exception as e:
+                logger.warning(f"关闭 Redis 连接池失败: {e}")
+        self._pool = None
+        self._client = None
+        # 异步连接池绑定在创建它的事件循环上，这里只丢弃引用
+        self._async_pool = None
+        self._async_client = None
+
+
+redis_connections = RedisConnectionFactory()
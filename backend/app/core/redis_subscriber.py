@@ -1,48 +1,140 @@
 # ws_pubsub.py
+"""
+Redis -> WebSocket 消息路由
+
+原来每个 API 进程都 psubscribe ws:user:*，所有参与者的每一帧都会发到每个进程，
+再由没有持有该连接的进程丢弃，扇出开销随"副本数 × 总流量"增长。
+
+现在每个进程只订阅连接在本进程上的参与者的频道 ws:user:{participant_id}：
+- WebSocket 建立时 add_participant 订阅，断开时 remove_participant 退订（按连接数引用计数）
+- 发布方（Celery Worker）不需要任何改动，也不需要参与者 -> 节点的注册表
+- Redis 只把消息投递给真正持有连接的进程，扩容 API 层不再放大扇出
+"""
 import asyncio
-import json
+from typing import Callable, Dict, Optional
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
 from app.config.dependency_injection import get_aioredis
-from app.core.websocket_manager import ws_manager
+from app.core.websocket_manager import ws_manager, WebSocketManager
 import logging
 
 logger = logging.getLogger(__name__)
-async def redis_subscriber():
-    try:
-        redis = get_aioredis()
-        pubsub = redis.pubsub()
-        await pubsub.psubscribe("ws:user:*")
-        logger.info("已订阅 ws:user:*")
 
-        async for message in pubsub.listen():
-            try:
-                # 只处理模式消息
-                if message["type"] != "pmessage":
-                    continue
-                channel = message["channel"]
-                if isinstance(channel, bytes):
-                    channel = channel.decode()
-                print(channel)
-                #channel = message["channel"].decode()  # ws:user:{participant_id}
-                raw_data = message["data"]
-                print(raw_data)
+CHANNEL_PREFIX = "ws:user:"
+
+
+def channel_for(participant_id: str) -> str:
+    """参与者对应的发布频道"""
+    return f"{CHANNEL_PREFIX}{participant_id}"
+
+
+class ParticipantChannelRouter:
+    def __init__(
+        self,
+        redis_factory: Callable[[], Redis] = get_aioredis,
+        manager: WebSocketManager = ws_manager,
+        poll_timeout: float = 1.0,
+    ):
+        """
+        Args:
+            redis_factory: 返回异步 Redis 客户端的工厂
+            manager: 本进程的 WebSocket 连接管理器
+            poll_timeout: 没有订阅或没有消息时每次轮询等待的秒数
+        """
+        self.redis_factory = redis_factory
+        self.manager = manager
+        self.poll_timeout = poll_timeout
+        self._pubsub: Optional[PubSub] = None
+        self._refcounts: Dict[str, int] = {}
+        self._lock = asyncio.Lock()
+
+        # 统计信息
+        self.messages_routed = 0
 
+    @property
+    def subscribed_participants(self):
+        return set(self._refcounts)
+
+    async def add_participant(self, participant_id: str) -> None:
+        """参与者在本进程建立连接后调用，首次连接时订阅其频道"""
+        async with self._lock:
+            count = self._refcounts.get(participant_id, 0)
+            self._refcounts[participant_id] = count + 1
+            if count == 0:
                 try:
-                    payload = json.loads(raw_data)
-                except json.JSONDecodeError:
-                    logger.warning(f"收到非JSON消息: {raw_data} (channel={channel})")
-                    continue
+                    await self._get_pubsub().subscribe(channel_for(participant_id))
+                    logger.info(f"已订阅 {channel_for(participant_id)}")
+                except Exception as e:
+                    # 订阅连接异常时 run 会重建连接，并按引用计数恢复全部订阅
+                    logger.error(f"订阅 {channel_for(participant_id)} 失败: {e}")
+
+    async def remove_participant(self, participant_id: str) -> None:
+        """参与者在本进程的连接断开后调用，最后一个连接断开时退订"""
+        async with self._lock:
+            count = self._refcounts.get(participant_id, 0)
+            if count <= 1:
+                self._refcounts.pop(participant_id, None)
+                if count == 1 and self._pubsub is not None:
+                    try:
+                        await self._pubsub.unsubscribe(channel_for(participant_id))
+                        logger.info(f"已退订 {channel_for(participant_id)}")
+                    except Exception as e:
+                        logger.error(f"退订 {channel_for(participant_id)} 失败: {e}")
+            else:
+                self._refcounts[participant_id] = count - 1
+
+    async def run(self) -> None:
+        """读取本进程订阅的频道并转发给对应的 WebSocket，直到被取消"""
+        async with self._lock:
+            pubsub = self._get_pubsub()
+            # 重启后恢复订阅仍在线的参与者
+            channels = [channel_for(participant_id) for participant_id in self._refcounts]
+            if channels:
+                await pubsub.subscribe(*channels)
+        await pubsub.connect()
 
-                participant_id = channel.split(":")[-1]
-                logger.debug(f"准备分发消息给用户 {participant_id}: {payload}")
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=self.poll_timeout)
+            if message is None or message["type"] != "message":
+                continue
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            # 消息体由发布方保证是 JSON 帧，这里原样转发，不再解析
+            participant_id = channel[len(CHANNEL_PREFIX):]
+            self.messages_routed += 1
 
-                # 启动异步任务，防止阻塞主循环
-                asyncio.create_task(ws_manager.send_to_user(participant_id, raw_data))
+            # send_to_user 只放入该连接的有界发送队列，不等待网络，按到达顺序入队即可保证帧序
+            await self.manager.send_to_user(participant_id, message["data"])
 
+    async def reset(self) -> None:
+        """关闭当前订阅连接，下次 run 时重新建立"""
+        async with self._lock:
+            pubsub, self._pubsub = self._pubsub, None
+        if pubsub is not None:
+            try:
+                await pubsub.aclose()
             except Exception as e:
-                logger.error(f"处理消息出错: {e}", exc_info=True)
+                logger.warning(f"关闭 Redis 订阅连接失败: {e}")
+
+    def _get_pubsub(self) -> PubSub:
+        if self._pubsub is None:
+            self._pubsub = self.redis_factory().pubsub()
+        return self._pubsub
 
-    except Exception as e:
-        logger.critical("Redis 订阅器崩溃", exc_info=True)
-        # 这里可以考虑重试 / 重连
-        await asyncio.sleep(5)
-        asyncio.create_task(redis_subscriber())  # 自动重启订阅
\ No newline at end of file
+
+channel_router = ParticipantChannelRouter()
+
+
+async def redis_subscriber():
+    """在应用生命周期内运行 channel_router，出错后重建订阅连接并重试"""
+    while True:
+        try:
+            await channel_router.run()
+        except asyncio.CancelledError:
+            await channel_router.reset()
+            raise
+        except Exception:
+            logger.critical("Redis 订阅器崩溃，5 秒后重连", exc_info=True)
+            await channel_router.reset()
+            await asyncio.sleep(5)
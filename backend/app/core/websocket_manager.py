@@ -1,26 +1,263 @@
+"""
+WebSocket 连接管理
+
+原来 redis_subscriber 为每条消息创建一个任务直接 await websocket.send_text：
+客户端变慢时任务无限堆积，同一参与者的帧之间没有顺序保证，发送失败也无人处理。
+
+现在每个连接有一个有界发送队列，由唯一的写任务按顺序发送：
+- send_to_user 只入队，不等待网络，帧的顺序即入队顺序
+- 队列满时先把排队中同一任务相邻的 streaming 帧合并成一帧（文本拼接，保留较大的 seq）
+- 合并后仍然满时按策略处理：close 关闭连接（客户端带 last_seq 重连后从 Redis Stream 补发），
+  drop 丢弃新消息
+- 单帧发送超时或失败时关闭连接，由端点的 finally 清理
+- get_metrics 提供队列深度与合并/丢弃/关闭计数
+"""
 import asyncio
-from typing import Dict
+import json
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional
 from fastapi import WebSocket
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 队列溢出时关闭连接使用的关闭码：1013 Try Again Later
+OVERFLOW_CLOSE_CODE = 1013
+
+
+class ConnectionSendQueue:
+    """单个 WebSocket 连接的有界发送队列"""
+
+    def __init__(
+        self,
+        participant_id: str,
+        websocket: WebSocket,
+        max_size: int,
+        send_timeout: float,
+        overflow_policy: str,
+    ):
+        self.participant_id = participant_id
+        self.websocket = websocket
+        self.max_size = max_size
+        self.send_timeout = send_timeout
+        self.overflow_policy = overflow_policy
+        self._queue: Deque[str] = deque()
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        # 暂停期间只入队不发送（补发历史帧时使用）
+        self.paused = False
+        self.closed = False
+
+        # 统计信息
+        self.enqueued = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._run(), name=f"ws-writer-{self.participant_id}")
+
+    def put(self, message: str) -> None:
+        """入队一条消息；队列满时先合并，仍然满则按溢出策略处理"""
+        if self.closed:
+            return
+        if len(self._queue) >= self.max_size and not self.paused:
+            # 暂停期间不合并：合并后的帧无法再按已补发的 seq 去重
+            self._coalesce()
+        if len(self._queue) >= self.max_size:
+            if self.overflow_policy == "drop":
+                self.dropped += 1
+                return
+            logger.warning(f"参与者 {self.participant_id} 的发送队列已满（{self.max_size}），关闭连接")
+            self.dropped += 1
+            self._close_soon(OVERFLOW_CLOSE_CODE, "send queue overflow")
+            return
+
+        self._queue.append(message)
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._wakeup.set()
+
+    def resume(self, replayed: Optional[Dict[str, int]] = None) -> None:
+        """恢复发送，丢弃暂停期间入队但已经补发过的帧"""
+        if replayed:
+            self._queue = deque(message for message in self._queue if not _already_replayed(message, replayed))
+        self.paused = False
+        self._wakeup.set()
+
+    async def aclose(self) -> None:
+        """停止写任务，丢弃未发送的消息"""
+        self.closed = True
+        self._queue.clear()
+        self._wakeup.set()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def _run(self) -> None:
+        while not self.closed:
+            if self.paused or not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            message = self._queue.popleft()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(message), self.send_timeout)
+                self.sent += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"向参与者 {self.participant_id} 发送消息失败，关闭连接: {e!r}")
+                self._close_soon(1011, "send failed")
+                return
+
+    def _coalesce(self) -> None:
+        """把相邻的、同一任务的 streaming 帧合并为一帧"""
+        merged: Deque[str] = deque()
+        last_frame: Optional[dict] = None
+        for message in self._queue:
+            frame = _parse_streaming_frame(message)
+            if frame is not None and last_frame is not None and frame["taskid"] == last_frame["taskid"]:
+                last_frame["message"] += frame["message"]
+                last_frame["seq"] = frame.get("seq", last_frame.get("seq"))
+                merged[-1] = json.dumps(last_frame, ensure_ascii=False)
+                self.coalesced += 1
+                continue
+            merged.append(message)
+            last_frame = frame
+        self._queue = merged
+
+    def _close_soon(self, code: int, reason: str) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._wakeup.set()
+        asyncio.create_task(self._close_websocket(code, reason))
+
+    async def _close_websocket(self, code: int, reason: str) -> None:
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception as e:
+            logger.debug(f"关闭参与者 {self.participant_id} 的连接失败: {e!r}")
+
 
 class WebSocketManager:
-    def __init__(self):
+    def __init__(
+        self,
+        max_queue_size: int = settings.WS_SEND_QUEUE_MAX_SIZE,
+        send_timeout: float = settings.WS_SEND_TIMEOUT_SECONDS,
+        overflow_policy: str = settings.WS_SEND_OVERFLOW_POLICY,
+    ):
         self.active_connections: Dict[str, WebSocket] = {}
+        self._queues: Dict[str, ConnectionSendQueue] = {}
         self._lock = asyncio.Lock() # 并发锁
+        self.max_queue_size = max_queue_size
+        self.send_timeout = send_timeout
+        self.overflow_policy = overflow_policy
+
+        # 已关闭连接的累计统计
+        self._closed_totals = {"sent": 0, "coalesced": 0, "dropped": 0}
 
     async def connect(self, participant_id: str, websocket: WebSocket):
         await websocket.accept()
+        queue = ConnectionSendQueue(
+            participant_id, websocket, self.max_queue_size, self.send_timeout, self.overflow_policy
+        )
+        queue.start()
         async with self._lock: # 获取锁
+            previous = self._queues.get(participant_id)
             self.active_connections[participant_id] = websocket
+            self._queues[participant_id] = queue
+        if previous is not None:
+            await self._retire(previous)
 
-    async def disconnect(self, participant_id: str):
+    async def disconnect(self, participant_id: str, websocket: Optional[WebSocket] = None):
+        """
+        移除连接。传入 websocket 时只在它仍是该参与者的当前连接时移除，
+        避免旧连接的清理把刚建立的新连接一起删掉。
+        """
         async with self._lock: # 获取锁
-            if participant_id in self.active_connections:
-                del self.active_connections[participant_id]
+            queue = self._queues.get(participant_id)
+            if queue is None or (websocket is not None and queue.websocket is not websocket):
+                return
+            del self._queues[participant_id]
+            self.active_connections.pop(participant_id, None)
+        await self._retire(queue)
 
     async def send_to_user(self, participant_id: str, message: str):
-        
-        if participant_id in self.active_connections:
-            websocket = self.active_connections[participant_id]
-            await websocket.send_text(message)
-            print(f"发送完毕")
+        """把消息放入参与者的发送队列，由该连接的写任务按顺序发送"""
+        queue = self._queues.get(participant_id)
+        if queue is not None:
+            queue.put(message)
+
+    def hold(self, participant_id: str):
+        """开始暂存该参与者的实时消息（在订阅频道之前调用）"""
+        queue = self._queues.get(participant_id)
+        if queue is not None:
+            queue.paused = True
+
+    async def release(self, participant_id: str, replayed: Optional[Dict[str, int]] = None):
+        """
+        结束暂存：按到达顺序发送暂存的实时消息，跳过已经补发过的帧。
+
+        Args:
+            participant_id: 参与者ID
+            replayed: 已补发的 {taskid: 最大 seq}
+        """
+        queue = self._queues.get(participant_id)
+        if queue is not None:
+            queue.resume(replayed)
+
+    def get_metrics(self) -> dict:
+        """发送队列的深度与计数统计"""
+        queues = list(self._queues.values())
+        depths = [queue.depth for queue in queues]
+        return {
+            "connections": len(queues),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "queue_depth_high_watermark": max((queue.max_depth for queue in queues), default=0),
+            "max_queue_size": self.max_queue_size,
+            "overflow_policy": self.overflow_policy,
+            "sent": self._closed_totals["sent"] + sum(queue.sent for queue in queues),
+            "coalesced": self._closed_totals["coalesced"] + sum(queue.coalesced for queue in queues),
+            "dropped": self._closed_totals["dropped"] + sum(queue.dropped for queue in queues),
+        }
+
+    async def _retire(self, queue: ConnectionSendQueue) -> None:
+        self._closed_totals["sent"] += queue.sent
+        self._closed_totals["coalesced"] += queue.coalesced
+        self._closed_totals["dropped"] += queue.dropped
+        await queue.aclose()
+
+
+def _parse_streaming_frame(message: str) -> Optional[dict]:
+    try:
+        frame = json.loads(message)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(frame, dict) or frame.get("type") != "streaming" or not isinstance(frame.get("message"), str):
+        return None
+    return frame
+
+
+def _already_replayed(message: str, replayed: Dict[str, int]) -> bool:
+    try:
+        frame = json.loads(message)
+    except (TypeError, ValueError):
+        return False
+    seq = frame.get("seq")
+    max_seq = replayed.get(frame.get("taskid"))
+    return seq is not None and max_seq is not None and seq <= max_seq
+
 ws_manager = WebSocketManager()
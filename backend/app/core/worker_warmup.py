@@ -0,0 +1,129 @@
+"""
+chat Worker 的模型预加载与预热
+
+原来 init_worker_process（worker_process_init）在 fork 之后由每个子进程各自创建 DynamicController：
+每个子进程都重新导入 transformers/torch、加载情感分析模型和聚类模型，
+SentenceTransformer 要等到第一次聚类时才懒加载，第一个聊天任务要承担这部分延迟。
+
+预加载-fork 策略：
+- Worker 主进程（worker_init，fork 之前）创建 DynamicController，加载情感分析模型、聚类模型文件、
+  RAG 索引和 SentenceTransformer，然后 gc.freeze() 把这些长期存在的对象移出 GC 扫描范围，
+  子进程以写时复制方式共享这些只读页面，GC 不会因为改写对象头而复制它们
+- 子进程（worker_process_init）复用继承的 DynamicController，只做一次预热推理：
+  推理线程池、内存分配器等状态在 fork 后不能安全继承，所以推理放在子进程中进行
+- 预热完成后写入就绪文件（CHAT_WORKER_READY_FILE），容器健康检查据此判断 Worker 可以接收任务
+启动耗时与内存对比见 scripts/benchmark_worker_startup.py。
+"""
+
+import gc
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 预热推理使用的示例文本
+WARMUP_TEXT = "I am stuck on this exercise and do not understand why my code fails."
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def preload_models(controller) -> Dict[str, float]:
+    """
+    加载 DynamicController 尚未加载的只读模型（SentenceTransformer 默认懒加载），返回各步骤耗时（毫秒）。
+
+    启用模型服务时聚类编码经模型服务完成，不在本进程加载。
+    """
+    timings: Dict[str, float] = {}
+    clustering_service = getattr(controller, "clustering_service", None)
+    if (
+        clustering_service is not None
+        and getattr(clustering_service, "is_loaded", False)
+        and getattr(clustering_service, "model_client", None) is None
+    ):
+        start = time.perf_counter()
+        try:
+            from app.services.clustering_core_service import _model_cache
+            _model_cache.get_model(clustering_service.config["model_name"])
+            timings["sentence_transformer"] = _elapsed_ms(start)
+        except Exception as e:
+            logger.warning(f"预加载 SentenceTransformer 失败，首次聚类时再加载: {e}")
+    return timings
+
+
+def preload_chat_dependencies(create_controller) -> tuple:
+    """
+    在 fork 之前创建 DynamicController 并加载全部只读模型。
+
+    Args:
+        create_controller: 创建 DynamicController 的函数（无参数）
+
+    Returns:
+        tuple: (controller, 各步骤耗时)
+    """
+    start = time.perf_counter()
+    controller = create_controller()
+    timings = {"controller": _elapsed_ms(start)}
+    timings.update(preload_models(controller))
+    # 把预加载的对象移到永久代，子进程的 GC 不再扫描（改写）它们所在的页面
+    gc.collect()
+    gc.freeze()
+    timings["total"] = _elapsed_ms(start)
+    logger.info(f"chat 依赖预加载完成 (PID: {os.getpid()}): {timings}")
+    return controller, timings
+
+
+def warm_inference(controller) -> Dict[str, float]:
+    """对已加载的模型各做一次推理，返回各步骤耗时（毫秒）；失败只记录日志"""
+    timings: Dict[str, float] = {}
+    sentiment_service = getattr(controller, "sentiment_service", None)
+    if sentiment_service is not None:
+        start = time.perf_counter()
+        try:
+            sentiment_service.analyze_sentiment(WARMUP_TEXT)
+            timings["sentiment"] = _elapsed_ms(start)
+        except Exception as e:
+            logger.warning(f"情感分析预热失败: {e}")
+
+    clustering_service = getattr(controller, "clustering_service", None)
+    if clustering_service is not None and getattr(clustering_service, "is_loaded", False):
+        start = time.perf_counter()
+        try:
+            clustering_service.classify_with_strategy([WARMUP_TEXT])
+            timings["clustering"] = _elapsed_ms(start)
+        except Exception as e:
+            logger.warning(f"聚类预热失败: {e}")
+    return timings
+
+
+def mark_ready(path: Optional[str], info: dict) -> None:
+    """原子地写入就绪文件（多个子进程各自写入时以最后一个为准）"""
+    if not path:
+        return
+    payload = {"pid": os.getpid(), "ready_at": time.time(), **info}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"写入就绪文件 {path} 失败: {e}")
+
+
+def clear_ready(path: Optional[str]) -> None:
+    """Worker 启动时删除上次留下的就绪文件"""
+    if path and os.path.exists(path):
+        try:
+            os.unlink(path)
+        except OSError as e:
+            logger.warning(f"删除就绪文件 {path} 失败: {e}")
+
+
+def is_ready(path: Optional[str] = settings.CHAT_WORKER_READY_FILE) -> bool:
+    return bool(path) and os.path.exists(path)
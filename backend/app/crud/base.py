@@ -2,7 +2,8 @@ from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union, Tup
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from sqlalchemy import asc, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import asc, desc, func, select
 
 # 导入SQLAlchemy模型基类
 from app.db.base_class import Base
@@ -31,6 +32,46 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         """
         self.model = model
 
+    def _apply_query_options(
+        self,
+        query: Any,
+        filter_conditions: Optional[Dict[str, Any]] = None,
+        sort_by: Optional[Union[str, List[Tuple[str, SortDirection]]]] = None
+    ) -> Any:
+        """
+        在查询上应用筛选和排序条件，同时适用于同步的 Query 和异步使用的 select() 语句。
+        
+        Args:
+            query: Query 或 Select 对象
+            filter_conditions: 筛选条件字典，例如 {"participant_id": "user123"}
+            sort_by: 排序字段，可以是单个字段名字符串或字段-方向元组列表
+            
+        Returns:
+            应用条件后的 Query 或 Select 对象
+        """
+        # 应用筛选条件
+        if filter_conditions:
+            for field, value in filter_conditions.items():
+                if hasattr(self.model, field):
+                    # 简单相等筛选
+                    query = query.filter(getattr(self.model, field) == value)
+        
+        # 应用排序
+        if sort_by:
+            if isinstance(sort_by, str):
+                # 单字段排序，默认升序
+                query = query.order_by(asc(getattr(self.model, sort_by)))
+            elif isinstance(sort_by, list):
+                # 多字段排序
+                for field, direction in sort_by:
+                    if hasattr(self.model, field):
+                        column = getattr(self.model, field)
+                        if direction == SortDirection.DESC:
+                            query = query.order_by(desc(column))
+                        else:
+                            query = query.order_by(asc(column))
+        return query
+
     def get(self, db: Session, obj_id: Any) -> Optional[ModelType]:
         """
         通过ID获取单个记录。
@@ -69,29 +110,7 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         Returns:
             List[ModelType]: 记录列表
         """
-        query = db.query(self.model)
-        
-        # 应用筛选条件
-        if filter_conditions:
-            for field, value in filter_conditions.items():
-                if hasattr(self.model, field):
-                    # 简单相等筛选
-                    query = query.filter(getattr(self.model, field) == value)
-        
-        # 应用排序
-        if sort_by:
-            if isinstance(sort_by, str):
-                # 单字段排序，默认升序
-                query = query.order_by(asc(getattr(self.model, sort_by)))
-            elif isinstance(sort_by, list):
-                # 多字段排序
-                for field, direction in sort_by:
-                    if hasattr(self.model, field):
-                        column = getattr(self.model, field)
-                        if direction == SortDirection.DESC:
-                            query = query.order_by(desc(column))
-                        else:
-                            query = query.order_by(asc(column))
+        query = self._apply_query_options(db.query(self.model), filter_conditions, sort_by)
         
         # 应用分页
         sql = query.statement.compile(compile_kwargs={"literal_binds": True})
@@ -116,14 +135,7 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         Returns:
             int: 符合条件的记录总数
         """
-        query = db.query(self.model)
-        
-        # 应用筛选条件
-        if filter_conditions:
-            for field, value in filter_conditions.items():
-                if hasattr(self.model, field):
-                    # 简单相等筛选
-                    query = query.filter(getattr(self.model, field) == value)
+        query = self._apply_query_options(db.query(self.model), filter_conditions)
         
         return query.count()
 
@@ -196,3 +208,73 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             db.delete(obj)
             db.commit()
         return obj
+
+    # --- 异步版本：用于 async 端点，数据库等待不占用线程池、不阻塞事件循环 ---
+
+    async def get_async(self, db: AsyncSession, obj_id: Any) -> Optional[ModelType]:
+        """
+        get 的异步版本。
+        
+        Args:
+            db: 异步数据库会话
+            obj_id: 记录ID
+            
+        Returns:
+            Optional[ModelType]: 找到的记录，如果不存在则返回None
+        """
+        if obj_id is None:
+            return None
+        result = await db.execute(select(self.model).filter(self.model.id == obj_id).limit(1))  # type: ignore
+        return result.scalars().first()
+
+    async def get_multi_async(
+        self, 
+        db: AsyncSession, 
+        *, 
+        skip: int = 0, 
+        limit: int = 100,
+        filter_conditions: Optional[Dict[str, Any]] = None,
+        sort_by: Optional[Union[str, List[Tuple[str, SortDirection]]]] = None
+    ) -> List[ModelType]:
+        """
+        get_multi 的异步版本，参数含义相同。
+        
+        Returns:
+            List[ModelType]: 记录列表
+        """
+        stmt = self._apply_query_options(select(self.model), filter_conditions, sort_by)
+        result = await db.execute(stmt.offset(skip).limit(limit))
+        return list(result.scalars().all())
+
+    async def get_count_async(
+        self, 
+        db: AsyncSession, 
+        *, 
+        filter_conditions: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        get_count 的异步版本，参数含义相同。
+        
+        Returns:
+            int: 符合条件的记录总数
+        """
+        stmt = self._apply_query_options(select(func.count()).select_from(self.model), filter_conditions)
+        result = await db.execute(stmt)
+        return result.scalar_one()
+
+    async def create_async(self, db: AsyncSession, *, obj_in: CreateSchemaType) -> ModelType:
+        """
+        create 的异步版本。
+        
+        Args:
+            db: 异步数据库会话
+            obj_in: 创建记录的数据对象
+            
+        Returns:
+            ModelType: 创建的记录
+        """
+        db_obj = self.model(**obj_in.model_dump())  # SQLAlchemy model
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
@@ -1,8 +1,42 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app.crud.base import CRUDBase
 from app.models.participant import Participant
 from app.schemas.participant import ParticipantCreate, ParticipantUpdate
 
 class CRUDParticipant(CRUDBase[Participant, ParticipantCreate, ParticipantUpdate]):
-    pass
+    def create_if_not_exists(self, db: Session, *, obj_in: ParticipantCreate) -> bool:
+        """
+        幂等地创建参与者：已存在时什么也不做。
 
-participant = CRUDParticipant(Participant)
\ No newline at end of file
+        只发出一条 INSERT（SQLite/PostgreSQL 使用 ON CONFLICT DO NOTHING，
+        MySQL 使用 INSERT IGNORE），不需要先 SELECT 再 INSERT，也不会在并发补录时抛出主键冲突。
+
+        Args:
+            db: 数据库会话
+            obj_in: 参与者创建数据
+
+        Returns:
+            bool: 本次调用是否插入了新参与者（并发调用中只有一个返回 True）
+        """
+        values = obj_in.model_dump()
+        dialect = db.get_bind().dialect.name
+        if dialect == "sqlite":
+            stmt = sqlite_insert(Participant).values(**values).on_conflict_do_nothing(index_elements=["id"])
+        elif dialect == "postgresql":
+            stmt = postgresql_insert(Participant).values(**values).on_conflict_do_nothing(index_elements=["id"])
+        elif dialect in ("mysql", "mariadb"):
+            stmt = mysql_insert(Participant).values(**values).prefix_with("IGNORE")
+        else:
+            # 其他数据库退回到先查后插
+            if self.get(db, obj_id=obj_in.id):
+                return False
+            self.create(db, obj_in=obj_in)
+            return True
+        result = db.execute(stmt)
+        db.commit()
+        return result.rowcount > 0
+
+participant = CRUDParticipant(Participant)
@@ -1,5 +1,6 @@
 from typing import List
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.crud.base import CRUDBase
 from app.models.user_progress import UserProgress
 from app.schemas.user_progress import UserProgressCreate, UserProgressUpdate
@@ -15,5 +16,15 @@ class CRUDProgress(CRUDBase[UserProgress, UserProgressCreate, UserProgressUpdate
         )
         return [record.topic_id for record in progress_records]
 
+    async def get_completed_topics_by_user_async(self, db: AsyncSession, *, participant_id: str) -> List[str]:
+        """
+        get_completed_topics_by_user 的异步版本
+        """
+        progress_records = await self.get_multi_async(
+            db, 
+            filter_conditions={"participant_id": participant_id}
+        )
+        return [record.topic_id for record in progress_records]
+
 # 实例化并暴露给 API 层使用
 progress = CRUDProgress(UserProgress)
@@ -0,0 +1,195 @@
+"""
+数据库微批量写入器
+
+db_writer_queue 上的轻量级写入任务（行为事件、AI 事件、聊天记录、代码提交）
+原本每条记录都单独 INSERT + commit，在 SQLite 上每次 commit 都是一次 fsync。
+BatchWriter 在 Worker 进程内维护一个缓冲区，任务把待写入的行放进缓冲区后阻塞等待，
+缓冲区在达到 N 行或等待超过 T 毫秒时用 bulk_insert_mappings 一次性写入并提交。
+
+语义说明（至少一次）：
+- 任务只有在其所在批次提交成功后才返回，配合 acks_late 使用时，
+  消息只会在数据真正落库后才被确认；
+- 批次写入失败时会逐行重试，只有真正失败的那一行会把异常抛回给对应任务，
+  由任务自身决定重试。
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.base_class import Base
+from app.db.database import WriteSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingWrite:
+    """缓冲区中的一行待写入数据，以及通知调用方写入结果的事件。"""
+
+    __slots__ = ("model", "mapping", "done", "error")
+
+    def __init__(self, model: Type[Base], mapping: Dict[str, Any]):
+        self.model = model
+        self.mapping = mapping
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class BatchWriter:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = WriteSessionLocal,
+        max_batch_size: int = 200,
+        max_latency_ms: int = 50,
+    ):
+        """
+        Args:
+            session_factory: 创建数据库会话的工厂
+            max_batch_size: 缓冲区达到该行数时立即写入
+            max_latency_ms: 一行数据在缓冲区中最多等待的毫秒数
+        """
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+
+        self._cond = threading.Condition()
+        self._pending: List[_PendingWrite] = []
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid: Optional[int] = None
+
+        # 统计信息，便于观察批量效果
+        self.batches_flushed = 0
+        self.rows_flushed = 0
+
+    def write(self, model: Type[Base], mapping: Dict[str, Any], timeout: Optional[float] = None) -> None:
+        """
+        将一行数据放入缓冲区，并阻塞直到其所在批次提交完成。
+
+        Args:
+            model: SQLAlchemy 模型类
+            mapping: 列名到值的映射
+            timeout: 最长等待秒数，None 表示一直等待
+
+        Raises:
+            TimeoutError: 在 timeout 内没有完成写入
+            Exception: 该行写入数据库失败时抛出的原始异常
+        """
+        error = self.write_many(model, [mapping], timeout)[0]
+        if error is not None:
+            raise error
+
+    def write_many(
+        self,
+        model: Type[Base],
+        mappings: List[Dict[str, Any]],
+        timeout: Optional[float] = None,
+    ) -> List[Optional[BaseException]]:
+        """
+        将多行数据一起放入缓冲区，并阻塞直到它们全部提交完成。
+
+        Args:
+            model: SQLAlchemy 模型类
+            mappings: 每行列名到值的映射
+            timeout: 最长等待秒数，None 表示一直等待
+
+        Returns:
+            List[Optional[BaseException]]: 与 mappings 一一对应，写入成功为 None，失败为原始异常
+
+        Raises:
+            TimeoutError: 在 timeout 内没有完成写入
+        """
+        batch = [_PendingWrite(model, mapping) for mapping in mappings]
+        if not batch:
+            return []
+
+        self._ensure_flusher()
+        with self._cond:
+            self._pending.extend(batch)
+            if len(self._pending) >= self.max_batch_size:
+                self._cond.notify()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for pending in batch:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not pending.done.wait(remaining):
+                raise TimeoutError(f"Batch write of {model.__tablename__} rows timed out after {timeout}s")
+        return [pending.error for pending in batch]
+
+    def flush(self) -> int:
+        """
+        立即写入缓冲区中的所有行。
+
+        Returns:
+            int: 本次写入的行数
+        """
+        with self._cond:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+
+        try:
+            self._insert(batch)
+        except Exception as e:
+            # 整批失败时逐行重试，避免一行坏数据拖垮同批次的其他任务
+            logger.warning(f"BatchWriter: 批量写入 {len(batch)} 行失败，改为逐行写入: {e}")
+            for pending in batch:
+                try:
+                    self._insert([pending])
+                except Exception as row_error:
+                    pending.error = row_error
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+        self.batches_flushed += 1
+        self.rows_flushed += len(batch)
+        return len(batch)
+
+    def _insert(self, batch: List[_PendingWrite]) -> None:
+        rows_by_model: Dict[Type[Base], List[Dict[str, Any]]] = {}
+        for pending in batch:
+            rows_by_model.setdefault(pending.model, []).append(pending.mapping)
+
+        db = self.session_factory()
+        try:
+            for model, rows in rows_by_model.items():
+                db.bulk_insert_mappings(model, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _ensure_flusher(self) -> None:
+        # prefork 模式下 fork 出的子进程不会继承父进程的线程，需要按 PID 重新启动
+        pid = os.getpid()
+        if self._flusher is not None and self._flusher_pid == pid and self._flusher.is_alive():
+            return
+        with self._cond:
+            if self._flusher is not None and self._flusher_pid == pid and self._flusher.is_alive():
+                return
+            self._flusher_pid = pid
+            self._flusher = threading.Thread(target=self._run, name="db-batch-writer", daemon=True)
+            self._flusher.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if len(self._pending) < self.max_batch_size:
+                    self._cond.wait(self.max_latency)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"BatchWriter: 刷新缓冲区时出错: {e}", exc_info=True)
+
+
+batch_writer = BatchWriter(
+    max_batch_size=settings.DB_BATCH_MAX_SIZE,
+    max_latency_ms=settings.DB_BATCH_MAX_LATENCY_MS,
+)
@@ -1,19 +1,145 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.sql.dml import UpdateBase
 from app.core.config import settings
-from typing import Generator
+from typing import AsyncGenerator, Generator, Optional
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
-# 创建数据库引擎
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    pool_size=10,
-    max_overflow=20
-)
+# SQLite 等待写锁的最长时间（毫秒），超过后才会抛出 "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = 30000
+
+
+def _is_memory_sqlite(database_url: str) -> bool:
+    return database_url.split("://", 1)[-1] in ("", "/:memory:")
+
+
+def _configure_sqlite(engine: Engine, *, writer: bool, is_memory: bool) -> None:
+    """为 SQLite 引擎（同步引擎，或异步引擎的 sync_engine）注册 PRAGMA 与事务开始方式"""
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # 关闭驱动自带的事务管理，由下面的 begin 事件显式发出 BEGIN
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        if not is_memory:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin_transaction(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if writer else "BEGIN")
+
+
+def create_db_engine(database_url: str, *, writer: bool = False) -> Engine:
+    """
+    根据数据库类型创建引擎。
+
+    对 SQLite 做了专门配置，使多个进程（API 与各 Celery Worker）可以共享同一个数据库文件：
+    - WAL 模式：读取基于快照，不会被写入阻塞，也不会阻塞写入
+    - synchronous=NORMAL：WAL 模式下只在检查点时 fsync，提交不再每次落盘
+    - busy_timeout：拿不到写锁时在 SQLite 内部排队等待，而不是立即报错
+    - writer=True 时，事务以 BEGIN IMMEDIATE 开始并且每个进程只保留一个连接，
+      写事务在开始时就拿到写锁，进程内的写入在这条连接上串行执行，
+      避免读事务升级为写事务时因快照过期而直接失败
+
+    Args:
+        database_url: 数据库连接 URL
+        writer: 是否创建写引擎
+
+    Returns:
+        Engine: SQLAlchemy 引擎
+    """
+    if not database_url.startswith("sqlite"):
+        return create_engine(
+            database_url,
+            pool_pre_ping=True,
+            pool_recycle=300,
+            pool_size=10,
+            max_overflow=20
+        )
+
+    is_memory = _is_memory_sqlite(database_url)
+    pool_kwargs = {}
+    if not is_memory:
+        pool_kwargs = {"pool_size": 1, "max_overflow": 0} if writer else {"pool_size": 10, "max_overflow": 20}
+
+    engine = create_engine(
+        database_url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        **pool_kwargs
+    )
+    _configure_sqlite(engine, writer=writer, is_memory=is_memory)
+    return engine
+
+
+class RoutingSession(Session):
+    """
+    读写分离的 Session（SQLite 文件数据库）
+
+    查询使用读引擎（BEGIN，读取基于 WAL 快照）；一旦 flush 或执行 INSERT/UPDATE/DELETE，
+    本次事务余下的语句都使用写引擎（BEGIN IMMEDIATE，每个进程一个写连接）。
+    这样所有写入都经过同一个写连接串行执行，不会出现读事务升级为写事务时因快照过期而失败。
+    """
+
+    def __init__(self, *args, reader: Engine, writer: Engine, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._reader = reader
+        self._writer = writer
+        self._writing = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._writing or self._flushing or isinstance(clause, UpdateBase):
+            self._writing = True
+            return self._writer
+        return self._reader
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_routing(session, transaction):
+    # 事务结束后，下一个事务的查询重新使用读引擎
+    if transaction.parent is None:
+        session._writing = False
+
+
+def create_session_factory(reader: Engine, writer: Engine) -> sessionmaker:
+    """创建 Session 工厂：读写引擎相同时直接绑定，不同时按读写分别路由"""
+    if writer is reader:
+        return sessionmaker(autocommit=False, autoflush=False, bind=reader)
+    return sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, reader=reader, writer=writer)
+
+
+def _needs_write_engine(database_url: str) -> bool:
+    # 只有 SQLite 文件数据库需要单独的写引擎；内存数据库只能有一个引擎，否则读写会落到两个不同的数据库
+    return database_url.startswith("sqlite") and not _is_memory_sqlite(database_url)
+
+
+# 创建数据库引擎（读写通用，SQLite 下读取基于 WAL 快照）
+engine = create_db_engine(settings.DATABASE_URL)
+
+# 写引擎：SQLite 文件数据库下每个进程一个写连接；其他情况直接复用同一个引擎
+write_engine = create_db_engine(settings.DATABASE_URL, writer=True) if _needs_write_engine(settings.DATABASE_URL) else engine
+
+# 创建一个Session工厂（SQLite 下查询走读引擎，写入走写引擎）
+SessionLocal = create_session_factory(engine, write_engine)
+
+# 专用于写入的Session工厂（批量写入、参与者补录等）
+WriteSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=write_engine)
+
+
+def _dispose_engines_after_fork():
+    # prefork Worker 的子进程不能复用父进程的连接，丢弃继承来的连接池（不关闭父进程仍在使用的连接）
+    engine.dispose(close=False)
+    if write_engine is not engine:
+        write_engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_engines_after_fork)
 
-# 创建一个Session工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # FastAPI 依赖项，用于在每个请求中获取数据库会话
 def get_db() -> Generator[Session, None, None]:
@@ -22,3 +148,92 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+# 异步驱动映射：同步 URL 前缀 -> 异步 URL 前缀
+_ASYNC_DRIVERS = {
+    "sqlite://": "sqlite+aiosqlite://",
+    "sqlite+pysqlite://": "sqlite+aiosqlite://",
+    "mysql://": "mysql+asyncmy://",
+    "mysql+pymysql://": "mysql+asyncmy://",
+    "postgresql://": "postgresql+asyncpg://",
+    "postgresql+psycopg2://": "postgresql+asyncpg://",
+}
+
+
+def to_async_database_url(database_url: str) -> str:
+    """将同步数据库 URL 转换为对应异步驱动（aiosqlite / asyncmy / asyncpg）的 URL"""
+    for sync_prefix, async_prefix in _ASYNC_DRIVERS.items():
+        if database_url.startswith(sync_prefix):
+            return async_prefix + database_url[len(sync_prefix):]
+    return database_url
+
+
+def create_async_db_engine(database_url: str, *, writer: bool = False) -> AsyncEngine:
+    """
+    创建异步引擎，SQLite 下与同步引擎使用相同的 WAL / busy_timeout 配置。
+
+    Args:
+        database_url: 同步或异步数据库连接 URL
+        writer: 是否创建写引擎（BEGIN IMMEDIATE，每个进程一个连接）
+
+    Returns:
+        AsyncEngine: SQLAlchemy 异步引擎
+    """
+    async_url = to_async_database_url(database_url)
+    if not async_url.startswith("sqlite"):
+        return create_async_engine(
+            async_url,
+            pool_pre_ping=True,
+            pool_recycle=300,
+            pool_size=10,
+            max_overflow=20
+        )
+
+    is_memory = _is_memory_sqlite(async_url)
+    pool_kwargs = {"pool_size": 1, "max_overflow": 0} if writer and not is_memory else {}
+    async_engine = create_async_engine(
+        async_url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        **pool_kwargs
+    )
+    _configure_sqlite(async_engine.sync_engine, writer=writer, is_memory=is_memory)
+    return async_engine
+
+
+def create_async_session_factory(reader: AsyncEngine, writer: AsyncEngine) -> async_sessionmaker:
+    """创建异步 Session 工厂，读写路由方式与 create_session_factory 相同"""
+    if writer is reader:
+        return async_sessionmaker(reader, autoflush=False, expire_on_commit=False)
+    return async_sessionmaker(
+        sync_session_class=RoutingSession,
+        autoflush=False,
+        expire_on_commit=False,
+        reader=reader.sync_engine,
+        writer=writer.sync_engine,
+    )
+
+
+# 异步引擎按需创建：只有 API 进程会用到，Celery Worker 不需要安装异步驱动
+_async_engine: Optional[AsyncEngine] = None
+_async_write_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+
+
+def get_async_session_factory() -> async_sessionmaker:
+    """获取异步 Session 工厂（单例，SQLite 下写入同样经过每个进程一个的写连接）"""
+    global _async_engine, _async_write_engine, _async_session_factory
+    if _async_session_factory is None:
+        _async_engine = create_async_db_engine(settings.DATABASE_URL)
+        _async_write_engine = (
+            create_async_db_engine(settings.DATABASE_URL, writer=True)
+            if _needs_write_engine(settings.DATABASE_URL) else _async_engine
+        )
+        _async_session_factory = create_async_session_factory(_async_engine, _async_write_engine)
+    return _async_session_factory
+
+
+# FastAPI 依赖项，用于在 async 端点中获取异步数据库会话，数据库等待不再占用线程池或阻塞事件循环
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with get_async_session_factory()() as db:
+        yield db
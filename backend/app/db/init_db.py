@@ -23,9 +23,10 @@ else:
     if os.path.exists(env_example_path):
         load_dotenv(env_example_path)
 
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import sessionmaker
 from app.db.base_class import Base
+from app.db.database import create_db_engine
 from app.core.config import settings
 
 # 导入所有模型，确保它们被正确注册
@@ -39,10 +40,8 @@ from app.models.submission import Submission
 def init_db():
     """初始化数据库，创建所有表"""
     print(f"Using database URL: {settings.DATABASE_URL}")
-    # 创建数据库引擎
-    engine = create_engine(
-        settings.DATABASE_URL
-    )
+    # 创建数据库引擎（SQLite 下同时把数据库文件切换为 WAL 模式）
+    engine = create_db_engine(settings.DATABASE_URL)
     
     # 创建所有表
     Base.metadata.create_all(bind=engine)
@@ -9,6 +9,7 @@ import asyncio
 from contextlib import asynccontextmanager
 #from app.api import socket_router 
 from app.core.redis_subscriber import redis_subscriber
+from app.services.content_loader import preload_content
 import logging
 
 # 设置时区为上海
@@ -20,6 +21,9 @@ async def lifespan(app: FastAPI):
     在应用生命周期里启动 redis_subscriber 作为后台任务，并在关闭时取消它。
     保证订阅器和 ws_manager 在同一进程内。
     """
+    # 加载并校验全部学习内容和测试任务（/submit-test 直接使用编译好的检查点计划）
+    logging.info(f"预加载内容文件 {preload_content()} 个")
+
     # 启动订阅协程（不会阻塞主线程）
     logging.info("启动 Redis 订阅器任务")
     app.state.redis_task = asyncio.create_task(redis_subscriber())
@@ -57,12 +57,14 @@ class SocketResponse2(BaseModel):
         status: 响应状态，'success'表示成功，'error'表示错误
         error_message: 错误信息，可选字段
         timestamp: 时间戳，记录消息发送时间
+        seq: 同一任务内递增的帧序号（流式消息使用），用于去重、排序与断线续传
     """
     type: str
     taskid:str
     message: Any = None
     error: Optional[Error] = None
     timestamp: Optional[datetime] = None
+    seq: Optional[int] = None
 
 class SocketResponse(BaseModel):
     """Socket响应模型
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import Optional, Dict, List, Any, Union, TYPE_CHECKING
 from enum import Enum
 
@@ -109,10 +109,16 @@ class BaseCheckpoint(BaseModel):
         name: 检查点名称，用于标识和描述检查点
         type: 检查点类型
         feedback: 反馈信息，当检查点失败时显示给用户
+        depends_on: 依赖的检查点名称列表（必须排在本检查点之前）。
+            None（默认）表示按原顺序在主页面上执行；空列表表示只依赖初始页面，可以在独立页面上并行执行；
+            非空时在所依赖检查点执行后的页面上评估
     """
     name: str = Field(..., min_length=1, description="检查点名称")
     type: CheckpointType = Field(..., description="检查点类型")
     feedback: str = Field(..., min_length=1, description="反馈信息")
+    depends_on: Optional[List[str]] = Field(None, description="依赖的检查点名称列表")
+    # 预先编译的执行计划（checkpoint_compiler.AssertionPlan），加载任务时生成，不参与序列化
+    _plan: Any = PrivateAttr(default=None)
 
 
 class AssertAttributeCheckpoint(BaseCheckpoint):
@@ -0,0 +1,36 @@
+from pydantic import BaseModel, Field
+from typing import Any, Literal, Optional
+
+
+class ClientMessage(BaseModel):
+    """客户端通过 WebSocket 发送的请求消息
+
+    与 HTTP 端点一一对应，payload 的结构与对应端点的请求体相同，
+    participant_id 一律以连接所属的参与者为准。
+
+    Attributes:
+        type: 请求类型，chat(/chat/ai/chat2)、submit_test(/submission/submit-test2)、
+              behavior_batch(/behavior/log/batch)、ping(心跳)
+        request_id: 客户端生成的请求ID，原样带回到 ack 中
+        payload: 请求体
+    """
+    type: Literal["chat", "submit_test", "behavior_batch", "ping"]
+    request_id: Optional[str] = Field(None, description="客户端请求ID")
+    payload: Any = None
+
+
+class ServerAck(BaseModel):
+    """服务器对客户端请求的确认消息
+
+    Attributes:
+        type: 固定为 "ack"
+        request_id: 对应请求的ID
+        code: 状态码，与对应 HTTP 端点的状态码一致（202 表示已受理）
+        message: 结果说明或错误信息
+        data: 数据载荷，如任务ID、接收的事件数
+    """
+    type: Literal["ack"] = "ack"
+    request_id: Optional[str] = None
+    code: int = 202
+    message: str = "accepted"
+    data: Any = None
@@ -0,0 +1,363 @@
+"""
+AsyncSandboxService（基于 async_playwright 的沙箱评测引擎）
+
+SandboxService 基于 playwright.sync_api，不能在事件循环中调用，每次评测都独占一个线程/进程
+并重新启动一次 Chromium，submit_queue 因此只能用 -c 2 的 prefork 进程扩展。
+
+AsyncSandboxService.run_evaluation_async 是协程，可以在一个事件循环中同时进行多个评测：
+- 进程内共用一个按需启动的 Chromium，浏览器断开（崩溃）后下一次评测时重新启动
+- 每个评测使用独立的 BrowserContext（cookie、storage 互不可见），结束、超时或被取消时关闭
+- 同时进行的评测数由 max_concurrency 限制，超过时排队等待
+- 每个评测有总时限，超时后取消并返回 EVALUATION_TIMEOUT_MESSAGE；调用方取消协程时同样会关闭上下文
+- 页面的外部请求按 SandboxNetworkPolicy 拦截或由本地资源响应，加载等待的事件与时限和同步引擎相同
+- 页面 HTML 构建、静态预检、检查点编译与判定文案全部沿用 SandboxService，结果与同步引擎一致；
+  按 depends_on 划分的独立执行链用 asyncio.gather 并发执行
+
+同步的 run_evaluation 与 SandboxService 约定相同（参数一致，返回同样的结果字典），它把评测提交到
+进程内的后台事件循环上并等待结果。提交 Worker 因此可以用 --pool=threads 运行多个任务线程，
+所有线程的评测共用一个浏览器，不再需要为每个并发评测 fork 一个进程并各自启动 Chromium。
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from playwright.async_api import Error, Page, TimeoutError as PlaywrightTimeoutError, async_playwright
+
+from app.core.config import settings
+from app.services.checkpoint_compiler import (
+    BUNDLED_ASSERTION_TYPES,
+    CHECKPOINT_BUNDLE_SCRIPT,
+    assertion_plan,
+    compile_assertions,
+    plan_isolated_chains,
+)
+from app.services.sandbox_service import (
+    CHROMIUM_LAUNCH_ARGS,
+    EVALUATION_TIMEOUT_MESSAGE,
+    INTERNAL_ERROR_MESSAGE,
+    RAW_HTML_TASKS,
+    SandboxService,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSandboxService(SandboxService):
+    def __init__(
+        self,
+        playwright_factory: Callable = async_playwright,
+        headless=True,
+        static_precheck=settings.SANDBOX_STATIC_PRECHECK,
+        parallel_interactions=settings.SANDBOX_PARALLEL_INTERACTIONS,
+        timeout_seconds: float = settings.SANDBOX_EVALUATION_TIMEOUT_SECONDS,
+        max_concurrency: int = settings.SANDBOX_ASYNC_MAX_CONCURRENCY,
+        **kwargs,
+    ):
+        """
+        初始化异步沙箱服务
+
+        Args:
+            playwright_factory: 返回 async_playwright 上下文管理器的工厂，用于依赖注入
+            headless: 是否以无头模式运行浏览器
+            static_precheck: 是否先尝试在静态 DOM 上判定检查点（见 static_evaluator）
+            parallel_interactions: 是否把互不依赖的交互检查点放到独立页面上并发执行
+            timeout_seconds: 单次评测的总时限（秒）
+            max_concurrency: 同时进行的评测数上限
+            **kwargs: 页面加载与网络拦截参数（wait_until、page_load_timeout_ms、network_policy），与 SandboxService 相同
+        """
+        super().__init__(
+            headless=headless,
+            static_precheck=static_precheck,
+            parallel_interactions=parallel_interactions,
+            timeout_seconds=timeout_seconds,
+            **kwargs,
+        )
+        self._playwright_factory = playwright_factory
+        self._max_concurrency = max_concurrency
+        self._playwright_context = None
+        self._playwright = None
+        self._browser = None
+        # 事件循环相关的对象在第一次评测时创建，避免绑定到导入时的事件循环
+        self._launch_lock: Optional[asyncio.Lock] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # run_evaluation（同步接口）使用的后台事件循环，按进程创建
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_pid: Optional[int] = None
+        self._loop_lock = threading.Lock()
+
+    def run_evaluation(
+        self, user_code: Dict[str, str], checkpoints: List[Any], topic_id: str = None
+    ) -> Dict[str, Any]:
+        """
+        运行代码评测（同步接口，与 SandboxService.run_evaluation 相同）
+
+        在进程内的后台事件循环上执行 run_evaluation_async 并阻塞等待结果，可以从多个线程同时调用。
+        不能在事件循环线程中调用（会阻塞事件循环），协程代码应直接 await run_evaluation_async。
+
+        Returns:
+            评测结果字典
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self.run_evaluation_async(user_code, checkpoints, topic_id=topic_id), self._get_loop()
+        )
+        return future.result()
+
+    def shutdown(self) -> None:
+        """关闭浏览器并停止后台事件循环（Worker 退出时调用）"""
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            if loop is None or self._loop_pid != os.getpid():
+                return
+            self._loop = self._loop_thread = self._loop_pid = None
+        try:
+            asyncio.run_coroutine_threadsafe(self.close(), loop).result(timeout=10)
+        except Exception as e:
+            logger.warning(f"AsyncSandboxService: 关闭浏览器失败: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=10)
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """返回后台事件循环，第一次调用或 fork 之后在新线程中创建"""
+        with self._loop_lock:
+            if self._loop is not None and self._loop_pid == os.getpid():
+                return self._loop
+            # fork 出的子进程不能使用父进程的事件循环线程和浏览器连接
+            self._playwright_context = None
+            self._playwright = None
+            self._browser = None
+            self._launch_lock = None
+            self._semaphore = None
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="async-sandbox-loop", daemon=True)
+            thread.start()
+            self._loop, self._loop_thread, self._loop_pid = loop, thread, os.getpid()
+            return loop
+
+    async def run_evaluation_async(
+        self,
+        user_code: Dict[str, str],
+        checkpoints: List[Any],
+        topic_id: str = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        运行代码评测
+
+        Args:
+            user_code: 用户提交的代码，包含 html, css, js
+            checkpoints: 检查点列表
+            topic_id: 测试任务ID，用于判断是否使用 raw HTML 模式
+            timeout: 本次评测的时限（秒），默认使用 timeout_seconds；排队等待的时间不计入
+
+        Returns:
+            评测结果字典
+        """
+        raw_html_mode = (topic_id in RAW_HTML_TASKS)
+        full_html = self._build_page_html(user_code, raw_html_mode)
+
+        static_result = self._static_result(full_html, user_code, checkpoints, raw_html_mode)
+        if static_result is not None:
+            return static_result
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        async with self._semaphore:
+            try:
+                outcomes = await asyncio.wait_for(
+                    self._evaluate_in_context(full_html, checkpoints),
+                    timeout=timeout if timeout is not None else self._timeout_seconds,
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"AsyncSandboxService: 评测超时，topic={topic_id}")
+                return {"passed": False, "message": EVALUATION_TIMEOUT_MESSAGE, "details": []}
+            except Error as e:
+                return {"passed": False, "message": INTERNAL_ERROR_MESSAGE, "details": [str(e)]}
+
+        return self._summarize(checkpoints, outcomes)
+
+    async def close(self) -> None:
+        """关闭共用的浏览器与 Playwright（Worker 退出时调用）"""
+        browser, self._browser = self._browser, None
+        if browser is not None:
+            try:
+                await browser.close()
+            except Error:
+                # 浏览器可能已经关闭，忽略错误
+                pass
+        if self._playwright_context is not None:
+            await self._playwright_context.__aexit__(None, None, None)
+            self._playwright_context = None
+            self._playwright = None
+
+    async def _get_browser(self):
+        """返回共用的浏览器，未启动或已断开时（重新）启动"""
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            if self._playwright is None:
+                self._playwright_context = self._playwright_factory()
+                self._playwright = await self._playwright_context.__aenter__()
+            if self._browser is not None:
+                logger.warning("AsyncSandboxService: 浏览器已断开，重新启动")
+            self._browser = await self._playwright.chromium.launch(
+                headless=self._headless, args=CHROMIUM_LAUNCH_ARGS
+            )
+            return self._browser
+
+    async def _evaluate_in_context(self, full_html: str, checkpoints: List[Any]) -> List[Tuple[bool, str]]:
+        """在一个新的浏览器上下文中评估全部检查点，结束（包括超时取消）时关闭上下文"""
+        browser = await self._get_browser()
+        context = await browser.new_context()
+        try:
+            chains = plan_isolated_chains(checkpoints) if self._parallel_interactions else None
+            if chains is None:
+                chains = [list(range(len(checkpoints)))]
+            pages = [await context.new_page() for _ in chains]
+            await asyncio.gather(*(self._load_page_async(page, full_html) for page in pages))
+
+            chain_outcomes = await asyncio.gather(*(
+                self._evaluate_checkpoints_async(page, [checkpoints[i] for i in chain])
+                for page, chain in zip(pages, chains)
+            ))
+        finally:
+            try:
+                await context.close()
+            except Error:
+                pass
+
+        outcomes: List[Tuple[bool, str]] = [None] * len(checkpoints)
+        for chain, results in zip(chains, chain_outcomes):
+            for index, outcome in zip(chain, results):
+                outcomes[index] = outcome
+        return outcomes
+
+    async def _load_page_async(self, page: Page, full_html: str) -> None:
+        """注册网络拦截并加载页面，超过 page_load_timeout_ms 时不再等待剩余资源"""
+        if self._network_policy.enabled:
+            await page.route("**/*", self._network_policy.handle_async)
+        page.set_default_timeout(self._timeout_seconds * 1000)
+        try:
+            await page.set_content(full_html, wait_until=self._wait_until, timeout=self._page_load_timeout_ms)
+        except PlaywrightTimeoutError:
+            logger.info(f"沙箱页面在 {self._page_load_timeout_ms}ms 内未到达 {self._wait_until}，继续评估")
+
+    async def _evaluate_checkpoints_async(self, page: Page, checkpoints: List[Any]) -> List[Tuple[bool, str]]:
+        """按顺序评估一个页面上的检查点，连续的非交互检查点合并为一次 page.evaluate"""
+        results = []
+        pending = []
+        for cp in checkpoints:
+            if cp.type == "interaction_and_assert":
+                results.extend(await self._evaluate_bundle_async(page, pending))
+                pending = []
+                results.append(await self._evaluate_interaction_async(page, cp))
+            else:
+                pending.append(cp)
+        results.extend(await self._evaluate_bundle_async(page, pending))
+        return results
+
+    async def _evaluate_interaction_async(self, page: Page, checkpoint) -> Tuple[bool, str]:
+        """执行交互动作并评估其嵌套断言，与 SandboxService._evaluate_checkpoint 的文案一致"""
+        action_type = checkpoint.action_type
+        action_selector = checkpoint.action_selector
+        action_value = checkpoint.action_value
+        try:
+            try:
+                if action_type == "click":
+                    await page.locator(action_selector).click()
+                elif action_type == "type_text":
+                    if action_value is not None:
+                        await page.locator(action_selector).fill(action_value)
+                    else:
+                        return False, "type_text 操作需要提供 action_value"
+                elif action_type == "hover":
+                    await page.locator(action_selector).hover()
+                elif action_type == "focus":
+                    await page.locator(action_selector).focus()
+                elif action_type == "blur":
+                    await page.locator(action_selector).evaluate("element => element.blur()")
+                elif action_type == "scroll":
+                    await page.locator(action_selector).scroll_into_view_if_needed()
+                elif action_type == "wait":
+                    # 默认等待100毫秒
+                    await page.wait_for_timeout(int(action_value) if action_value is not None else 100)
+                else:
+                    return False, f"不支持的动作类型: {action_type}"
+            except Exception as e:
+                return False, f"执行动作 '{action_type}' 时发生错误: {e}"
+
+            return (await self._evaluate_bundle_async(page, [checkpoint.assertion]))[0]
+        except Exception as e:
+            return False, f"执行检查点时发生错误: {e}"
+
+    async def _evaluate_bundle_async(self, page: Page, assertions: List[Any]) -> List[Tuple[bool, str]]:
+        """SandboxService._evaluate_bundle 的异步版本，回退规则相同"""
+        results = []
+        while len(results) < len(assertions):
+            batch = assertions[len(results):]
+            try:
+                observations = await page.evaluate(CHECKPOINT_BUNDLE_SCRIPT, compile_assertions(batch))
+                if not isinstance(observations, list):
+                    raise TypeError(f"观测结果类型错误: {type(observations).__name__}")
+            except Exception as e:
+                logger.warning(f"检查点合并评估失败，改为逐个评估: {e}")
+                for assertion in batch:
+                    results.append(await self._evaluate_assertion_async(page, assertion))
+                break
+            for assertion, observation in zip(batch, observations):
+                if observation.get("fallback"):
+                    results.append(await self._evaluate_assertion_async(page, assertion))
+                    break
+                results.append(self._judge_assertion(assertion, observation))
+        return results
+
+    async def _evaluate_assertion_async(self, page: Page, assertion) -> Tuple[bool, str]:
+        if assertion is None or assertion.type not in BUNDLED_ASSERTION_TYPES:
+            return self._judge_assertion(assertion, {})
+        try:
+            return self._judge_assertion(assertion, await self._observe_assertion_async(page, assertion))
+        except Exception as e:
+            return False, f"执行断言时发生错误: {e}"
+
+    async def _observe_assertion_async(self, page: Page, assertion) -> Dict[str, Any]:
+        """SandboxService._observe_assertion 的异步版本"""
+        observation: Dict[str, Any] = {}
+        if assertion.type == "custom_script":
+            try:
+                observation["value"] = await page.evaluate(assertion_plan(assertion).item["script"])
+            except Exception as e:
+                observation["error"] = str(e)
+            return observation
+
+        locator = page.locator(assertion.selector)
+        assertion_op = assertion.assertion_type
+        try:
+            if assertion.type == "assert_style":
+                observation["value"] = await locator.evaluate(
+                    "(element, prop) => window.getComputedStyle(element).getPropertyValue(prop)",
+                    assertion.css_property
+                )
+            elif assertion.type == "assert_text_content":
+                observation["text"] = await locator.text_content(timeout=5000)
+            elif assertion.type == "assert_attribute":
+                observation["count"] = await locator.count()
+                if observation["count"] > 0 and assertion_op in ("exists", "not_exists"):
+                    observation["has_attribute"] = await locator.evaluate(
+                        "(element, attr) => element.hasAttribute(attr)", assertion.attribute
+                    )
+                elif observation["count"] > 0:
+                    observation["value"] = await locator.evaluate(
+                        "(element, attr) => element.getAttribute(attr)", assertion.attribute
+                    )
+            elif assertion.type == "assert_element":
+                observation["count"] = await locator.count()
+                if observation["count"] > 0 and assertion_op not in ("exists", "not_exists"):
+                    observation["text"] = await locator.text_content(timeout=5000)
+        except Exception as e:
+            observation["error"] = str(e)
+        return observation
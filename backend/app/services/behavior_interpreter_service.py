@@ -22,10 +22,14 @@ from datetime import datetime, timedelta
 import traceback
 from typing import Optional, Any, Dict, Callable
 
+from app.services.buffered_profile import ProfileConflictError
+
 # 规则参数（可在这里调整或从配置中读取）
 FRUSTRATION_WINDOW_MINUTES = 2
 FRUSTRATION_ERROR_RATE_THRESHOLD = 0.75
 FRUSTRATION_INTERVAL_SECONDS = 10
+# 批量解释时档案字段被并发修改，基于最新档案重新解释这一批事件的最多次数
+BATCH_REINTERPRET_ATTEMPTS = 3
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -161,7 +165,44 @@ class BehaviorInterpreterService:
             logger.info(f"BehaviorInterpreterService: 未处理的事件类型 {event_type}")
             return
 
-    def _handle_test_submission(self, participant_id, event_data, timestamp, 
+    def interpret_events(self, events, user_state_service=None, db_session=None):
+        """
+        批量入口：按原顺序解释一批行为事件。
+
+        同一参与者的事件在同一个缓冲档案上依次解释，档案只从 Redis 读取一次、写回一次。
+        写回时发现同一字段被其他客户端修改（ProfileConflictError），丢弃缓冲区并基于最新档案重新解释；
+        多次冲突后退回逐条解释，每个操作直接读写 Redis。
+
+        Args:
+            events: BehaviorEvent 实例或等价 dict 的列表
+            user_state_service: UserStateService 实例，用于状态更新操作
+            db_session: 数据库会话，用于挫败检测等需要查询历史数据的操作
+        """
+        events_by_participant: Dict[Any, list] = {}
+        for event in events:
+            participant_id = getattr(event, "participant_id", None) or (event.get("participant_id") if isinstance(event, dict) else None)
+            events_by_participant.setdefault(participant_id, []).append(event)
+
+        for participant_id, participant_events in events_by_participant.items():
+            if user_state_service is None or not participant_id:
+                for event in participant_events:
+                    self.interpret_event(event, user_state_service=user_state_service, db_session=db_session)
+                continue
+
+            for attempt in range(BATCH_REINTERPRET_ATTEMPTS):
+                try:
+                    with user_state_service.buffered_profile(participant_id) as buffered_service:
+                        for event in participant_events:
+                            self.interpret_event(event, user_state_service=buffered_service, db_session=db_session)
+                    break
+                except ProfileConflictError as e:
+                    logger.info(f"BehaviorInterpreterService: 参与者 {participant_id} 的档案被并发修改（{e}），重新解释本批事件")
+            else:
+                logger.warning(f"BehaviorInterpreterService: 参与者 {participant_id} 的档案持续冲突，改为逐条解释")
+                for event in participant_events:
+                    self.interpret_event(event, user_state_service=user_state_service, db_session=db_session)
+
+    def _handle_test_submission(self, participant_id, event_data, timestamp,
                                user_state_service, db_session, crud_event, SessionLocal, is_replay):
         """处理测试提交事件"""
         # 从 event_data 中解析 topic_id 与正确性标志
@@ -0,0 +1,287 @@
+"""
+BufferedProfileRedis（用户档案读写缓冲）
+
+UserStateService 的每个操作都会通过 RedisJSON 读取整个档案、再逐个字段 JSON.SET，
+批量解释同一参与者的多条行为事件时，这意味着每条事件都有多次 Redis 往返。
+
+BufferedProfileRedis 包装真实的 Redis 客户端，只对一个档案 key 生效：
+- 第一次访问时 WATCH 并读取整个档案，之后的 json().get / json().set 都在内存中完成
+- commit() 时把修改过的字段在一个 MULTI/EXEC 事务中一次性写回
+- 其他 key 与其他命令原样转发给真实客户端
+
+缓冲期间档案可能被其他进程修改（例如 db_writer 中的 BKT 更新）。此时事务因 WATCH 失败，
+commit() 重新读取档案，把本次的修改（读取时的版本 → 缓冲区）三方合并到最新版本上再写回：
+只有一方修改的字段取修改后的值，字典逐个字段合并，双方都修改的计数器（COUNTER_FIELDS）按增量叠加。
+双方都修改了其他字段（mastery_prob、persistence_score、recent_events 等绝对值）时无法判断正确结果，
+commit() 抛出 ProfileConflictError，调用方应丢弃缓冲区，基于最新档案重新解释这一批事件。
+
+路径语法兼容 UserStateService 中使用的 RedisJSON legacy path：
+'.'、'.a.b'、'.a["b"]'、'a.b'（set_profile 会补全前缀 '.'）。
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import redis
+from redis.exceptions import ResponseError, WatchError
+
+_PathToken = Union[str, int]
+
+# commit 因并发修改而重新合并的最多次数
+COMMIT_MAX_ATTEMPTS = 5
+
+# 双方都修改时可以按增量合并的计数器：UserStateService 只会对它们加一
+COUNTER_FIELDS = ("focus_changes", "idle_count", "dom_selects", "code_edits", "help_requests")
+COUNTER_PREFIXES = ("question_count_",)
+
+# 三方合并中表示"该路径不存在"
+_MISSING = object()
+
+
+class ProfileConflictError(WatchError):
+    """缓冲期间同一个非计数器字段也被其他客户端修改，无法安全合并"""
+
+_PATH_TOKEN_RE = re.compile(r'\.([^.\[\]]+)|\["([^"]*)"\]|\[(\d+)\]')
+_IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_ROOT_PATHS = ("", ".", "$")
+
+
+def _parse_path(path: str) -> Tuple[_PathToken, ...]:
+    if path in _ROOT_PATHS:
+        return ()
+    if not path.startswith((".", "[")):
+        path = "." + path
+
+    tokens: List[_PathToken] = []
+    pos = 0
+    while pos < len(path):
+        match = _PATH_TOKEN_RE.match(path, pos)
+        if match is None:
+            raise ResponseError(f"invalid JSON path: {path}")
+        name, quoted, index = match.groups()
+        if index is not None:
+            tokens.append(int(index))
+        else:
+            tokens.append(name if name is not None else quoted)
+        pos = match.end()
+    return tuple(tokens)
+
+
+def _format_path(tokens: Tuple[_PathToken, ...]) -> str:
+    if not tokens:
+        return "."
+    parts = []
+    for token in tokens:
+        if isinstance(token, int):
+            parts.append(f"[{token}]")
+        elif _IDENTIFIER_RE.fullmatch(token):
+            parts.append(f".{token}")
+        else:
+            parts.append(f'["{token}"]')
+    return "".join(parts)
+
+
+def _json_copy(value: Any) -> Any:
+    # 与真实 RedisJSON 一样经过一次 JSON 序列化：不可序列化的值照常报错，返回值不与缓冲区共享引用
+    return json.loads(json.dumps(value))
+
+
+def _lookup(doc: Any, tokens: Tuple[_PathToken, ...]) -> Any:
+    node = doc
+    for token in tokens:
+        try:
+            node = node[token]
+        except (KeyError, IndexError, TypeError):
+            return _MISSING
+    return node
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_counter_path(tokens: Tuple[_PathToken, ...]) -> bool:
+    if len(tokens) != 2 or tokens[0] != "behavior_patterns" or not isinstance(tokens[1], str):
+        return False
+    return tokens[1] in COUNTER_FIELDS or tokens[1].startswith(COUNTER_PREFIXES)
+
+
+def _merge_value(base: Any, mine: Any, theirs: Any, tokens: Tuple[_PathToken, ...] = ()) -> Any:
+    """三方合并：base 为读取时的值，mine 为缓冲区中的值，theirs 为 Redis 中的最新值，tokens 为所在路径"""
+    if theirs is _MISSING or theirs == base:
+        return mine
+    if mine == base:
+        return theirs
+    if isinstance(mine, dict) and isinstance(theirs, dict):
+        base_dict = base if isinstance(base, dict) else {}
+        merged = dict(theirs)
+        for key, value in mine.items():
+            merged[key] = _merge_value(
+                base_dict.get(key, _MISSING), value, theirs.get(key, _MISSING), tokens + (key,)
+            )
+        for key in base_dict.keys() - mine.keys():
+            # 本次删除的字段：对方没有修改时才删除
+            if merged.get(key, _MISSING) == base_dict[key]:
+                merged.pop(key, None)
+        return merged
+    if _is_counter_path(tokens) and _is_number(mine) and _is_number(theirs) and _is_number(base):
+        return theirs + (mine - base)
+    raise ProfileConflictError(f"Path '{_format_path(tokens)}' 在缓冲期间被并发修改")
+
+
+class _BufferedJSON:
+    """只实现 UserStateService 用到的 get / set，其余 key 转发给真实客户端"""
+
+    def __init__(self, owner: "BufferedProfileRedis"):
+        self._owner = owner
+
+    def get(self, name: str, *paths: str, **kwargs) -> Any:
+        if name != self._owner.key:
+            return self._owner.redis_client.json().get(name, *paths, **kwargs)
+
+        doc = self._owner._load()
+        if doc is None:
+            return None
+        if not paths:
+            return _json_copy(doc)
+        if len(paths) == 1:
+            return _json_copy(self._owner._resolve(_parse_path(paths[0])))
+        return {path: _json_copy(self._owner._resolve(_parse_path(path))) for path in paths}
+
+    def set(self, name: str, path: str, obj: Any, *args, **kwargs) -> Optional[bool]:
+        if name != self._owner.key or args or kwargs:
+            # nx/xx 等条件写入不做缓冲，直接转发
+            return self._owner.redis_client.json().set(name, path, obj, *args, **kwargs)
+        self._owner._assign(_parse_path(path), _json_copy(obj))
+        return True
+
+
+class BufferedProfileRedis:
+    def __init__(self, redis_client: redis.Redis, key: str):
+        """
+        Args:
+            redis_client: 真实的 Redis 客户端
+            key: 需要缓冲的档案 key，例如 user_profile:{participant_id}
+        """
+        self.redis_client = redis_client
+        self.key = key
+        self._json = _BufferedJSON(self)
+        self._loaded = False
+        self._doc: Any = None
+        # 读取时的档案，发生并发修改时作为三方合并的基准
+        self._base: Any = None
+        # 读取时 WATCH 档案 key 的事务 pipeline，commit 时在同一连接上执行 MULTI/EXEC
+        self._pipe = None
+        # 修改过的路径（保持插入顺序），commit 时合并成最少的写入
+        self._dirty: Dict[Tuple[_PathToken, ...], None] = {}
+
+    def json(self) -> _BufferedJSON:
+        return self._json
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.redis_client, name)
+
+    def commit(self) -> int:
+        """
+        将修改过的字段写回 Redis（MULTI/EXEC 事务，无并发修改时一次往返）。
+
+        读取之后档案被其他客户端修改时，重新读取并把本次的修改合并到最新版本上再写回。
+
+        Returns:
+            int: 写回的路径数
+
+        Raises:
+            ProfileConflictError: 双方修改了同一个非计数器字段，缓冲区中的修改不能再使用
+        """
+        paths = self._collapsed_dirty_paths()
+        pipe, self._pipe = self._pipe, None
+        try:
+            if not paths:
+                return 0
+            if pipe is None:
+                # 没有读取过档案（只整体覆盖了根路径），无需检查并发修改
+                pipe = self.redis_client.json().pipeline(transaction=True)
+                pipe.multi()
+                self._queue_writes(pipe, [(tokens, self._resolve(tokens)) for tokens in paths])
+                pipe.execute()
+            else:
+                self._commit_watched(pipe, paths)
+            self._dirty.clear()
+            return len(paths)
+        finally:
+            if pipe is not None:
+                pipe.reset()
+
+    def _commit_watched(self, pipe, paths: List[Tuple[_PathToken, ...]]) -> None:
+        writes = [(tokens, self._resolve(tokens)) for tokens in paths]
+        for attempt in range(COMMIT_MAX_ATTEMPTS):
+            if attempt > 0:
+                pipe.watch(self.key)
+                writes = self._merge_writes(pipe.get(self.key), paths)
+            pipe.multi()
+            self._queue_writes(pipe, writes)
+            try:
+                pipe.execute()
+                return
+            except WatchError:
+                continue
+        raise WatchError(f"{self.key} 持续被并发修改，{COMMIT_MAX_ATTEMPTS} 次合并后仍未写回")
+
+    def _merge_writes(self, current: Any, paths: List[Tuple[_PathToken, ...]]) -> List[Tuple[Tuple[_PathToken, ...], Any]]:
+        """把本次修改合并到 Redis 中的最新档案上，返回需要写入的 (路径, 值)"""
+        writes = []
+        for tokens in paths:
+            if tokens and (current is None or _lookup(current, tokens[:-1]) is _MISSING):
+                # 档案或父路径已被删除，无处合并
+                continue
+            value = _merge_value(_lookup(self._base, tokens), self._resolve(tokens), _lookup(current, tokens), tokens)
+            writes.append((tokens, value))
+        return writes
+
+    def _queue_writes(self, pipe, writes: List[Tuple[Tuple[_PathToken, ...], Any]]) -> None:
+        for tokens, value in writes:
+            pipe.set(self.key, _format_path(tokens), value)
+
+    def _load(self) -> Any:
+        if not self._loaded:
+            self._pipe = self.redis_client.json().pipeline(transaction=True)
+            self._pipe.watch(self.key)
+            self._doc = self._pipe.get(self.key)
+            self._base = _json_copy(self._doc)
+            self._loaded = True
+        return self._doc
+
+    def _resolve(self, tokens: Tuple[_PathToken, ...]) -> Any:
+        node = self._load()
+        for token in tokens:
+            try:
+                node = node[token]
+            except (KeyError, IndexError, TypeError):
+                raise ResponseError(f"Path '{_format_path(tokens)}' does not exist")
+        return node
+
+    def _assign(self, tokens: Tuple[_PathToken, ...], value: Any) -> None:
+        if not tokens:
+            self._loaded = True
+            self._doc = value
+            self._dirty = {(): None}
+            return
+
+        parent = self._resolve(tokens[:-1]) if self._load() is not None else None
+        last = tokens[-1]
+        if isinstance(parent, dict) and isinstance(last, str):
+            parent[last] = value
+        elif isinstance(parent, list) and isinstance(last, int) and last < len(parent):
+            parent[last] = value
+        else:
+            raise ResponseError(f"Path '{_format_path(tokens)}' does not exist")
+        self._dirty[tokens] = None
+
+    def _collapsed_dirty_paths(self) -> List[Tuple[_PathToken, ...]]:
+        # 父路径已经整体写回时，子路径不需要再单独写
+        dirty = list(self._dirty)
+        return [
+            tokens for tokens in dirty
+            if not any(len(other) < len(tokens) and tokens[:len(other)] == other for other in dirty)
+        ]
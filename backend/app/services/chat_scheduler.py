@@ -0,0 +1,373 @@
+"""
+FairChatScheduler（chat 生成公平调度器）
+
+chat_queue 由 -c 2 的 prefork Worker 按 FIFO 消费：同一参与者连发几条消息，
+或一次很长的生成，都会让其他人的请求排在后面，课堂集中提问时首字延迟不可控。
+
+FairChatScheduler 放在 LLM 生成之前，请求先进入 Redis 中按参与者划分的待调度队列，
+只有有空闲名额时才分派到 chat_queue：
+- 全局最多 max_inflight 个任务在 chat_queue 中排队或执行，chat_queue 本身始终很短
+- 每个参与者最多 per_participant_limit 个任务同时进行
+- 同一参与者的新消息取代其尚未开始的旧消息（通过 on_superseded 为其发布取消的结束帧），并通知正在生成的旧回答提前结束
+- 有待调度请求的参与者组成一个环，按加权轮转依次分派（权重为每轮可连续分派的请求数）
+- 分派时登记租约（dispatch_grace_seconds 内等待 Worker 开始），Worker 开始后按 lease_seconds 的短租约
+  在后台持续续期，结束时释放名额并继续分派；Worker 崩溃后短租约很快到期，名额自动回收
+调度状态的读写都在 Lua 脚本中完成，多个 API 进程与 Worker 并发调用时保持一致。
+脚本访问的每个键都通过 KEYS 传入；默认键前缀带有哈希标签 {chat_sched}，Redis Cluster 中所有调度键位于同一个槽。
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# 哈希标签让所有调度键落在 Redis Cluster 的同一个槽，脚本才能同时访问它们
+KEY_PREFIX = "{chat_sched}:"
+
+# KEYS: 参与者待调度队列, 参与者环, 环成员集合, 权重, 参与者进行中集合, 参与者取消集合
+# ARGV: participant_id, 请求条目 JSON, 是否取代旧请求, 权重, 取消集合过期秒数
+# 返回被取代（从待调度队列中删除）的请求条目
+_SUBMIT_SCRIPT = """
+local superseded = {}
+if ARGV[3] == '1' then
+    superseded = redis.call('LRANGE', KEYS[1], 0, -1)
+    redis.call('DEL', KEYS[1])
+    local running = redis.call('ZRANGE', KEYS[5], 0, -1)
+    if #running > 0 then
+        redis.call('SADD', KEYS[6], unpack(running))
+        redis.call('EXPIRE', KEYS[6], tonumber(ARGV[5]))
+    end
+end
+redis.call('RPUSH', KEYS[1], ARGV[2])
+redis.call('HSET', KEYS[4], ARGV[1], ARGV[4])
+if redis.call('SADD', KEYS[3], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+end
+return superseded
+"""
+
+# 处理环首的一个参与者：分派其下一条请求、轮转到环尾或移出环
+# KEYS: 参与者环, 环成员集合, 全局进行中集合, 权重, 本轮已分派次数, 参与者待调度队列, 参与者进行中集合
+# ARGV: participant_id, 当前时间, 全局上限, 参与者上限, 分派后等待 Worker 开始的秒数
+# 返回 {'full'}（没有空闲名额）、{'stale'}（环首已不是该参与者）、{'skip'}（该参与者本轮不分派）
+# 或 {'dispatch', 请求条目}
+_NEXT_SCRIPT = """
+local now = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+if redis.call('ZCARD', KEYS[3]) >= tonumber(ARGV[3]) then
+    return {'full'}
+end
+local pid = ARGV[1]
+if redis.call('LINDEX', KEYS[1], 0) ~= pid then
+    return {'stale'}
+end
+redis.call('LPOP', KEYS[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[7], '-inf', now)
+if redis.call('LLEN', KEYS[6]) == 0 then
+    redis.call('SREM', KEYS[2], pid)
+    redis.call('HDEL', KEYS[5], pid)
+    return {'skip'}
+end
+if redis.call('ZCARD', KEYS[7]) >= tonumber(ARGV[4]) then
+    redis.call('RPUSH', KEYS[1], pid)
+    return {'skip'}
+end
+local entry = redis.call('LPOP', KEYS[6])
+local taskid = cjson.decode(entry)['task_id']
+local deadline = now + tonumber(ARGV[5])
+redis.call('ZADD', KEYS[3], deadline, taskid)
+redis.call('ZADD', KEYS[7], deadline, taskid)
+if redis.call('LLEN', KEYS[6]) == 0 then
+    redis.call('SREM', KEYS[2], pid)
+    redis.call('HDEL', KEYS[5], pid)
+else
+    local weight = tonumber(redis.call('HGET', KEYS[4], pid) or '1')
+    if redis.call('HINCRBY', KEYS[5], pid, 1) < weight then
+        redis.call('LPUSH', KEYS[1], pid)
+    else
+        redis.call('HDEL', KEYS[5], pid)
+        redis.call('RPUSH', KEYS[1], pid)
+    end
+end
+return {'dispatch', entry}
+"""
+
+
+class ChatLease:
+    """
+    单个生成任务的租约：定期续期，并检查是否已被同一参与者的新消息取代
+
+    生成循环通过 should_stop 按 check_interval 续期；检索、等待首个 token 等阶段不会调用 should_stop，
+    start() 启动的后台线程按 renew_interval 续期，保证短租约在任务正常运行时不会到期。
+    """
+
+    def __init__(
+        self,
+        scheduler: "FairChatScheduler",
+        participant_id: str,
+        taskid: str,
+        check_interval: float = 1.0,
+        renew_interval: Optional[float] = None,
+    ):
+        self.scheduler = scheduler
+        self.participant_id = participant_id
+        self.taskid = taskid
+        self.check_interval = check_interval
+        self.renew_interval = renew_interval if renew_interval is not None else check_interval
+        self._next_check = time.monotonic() + check_interval
+        self._stopped = threading.Event()
+        self._keeper: Optional[threading.Thread] = None
+        self.cancelled = False
+
+    def start(self) -> "ChatLease":
+        """立即续期一次，并启动后台续期线程"""
+        self._renew()
+        self._keeper = threading.Thread(target=self._keep_alive, name=f"chat-lease-{self.taskid}", daemon=True)
+        self._keeper.start()
+        return self
+
+    def stop(self) -> None:
+        """停止后台续期（任务结束、释放名额之前调用）"""
+        self._stopped.set()
+        if self._keeper is not None:
+            self._keeper.join(timeout=self.renew_interval + 1)
+            self._keeper = None
+
+    def _keep_alive(self) -> None:
+        while not self._stopped.wait(self.renew_interval):
+            self._renew()
+
+    def _renew(self) -> None:
+        try:
+            if self.scheduler.heartbeat(self.participant_id, self.taskid):
+                self.cancelled = True
+        except redis.RedisError as e:
+            logger.warning(f"ChatLease: 续期失败，继续生成: {e}")
+
+    def should_stop(self) -> bool:
+        """距上次检查超过 check_interval 时续期并检查取消标记"""
+        if self.cancelled:
+            return True
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+        self._renew()
+        return self.cancelled
+
+
+class FairChatScheduler:
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        dispatch: Callable[[str, dict], None],
+        max_inflight: int = 4,
+        per_participant_limit: int = 1,
+        supersede: bool = True,
+        lease_seconds: int = 30,
+        dispatch_grace_seconds: int = 120,
+        mode_weights: Optional[Dict[str, int]] = None,
+        key_prefix: str = KEY_PREFIX,
+        on_superseded: Optional[Callable[[str, dict], None]] = None,
+    ):
+        """
+        Args:
+            redis_client: 保存调度状态的 Redis 客户端
+            dispatch: 分派函数 dispatch(task_id, request_data)，把请求发送到 chat_queue
+            max_inflight: 全局同时排队或执行的任务数上限
+            per_participant_limit: 每个参与者同时进行的任务数上限
+            supersede: 同一参与者的新消息是否取代旧消息
+            lease_seconds: Worker 开始执行后的租约秒数，由后台线程续期；Worker 崩溃时到期后回收名额
+            dispatch_grace_seconds: 分派后等待 Worker 开始执行（第一次续期）的秒数，覆盖任务在 chat_queue 中排队的时间
+            mode_weights: 按请求模式设置的轮转权重，如 {"test": 2, "learning": 1}
+            key_prefix: 调度状态的键前缀
+            on_superseded: 通知函数 on_superseded(task_id, request_data)，在尚未开始的请求被新消息取代时调用，
+                例如为该任务发布取消的 stream_end，等待它的客户端不会一直没有结束帧
+        """
+        self.redis_client = redis_client
+        self.dispatch = dispatch
+        self.max_inflight = max_inflight
+        self.per_participant_limit = per_participant_limit
+        self.supersede = supersede
+        self.lease_seconds = lease_seconds
+        self.dispatch_grace_seconds = dispatch_grace_seconds
+        self.mode_weights = mode_weights or {}
+        self.key_prefix = key_prefix
+        self.on_superseded = on_superseded
+        self._submit_script = redis_client.register_script(_SUBMIT_SCRIPT)
+        self._next_script = redis_client.register_script(_NEXT_SCRIPT)
+
+        self.ring_key = f"{key_prefix}ring"
+        self.members_key = f"{key_prefix}ring:members"
+        self.running_key = f"{key_prefix}running"
+        self.weights_key = f"{key_prefix}weights"
+        self.turns_key = f"{key_prefix}turns"
+
+    def submit(self, request_data: dict) -> str:
+        """
+        登记一个聊天请求并尝试立即分派，返回任务ID。
+
+        Redis 不可用时退回直接分派，不影响聊天功能。
+        """
+        participant_id = request_data["participant_id"]
+        task_id = str(uuid.uuid4())
+        entry = json.dumps(
+            {"task_id": task_id, "request": request_data, "enqueued_at": time.time()},
+            ensure_ascii=False,
+            default=str,
+        )
+        weight = self.mode_weights.get(request_data.get("mode") or "", 1)
+        try:
+            superseded = self._submit_script(
+                keys=[
+                    self._queue_key(participant_id),
+                    self.ring_key,
+                    self.members_key,
+                    self.weights_key,
+                    self._participant_running_key(participant_id),
+                    self._cancel_key(participant_id),
+                ],
+                args=[
+                    participant_id,
+                    entry,
+                    "1" if self.supersede else "0",
+                    max(1, int(weight)),
+                    self.dispatch_grace_seconds,
+                ],
+            )
+        except redis.RedisError as e:
+            logger.error(f"FairChatScheduler: 调度状态不可用，直接分派: {e}")
+            self.dispatch(task_id, request_data)
+            return task_id
+
+        if superseded:
+            logger.info(f"FairChatScheduler: 参与者 {participant_id} 的 {len(superseded)} 个未开始请求被新消息取代")
+            self._notify_superseded(superseded)
+        try:
+            self.pump()
+        except redis.RedisError as e:
+            # 请求已登记，下一次提交或任务结束时会再次分派
+            logger.error(f"FairChatScheduler: 分派失败: {e}")
+        return task_id
+
+    def _notify_superseded(self, entries: List[bytes]) -> None:
+        """为每个被取代的请求调用 on_superseded，通知失败不影响新请求的分派"""
+        if self.on_superseded is None:
+            return
+        for entry in entries:
+            item = json.loads(entry)
+            try:
+                self.on_superseded(item["task_id"], item["request"])
+            except Exception as e:
+                logger.error(f"FairChatScheduler: 通知被取代的任务 {item['task_id']} 失败: {e}")
+
+    def pump(self) -> int:
+        """在有空闲名额时按轮转顺序分派待调度请求，返回本次分派的数量"""
+        dispatched = 0
+        while True:
+            entry = self._next_entry()
+            if entry is None:
+                return dispatched
+            item = json.loads(entry)
+            wait_ms = (time.time() - item.get("enqueued_at", time.time())) * 1000
+            try:
+                self.dispatch(item["task_id"], item["request"])
+                dispatched += 1
+                logger.info(f"FairChatScheduler: 分派任务 {item['task_id']}，调度等待 {wait_ms:.0f}ms")
+            except Exception as e:
+                logger.error(f"FairChatScheduler: 分派任务 {item['task_id']} 失败: {e}")
+                self._release(item["request"]["participant_id"], item["task_id"])
+
+    def _next_entry(self) -> Optional[bytes]:
+        """
+        按轮转顺序找到下一条可以分派的请求并登记为进行中
+
+        每次脚本调用只处理环首的参与者（其键通过 KEYS 传入）；环首在读取之后被并发修改时重新读取。
+        没有空闲名额、环为空或所有待调度参与者都达到上限时返回 None
+        """
+        # 每个参与者最多检查一次，另留出与环长度相同的次数应对并发修改
+        attempts = 2 * self.redis_client.llen(self.ring_key) + 1
+        for _ in range(attempts):
+            head = self.redis_client.lindex(self.ring_key, 0)
+            if head is None:
+                return None
+            participant_id = head.decode() if isinstance(head, bytes) else head
+            result = self._next_script(
+                keys=[
+                    self.ring_key,
+                    self.members_key,
+                    self.running_key,
+                    self.weights_key,
+                    self.turns_key,
+                    self._queue_key(participant_id),
+                    self._participant_running_key(participant_id),
+                ],
+                args=[
+                    participant_id,
+                    time.time(),
+                    self.max_inflight,
+                    self.per_participant_limit,
+                    self.dispatch_grace_seconds,
+                ],
+            )
+            status = result[0].decode() if isinstance(result[0], bytes) else result[0]
+            if status == "full":
+                return None
+            if status == "dispatch":
+                return result[1]
+        return None
+
+    def lease(self, participant_id: str, taskid: str, check_interval: float = 1.0) -> ChatLease:
+        """Worker 开始生成时获取租约（后台续期间隔为租约的三分之一）"""
+        return ChatLease(self, participant_id, taskid, check_interval, renew_interval=self.lease_seconds / 3)
+
+    def heartbeat(self, participant_id: str, taskid: str) -> bool:
+        """续期任务租约，返回该任务是否已被取代"""
+        deadline = time.time() + self.lease_seconds
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zadd(self.running_key, {taskid: deadline}, xx=True)
+        pipe.zadd(self._participant_running_key(participant_id), {taskid: deadline}, xx=True)
+        pipe.sismember(self._cancel_key(participant_id), taskid)
+        return bool(pipe.execute()[-1])
+
+    def complete(self, participant_id: str, taskid: str) -> None:
+        """任务结束（包括失败和取消）时释放名额，并继续分派"""
+        try:
+            self._release(participant_id, taskid)
+            self.pump()
+        except redis.RedisError as e:
+            logger.error(f"FairChatScheduler: 释放任务 {taskid} 失败，等待租约到期回收: {e}")
+
+    def get_stats(self) -> dict:
+        """待调度参与者数与进行中的任务数"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.scard(self.members_key)
+        pipe.zcount(self.running_key, time.time(), "+inf")
+        waiting_participants, running = pipe.execute()
+        return {
+            "waiting_participants": waiting_participants,
+            "running": running,
+            "max_inflight": self.max_inflight,
+        }
+
+    def _release(self, participant_id: str, taskid: str) -> None:
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zrem(self.running_key, taskid)
+        pipe.zrem(self._participant_running_key(participant_id), taskid)
+        pipe.srem(self._cancel_key(participant_id), taskid)
+        pipe.execute()
+
+    def _queue_key(self, participant_id: str) -> str:
+        return f"{self.key_prefix}queue:{participant_id}"
+
+    def _participant_running_key(self, participant_id: str) -> str:
+        return f"{self.key_prefix}running:{participant_id}"
+
+    def _cancel_key(self, participant_id: str) -> str:
+        return f"{self.key_prefix}cancel:{participant_id}"
@@ -0,0 +1,188 @@
+"""
+ChatStreamPublisher（流式回复合并发布器）
+
+process_chat_request 原来对 LLM 产出的每个增量（通常只有一个 token）都构造一次 SocketResponse2、
+model_dump_json 一次并 publish 一次，API 端的 redis_subscriber 再逐条解析和转发。
+
+ChatStreamPublisher 在 chat worker 内合并增量文本：
+- 第一段文本立即发送，不增加首字延迟
+- 之后累计到 flush_chars 个字符，或距本窗口第一段文本超过 flush_interval_ms 毫秒时发送一帧
+- LLM 停顿时由后台线程按时间刷新，缓冲的文本不会被卡住
+- 每帧带递增的 seq，客户端可据此去重、排序或断线续传
+- 帧 JSON 由预先构造的模板拼接，字段与 SocketResponse2.model_dump_json() 一致，不再逐帧走 Pydantic
+- inline_flush=False 时所有帧都由后台线程发布，write 只写缓冲区，可以直接在事件循环中调用
+- 设置 stream_ttl_seconds 后，每帧同时 XADD 到该任务的有上限 Redis Stream（与 PUBLISH 在同一个 pipeline 中），
+  并记录参与者最近的任务ID，WebSocket 断线重连时可按 last_seq 补发
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+def chat_stream_key(taskid: str) -> str:
+    """任务对应的 Redis Stream"""
+    return f"chat_stream:{taskid}"
+
+
+def latest_chat_stream_key(participant_id: str) -> str:
+    """参与者最近一次流式回复的任务ID"""
+    return f"chat_stream:latest:{participant_id}"
+
+
+def _utc_timestamp() -> str:
+    # 与 Pydantic 序列化 UTC datetime 的格式一致
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class ChatStreamPublisher:
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        participant_id: str,
+        taskid: str,
+        flush_interval_ms: int = 50,
+        flush_chars: int = 64,
+        stream_ttl_seconds: Optional[int] = None,
+        stream_maxlen: int = 2000,
+        inline_flush: bool = True,
+    ):
+        """
+        Args:
+            redis_client: 用于 publish 的 Redis 客户端
+            participant_id: 参与者ID，决定发布的频道 ws:user:{participant_id}
+            taskid: Celery 任务ID，写入每一帧
+            flush_interval_ms: 缓冲文本最多等待的毫秒数
+            flush_chars: 缓冲文本达到该字符数时立即发送
+            stream_ttl_seconds: 可续传 Stream 的过期秒数，None 表示只 PUBLISH 不写 Stream
+            stream_maxlen: Stream 最多保留的帧数（近似裁剪）
+            inline_flush: 达到发送条件时是否在 write 的调用线程中直接发布；
+                False 时交给后台线程发布，write 不做网络 I/O（供事件循环中调用）
+        """
+        self.redis_client = redis_client
+        self.participant_id = participant_id
+        self.taskid = taskid
+        self.channel = f"ws:user:{participant_id}"
+        self.stream_ttl_seconds = stream_ttl_seconds
+        self.stream_maxlen = stream_maxlen
+        self.stream_key = chat_stream_key(taskid)
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.flush_chars = flush_chars
+        self.inline_flush = inline_flush
+
+        # 预先构造帧模板，逐帧只需填入 seq / message / timestamp
+        taskid_json = json.dumps(taskid, ensure_ascii=False)
+        self._templates = {
+            frame_type: (
+                '{"type":' + json.dumps(frame_type) + ',"taskid":' + taskid_json
+                + ',"message":%s,"error":null,"timestamp":"%s","seq":%d}'
+            )
+            for frame_type in ("stream_start", "streaming", "stream_end")
+        }
+
+        self._cond = threading.Condition()
+        self._buffer: List[str] = []
+        self._buffered_chars = 0
+        self._deadline: Optional[float] = None
+        self._seq = 0
+        self._first_chunk_sent = False
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+
+        # 统计信息，便于观察合并效果
+        self.chunks_received = 0
+        self.frames_published = 0
+
+    def start(self, message: str = "开始") -> None:
+        """发布 stream_start 帧，并启动按时间刷新的后台线程"""
+        with self._cond:
+            self._publish_locked("stream_start", message)
+        self._flusher = threading.Thread(target=self._run, name="chat-stream-flusher", daemon=True)
+        self._flusher.start()
+
+    def write(self, chunk: str) -> None:
+        """写入一段增量文本，按字符数或时间窗口合并后发送"""
+        if not chunk:
+            return
+        with self._cond:
+            self.chunks_received += 1
+            self._buffer.append(chunk)
+            self._buffered_chars += len(chunk)
+
+            if not self._first_chunk_sent or self._buffered_chars >= self.flush_chars:
+                self._first_chunk_sent = True
+                if self.inline_flush:
+                    self._flush_locked()
+                else:
+                    self._deadline = time.monotonic()
+                    self._cond.notify()
+            elif self._deadline is None:
+                self._deadline = time.monotonic() + self.flush_interval
+                self._cond.notify()
+
+    def end(self, message: str = "结束") -> None:
+        """发送剩余的缓冲文本和 stream_end 帧，并停止后台线程"""
+        with self._cond:
+            self._flush_locked()
+            self._publish_locked("stream_end", message)
+        self.close()
+
+    def close(self) -> None:
+        """停止后台线程；未调用 end 时剩余的缓冲文本会被丢弃"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=1)
+
+    def _flush_locked(self) -> None:
+        self._deadline = None
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffered_chars = 0
+        self._publish_locked("streaming", text)
+
+    def _publish_locked(self, frame_type: str, message: str) -> None:
+        # 在锁内发布，保证帧按 seq 顺序进入频道
+        seq = self._seq
+        self._seq += 1
+        frame = self._templates[frame_type] % (
+            json.dumps(message, ensure_ascii=False), _utc_timestamp(), seq
+        )
+        if self.stream_ttl_seconds is None:
+            self.redis_client.publish(self.channel, frame)
+        else:
+            # 先写 Stream 再 PUBLISH：重连的客户端补发时不会漏掉已经推送过的帧
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.xadd(self.stream_key, {"seq": seq, "frame": frame}, maxlen=self.stream_maxlen, approximate=True)
+            if frame_type != "streaming":
+                pipe.expire(self.stream_key, self.stream_ttl_seconds)
+            if frame_type == "stream_start":
+                pipe.set(latest_chat_stream_key(self.participant_id), self.taskid, ex=self.stream_ttl_seconds)
+            pipe.publish(self.channel, frame)
+            pipe.execute()
+        self.frames_published += 1
+
+    def _run(self) -> None:
+        with self._cond:
+            while not self._closed:
+                if self._deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                try:
+                    self._flush_locked()
+                except Exception as e:
+                    logger.error(f"ChatStreamPublisher: 定时刷新失败: {e}", exc_info=True)
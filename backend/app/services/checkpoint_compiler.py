@@ -0,0 +1,379 @@
+"""
+检查点编译器
+
+原来 SandboxService 对每个检查点分别调用 locator.count()、locator.evaluate()、text_content() 等，
+每次调用都是一次与浏览器的往返；元素不存在时 text_content(timeout=5000) 还要等满 5 秒。
+
+编译器把一段连续的非交互断言（assert_element、assert_text_content、assert_attribute、
+assert_style、custom_script）编译成观测项列表，由 CHECKPOINT_BUNDLE_SCRIPT 在一次 page.evaluate
+中按顺序采集原始观测值（匹配数量、计算样式、文本、属性、脚本结果），
+判定与反馈文案仍由 SandboxService 在 Python 中完成，与逐个调用时一致。
+
+- 选择器按 document.querySelectorAll 解析；取值类断言沿用 locator 的严格模式，匹配数量不为 1 时记为错误
+- 选择器不是合法的 CSS（例如 Playwright 专有的 text= 选择器）或页面禁止 eval 时，
+  观测在该项处停止并标记 fallback，由 SandboxService 对该项回退到逐个调用的方式后继续
+
+plan_isolated_chains 把检查点按 depends_on 划分成互不影响的执行链，
+每条链在同一浏览器上下文中的独立页面上执行，各页面的 wait 动作可以重叠。
+
+compile_checkpoints 在加载任务时为每个断言生成一次不可变的 AssertionPlan（观测项、包装好的脚本、
+编译好的正则表达式、解析好的期望 CSS 值），保存在检查点上；每次提交只执行计划，不再重复编译和解析。
+"""
+
+import re
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+
+# 可以编译进同一次 page.evaluate 的断言类型
+# （CheckpointType 是 str 枚举，其哈希与字符串值不同，因此用元组按 == 比较）
+BUNDLED_ASSERTION_TYPES = (
+    "assert_element",
+    "assert_text_content",
+    "assert_attribute",
+    "assert_style",
+    "custom_script",
+)
+
+# 按顺序采集观测值；每项返回 {count, value, has_attribute, text, error, fallback} 中的若干字段
+CHECKPOINT_BUNDLE_SCRIPT = """async (items) => {
+    const describe = (e) => (e && e.message) ? `${e.name}: ${e.message}` : String(e);
+    const results = [];
+    for (const item of items) {
+        const obs = {};
+        results.push(obs);
+        if (item.kind === "skip") {
+            continue;
+        }
+        if (item.kind === "script") {
+            try {
+                const value = await (0, eval)(item.script);
+                // 只有假值会出现在反馈中，真值统一返回 true，避免序列化 DOM 节点等对象
+                obs.value = value ? true : (value === undefined ? null : value);
+            } catch (e) {
+                if (e instanceof EvalError) {
+                    obs.fallback = describe(e);
+                    break;
+                }
+                obs.error = describe(e);
+            }
+            continue;
+        }
+        let elements;
+        try {
+            elements = document.querySelectorAll(item.selector);
+        } catch (e) {
+            obs.fallback = describe(e);
+            break;
+        }
+        obs.count = elements.length;
+        if (elements.length !== 1) {
+            if (item.style !== undefined || item.attribute !== undefined) {
+                obs.error = elements.length === 0
+                    ? `no element matches selector '${item.selector}'`
+                    : `strict mode violation: '${item.selector}' resolved to ${elements.length} elements`;
+            }
+            continue;
+        }
+        const element = elements[0];
+        try {
+            if (item.style !== undefined) {
+                obs.value = window.getComputedStyle(element).getPropertyValue(item.style);
+            }
+            if (item.attribute !== undefined) {
+                obs.has_attribute = element.hasAttribute(item.attribute);
+                obs.value = element.getAttribute(item.attribute);
+            }
+            if (item.text) {
+                obs.text = element.textContent;
+            }
+        } catch (e) {
+            obs.error = describe(e);
+        }
+    }
+    return results;
+}"""
+
+
+def wrap_custom_script(script: str) -> str:
+    """未写成 IIFE 的自定义脚本用 IIFE 包装，使其中的 return 生效"""
+    if not (script.startswith("(()") and script.endswith(")()")):
+        script = f"(() => {{ {script} }})()"
+    return script
+
+
+# ---- CSS 值 ----
+
+CSS_NUMBER_PATTERN = re.compile(r'^([+-]?(?:\d+\.?\d*|\.\d+))([a-zA-Z%]*)$')
+RGB_PATTERN = re.compile(r'rgb\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)')
+RGBA_PATTERN = re.compile(r'rgba\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*,\s*[\d.]+\s*\)')
+
+# font-weight 关键字与数值的等价关系（bolder/lighter 的计算值取决于父元素的字重，不在此列）
+FONT_WEIGHT_MAPPING = {
+    'bold': '700',
+    '700': 'bold',
+    'normal': '400',
+    '400': 'normal',
+}
+
+# 长度单位相对于 px 的转换因子，百分比无法换算
+CSS_UNIT_FACTORS = {
+    'px': 1,
+    'pt': 4/3,
+    'pc': 16,
+    'in': 96,
+    'cm': 96/2.54,
+    'mm': 96/25.4,
+    '%': None
+}
+
+COLOR_NAMES = {
+    'black': '#000000',
+    'white': '#ffffff',
+    'red': '#ff0000',
+    'green': '#008000',
+    'blue': '#0000ff',
+    'yellow': '#ffff00',
+    'orange': '#ffa500',
+    'purple': '#800080',
+    'gray': '#808080',
+    'pink': '#ffc0cb',
+    'brown': '#a52a2a',
+    'cyan': '#00ffff',
+    'magenta': '#ff00ff',
+    'lime': '#00ff00',
+    'maroon': '#800000',
+    'navy': '#000080',
+    'olive': '#808000',
+    'silver': '#c0c0c0',
+    'teal': '#008080',
+    'transparent': 'rgba(0,0,0,0)'
+}
+
+
+def normalize_color_value(color_value: str) -> str:
+    """将颜色值标准化为统一格式（#rrggbb），不是颜色时返回去除首尾空格并小写化的原值"""
+    color_value = color_value.strip().lower()
+
+    if color_value.startswith('#'):
+        # 扩展3位十六进制颜色值到6位
+        if len(color_value) == 4:
+            color_value = '#' + color_value[1]*2 + color_value[2]*2 + color_value[3]*2
+        return color_value
+
+    if color_value.startswith('rgb('):
+        match = RGB_PATTERN.search(color_value)
+        if match:
+            r, g, b = map(int, match.groups())
+            return f"#{r:02x}{g:02x}{b:02x}"
+
+    # rgba() 忽略 alpha 通道
+    if color_value.startswith('rgba('):
+        match = RGBA_PATTERN.search(color_value)
+        if match:
+            r, g, b = map(int, match.groups())
+            return f"#{r:02x}{g:02x}{b:02x}"
+
+    return COLOR_NAMES.get(color_value, color_value)
+
+
+@dataclass(frozen=True)
+class CssValue:
+    """解析后的 CSS 值"""
+    text: str  # 去除首尾空格并小写化的原值
+    color: Optional[str]  # 标准化后的颜色，不是颜色时为 None
+    number: Union[float, str]  # 数值部分，无法按“数值+单位”解析时为 text
+    unit: str
+
+
+def parse_css_value(value: str) -> CssValue:
+    text = value.strip().lower()
+    color = normalize_color_value(text)
+    match = CSS_NUMBER_PATTERN.match(text)
+    if match:
+        number, unit = match.groups()
+        number, unit = float(number), unit.lower()
+    else:
+        number, unit = text, ""
+    return CssValue(text=text, color=color if color.startswith(('#', 'rgba')) else None, number=number, unit=unit)
+
+
+def compare_css_values(actual: CssValue, expected: CssValue, assertion_op: str) -> bool:
+    """按断言操作比较两个 CSS 值：font-weight 关键字、颜色、带单位的数值，最后回退到字符串比较"""
+    actual_value, expected_value = actual.text, expected.text
+
+    if assertion_op == "equals":
+        if FONT_WEIGHT_MAPPING.get(actual_value) == expected_value or FONT_WEIGHT_MAPPING.get(expected_value) == actual_value:
+            return True
+
+    if actual.color is not None and expected.color is not None:
+        if assertion_op == 'equals':
+            return actual.color == expected.color
+        elif assertion_op == 'not_equals':
+            return actual.color != expected.color
+
+    try:
+        actual_num, actual_unit = actual.number, actual.unit
+        expected_num, expected_unit = expected.number, expected.unit
+
+        # 单位不一致时换算到期望值的单位
+        if actual_unit != expected_unit and actual_unit and expected_unit:
+            if actual_unit in CSS_UNIT_FACTORS and expected_unit in CSS_UNIT_FACTORS:
+                if actual_unit != '%' and expected_unit != '%':
+                    actual_num = actual_num * CSS_UNIT_FACTORS[actual_unit] / CSS_UNIT_FACTORS[expected_unit]
+
+        if assertion_op == "equals":
+            return actual_num == expected_num
+        if assertion_op == "greater_than":
+            return actual_num > expected_num
+        elif assertion_op == "less_than":
+            return actual_num < expected_num
+        elif assertion_op == "greater_than_or_equal":
+            return actual_num >= expected_num
+        elif assertion_op == "less_than_or_equal":
+            return actual_num <= expected_num
+        elif assertion_op == "contains":
+            return str(expected_value) in str(actual_value)
+        elif assertion_op == "exists":
+            return actual_value != "" and actual_value != "none"
+    except (ValueError, TypeError):
+        # 数值与字符串无法比较时，回退到字符串比较
+        pass
+
+    if assertion_op == "equals":
+        return actual_value == expected_value
+    elif assertion_op == "contains":
+        return expected_value in actual_value
+    elif assertion_op == "not_equals":
+        return actual_value != expected_value
+    elif assertion_op == "not_contain":
+        return expected_value not in actual_value
+
+    return False
+
+
+# ---- 断言 ----
+
+def compile_assertion(assertion) -> Dict[str, Any]:
+    """把一个断言编译成观测项"""
+    assertion_type = assertion.type if assertion is not None else None
+    if assertion_type not in BUNDLED_ASSERTION_TYPES:
+        return {"kind": "skip"}
+    if assertion_type == "custom_script":
+        return {"kind": "script", "script": wrap_custom_script(assertion.script)}
+
+    item: Dict[str, Any] = {"kind": "query", "selector": assertion.selector}
+    op = assertion.assertion_type
+    if assertion_type == "assert_style":
+        item["style"] = assertion.css_property
+    elif assertion_type == "assert_attribute":
+        item["attribute"] = assertion.attribute
+    elif assertion_type == "assert_text_content":
+        item["text"] = True
+    elif op not in ("exists", "not_exists"):
+        # assert_element 只有比较文本时才需要读取文本
+        item["text"] = True
+    return item
+
+
+@dataclass(frozen=True)
+class AssertionPlan:
+    """一个断言预先编译好的执行计划"""
+    item: Mapping[str, Any]  # CHECKPOINT_BUNDLE_SCRIPT 的观测项（custom_script 已包装为 IIFE）
+    regex: Optional["re.Pattern"] = None  # matches_regex / regex 断言编译好的正则表达式
+    regex_error: Optional[re.error] = None  # 正则表达式无法编译时的错误，判定时按原来的方式报告
+    expected_css: Optional[CssValue] = None  # assert_style 解析好的期望值
+
+
+SKIP_PLAN = AssertionPlan(item=MappingProxyType({"kind": "skip"}))
+
+
+def compile_assertion_plan(assertion) -> AssertionPlan:
+    if assertion is None:
+        return SKIP_PLAN
+    regex, regex_error, expected_css = None, None, None
+    op = getattr(assertion, "assertion_type", None)
+    value = getattr(assertion, "value", None)
+    if op in ("matches_regex", "regex") and isinstance(value, str):
+        try:
+            regex = re.compile(value)
+        except re.error as e:
+            regex_error = e
+    if assertion.type == "assert_style" and isinstance(value, str):
+        expected_css = parse_css_value(value)
+    return AssertionPlan(
+        item=MappingProxyType(compile_assertion(assertion)),
+        regex=regex,
+        regex_error=regex_error,
+        expected_css=expected_css,
+    )
+
+
+def assertion_plan(assertion) -> AssertionPlan:
+    """返回断言的执行计划；加载时没有编译过的断言（例如直接构造的检查点）在第一次使用时编译"""
+    if assertion is None:
+        return SKIP_PLAN
+    plan = assertion._plan
+    if plan is None:
+        plan = assertion._plan = compile_assertion_plan(assertion)
+    return plan
+
+
+def compile_checkpoints(checkpoints: List[Any]) -> None:
+    """为检查点及交互检查点中嵌套的断言编译执行计划（加载任务时调用一次）"""
+    for checkpoint in checkpoints:
+        checkpoint._plan = compile_assertion_plan(checkpoint)
+        assertion = getattr(checkpoint, "assertion", None)
+        if assertion is not None:
+            compile_checkpoints([assertion])
+
+
+def compile_assertions(assertions: List[Any]) -> List[Dict[str, Any]]:
+    return [dict(assertion_plan(assertion).item) for assertion in assertions]
+
+
+def plan_isolated_chains(checkpoints: List[Any]) -> Optional[List[List[int]]]:
+    """
+    按 depends_on 把检查点划分为可以在独立页面上并行执行的链。
+
+    - 未声明 depends_on（None）的检查点都放在第一条链（主页面）上，按原顺序执行，行为与原来相同
+    - depends_on 为空列表的交互检查点只依赖初始页面，各自成为一条新链；
+      非交互检查点在主页面尚未执行任何交互时放在主页面上，否则也单独成链
+    - depends_on 非空的检查点接在其依赖所在的链之后
+
+    Returns:
+        各条链上的检查点下标（链内保持原顺序），第一条为主页面；
+        依赖无法解析（名称不存在、引用后面的检查点、跨越多条链）或含交互的链不足两条时返回 None，
+        调用方按原来的方式在一个页面上顺序执行
+    """
+    chains: List[List[int]] = [[]]
+    chain_of: Dict[str, int] = {}
+    main_page_touched = False
+    for index, cp in enumerate(checkpoints):
+        depends_on = getattr(cp, "depends_on", None)
+        interactive = getattr(cp, "type", None) == "interaction_and_assert"
+        if depends_on:
+            if any(name not in chain_of for name in depends_on):
+                return None
+            dependency_chains = {chain_of[name] for name in depends_on}
+            if len(dependency_chains) != 1:
+                return None
+            chain = dependency_chains.pop()
+        elif depends_on is None or not (interactive or main_page_touched):
+            chain = 0
+        else:
+            chains.append([])
+            chain = len(chains) - 1
+        if chain == 0 and interactive:
+            main_page_touched = True
+        chains[chain].append(index)
+        chain_of[cp.name] = chain
+
+    interactive_chains = sum(
+        any(getattr(checkpoints[i], "type", None) == "interaction_and_assert" for i in chain)
+        for chain in chains
+    )
+    if interactive_chains < 2:
+        # 少于两条含交互的链时，独立页面不会带来任何重叠
+        return None
+    return chains
@@ -1,11 +1,16 @@
 # backend/app/services/content_loader.py
 import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
 from fastapi import HTTPException
-from functools import lru_cache
-from typing import Union
+from typing import Dict, Iterable, Tuple, Union
 
 from app.core.config import settings
+from app.core.prerendered_response import PrerenderedJSON, prerender_json
+from app.services.checkpoint_compiler import compile_checkpoints
 from app.schemas.content import (
     LearningContent, 
     TestTask,
@@ -17,66 +22,175 @@ from app.schemas.content import (
     InteractionAndAssertCheckpoint,
     BaseCheckpoint
 )
+from app.schemas.response import StandardResponse
+logger = logging.getLogger(__name__)
+
 # 从配置中获取data目录路径
 DATA_DIR = Path(settings.DATA_DIR)
 
-# 使用LRU缓存来避免重复读取文件，提升性能
-@lru_cache(maxsize=128)
-def load_json_content(content_type: str, topic_id: str) -> Union[LearningContent, TestTask]:
+# 检查点 type -> 模型；未知类型使用基类
+CHECKPOINT_MODELS = {
+    "assert_attribute": AssertAttributeCheckpoint,
+    "assert_style": AssertStyleCheckpoint,
+    "assert_text_content": AssertTextContentCheckpoint,
+    "assert_element": AssertElementCheckpoint,
+    "custom_script": CustomScriptCheckpoint,
+    "interaction_and_assert": InteractionAndAssertCheckpoint,
+}
+
+
+def _build_checkpoint(checkpoint_data: dict) -> BaseCheckpoint:
+    """根据 type 构造检查点模型，交互检查点中嵌套的断言同样按 type 构造"""
+    assertion_data = checkpoint_data.get("assertion")
+    if checkpoint_data.get("type") == "interaction_and_assert" and assertion_data:
+        checkpoint_data = {**checkpoint_data, "assertion": _build_checkpoint(assertion_data)}
+    return CHECKPOINT_MODELS.get(checkpoint_data.get("type"), BaseCheckpoint)(**checkpoint_data)
+
+
+CONTENT_MODELS = {
+    "learning_content": LearningContent,
+    "test_tasks": TestTask,
+}
+
+ContentModel = Union[LearningContent, TestTask]
+
+
+@dataclass(frozen=True)
+class ContentEntry:
     """
-    一个带缓存的函数，用于从JSON文件中加载内容。 
-    content_type 应该是 'learning_content' 或 'test_tasks'。
+    一个内容文件加载后的结果
+
+    Attributes:
+        model: 校验后的 Pydantic 模型（测试任务的检查点已编译执行计划）
+        rendered: StandardResponse(data=model) 预先序列化的 JSON（含 ETag 与 gzip 版本），接口直接返回
+        mtime_ns: 加载时文件的修改时间
+        size: 加载时文件的大小
     """
-    content_file = DATA_DIR / content_type / f"{topic_id}.json"
-    if not content_file.exists():
-        raise HTTPException(status_code=404, detail=f"未找到主题'{topic_id}'的{content_type}。")
-
-    with open(content_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    
-    # 根据content_type返回相应的Pydantic模型实例
+    model: ContentModel
+    rendered: PrerenderedJSON
+    mtime_ns: int
+    size: int
+
+
+def _parse_content(content_type: str, data: dict) -> ContentModel:
+    """根据content_type构造相应的Pydantic模型实例"""
     if content_type == "learning_content":
         return LearningContent(**data)
-    elif content_type == "test_tasks":
-        # 处理检查点类型
-        if "checkpoints" in data:
-            processed_checkpoints = []
-            for checkpoint_data in data["checkpoints"]:
-                checkpoint_type = checkpoint_data.get("type")
-                if checkpoint_type == "assert_attribute":
-                    processed_checkpoints.append(AssertAttributeCheckpoint(**checkpoint_data))
-                elif checkpoint_type == "assert_style":
-                    processed_checkpoints.append(AssertStyleCheckpoint(**checkpoint_data))
-                elif checkpoint_type == "assert_text_content":
-                    processed_checkpoints.append(AssertTextContentCheckpoint(**checkpoint_data))
-                elif checkpoint_type == "assert_element":
-                    processed_checkpoints.append(AssertElementCheckpoint(**checkpoint_data))
-                elif checkpoint_type == "custom_script":
-                    processed_checkpoints.append(CustomScriptCheckpoint(**checkpoint_data))
-                elif checkpoint_type == "interaction_and_assert":
-                    # 递归处理嵌套的断言
-                    if "assertion" in checkpoint_data and checkpoint_data["assertion"]:
-                        assertion_data = checkpoint_data["assertion"]
-                        assertion_type = assertion_data.get("type")
-                        if assertion_type == "assert_attribute":
-                            checkpoint_data["assertion"] = AssertAttributeCheckpoint(**assertion_data)
-                        elif assertion_type == "assert_style":
-                            checkpoint_data["assertion"] = AssertStyleCheckpoint(**assertion_data)
-                        elif assertion_type == "assert_text_content":
-                            checkpoint_data["assertion"] = AssertTextContentCheckpoint(**assertion_data)
-                        elif assertion_type == "assert_element":
-                            checkpoint_data["assertion"] = AssertElementCheckpoint(**assertion_data)
-                        elif assertion_type == "custom_script":
-                            checkpoint_data["assertion"] = CustomScriptCheckpoint(**assertion_data)
-                        elif assertion_type == "interaction_and_assert":
-                            # 对于嵌套的interaction_and_assert，我们需要递归处理
-                            # 这里简化处理，实际项目中可能需要更复杂的递归逻辑
-                            checkpoint_data["assertion"] = InteractionAndAssertCheckpoint(**assertion_data)
-                    processed_checkpoints.append(InteractionAndAssertCheckpoint(**checkpoint_data))
-                else:
-                    # 如果类型未知，使用基类
-                    processed_checkpoints.append(BaseCheckpoint(**checkpoint_data))
-            data["checkpoints"] = processed_checkpoints
-        return TestTask(**data)
-    else:
-        raise ValueError(f"不支持的content_type: {content_type}")
\ No newline at end of file
+    # 按 type 选择检查点模型，并为每个检查点预先编译执行计划
+    if "checkpoints" in data:
+        data["checkpoints"] = [_build_checkpoint(checkpoint_data) for checkpoint_data in data["checkpoints"]]
+    task = TestTask(**data)
+    compile_checkpoints(task.checkpoints)
+    return task
+
+
+class ContentRegistry:
+    """
+    学习内容与测试任务的进程内注册表
+
+    启动时通过 preload 一次性加载并校验全部文件；之后访问直接返回内存中的条目，
+    距上次检查超过 reload_interval 秒时比较文件的 mtime 和大小，变化则重新加载并整体替换条目。
+    重新加载失败（例如文件正在编辑、JSON 不完整）时保留旧条目，文件被删除时移除条目。
+    """
+
+    def __init__(self, data_dir: Path, reload_interval: float = 2.0):
+        self.data_dir = Path(data_dir)
+        self.reload_interval = reload_interval
+        self._entries: Dict[Tuple[str, str], ContentEntry] = {}
+        self._checked_at: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, content_type: str, topic_id: str) -> ContentEntry:
+        """返回内容条目，文件不存在时抛出 404"""
+        if content_type not in CONTENT_MODELS:
+            raise ValueError(f"不支持的content_type: {content_type}")
+        key = (content_type, topic_id)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - self._checked_at.get(key, 0.0) < self.reload_interval:
+            return entry
+        with self._lock:
+            return self._refresh(key)
+
+    def preload(self, content_types: Iterable[str] = tuple(CONTENT_MODELS)) -> int:
+        """
+        加载目录下的全部文件
+
+        Returns:
+            成功加载的文件数（无法加载的文件记录日志后跳过，访问时仍按原方式报错）
+        """
+        loaded = 0
+        for content_type in content_types:
+            for content_file in sorted((self.data_dir / content_type).glob("*.json")):
+                try:
+                    self.get(content_type, content_file.stem)
+                    loaded += 1
+                except Exception as e:
+                    logger.warning(f"预加载 {content_type}/{content_file.stem} 失败: {e}")
+        return loaded
+
+    def _refresh(self, key: Tuple[str, str]) -> ContentEntry:
+        content_type, topic_id = key
+        entry = self._entries.get(key)
+        # 持锁期间其他线程可能已经检查过
+        if entry is not None and time.monotonic() - self._checked_at.get(key, 0.0) < self.reload_interval:
+            return entry
+
+        content_file = self.data_dir / content_type / f"{topic_id}.json"
+        try:
+            if Path(topic_id).name != topic_id:
+                raise FileNotFoundError(topic_id)
+            stat = content_file.stat()
+        except (FileNotFoundError, NotADirectoryError):
+            self._entries.pop(key, None)
+            self._checked_at.pop(key, None)
+            raise HTTPException(status_code=404, detail=f"未找到主题'{topic_id}'的{content_type}。")
+
+        self._checked_at[key] = time.monotonic()
+        if entry is not None and (entry.mtime_ns, entry.size) == (stat.st_mtime_ns, stat.st_size):
+            return entry
+
+        try:
+            with open(content_file, "r", encoding="utf-8") as f:
+                model = _parse_content(content_type, json.load(f))
+        except Exception as e:
+            if entry is None:
+                raise
+            logger.warning(f"重新加载 {content_type}/{topic_id} 失败，继续使用旧版本: {e}")
+            return entry
+
+        body = StandardResponse[CONTENT_MODELS[content_type]](data=model).model_dump_json().encode("utf-8")
+        entry = ContentEntry(model=model, rendered=prerender_json(body), mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        self._entries[key] = entry
+        logger.debug(f"已加载 {content_type}/{topic_id}")
+        return entry
+
+
+content_registry = ContentRegistry(DATA_DIR, reload_interval=settings.CONTENT_RELOAD_INTERVAL_SECONDS)
+
+
+def load_json_content(content_type: str, topic_id: str) -> ContentModel:
+    """
+    从内容注册表中获取内容，文件修改后会自动重新加载。
+    content_type 应该是 'learning_content' 或 'test_tasks'。
+    """
+    return content_registry.get(content_type, topic_id).model
+
+
+def preload_content() -> int:
+    """
+    启动时加载并校验全部学习内容和测试任务，第一次访问不再承担读取、校验与编译的开销。
+
+    Returns:
+        成功加载的文件数
+    """
+    return content_registry.preload()
+
+
+def preload_test_tasks() -> int:
+    """
+    启动时加载并编译全部测试任务（提交 Worker 只需要测试任务）。
+
+    Returns:
+        成功加载的任务数（无法加载的任务记录日志后跳过，提交时仍按原方式报错）
+    """
+    return content_registry.preload(("test_tasks",))
@@ -25,7 +25,14 @@ from app.core.config import settings
 class DistanceBasedClusteringService:
     """基于距离的聚类服务：直接使用预训练模型文件"""
     
-    def __init__(self, model_dir: str = None):
+    def __init__(self, model_dir: str = None, model_client=None):
+        """
+        Args:
+            model_dir: 预训练模型目录，None 时使用配置
+            model_client: 模型服务客户端（ModelServerClient）；提供时句向量编码经模型服务完成，
+                本进程不加载 SentenceTransformer
+        """
+        self.model_client = model_client
         if model_dir is None:
             # 使用配置化的模型目录路径
             model_dir = settings.PROGRESS_CLUSTERING_MODEL_DIR
@@ -246,7 +253,10 @@ class DistanceBasedClusteringService:
             
             # 语义编码（只对有效消息编码）
             valid_clean_texts = [clean_texts[i] for i in valid_indices]
-            per_msg_embs = encode_messages(valid_clean_texts, model_name=self.config['model_name'])
+            if self.model_client is not None:
+                per_msg_embs = self.model_client.encode(valid_clean_texts, model_name=self.config['model_name'])
+            else:
+                per_msg_embs = encode_messages(valid_clean_texts, model_name=self.config['model_name'])
             
             # 为padding位置创建零向量
             if is_padded:
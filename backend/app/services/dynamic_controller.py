@@ -1,6 +1,9 @@
 # backend/app/services/dynamic_controller.py
+import asyncio
+import functools
 import json
 import logging
+from concurrent.futures import Executor
 from typing import Any, Optional
 from sqlalchemy.orm import Session
 from app.schemas.chat import ChatRequest, ChatResponse, UserStateSummary, SentimentAnalysisResult
@@ -78,166 +81,14 @@ class DynamicController:
         """
         logger.info(f"开始进行翻译...{request.user_message}")
         try:
-          
-            # 步骤1: 获取或创建用户档案（使用UserStateService）
-            profile, _ = self.user_state_service.get_or_create_profile(request.participant_id, db)
-            # 步骤2: 情感分析
-            if self.sentiment_service:
-                sentiment_result = self.sentiment_service.analyze_sentiment(
-                    request.user_message
-                )
-            else:
-                # 如果情感分析服务未启用，创建一个默认的情感分析结果
-                from app.schemas.chat import SentimentAnalysisResult
-                sentiment_result = SentimentAnalysisResult(
-                    label="neutral",
-                    confidence=0.0,
-                    details={}
-                )
-
-            # 暂不构建用户状态摘要，等待内容加载后递增提问计数
-
-            # 步骤3: RAG检索
-            retrieved_knowledge = []
-            if self.rag_service:
-                try:
-                    retrieved_knowledge = self.rag_service.retrieve(request.user_message)
-                except Exception as e:
-                    print(f"⚠️ RAG检索失败，使用空知识内容: {e}")
-                    retrieved_knowledge = []
-
-            # 步骤4: 加载内容（学习内容或测试任务）
-            content_title = None
-            loaded_content_json = None
-            if request.mode and request.content_id:
-                try:
-                    content_type = "learning_content" if request.mode == "learning" else "test_tasks"
-                    loaded_content = load_json_content(content_type, request.content_id)
-                    content_title = getattr(loaded_content, 'title', None) or getattr(loaded_content, 'topic_id', None)
-                    
-                    # 根据模式处理内容
-                    # 学习模式：排除 sc_all 字段；测试模式：保留完整JSON
-                    if request.mode == "learning":
-                        learning_content_dict = loaded_content.model_dump()
-                        learning_content_dict.pop('sc_all', None)
-                        loaded_content_json = json.dumps(learning_content_dict, ensure_ascii=False)
-                    else:
-                        loaded_content_json = loaded_content.model_dump_json()
-
-                except Exception as e:
-                    print(f"⚠️ 内容加载失败: {e}")
-                    loaded_content = None
-                    content_title = None
-            else:
-                loaded_content = None
-
-            # 在生成提示词前：递增求助/提问计数，使当前轮次即可反映最新次数
-            try:
-                self.user_state_service.handle_ai_help_request(request.participant_id, content_title)
-                # 重新获取最新profile（从Redis），以反映递增后的行为计数
-                profile, _ = self.user_state_service.get_or_create_profile(request.participant_id, db)
-            except Exception as _:
-                # 计数递增失败不影响主流程
-                pass
-
-            # 步骤4.5: 进度聚类分析（在构建用户状态摘要前）
-            if request.conversation_history:
-                # 将ConversationMessage转换为字典格式用于聚类分析
-                conversation_for_clustering = []
-                for msg in request.conversation_history:
-                    conversation_for_clustering.append({
-                        'role': msg.role,
-                        'content': msg.content
-                    })
-                
-                # 使用节流逻辑：仅在满足条件时才触发聚类分析
-                should_cluster = self.user_state_service._should_perform_clustering(profile, conversation_for_clustering)
-                if should_cluster:
-                    try:
-                        # 触发聚类分析：使用注入的聚类服务
-                        clustering_result = self.user_state_service.update_progress_clustering(
-                            request.participant_id, 
-                            conversation_for_clustering,
-                            clustering_service=self.clustering_service
-                        )
-                        
-                        if clustering_result and clustering_result.get('analysis_successful'):
-                            model_type = clustering_result.get('model_type', 'unknown')
-                            print(f"✅ 距离聚类分析完成 ({model_type}): {clustering_result['cluster_name']} "
-                                  f"(置信度: {clustering_result.get('confidence', 0):.3f}, 类型: {clustering_result.get('classification_type', 'unknown')})")
-                        
-                        # 重新获取profile以反映聚类分析结果
-                        profile, _ = self.user_state_service.get_or_create_profile(request.participant_id, db)
-                        
-                    except Exception as e:
-                        print(f"⚠️ 进度聚类分析失败，继续正常流程: {e}")
-                else:
-                    print(f"🚦 聚类分析节流：跳过此次请求（消息数未达到步长8或时间间隔不足）")
-
-            # 现在构建用户状态摘要（包含最新行为计数、情感和聚类结果）
-            user_state_summary = self._build_user_state_summary(profile, sentiment_result)
-
-            # 诊断日志：输出本次对话可见的BKT快照与上下文注入情况
-            try:
-                bkt = getattr(user_state_summary, 'bkt_models', {}) or {}
-                topic_details = []
-                for topic_id, model in (bkt.items() if isinstance(bkt, dict) else []):
-                    prob = None
-                    if isinstance(model, dict):
-                        prob = model.get('mastery_prob')
-                    else:
-                        prob = getattr(model, 'mastery_prob', None)
-                        if prob is None and hasattr(model, 'get_mastery_prob'):
-                            try:
-                                prob = model.get_mastery_prob()
-                            except Exception:
-                                prob = None
-                    if isinstance(prob, (int, float)):
-                        topic_details.append(f"{topic_id}={prob:.3f}")
-                    else:
-                        topic_details.append(f"{topic_id}=None")
-                topic_str = "; ".join(topic_details) if topic_details else "none"
-                self.logger.info(
-                    f"BKT snapshot for {request.participant_id} (mode={request.mode}, content_id={request.content_id}): "
-                    f"topics={len(bkt) if isinstance(bkt, dict) else 0}; {topic_str}"
-                )
-            except Exception as e:
-                self.logger.warning(f"Failed to log BKT snapshot: {e}")
-
-            # 步骤5: 生成提示词
-            # 将ConversationMessage转换为字典格式
-            conversation_history_dicts = []
-            if request.conversation_history:
-                for msg in request.conversation_history:
-                    conversation_history_dicts.append({
-                        'role': msg.role,
-                        'content': msg.content
-                    })
-            elif request.conversation_history is None:
-                # 确保即使conversation_history为None也传递空列表
-                conversation_history_dicts = []
-
-            retrieved_knowledge_content = [item['content'] for item in retrieved_knowledge if isinstance(item, dict) and 'content' in item]
-            # 诊断日志：上下文注入规模
-            try:
-                test_count = len(request.test_results) if request.test_results else 0
-                self.logger.info(
-                    f"Context inputs -> RAG={len(retrieved_knowledge_content)}, content_json={'yes' if loaded_content_json else 'no'}, "
-                    f"test_results={test_count}"
-                )
-            except Exception:
-                pass
-            system_prompt, messages, context_snapshot = self.prompt_generator.create_prompts(
-                user_state=user_state_summary,
-                retrieved_context=retrieved_knowledge_content,
-                conversation_history=conversation_history_dicts,
-                user_message=request.user_message,
-                code_content=request.code_context,
-                mode=request.mode,
-                content_title=content_title,
-                content_json=loaded_content_json,  # 传递加载的内容JSON
-                test_results=request.test_results  # 传递测试结果
-            )
+            # 步骤1-5: 用户档案、情感分析、RAG检索、内容加载、聚类和提示词生成（阻塞操作，在线程池中执行）
+            loop = asyncio.get_running_loop()
+            prepared = await loop.run_in_executor(None, self._prepare_chat_prompt, request, db)
+            system_prompt = prepared["system_prompt"]
+            messages = prepared["messages"]
+            context_snapshot = prepared["context_snapshot"]
+            sentiment_result = prepared["sentiment_result"]
+            content_title = prepared["content_title"]
 
             # 步骤6: 调用LLM
             #TODO:done表示流式输出是否完成    elapsed:表示当前已经输出多少字
@@ -263,6 +114,182 @@ class DynamicController:
                 ai_response="I'm sorry, but a critical error occurred on our end. Please notify the research staff."
             )
 
+    def _prepare_chat_prompt(self, request: ChatRequest, db: Session) -> dict:
+        """
+        generate_adaptive_response 调用 LLM 之前的步骤：用户档案、情感分析、RAG检索、内容加载、进度聚类和提示词生成。
+
+        这些步骤包含同步的 Redis/数据库访问和 CPU 计算，由 generate_adaptive_response 放到线程池中执行。
+
+        Returns:
+            dict: system_prompt、messages、context_snapshot、sentiment_result、content_title
+        """
+        # 步骤1: 获取或创建用户档案（使用UserStateService）
+        profile, _ = self.user_state_service.get_or_create_profile(request.participant_id, db)
+        # 步骤2: 情感分析
+        if self.sentiment_service:
+            sentiment_result = self.sentiment_service.analyze_sentiment(
+                request.user_message
+            )
+        else:
+            # 如果情感分析服务未启用，创建一个默认的情感分析结果
+            from app.schemas.chat import SentimentAnalysisResult
+            sentiment_result = SentimentAnalysisResult(
+                label="neutral",
+                confidence=0.0,
+                details={}
+            )
+
+        # 暂不构建用户状态摘要，等待内容加载后递增提问计数
+
+        # 步骤3: RAG检索
+        retrieved_knowledge = []
+        if self.rag_service:
+            try:
+                retrieved_knowledge = self.rag_service.retrieve(request.user_message)
+            except Exception as e:
+                print(f"⚠️ RAG检索失败，使用空知识内容: {e}")
+                retrieved_knowledge = []
+
+        # 步骤4: 加载内容（学习内容或测试任务）
+        content_title = None
+        loaded_content_json = None
+        if request.mode and request.content_id:
+            try:
+                content_type = "learning_content" if request.mode == "learning" else "test_tasks"
+                loaded_content = load_json_content(content_type, request.content_id)
+                content_title = getattr(loaded_content, 'title', None) or getattr(loaded_content, 'topic_id', None)
+
+                # 根据模式处理内容
+                # 学习模式：排除 sc_all 字段；测试模式：保留完整JSON
+                if request.mode == "learning":
+                    learning_content_dict = loaded_content.model_dump()
+                    learning_content_dict.pop('sc_all', None)
+                    loaded_content_json = json.dumps(learning_content_dict, ensure_ascii=False)
+                else:
+                    loaded_content_json = loaded_content.model_dump_json()
+
+            except Exception as e:
+                print(f"⚠️ 内容加载失败: {e}")
+                loaded_content = None
+                content_title = None
+        else:
+            loaded_content = None
+
+        # 在生成提示词前：递增求助/提问计数，使当前轮次即可反映最新次数
+        try:
+            self.user_state_service.handle_ai_help_request(request.participant_id, content_title)
+            # 重新获取最新profile（从Redis），以反映递增后的行为计数
+            profile, _ = self.user_state_service.get_or_create_profile(request.participant_id, db)
+        except Exception as _:
+            # 计数递增失败不影响主流程
+            pass
+
+        # 步骤4.5: 进度聚类分析（在构建用户状态摘要前）
+        if request.conversation_history:
+            # 将ConversationMessage转换为字典格式用于聚类分析
+            conversation_for_clustering = []
+            for msg in request.conversation_history:
+                conversation_for_clustering.append({
+                    'role': msg.role,
+                    'content': msg.content
+                })
+
+            # 使用节流逻辑：仅在满足条件时才触发聚类分析
+            should_cluster = self.user_state_service._should_perform_clustering(profile, conversation_for_clustering)
+            if should_cluster:
+                try:
+                    # 触发聚类分析：使用注入的聚类服务
+                    clustering_result = self.user_state_service.update_progress_clustering(
+                        request.participant_id, 
+                        conversation_for_clustering,
+                        clustering_service=self.clustering_service
+                    )
+
+                    if clustering_result and clustering_result.get('analysis_successful'):
+                        model_type = clustering_result.get('model_type', 'unknown')
+                        print(f"✅ 距离聚类分析完成 ({model_type}): {clustering_result['cluster_name']} "
+                              f"(置信度: {clustering_result.get('confidence', 0):.3f}, 类型: {clustering_result.get('classification_type', 'unknown')})")
+
+                    # 重新获取profile以反映聚类分析结果
+                    profile, _ = self.user_state_service.get_or_create_profile(request.participant_id, db)
+
+                except Exception as e:
+                    print(f"⚠️ 进度聚类分析失败，继续正常流程: {e}")
+            else:
+                print(f"🚦 聚类分析节流：跳过此次请求（消息数未达到步长8或时间间隔不足）")
+
+        # 现在构建用户状态摘要（包含最新行为计数、情感和聚类结果）
+        user_state_summary = self._build_user_state_summary(profile, sentiment_result)
+
+        # 诊断日志：输出本次对话可见的BKT快照与上下文注入情况
+        try:
+            bkt = getattr(user_state_summary, 'bkt_models', {}) or {}
+            topic_details = []
+            for topic_id, model in (bkt.items() if isinstance(bkt, dict) else []):
+                prob = None
+                if isinstance(model, dict):
+                    prob = model.get('mastery_prob')
+                else:
+                    prob = getattr(model, 'mastery_prob', None)
+                    if prob is None and hasattr(model, 'get_mastery_prob'):
+                        try:
+                            prob = model.get_mastery_prob()
+                        except Exception:
+                            prob = None
+                if isinstance(prob, (int, float)):
+                    topic_details.append(f"{topic_id}={prob:.3f}")
+                else:
+                    topic_details.append(f"{topic_id}=None")
+            topic_str = "; ".join(topic_details) if topic_details else "none"
+            self.logger.info(
+                f"BKT snapshot for {request.participant_id} (mode={request.mode}, content_id={request.content_id}): "
+                f"topics={len(bkt) if isinstance(bkt, dict) else 0}; {topic_str}"
+            )
+        except Exception as e:
+            self.logger.warning(f"Failed to log BKT snapshot: {e}")
+
+        # 步骤5: 生成提示词
+        # 将ConversationMessage转换为字典格式
+        conversation_history_dicts = []
+        if request.conversation_history:
+            for msg in request.conversation_history:
+                conversation_history_dicts.append({
+                    'role': msg.role,
+                    'content': msg.content
+                })
+        elif request.conversation_history is None:
+            # 确保即使conversation_history为None也传递空列表
+            conversation_history_dicts = []
+
+        retrieved_knowledge_content = [item['content'] for item in retrieved_knowledge if isinstance(item, dict) and 'content' in item]
+        # 诊断日志：上下文注入规模
+        try:
+            test_count = len(request.test_results) if request.test_results else 0
+            self.logger.info(
+                f"Context inputs -> RAG={len(retrieved_knowledge_content)}, content_json={'yes' if loaded_content_json else 'no'}, "
+                f"test_results={test_count}"
+            )
+        except Exception:
+            pass
+        system_prompt, messages, context_snapshot = self.prompt_generator.create_prompts(
+            user_state=user_state_summary,
+            retrieved_context=retrieved_knowledge_content,
+            conversation_history=conversation_history_dicts,
+            user_message=request.user_message,
+            code_content=request.code_context,
+            mode=request.mode,
+            content_title=content_title,
+            content_json=loaded_content_json,  # 传递加载的内容JSON
+            test_results=request.test_results  # 传递测试结果
+        )
+        return {
+            "system_prompt": system_prompt,
+            "messages": messages,
+            "context_snapshot": context_snapshot,
+            "sentiment_result": sentiment_result,
+            "content_title": content_title,
+        }
+
     @staticmethod
     def _build_user_state_summary(
         profile: Any,
@@ -386,6 +413,162 @@ class DynamicController:
             # 数据保存失败必须报错，科研数据完整性优先
             raise RuntimeError(f"Failed to log AI interaction for {request.participant_id}: {e}")
 
+    def _prepare_adaptive_prompt(self, request: ChatRequest, db: Session) -> dict:
+        """
+        调用 LLM 之前的全部步骤：翻译、用户档案、情感分析、RAG检索、内容加载、进度聚类和提示词生成。
+
+        这些步骤都是阻塞的 I/O 或 CPU 计算，同步流程直接调用，异步流程放到线程池中执行。
+
+        Returns:
+            dict: system_prompt、messages、context_snapshot、sentiment_result、content_title
+        """
+        # 创建翻译缓存避免重复翻译
+        translation_cache = {}
+        
+        def get_translation(text):
+            """获取翻译结果，使用缓存避免重复翻译"""
+            if text not in translation_cache:
+                translation_cache[text] = translate(text)
+            return translation_cache[text]
+        
+        logger.info(f"翻译前：{request.user_message}")
+        translated_message = get_translation(request.user_message)
+        logger.info(f"翻译后：{translated_message}")
+        # 步骤1: 获取或创建用户档案（使用UserStateService）
+        profile, _ = self.user_state_service.get_or_create_profile(request.participant_id, db)
+        # 步骤2: 情感分析
+        if self.sentiment_service:
+            sentiment_result = self.sentiment_service.analyze_sentiment(
+                translated_message
+            )
+        else:
+            # 如果情感分析服务未启用，创建一个默认的情感分析结果
+            from app.schemas.chat import SentimentAnalysisResult
+            sentiment_result = SentimentAnalysisResult(
+                label="neutral",
+                confidence=0.0,
+                details={}
+            )
+        # 暂不构建用户状态摘要，等待内容加载后递增提问计数
+        # 步骤3: RAG检索
+        retrieved_knowledge = []
+        if self.rag_service:
+            try:
+                retrieved_knowledge = self.rag_service.retrieve(request.user_message)
+            except Exception as e:
+                print(f"⚠️ RAG检索失败，使用空知识内容: {e}")
+                retrieved_knowledge = []
+        # 步骤4: 加载内容（学习内容或测试任务）
+        content_title = None
+        loaded_content_json = None
+        if request.mode and request.content_id:
+            try:
+                content_type = "learning_content" if request.mode == "learning" else "test_tasks"
+                loaded_content = load_json_content(content_type, request.content_id)
+                content_title = getattr(loaded_content, 'title', None) or getattr(loaded_content, 'topic_id', None)
+                
+                # 根据模式处理内容
+                # 学习模式：排除 sc_all 字段；测试模式：保留完整JSON
+                if request.mode == "learning":
+                    learning_content_dict = loaded_content.model_dump()
+                    learning_content_dict.pop('sc_all', None)
+                    loaded_content_json = json.dumps(learning_content_dict, ensure_ascii=False)
+                else:
+                    loaded_content_json = loaded_content.model_dump_json()
+            except Exception as e:
+                print(f"⚠️ 内容加载失败: {e}")
+                loaded_content = None
+                content_title = None
+        else:
+            loaded_content = None
+        # 在生成提示词前：递增求助/提问计数，使当前轮次即可反映最新次数
+        try:
+            self.user_state_service.handle_ai_help_request(request.participant_id, content_title)
+            # 重新获取最新profile（从Redis），以反映递增后的行为计数
+            profile, _ = self.user_state_service.get_or_create_profile(request.participant_id, db)
+        except Exception as _:
+            pass
+
+        # 步骤4.5: 进度聚类分析（在构建用户状态摘要前）
+        if request.conversation_history:
+            # 将ConversationMessage转换为字典格式用于聚类分析
+            conversation_for_clustering = []
+            trans_history = []
+            for msg in request.conversation_history:
+                conversation_for_clustering.append({
+                    'role': msg.role,
+                    'content': msg.content
+                })
+            
+            
+            # 使用节流逻辑：仅在满足条件时才触发聚类分析
+            should_cluster = self.user_state_service._should_perform_clustering(profile,conversation_for_clustering)
+            if should_cluster:
+                try:
+                    for msg in request.conversation_history:
+                        if msg.role == 'user':
+                            trans_history.append({
+                                'role': msg.role,
+                                'content': get_translation(msg.content)
+                            })
+                            logger.info(f"翻译历史：{trans_history}")
+                    # 触发聚类分析：使用注入的聚类服务
+                    clustering_result = self.user_state_service.update_progress_clustering(
+                        request.participant_id, 
+                        trans_history,
+                        clustering_service=self.clustering_service
+                    )
+                    
+                    if clustering_result and clustering_result.get('analysis_successful'):
+                        model_type = clustering_result.get('model_type', 'unknown')
+                        logger.info(f"✅ 距离聚类分析完成 (同步-{model_type}): {clustering_result['cluster_name']} "
+                              f"(置信度: {clustering_result.get('confidence', 0):.3f}, 类型: {clustering_result.get('classification_type', 'unknown')})")
+                    
+                    # 重新获取profile以反映聚类分析结果
+                    profile, _ = self.user_state_service.get_or_create_profile(request.participant_id, db)
+                    
+                except Exception as e:
+                    print(f"⚠️ 进度聚类分析失败 (同步)，继续正常流程: {e}")
+            else:
+                print(f"🚦 聚类分析节流 (同步)：跳过此次请求（消息数未达到步长8或时间间隔不足）")
+
+        # 现在构建用户状态摘要（包含最新行为计数、情感和聚类结果）
+        user_state_summary = self._build_user_state_summary(profile, sentiment_result)
+
+        # 步骤5: 生成提示词
+        # 将ConversationMessage转换为字典格式
+        conversation_history_dicts = []
+        
+        if request.conversation_history:
+            for msg in request.conversation_history:
+                conversation_history_dicts.append({
+                    'role': msg.role,
+                    'content': msg.content
+                })
+                
+        elif request.conversation_history is None:
+            # 确保即使conversation_history为None也传递空列表
+            conversation_history_dicts = []
+        retrieved_knowledge_content = [item['content'] for item in retrieved_knowledge if isinstance(item, dict) and 'content' in item]
+        system_prompt, messages, context_snapshot = self.prompt_generator.create_prompts(
+            user_state=user_state_summary,
+            retrieved_context=retrieved_knowledge_content,
+            conversation_history=conversation_history_dicts,
+            user_message=request.user_message,
+            code_content=request.code_context,
+            mode=request.mode,
+            content_title=content_title,
+            content_json=loaded_content_json,  # 传递加载的内容JSON
+            test_results=request.test_results  # 传递测试结果
+        )
+        return {
+            "system_prompt": system_prompt,
+            "messages": messages,
+            "context_snapshot": context_snapshot,
+            "sentiment_result": sentiment_result,
+            "content_title": content_title,
+        }
+
     def generate_adaptive_response_sync(
         self,
         request: ChatRequest,
@@ -403,157 +586,23 @@ class DynamicController:
         """
         
         try:
-            # 创建翻译缓存避免重复翻译
-            translation_cache = {}
-            
-            def get_translation(text):
-                """获取翻译结果，使用缓存避免重复翻译"""
-                if text not in translation_cache:
-                    translation_cache[text] = translate(text)
-                return translation_cache[text]
-            
-            logger.info(f"翻译前：{request.user_message}")
-            translated_message = get_translation(request.user_message)
-            logger.info(f"翻译后：{translated_message}")
-            # 步骤1: 获取或创建用户档案（使用UserStateService）
-            profile, _ = self.user_state_service.get_or_create_profile(request.participant_id, db)
-            # 步骤2: 情感分析
-            if self.sentiment_service:
-                sentiment_result = self.sentiment_service.analyze_sentiment(
-                    translated_message
-                )
-            else:
-                # 如果情感分析服务未启用，创建一个默认的情感分析结果
-                from app.schemas.chat import SentimentAnalysisResult
-                sentiment_result = SentimentAnalysisResult(
-                    label="neutral",
-                    confidence=0.0,
-                    details={}
-                )
-            # 暂不构建用户状态摘要，等待内容加载后递增提问计数
-            # 步骤3: RAG检索
-            retrieved_knowledge = []
-            if self.rag_service:
-                try:
-                    retrieved_knowledge = self.rag_service.retrieve(request.user_message)
-                except Exception as e:
-                    print(f"⚠️ RAG检索失败，使用空知识内容: {e}")
-                    retrieved_knowledge = []
-            # 步骤4: 加载内容（学习内容或测试任务）
-            content_title = None
-            loaded_content_json = None
-            if request.mode and request.content_id:
-                try:
-                    content_type = "learning_content" if request.mode == "learning" else "test_tasks"
-                    loaded_content = load_json_content(content_type, request.content_id)
-                    content_title = getattr(loaded_content, 'title', None) or getattr(loaded_content, 'topic_id', None)
-                    
-                    # 根据模式处理内容
-                    # 学习模式：排除 sc_all 字段；测试模式：保留完整JSON
-                    if request.mode == "learning":
-                        learning_content_dict = loaded_content.model_dump()
-                        learning_content_dict.pop('sc_all', None)
-                        loaded_content_json = json.dumps(learning_content_dict, ensure_ascii=False)
-                    else:
-                        loaded_content_json = loaded_content.model_dump_json()
-                except Exception as e:
-                    print(f"⚠️ 内容加载失败: {e}")
-                    loaded_content = None
-                    content_title = None
-            else:
-                loaded_content = None
-            # 在生成提示词前：递增求助/提问计数，使当前轮次即可反映最新次数
-            try:
-                self.user_state_service.handle_ai_help_request(request.participant_id, content_title)
-                # 重新获取最新profile（从Redis），以反映递增后的行为计数
-                profile, _ = self.user_state_service.get_or_create_profile(request.participant_id, db)
-            except Exception as _:
-                pass
-
-            # 步骤4.5: 进度聚类分析（在构建用户状态摘要前）
-            if request.conversation_history:
-                # 将ConversationMessage转换为字典格式用于聚类分析
-                conversation_for_clustering = []
-                trans_history = []
-                for msg in request.conversation_history:
-                    conversation_for_clustering.append({
-                        'role': msg.role,
-                        'content': msg.content
-                    })
-                
-                
-                # 使用节流逻辑：仅在满足条件时才触发聚类分析
-                should_cluster = self.user_state_service._should_perform_clustering(profile,conversation_for_clustering)
-                if should_cluster:
-                    try:
-                        for msg in request.conversation_history:
-                            if msg.role == 'user':
-                                trans_history.append({
-                                    'role': msg.role,
-                                    'content': get_translation(msg.content)
-                                })
-                                logger.info(f"翻译历史：{trans_history}")
-                        # 触发聚类分析：使用注入的聚类服务
-                        clustering_result = self.user_state_service.update_progress_clustering(
-                            request.participant_id, 
-                            trans_history,
-                            clustering_service=self.clustering_service
-                        )
-                        
-                        if clustering_result and clustering_result.get('analysis_successful'):
-                            model_type = clustering_result.get('model_type', 'unknown')
-                            logger.info(f"✅ 距离聚类分析完成 (同步-{model_type}): {clustering_result['cluster_name']} "
-                                  f"(置信度: {clustering_result.get('confidence', 0):.3f}, 类型: {clustering_result.get('classification_type', 'unknown')})")
-                        
-                        # 重新获取profile以反映聚类分析结果
-                        profile, _ = self.user_state_service.get_or_create_profile(request.participant_id, db)
-                        
-                    except Exception as e:
-                        print(f"⚠️ 进度聚类分析失败 (同步)，继续正常流程: {e}")
-                else:
-                    print(f"🚦 聚类分析节流 (同步)：跳过此次请求（消息数未达到步长8或时间间隔不足）")
-
-            # 现在构建用户状态摘要（包含最新行为计数、情感和聚类结果）
-            user_state_summary = self._build_user_state_summary(profile, sentiment_result)
-
-            # 步骤5: 生成提示词
-            # 将ConversationMessage转换为字典格式
-            conversation_history_dicts = []
-            
-            if request.conversation_history:
-                for msg in request.conversation_history:
-                    conversation_history_dicts.append({
-                        'role': msg.role,
-                        'content': msg.content
-                    })
-                    
-            elif request.conversation_history is None:
-                # 确保即使conversation_history为None也传递空列表
-                conversation_history_dicts = []
-            retrieved_knowledge_content = [item['content'] for item in retrieved_knowledge if isinstance(item, dict) and 'content' in item]
-            system_prompt, messages, context_snapshot = self.prompt_generator.create_prompts(
-                user_state=user_state_summary,
-                retrieved_context=retrieved_knowledge_content,
-                conversation_history=conversation_history_dicts,
-                user_message=request.user_message,
-                code_content=request.code_context,
-                mode=request.mode,
-                content_title=content_title,
-                content_json=loaded_content_json,  # 传递加载的内容JSON
-                test_results=request.test_results  # 传递测试结果
-            )
+            prepared = self._prepare_adaptive_prompt(request, db)
+            system_prompt = prepared["system_prompt"]
             ai_response=""
             # 步骤6: 调用LLM（同步方式）
             for chunck in self.llm_gateway.get_stream_completion_sync(
                 system_prompt=system_prompt,
-                messages=messages
+                messages=prepared["messages"]
             ):
                 ai_response += chunck
                 yield chunck
             # 步骤7: 构建响应（只包含AI回复内容，符合TDD-II-10设计）
             response = ChatResponse(ai_response=ai_response)
             # 步骤8: 记录AI交互
-            self._log_ai_interaction(request, response, db, sentiment_result, background_tasks, system_prompt, content_title, context_snapshot)
+            self._log_ai_interaction(
+                request, response, db, prepared["sentiment_result"], background_tasks,
+                system_prompt, prepared["content_title"], prepared["context_snapshot"]
+            )
             #return response
         except Exception as e:
             print(f"❌ CRITICAL ERROR in generate_adaptive_response_sync: {e}")
@@ -564,3 +613,45 @@ class DynamicController:
             return ChatResponse(
                 ai_response="I'm sorry, but a critical error occurred on our end. Please notify the research staff."
             )
+
+    async def generate_adaptive_response_stream(
+        self,
+        request: ChatRequest,
+        db: Session,
+        executor: Optional[Executor] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        异步生成自适应AI回复的核心流程（供 asyncio 执行模式的 chat Worker 使用）
+
+        与 generate_adaptive_response_sync 步骤相同：LLM 之前的阻塞步骤（情感分析、聚类等）
+        和交互记录在 executor 中执行，LLM 流式输出直接异步读取，
+        一个事件循环可以同时运行多路生成。
+
+        Args:
+            request: 聊天请求
+            db: 数据库会话
+            executor: 执行阻塞步骤的线程池，None 时使用事件循环的默认线程池
+        Yields:
+            str: AI回复片段
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            prepared = await loop.run_in_executor(executor, self._prepare_adaptive_prompt, request, db)
+            ai_response = ""
+            async for chunk in self.llm_gateway.get_stream_completion(
+                system_prompt=prepared["system_prompt"],
+                messages=prepared["messages"]
+            ):
+                ai_response += chunk
+                yield chunk
+            response = ChatResponse(ai_response=ai_response)
+            await loop.run_in_executor(
+                executor,
+                functools.partial(
+                    self._log_ai_interaction,
+                    request, response, db, prepared["sentiment_result"], None,
+                    prepared["system_prompt"], prepared["content_title"], prepared["context_snapshot"]
+                )
+            )
+        except Exception as e:
+            logger.error(f"❌ CRITICAL ERROR in generate_adaptive_response_stream: {e}", exc_info=True)
@@ -1,6 +1,5 @@
 # backend/app/services/llm_gateway.py
 import os
-import asyncio
 from typing import List, Dict, Any, Optional
 from openai import OpenAI
 from app.core.config import settings
@@ -23,8 +22,21 @@ class LLMGateway:
             api_key=self.api_key,
             base_url=self.api_base
         )
+        # 异步客户端在首次使用时创建（只有 asyncio 执行模式需要）
+        self._async_client = None
         # 最近一次调用的token用量
         self.last_usage: Optional[dict] = None
+
+    @property
+    def async_client(self):
+        """AsyncOpenAI 客户端，供异步流式接口使用"""
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.api_base
+            )
+        return self._async_client
     
     def get_completion_sync(
         self, 
@@ -159,37 +171,20 @@ class LLMGateway:
             max_tokens = max_tokens or self.max_tokens
             temperature = temperature or self.temperature
             
-            # 调用LLM API - OpenAI客户端是同步的
-            # 使用 asyncio.to_thread 来在异步环境中运行同步代码
-            
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
+            # 使用 AsyncOpenAI 直接异步流式读取：等待下一个增量时让出事件循环，
+            # 一个进程内可以同时进行多路生成
+            response = await self.async_client.chat.completions.create(
                 model=self.model,
                 messages=full_messages,
                 max_tokens=max_tokens,
                 temperature=temperature,
                 stream=True,
             )
-            #return response
-            # 流式返回内容
-            for chunk in response:
+            async for chunk in response:
                 if chunk.choices and len(chunk.choices) > 0:
                     delta = chunk.choices[0].delta
                     if delta.content:
                         yield delta.content
-            
-            '''
-            # 直接异步流式
-            async with self.client.chat.completions.stream(
-                model=self.model,
-                messages=full_messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-            ) as stream:
-                async for event in stream:
-                    if event.type == "message.delta" and event.delta.get("content"):
-                        yield event.delta["content"]
-            '''
         except Exception as e:
             print(f"Error calling LLM API: {e}")
             yield f"I apologize, but I encountered an error: {str(e)}"
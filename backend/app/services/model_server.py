@@ -0,0 +1,226 @@
+"""
+本机模型服务（可选的 sidecar 进程）
+
+在一个进程中加载情感分析模型和句向量模型，经 Unix socket 为同一主机上的所有 Worker 提供推理：
+- 协议见 model_server_client（长度前缀 + JSON 帧）
+- 每个连接的请求按顺序处理，不同连接的请求进入按操作划分的队列
+- 批处理协程取出第一条请求后再等待 batch_window_ms，把期间到达的请求合并成一批（最多 max_batch_size 条文本），
+  由单个推理线程执行一次批量推理后按请求拆分结果
+- 推理在线程中执行，事件循环继续接收其他连接的请求
+
+启动: python -m app.services.model_server（Worker 侧设置 MODEL_SERVER_ENABLED=true）
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.model_server_client import (
+    MAX_FRAME_BYTES,
+    FRAME_HEADER,
+    encode_array,
+    pack_frame,
+    unpack_body,
+)
+
+logger = logging.getLogger(__name__)
+
+# 一条待处理请求: (请求内容, 等待结果的 future)
+_Pending = Tuple[dict, asyncio.Future]
+
+
+class ModelServer:
+    def __init__(
+        self,
+        sentiment_service,
+        encode_fn: Callable[[List[str], str], np.ndarray],
+        socket_path: str = settings.MODEL_SERVER_SOCKET_PATH,
+        batch_window_ms: int = settings.MODEL_SERVER_BATCH_WINDOW_MS,
+        max_batch_size: int = settings.MODEL_SERVER_MAX_BATCH_SIZE,
+    ):
+        """
+        Args:
+            sentiment_service: 在本进程加载模型的 SentimentAnalysisService
+            encode_fn: 句向量编码函数 encode_fn(texts, model_name)
+            socket_path: 监听的 Unix socket 路径
+            batch_window_ms: 合并请求的等待窗口（毫秒）
+            max_batch_size: 每批最多的文本条数
+        """
+        self.sentiment_service = sentiment_service
+        self.encode_fn = encode_fn
+        self.socket_path = socket_path
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        # 模型推理在单个线程中串行执行，批内并行由模型自身的算子线程完成
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-infer")
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._batchers: List[asyncio.Task] = []
+        self.started_at: Optional[float] = None
+
+        # 统计信息：请求数、批次数、文本条数
+        self.stats = {op: {"requests": 0, "batches": 0, "texts": 0} for op in ("sentiment", "encode")}
+
+    async def start(self) -> None:
+        """删除残留的 socket 文件后开始监听，并启动各操作的批处理协程"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._queues = {op: asyncio.Queue() for op in self.stats}
+        self._batchers = [asyncio.create_task(self._batch_loop(op)) for op in self.stats]
+        self._server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        self.started_at = time.time()
+        logger.info(f"ModelServer: 监听 {self.socket_path}")
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in self._batchers:
+            task.cancel()
+        await asyncio.gather(*self._batchers, return_exceptions=True)
+        self.executor.shutdown(wait=False)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def describe(self) -> dict:
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "sentiment_model": bool(getattr(self.sentiment_service, "model_available", False)),
+            "uptime_seconds": round(time.time() - (self.started_at or time.time()), 1),
+            "stats": self.stats,
+        }
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(FRAME_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                (size,) = FRAME_HEADER.unpack(header)
+                if size > MAX_FRAME_BYTES:
+                    logger.warning(f"ModelServer: 请求帧过大 ({size} 字节)，关闭连接")
+                    break
+                request = unpack_body(await reader.readexactly(size))
+                writer.write(pack_frame(await self._handle_request(request)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "ping":
+            return self.describe()
+        if op not in self._queues:
+            return {"error": f"unknown op: {op}"}
+        if not isinstance(request.get("texts"), list):
+            return {"error": "texts must be a list"}
+        self.stats[op]["requests"] += 1
+        future = asyncio.get_running_loop().create_future()
+        await self._queues[op].put((request, future))
+        try:
+            return await future
+        except Exception as e:
+            logger.error(f"ModelServer: {op} 推理失败: {e}", exc_info=True)
+            return {"error": f"{op} failed: {e}"}
+
+    async def _batch_loop(self, op: str) -> None:
+        queue = self._queues[op]
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[_Pending] = [await queue.get()]
+            size = len(batch[0][0]["texts"])
+            deadline = loop.time() + self.batch_window
+            while size < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0]["texts"])
+            await self._run_batch(op, batch)
+
+    async def _run_batch(self, op: str, batch: List[_Pending]) -> None:
+        loop = asyncio.get_running_loop()
+        # 按模型分组（encode 可能请求不同的模型）
+        groups: Dict[Optional[str], List[_Pending]] = {}
+        for item in batch:
+            groups.setdefault(item[0].get("model_name"), []).append(item)
+
+        for model_name, items in groups.items():
+            texts = [text for request, _ in items for text in request["texts"]]
+            self.stats[op]["batches"] += 1
+            self.stats[op]["texts"] += len(texts)
+            try:
+                if op == "sentiment":
+                    results = await loop.run_in_executor(
+                        self.executor, self.sentiment_service.analyze_sentiment_batch, texts
+                    )
+                    outputs = [{"label": r.label, "confidence": r.confidence} for r in results]
+                else:
+                    outputs = await loop.run_in_executor(self.executor, self.encode_fn, texts, model_name)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for request, future in items:
+                count = len(request["texts"])
+                part = outputs[offset:offset + count]
+                offset += count
+                if future.done():
+                    continue
+                if op == "sentiment":
+                    future.set_result({"results": part})
+                else:
+                    future.set_result(encode_array(np.asarray(part, dtype=np.float32).reshape(count, -1) if count else np.zeros((0, 0))))
+
+
+def _encode_texts(texts: List[str], model_name: Optional[str]) -> np.ndarray:
+    from app.services.clustering_core_service import encode_messages
+    if model_name:
+        return encode_messages(texts, model_name=model_name)
+    return encode_messages(texts)
+
+
+def main() -> None:
+    from app.services import sentiment_analysis_service as sentiment_module
+
+    logging.basicConfig(level=logging.INFO)
+    # 模型服务进程自己必须在本地加载模型
+    sentiment_service = sentiment_module.sentiment_analysis_service
+    if sentiment_service.model_client is not None:
+        sentiment_service = sentiment_module.SentimentAnalysisService()
+
+    server = ModelServer(sentiment_service=sentiment_service, encode_fn=_encode_texts)
+
+    async def _serve() -> None:
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await server.start()
+        await stop.wait()
+        await server.close()
+
+    asyncio.run(_serve())
+
+
+if __name__ == "__main__":
+    main()
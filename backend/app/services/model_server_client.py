@@ -0,0 +1,148 @@
+"""
+本机模型服务的客户端与通信协议
+
+chat_queue 的每个 prefork 进程都各自加载一份 BERT 情感分析模型和 all-mpnet-base-v2 句向量模型，
+内存随并发数线性增长，每个进程冷启动都要重新加载。
+启用 MODEL_SERVER_ENABLED 后，模型只在模型服务进程（app.services.model_server）中加载一份，
+SentimentAnalysisService 与 DistanceBasedClusteringService 经 ModelServerClient 调用。
+
+协议：Unix socket 上的请求/响应帧，每帧为 4 字节大端长度 + UTF-8 JSON
+- {"op": "ping"} -> {"ok": true, ...}
+- {"op": "sentiment", "texts": [...]} -> {"results": [{"label": ..., "confidence": ...}, ...]}
+- {"op": "encode", "texts": [...], "model_name": ...} -> {"shape": [n, d], "data": base64(float32)}
+- 出错时 -> {"error": "..."}
+"""
+
+import base64
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct(">I")
+# 单帧上限，防止异常数据导致一次分配过大的缓冲区
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+
+class ModelServerError(Exception):
+    """模型服务不可用或返回错误"""
+
+
+def pack_frame(message: dict) -> bytes:
+    body = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+def unpack_body(body: bytes) -> dict:
+    return json.loads(body.decode("utf-8"))
+
+
+def encode_array(array: np.ndarray) -> dict:
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    return {"shape": list(array.shape), "data": base64.b64encode(array.tobytes()).decode("ascii")}
+
+
+def decode_array(payload: dict) -> np.ndarray:
+    data = base64.b64decode(payload["data"])
+    return np.frombuffer(data, dtype=np.float32).reshape(payload["shape"])
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise ConnectionError("模型服务关闭了连接")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+class ModelServerClient:
+    def __init__(
+        self,
+        socket_path: str = settings.MODEL_SERVER_SOCKET_PATH,
+        timeout: float = settings.MODEL_SERVER_TIMEOUT_SECONDS,
+    ):
+        """
+        Args:
+            socket_path: 模型服务监听的 Unix socket 路径
+            timeout: 单次请求的超时秒数
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        # 每个线程一条连接；fork 后按 pid 重新连接，不与父进程共用 socket
+        self._local = threading.local()
+
+    def ping(self) -> dict:
+        """检查模型服务是否可用，返回已加载的模型与批处理统计"""
+        return self._call({"op": "ping"})
+
+    def sentiment(self, texts: List[str]) -> List[dict]:
+        """批量情感分析，返回与 texts 一一对应的 {"label", "confidence"}"""
+        return self._call({"op": "sentiment", "texts": list(texts)})["results"]
+
+    def encode(self, texts: List[str], model_name: str) -> np.ndarray:
+        """批量句向量编码，返回 (len(texts), dim) 的 float32 数组"""
+        return decode_array(self._call({"op": "encode", "texts": list(texts), "model_name": model_name}))
+
+    def close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def _connection(self) -> socket.socket:
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.sock = None
+            self._local.pid = os.getpid()
+        if self._local.sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return self._local.sock
+
+    def _call(self, request: dict) -> dict:
+        # 连接可能因模型服务重启而失效，失败时重连一次
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                sock.sendall(pack_frame(request))
+                (size,) = FRAME_HEADER.unpack(_recv_exactly(sock, FRAME_HEADER.size))
+                if size > MAX_FRAME_BYTES:
+                    raise ConnectionError(f"响应帧过大: {size} 字节")
+                response = unpack_body(_recv_exactly(sock, size))
+                break
+            except (OSError, ConnectionError) as e:
+                self.close()
+                if attempt == 1:
+                    raise ModelServerError(f"模型服务 {self.socket_path} 不可用: {e}") from e
+        if "error" in response:
+            raise ModelServerError(response["error"])
+        return response
+
+
+model_server_client = ModelServerClient()
+
+
+def get_model_server_client() -> Optional[ModelServerClient]:
+    """启用模型服务时返回客户端，否则返回 None（在进程内加载模型）"""
+    return model_server_client if settings.MODEL_SERVER_ENABLED else None
@@ -0,0 +1,143 @@
+"""
+ParticipantCache（参与者存在性缓存）
+
+各个 Celery 任务在处理事件前都要确保 participants 表中存在该用户（"软修复"补录），
+原来的做法是每个事件都 SELECT 一次，不存在再 INSERT。
+
+这里用两级缓存记住"已确认存在"的参与者：
+- 进程内 LRU：命中时不需要任何网络往返
+- Redis 集合：跨进程、跨 Worker 共享，命中时只需一次 Redis 往返，不访问数据库
+两级都未命中时，走一次幂等的 INSERT ... ON CONFLICT DO NOTHING，然后写回两级缓存。
+
+缓存的"存在"只对当前数据库成立：Redis 集合的键带有数据库标识（SQLite 为数据库文件的 inode，
+删除重建数据库后标识改变）和时间窗口编号，集合在窗口结束后过期。数据库被重置或换成另一个库时，
+旧的记录不会再被命中，每个参与者最多在一个窗口内被误判为存在。
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import redis
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.crud.crud_participant import participant as crud_participant
+from app.db.database import WriteSessionLocal
+from app.schemas.participant import ParticipantCreate
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+KNOWN_PARTICIPANTS_KEY = "participants:known"
+
+
+def database_identity(database_url: str) -> str:
+    """
+    数据库标识：SQLite 文件数据库为文件的设备号与 inode（删除重建后改变），其他数据库为主机与库名
+
+    文件不存在时返回 "missing"，数据库创建之后标识随之改变
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        try:
+            stat = os.stat(url.database or "")
+        except OSError:
+            return "missing"
+        return f"{stat.st_dev}-{stat.st_ino}"
+    return f"{url.host}:{url.port}/{url.database}"
+
+
+class ParticipantCache:
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        max_local_entries: int = 10000,
+        ttl_seconds: int = 86400,
+        identity: Optional[Callable[[], str]] = None,
+    ):
+        """
+        Args:
+            redis_client: 用于跨进程共享的 Redis 客户端，为 None 时只使用进程内缓存
+            max_local_entries: 进程内 LRU 最多保留的参与者数
+            ttl_seconds: 缓存时间窗口的长度，窗口结束后两级缓存中的记录都不再有效
+            identity: 返回当前数据库标识的函数，标识变化后两级缓存中的记录都不再有效
+        """
+        self.redis_client = redis_client
+        self.max_local_entries = max_local_entries
+        self.ttl_seconds = ttl_seconds
+        self.identity = identity or (lambda: "")
+        self._local: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_known(self, participant_id: str) -> bool:
+        """只查询缓存（进程内 LRU，然后 Redis），不访问数据库"""
+        version = self._version()
+        with self._lock:
+            if self._local.get(participant_id) == version:
+                self._local.move_to_end(participant_id)
+                return True
+
+        if self.redis_client is not None:
+            try:
+                if self.redis_client.sismember(self._known_key(version), participant_id):
+                    self._remember_locally(participant_id, version)
+                    return True
+            except redis.RedisError as e:
+                logger.warning(f"ParticipantCache: 查询 Redis 失败，回退到数据库: {e}")
+        return False
+
+    def ensure(self, participant_id: str, db: Optional[Session] = None, group: str = "experimental") -> None:
+        """
+        确保参与者在 participants 表中存在。
+
+        Args:
+            participant_id: 参与者ID
+            db: 数据库会话，为 None 时仅在缓存未命中时临时创建一个
+            group: 补录时使用的实验分组
+        """
+        if not participant_id or self.is_known(participant_id):
+            return
+
+        own_session = db is None
+        session = WriteSessionLocal() if own_session else db
+        try:
+            crud_participant.create_if_not_exists(session, obj_in=ParticipantCreate(id=participant_id, group=group))
+        finally:
+            if own_session:
+                session.close()
+        self.mark_known(participant_id)
+
+    def mark_known(self, participant_id: str) -> None:
+        """在参与者已确认写入数据库后调用，写回两级缓存"""
+        version = self._version()
+        self._remember_locally(participant_id, version)
+        if self.redis_client is not None:
+            try:
+                key = self._known_key(version)
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.sadd(key, participant_id)
+                # 窗口结束后不再读取该集合，多留一个窗口后过期
+                pipe.expire(key, 2 * self.ttl_seconds)
+                pipe.execute()
+            except redis.RedisError as e:
+                logger.warning(f"ParticipantCache: 写入 Redis 失败（忽略继续）: {e}")
+
+    def _version(self) -> Tuple[str, int]:
+        """当前的（数据库标识, 时间窗口编号）"""
+        return self.identity(), int(time.time() // self.ttl_seconds)
+
+    @staticmethod
+    def _known_key(version: Tuple[str, int]) -> str:
+        identity, window = version
+        return f"{KNOWN_PARTICIPANTS_KEY}:{identity}:{window}"
+
+    def _remember_locally(self, participant_id: str, version: Tuple[str, int]) -> None:
+        with self._lock:
+            self._local[participant_id] = version
+            self._local.move_to_end(participant_id)
+            while len(self._local) > self.max_local_entries:
+                self._local.popitem(last=False)
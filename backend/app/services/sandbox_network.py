@@ -0,0 +1,72 @@
+"""
+沙箱页面的网络拦截
+
+学生代码经常引用 CDN 字体、图片和远程脚本。教室网络是离线的，这些请求会一直挂起直到超时，
+page.set_content(wait_until="load") 要等它们全部结束，评测耗时因此由网络决定且没有上限。
+
+SandboxNetworkPolicy 通过 page.route 拦截页面发出的所有 http(s) 请求：
+- URL 以 local_assets 中的某个前缀开头、且本地目录中存在对应文件时，用该文件响应
+- 其余请求在 block_external 为真时立即中止（等同于断网，页面的 onerror 照常触发），否则放行
+data:、blob: 等不经过网络的资源不会进入路由，不受影响
+"""
+
+import logging
+import os
+from typing import Dict, Optional
+from urllib.parse import unquote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class SandboxNetworkPolicy:
+    def __init__(self, block_external: bool = True, local_assets: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            block_external: 是否中止不在本地资源白名单中的请求
+            local_assets: URL 前缀 -> 本地目录，前缀之后的路径映射为目录中的相对路径
+        """
+        self.block_external = block_external
+        # 最长的前缀优先匹配
+        self.local_assets = sorted((local_assets or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    @property
+    def enabled(self) -> bool:
+        """是否需要拦截请求（既不阻断也没有本地资源时不注册路由，避免每个请求多一次往返）"""
+        return self.block_external or bool(self.local_assets)
+
+    def resolve_local_asset(self, url: str) -> Optional[str]:
+        """返回 URL 对应的本地文件路径，不在白名单中、文件不存在或路径越出目录时返回 None"""
+        for prefix, directory in self.local_assets:
+            if not url.startswith(prefix):
+                continue
+            relative = unquote(urlsplit(url[len(prefix):]).path).lstrip("/")
+            root = os.path.realpath(directory)
+            path = os.path.realpath(os.path.join(root, relative))
+            if path != root and path.startswith(root + os.sep) and os.path.isfile(path):
+                return path
+            return None
+        return None
+
+    def handle(self, route) -> None:
+        """sync_api 的路由处理函数"""
+        url = route.request.url
+        path = self.resolve_local_asset(url)
+        if path is not None:
+            route.fulfill(path=path)
+        elif self.block_external:
+            logger.debug(f"沙箱拦截外部请求: {url}")
+            route.abort("blockedbyclient")
+        else:
+            route.continue_()
+
+    async def handle_async(self, route) -> None:
+        """async_api 的路由处理函数"""
+        url = route.request.url
+        path = self.resolve_local_asset(url)
+        if path is not None:
+            await route.fulfill(path=path)
+        elif self.block_external:
+            logger.debug(f"沙箱拦截外部请求: {url}")
+            await route.abort("blockedbyclient")
+        else:
+            await route.continue_()
@@ -1,7 +1,115 @@
 import asyncio
+import logging
+import os
+import signal
 import sys
-from playwright.sync_api import sync_playwright, Page, Error
-from typing import Dict, Any, List, Protocol, Tuple
+import threading
+import time
+import uuid
+from playwright.sync_api import sync_playwright, Page, Error, TimeoutError as PlaywrightTimeoutError
+from typing import Dict, Any, Generator, List, Optional, Protocol, Tuple
+
+from app.core.config import settings
+from app.services.checkpoint_compiler import (
+    BUNDLED_ASSERTION_TYPES,
+    CHECKPOINT_BUNDLE_SCRIPT,
+    assertion_plan,
+    compare_css_values,
+    compile_assertions,
+    normalize_color_value,
+    parse_css_value,
+    plan_isolated_chains,
+)
+from app.services.sandbox_network import SandboxNetworkPolicy
+from app.services.static_evaluator import observe_static_document
+
+logger = logging.getLogger(__name__)
+
+# 需要使用 raw HTML 模式的任务列表（直接使用用户的完整HTML代码）
+RAW_HTML_TASKS = ["1_3","1_end","2_end","3_end","4_end","5_end","6_end"]  # 可以在这里添加更多需要 raw 模式的任务
+
+# 评测服务自身出错（而不是用户代码未通过）时返回的消息
+INTERNAL_ERROR_MESSAGE = "评测服务发生内部错误。"
+
+# 单次评测超过时限被取消时返回的消息
+EVALUATION_TIMEOUT_MESSAGE = "评测超时，请检查代码中是否存在死循环或长时间运行的逻辑。"
+
+
+
+class EvaluationTimeout(Exception):
+    """评测超过总时限"""
+
+
+def kill_processes_with_arg(marker: str) -> int:
+    """
+    结束命令行参数中包含 marker 的进程（Chromium 主进程退出后渲染进程随之退出）
+
+    Returns:
+        结束的进程数；没有 /proc 的平台上返回 0
+    """
+    killed = 0
+    try:
+        pids = [name for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        logger.warning("当前平台没有 /proc，评测看门狗无法结束浏览器进程")
+        return 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                args = f.read().split(b"\0")
+            if marker.encode() in args:
+                os.kill(int(pid), signal.SIGKILL)
+                killed += 1
+        except (OSError, ValueError):
+            # 进程已经退出或无权读取
+            continue
+    return killed
+
+
+class EvaluationWatchdog:
+    """
+    评测看门狗：到达时限时从评测线程之外结束本次评测启动的 Chromium
+
+    page.evaluate 不受 set_default_timeout 约束，用户脚本死循环时渲染进程不会返回，
+    评测线程会一直阻塞在 Playwright 调用里，步骤之间的 deadline 检查也就无从执行。
+    sync_api 的对象不能跨线程使用，所以看门狗不调用 browser.close()，而是按启动参数中的唯一标记
+    结束浏览器进程；阻塞中的 Playwright 调用随即抛出 Error，run_evaluation 根据 fired 返回超时结果。
+    """
+
+    def __init__(self, timeout_seconds: float, kill=None):
+        self.marker = f"--sandbox-evaluation-id={uuid.uuid4().hex}"
+        self.fired = False
+        self._kill = kill or kill_processes_with_arg
+        self._timer = threading.Timer(timeout_seconds, self._fire)
+        self._timer.daemon = True
+
+    def __enter__(self):
+        self._timer.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._timer.cancel()
+        return False
+
+    def _fire(self) -> None:
+        self.fired = True
+        killed = self._kill(self.marker)
+        logger.warning(f"沙箱评测超过时限，已结束 {killed} 个浏览器进程")
+
+
+# 看门狗在评测总时限之后再等待的秒数
+WATCHDOG_GRACE_SECONDS = 1.0
+
+# 启动 Chromium 的参数（同步与异步引擎共用）
+CHROMIUM_LAUNCH_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-accelerated-2d-canvas',
+    '--no-first-run',
+    '--no-zygote',
+    '--disable-gpu'
+]
 
 
 # 定义接口协议，便于依赖注入和模拟
@@ -38,16 +146,41 @@ class DefaultPlaywrightManager:
 
 
 class SandboxService:
-    def __init__(self, playwright_manager=None, headless=True):
+    def __init__(
+        self,
+        playwright_manager=None,
+        headless=True,
+        static_precheck=settings.SANDBOX_STATIC_PRECHECK,
+        parallel_interactions=settings.SANDBOX_PARALLEL_INTERACTIONS,
+        timeout_seconds: float = settings.SANDBOX_EVALUATION_TIMEOUT_SECONDS,
+        wait_until: str = settings.SANDBOX_WAIT_UNTIL,
+        page_load_timeout_ms: int = settings.SANDBOX_PAGE_LOAD_TIMEOUT_MS,
+        network_policy: Optional[SandboxNetworkPolicy] = None,
+    ):
         """
         初始化沙箱服务
 
         Args:
             playwright_manager: Playwright 上下文管理器，用于依赖注入
             headless: 是否以无头模式运行浏览器
+            static_precheck: 是否先尝试在静态 DOM 上判定检查点（见 static_evaluator）
+            parallel_interactions: 是否把互不依赖的交互检查点放到独立页面上并行执行（见 plan_isolated_chains）
+            timeout_seconds: 单次评测的总时限（秒）
+            wait_until: 加载页面时等待的事件（load / domcontentloaded / commit）
+            page_load_timeout_ms: 加载页面的最长等待时间，超时后直接在已有的 DOM 上评估
+            network_policy: 页面网络拦截策略，默认按 SANDBOX_BLOCK_EXTERNAL_REQUESTS / SANDBOX_LOCAL_ASSETS 创建
         """
         self._playwright_manager = playwright_manager or DefaultPlaywrightManager()
         self._headless = headless
+        self._static_precheck = static_precheck
+        self._parallel_interactions = parallel_interactions
+        self._timeout_seconds = timeout_seconds
+        self._wait_until = wait_until
+        self._page_load_timeout_ms = page_load_timeout_ms
+        self._network_policy = network_policy or SandboxNetworkPolicy(
+            block_external=settings.SANDBOX_BLOCK_EXTERNAL_REQUESTS,
+            local_assets=settings.SANDBOX_LOCAL_ASSETS,
+        )
 
     def run_evaluation(self, user_code: Dict[str, str], checkpoints: List[Dict[str, Any]], topic_id: str = None) -> Dict[str, Any]:
         """
@@ -68,129 +201,202 @@ class SandboxService:
         #     return {"passed": True, "message": "通过", "details": []}
 
         # 根据 topic_id 判断是否使用 raw HTML 模式
-        # 指定需要使用 raw HTML 模式的任务列表
-        RAW_HTML_TASKS = ["1_3","1_end","2_end","3_end","4_end","5_end","6_end"]  # 可以在这里添加更多需要 raw 模式的任务
         raw_html_mode = (topic_id in RAW_HTML_TASKS)
-        
-        results = []
-        passed_all = True
+        full_html = self._build_page_html(user_code, raw_html_mode)
+
+        # 只涉及静态 DOM 的检查点直接在进程内判定，不启动浏览器
+        static_result = self._static_result(full_html, user_code, checkpoints, raw_html_mode)
+        if static_result is not None:
+            return static_result
 
         browser = None
         page = None
+        deadline = time.monotonic() + self._timeout_seconds
+        # 看门狗比 deadline 稍晚触发：能在步骤之间发现超时的情况照常抛出 EvaluationTimeout，
+        # 阻塞在页面脚本里的情况由看门狗结束浏览器
+        with EvaluationWatchdog(self._timeout_seconds + WATCHDOG_GRACE_SECONDS) as watchdog:
+            try:
+                with self._playwright_manager as p:
+                    browser = p.chromium.launch(
+                        headless=self._headless, args=CHROMIUM_LAUNCH_ARGS + [watchdog.marker]
+                    )
+                    chains = plan_isolated_chains(checkpoints) if self._parallel_interactions else None
+                    if chains is None:
+                        page = browser.new_page()
+                        self._prepare_page(page)
+                        self._load_page(page, full_html)
+                        outcomes = self._evaluate_checkpoints(page, checkpoints, deadline)
+                    else:
+                        outcomes = self._evaluate_isolated_chains(browser, full_html, checkpoints, chains, deadline)
+
+            except EvaluationTimeout:
+                logger.warning(f"沙箱评测超时，topic={topic_id}")
+                return {"passed": False, "message": EVALUATION_TIMEOUT_MESSAGE, "details": []}
+            except Error as e:
+                if watchdog.fired:
+                    logger.warning(f"沙箱评测超时（看门狗结束了浏览器），topic={topic_id}")
+                    return {"passed": False, "message": EVALUATION_TIMEOUT_MESSAGE, "details": []}
+                return {"passed": False, "message": INTERNAL_ERROR_MESSAGE, "details": [str(e)]}
+            finally:
+                # 确保资源被正确释放
+                if browser:
+                    try:
+                        browser.close()
+                    except Error:
+                        # 浏览器可能已经关闭，忽略错误
+                        pass
+
+        # 检查点内部会把 Playwright 错误记为未通过，浏览器被看门狗结束后同样按超时处理
+        if watchdog.fired:
+            logger.warning(f"沙箱评测超时（看门狗结束了浏览器），topic={topic_id}")
+            return {"passed": False, "message": EVALUATION_TIMEOUT_MESSAGE, "details": []}
+        return self._summarize(checkpoints, outcomes)
+
+    def _prepare_page(self, page: Page) -> None:
+        """注册网络拦截，并把页面操作的默认超时限制在评测总时限内"""
+        if self._network_policy.enabled:
+            page.route("**/*", self._network_policy.handle)
+        page.set_default_timeout(self._timeout_seconds * 1000)
+
+    def _load_page(self, page: Page, full_html: str) -> None:
+        """加载页面，超过 page_load_timeout_ms 时不再等待剩余资源"""
         try:
-            with self._playwright_manager as p:
-                browser = p.chromium.launch(
-                    headless=self._headless,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-setuid-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-accelerated-2d-canvas',
-                        '--no-first-run',
-                        '--no-zygote',
-                        '--disable-gpu'
-                    ]
-                )
-                page = browser.new_page()
-
-                # 根据模式构建HTML结构
-                if raw_html_mode:
-                    # Raw HTML模式：直接使用用户的完整HTML代码，不做任何修改
-                    full_html = user_code.get('html', '')
-
-                    # 如果用户没有写任何内容，添加一个标记以便检查点识别
-                    if not full_html.strip():
-                        # 用户什么都没写，使用一个特殊的空页面
-                        full_html = '<html><head></head><body data-empty="true"></body></html>'
-
-                    # 在Raw模式下，需要将CSS和JS也整合到HTML中
-                    css_content = user_code.get('css', '')
-                    js_content = user_code.get('js', '')
-
-                    # 将用户原始HTML传递给页面，供检查点使用
-                    full_html_with_script = full_html + f'<script>window.userOriginalHTML = {repr(user_code.get("html", ""))}</script>'
-
-                    # 注入CSS和JS
-                    if css_content:
-                        # 在<head>标签中添加<style>标签
-                        if '<head>' in full_html_with_script:
-                            full_html_with_script = full_html_with_script.replace(
-                                '<head>',
-                                f'<head><style>{css_content}</style>',
-                                1
-                            )
-                        else:
-                            # 如果没有<head>标签，添加一个
-                            full_html_with_script = full_html_with_script.replace(
-                                '<html',
-                                f'<html><head><style>{css_content}</style></head>',
-                                1
-                            )
+            page.set_content(full_html, wait_until=self._wait_until, timeout=self._page_load_timeout_ms)
+        except PlaywrightTimeoutError:
+            logger.info(f"沙箱页面在 {self._page_load_timeout_ms}ms 内未到达 {self._wait_until}，继续评估")
+
+    def _static_result(
+        self, full_html: str, user_code: Dict[str, str], checkpoints: List[Any], raw_html_mode: bool
+    ) -> Optional[Dict[str, Any]]:
+        """静态预检能够判定全部检查点时返回评测结果，否则返回 None（需要启动浏览器）"""
+        if not self._static_precheck or raw_html_mode:
+            return None
+        observations = observe_static_document(full_html, user_code, checkpoints)
+        if observations is None:
+            return None
+        return self._summarize(
+            checkpoints,
+            [self._judge_assertion(cp, obs) for cp, obs in zip(checkpoints, observations)]
+        )
+
+    def _summarize(self, checkpoints: List[Any], outcomes: List[Tuple[bool, str]]) -> Dict[str, Any]:
+        """把各检查点的判定结果汇总为评测结果字典"""
+        results = []
+        passed_all = True
+        for i, (cp, (passed, detail)) in enumerate(zip(checkpoints, outcomes)):
+            if not passed:
+                passed_all = False
+                # 如果检查点有自定义反馈，使用它，否则用默认的
+                feedback = cp.feedback if hasattr(cp, 'feedback') and cp.feedback else detail
+                results.append(f"检查点 {i + 1} 失败: {feedback}")
 
-                    if js_content:
-                        # 在</body>标签前添加<script>标签
-                        if '</body>' in full_html_with_script:
-                            full_html_with_script = full_html_with_script.replace(
-                                '</body>',
-                                f'<script>{js_content}</script></body>',
-                                1
-                            )
-                        else:
-                            # 如果没有</body>标签，添加一个
-                            full_html_with_script = full_html_with_script + f'<script>{js_content}</script>'
+        message = "恭喜！所有测试点都通过了！" if passed_all else "很遗憾，部分测试点未通过。"
+        return {"passed": passed_all, "message": message, "details": results}
 
-                    # 在Raw模式下也需要设置页面内容
-                    page.set_content(full_html_with_script, wait_until="load")  # 等待页面加载完成
+    def _build_page_html(self, user_code: Dict[str, str], raw_html_mode: bool) -> str:
+        """
+        根据模式构建交给浏览器的完整HTML
+
+        Args:
+            user_code: 用户提交的代码，包含 html, css, js
+            raw_html_mode: 是否使用 raw HTML 模式
+        """
+        if raw_html_mode:
+            # Raw HTML模式：直接使用用户的完整HTML代码，不做任何修改
+            full_html = user_code.get('html', '')
+
+            # 如果用户没有写任何内容，添加一个标记以便检查点识别
+            if not full_html.strip():
+                # 用户什么都没写，使用一个特殊的空页面
+                full_html = '<html><head></head><body data-empty="true"></body></html>'
+
+            # 在Raw模式下，需要将CSS和JS也整合到HTML中
+            css_content = user_code.get('css', '')
+            js_content = user_code.get('js', '')
+
+            # 将用户原始HTML传递给页面，供检查点使用
+            full_html_with_script = full_html + f'<script>window.userOriginalHTML = {repr(user_code.get("html", ""))}</script>'
+
+            # 注入CSS和JS
+            if css_content:
+                # 在<head>标签中添加<style>标签
+                if '<head>' in full_html_with_script:
+                    full_html_with_script = full_html_with_script.replace(
+                        '<head>',
+                        f'<head><style>{css_content}</style>',
+                        1
+                    )
                 else:
-                    # 标准沙箱模式：将用户代码嵌入到标准模板中
-                    # 检查用户代码是否已经包含完整的HTML结构
-                    user_html = user_code.get('html', '')
-                    if (user_html.strip().startswith('<!DOCTYPE html>') or 
-                        user_html.strip().startswith('<html') or
-                        '<html' in user_html.lower()):
-                        # 用户代码已经包含HTML结构，直接使用
-                        full_html = user_html
-                        
-                        # 注入CSS和JS到现有HTML中
-                        css_content = user_code.get('css', '')
-                        js_content = user_code.get('js', '')
-                        
-                        # 如果有CSS内容，尝试添加到<head>中
-                        if css_content:
-                            if '<head>' in full_html:
-                                # 确保只替换第一个<head>标签
-                                head_pos = full_html.find('<head>')
-                                head_end_pos = full_html.find('>', head_pos) + 1
-                                full_html = full_html[:head_end_pos] + f'<style>{css_content}</style>' + full_html[head_end_pos:]
-                            else:
-                                # 如果没有<head>，尝试添加到<html>后
-                                html_pos = full_html.find('<html')
-                                html_end_pos = full_html.find('>', html_pos) + 1
-                                full_html = full_html[:html_end_pos] + f'<head><style>{css_content}</style></head>' + full_html[html_end_pos:]
-                        
-                        # 如果有JS内容，尝试添加到</body>前或</html>前
-                        if js_content or True:  # 总是添加alert拦截脚本
-                            # 添加alert拦截脚本
-                            alert_script = """\n<script>\nwindow.__alertMessages = [];\nwindow.alert = function (msg) {\n    window.__alertMessages.push(msg);\n};\n</script>"""
-                            
-                            js_to_inject = alert_script
-                            if js_content:
-                                js_to_inject += f'\n<script>{js_content}</script>'
-                            
-                            if '</body>' in full_html:
-                                # 在</body>标签前插入JS
-                                body_end_pos = full_html.rfind('</body>')
-                                full_html = full_html[:body_end_pos] + js_to_inject + full_html[body_end_pos:]
-                            elif '</html>' in full_html:
-                                # 在</html>标签前插入JS
-                                html_end_pos = full_html.rfind('</html>')
-                                full_html = full_html[:html_end_pos] + js_to_inject + full_html[html_end_pos:]
-                            else:
-                                # 如果都没有，直接追加
-                                full_html = full_html + js_to_inject
+                    # 如果没有<head>标签，添加一个
+                    full_html_with_script = full_html_with_script.replace(
+                        '<html',
+                        f'<html><head><style>{css_content}</style></head>',
+                        1
+                    )
+
+            if js_content:
+                # 在</body>标签前添加<script>标签
+                if '</body>' in full_html_with_script:
+                    full_html_with_script = full_html_with_script.replace(
+                        '</body>',
+                        f'<script>{js_content}</script></body>',
+                        1
+                    )
+                else:
+                    # 如果没有</body>标签，添加一个
+                    full_html_with_script = full_html_with_script + f'<script>{js_content}</script>'
+
+            return full_html_with_script
+        else:
+            # 标准沙箱模式：将用户代码嵌入到标准模板中
+            # 检查用户代码是否已经包含完整的HTML结构
+            user_html = user_code.get('html', '')
+            if (user_html.strip().startswith('<!DOCTYPE html>') or 
+                user_html.strip().startswith('<html') or
+                '<html' in user_html.lower()):
+                # 用户代码已经包含HTML结构，直接使用
+                full_html = user_html
+                
+                # 注入CSS和JS到现有HTML中
+                css_content = user_code.get('css', '')
+                js_content = user_code.get('js', '')
+                
+                # 如果有CSS内容，尝试添加到<head>中
+                if css_content:
+                    if '<head>' in full_html:
+                        # 确保只替换第一个<head>标签
+                        head_pos = full_html.find('<head>')
+                        head_end_pos = full_html.find('>', head_pos) + 1
+                        full_html = full_html[:head_end_pos] + f'<style>{css_content}</style>' + full_html[head_end_pos:]
                     else:
-                        # 用户代码不包含HTML结构，使用标准模板
-                        full_html = f"""<!DOCTYPE html>
+                        # 如果没有<head>，尝试添加到<html>后
+                        html_pos = full_html.find('<html')
+                        html_end_pos = full_html.find('>', html_pos) + 1
+                        full_html = full_html[:html_end_pos] + f'<head><style>{css_content}</style></head>' + full_html[html_end_pos:]
+                
+                # 如果有JS内容，尝试添加到</body>前或</html>前
+                if js_content or True:  # 总是添加alert拦截脚本
+                    # 添加alert拦截脚本
+                    alert_script = """\n<script>\nwindow.__alertMessages = [];\nwindow.alert = function (msg) {\n    window.__alertMessages.push(msg);\n};\n</script>"""
+                    
+                    js_to_inject = alert_script
+                    if js_content:
+                        js_to_inject += f'\n<script>{js_content}</script>'
+                    
+                    if '</body>' in full_html:
+                        # 在</body>标签前插入JS
+                        body_end_pos = full_html.rfind('</body>')
+                        full_html = full_html[:body_end_pos] + js_to_inject + full_html[body_end_pos:]
+                    elif '</html>' in full_html:
+                        # 在</html>标签前插入JS
+                        html_end_pos = full_html.rfind('</html>')
+                        full_html = full_html[:html_end_pos] + js_to_inject + full_html[html_end_pos:]
+                    else:
+                        # 如果都没有，直接追加
+                        full_html = full_html + js_to_inject
+            else:
+                # 用户代码不包含HTML结构，使用标准模板
+                full_html = f"""<!DOCTYPE html>
                                         <html>
                                         <head>
                                             <meta charset="UTF-8">
@@ -207,29 +413,8 @@ class SandboxService:
                                             <script>{user_code.get('js', '')}</script>
                                         </body>
                                         </html>"""
-                    page.set_content(full_html, wait_until="load")  # 等待页面加载完成
-
-                for i, cp in enumerate(checkpoints):
-                    passed, detail = self._evaluate_checkpoint(page, cp)
-                    if not passed:
-                        passed_all = False
-                        # 如果检查点有自定义反馈，使用它，否则用默认的
-                        feedback = cp.feedback if hasattr(cp, 'feedback') and cp.feedback else detail
-                        results.append(f"检查点 {i + 1} 失败: {feedback}")
-
-        except Error as e:
-            return {"passed": False, "message": "评测服务发生内部错误。", "details": [str(e)]}
-        finally:
-            # 确保资源被正确释放
-            if browser:
-                try:
-                    browser.close()
-                except Error:
-                    # 浏览器可能已经关闭，忽略错误
-                    pass
-        
-        message = "恭喜！所有测试点都通过了！" if passed_all else "很遗憾，部分测试点未通过。"
-        return {"passed": passed_all, "message": message, "details": results}
+            return full_html
+
 
     def _evaluate_checkpoint(self, page: Page, checkpoint) -> Tuple[bool, str]:
         """
@@ -284,7 +469,7 @@ class SandboxService:
                     return False, f"执行动作 '{action_type}' 时发生错误: {e}"
 
                 # 交互后，对嵌套的断言进行评估
-                return self._evaluate_assertion(page, checkpoint.assertion)
+                return self._evaluate_bundle(page, [checkpoint.assertion])[0]
             else:
                 # 如果不是交互式检查点，直接评估断言
                 return self._evaluate_assertion(page, checkpoint)
@@ -292,9 +477,214 @@ class SandboxService:
         except Exception as e:
             return False, f"执行检查点时发生错误: {e}"
 
+    def _evaluate_checkpoints(
+        self, page: Page, checkpoints: List[Any], deadline: Optional[float] = None
+    ) -> List[Tuple[bool, str]]:
+        """
+        按顺序评估所有检查点
+
+        连续的非交互检查点编译成一次 page.evaluate；interaction_and_assert 仍按顺序执行 Playwright 动作。
+
+        Returns:
+            与 checkpoints 一一对应的 (是否通过, 详细信息) 列表
+
+        Raises:
+            EvaluationTimeout: 超过 deadline（time.monotonic() 时间）时
+        """
+        return self._run_steps([(page, self._checkpoint_steps(page, checkpoints))], deadline)[0]
+
+    def _evaluate_isolated_chains(
+        self, browser, full_html: str, checkpoints: List[Any], chains: List[List[int]],
+        deadline: Optional[float] = None,
+    ) -> List[Tuple[bool, str]]:
+        """
+        在同一浏览器上下文中为每条执行链打开一个从初始页面开始的独立页面，交错推进各条链
+
+        Returns:
+            与 checkpoints 一一对应的 (是否通过, 详细信息) 列表
+        """
+        context = browser.new_context()
+        try:
+            pages = [context.new_page() for _ in chains]
+            # 先让所有页面开始加载，再逐个等待加载完成，各页面的加载相互重叠
+            for page in pages:
+                self._prepare_page(page)
+                page.set_content(full_html, wait_until="commit", timeout=self._page_load_timeout_ms)
+            if self._wait_until != "commit":
+                for page in pages:
+                    try:
+                        page.wait_for_load_state(self._wait_until, timeout=self._page_load_timeout_ms)
+                    except PlaywrightTimeoutError:
+                        logger.info(f"沙箱页面在 {self._page_load_timeout_ms}ms 内未到达 {self._wait_until}，继续评估")
+
+            chain_outcomes = self._run_steps([
+                (page, self._checkpoint_steps(page, [checkpoints[i] for i in chain]))
+                for page, chain in zip(pages, chains)
+            ], deadline)
+        finally:
+            context.close()
+
+        outcomes: List[Tuple[bool, str]] = [None] * len(checkpoints)
+        for chain, results in zip(chains, chain_outcomes):
+            for index, outcome in zip(chain, results):
+                outcomes[index] = outcome
+        return outcomes
+
+    def _checkpoint_steps(
+        self, page: Page, checkpoints: List[Any]
+    ) -> Generator[int, None, List[Tuple[bool, str]]]:
+        """
+        在一个页面上按顺序评估检查点的生成器
+
+        wait 动作不在这里阻塞，而是 yield 需要等待的毫秒数，由 _run_steps 统一等待，
+        多个页面上的等待因此可以重叠；其他交互之后 yield 0。生成器结束时返回与 checkpoints 一一对应的结果列表。
+        """
+        results = []
+        pending = []
+        for cp in checkpoints:
+            if cp.type != "interaction_and_assert":
+                pending.append(cp)
+                continue
+            results.extend(self._evaluate_bundle(page, pending))
+            pending = []
+            if cp.action_type != "wait":
+                results.append(self._evaluate_checkpoint(page, cp))
+                # 每个交互之后让出一次，由 _run_steps 检查总时限
+                yield 0
+                continue
+            try:
+                # 默认等待100毫秒
+                wait_ms = int(cp.action_value) if cp.action_value is not None else 100
+            except Exception as e:
+                results.append((False, f"执行动作 '{cp.action_type}' 时发生错误: {e}"))
+                continue
+            yield wait_ms
+            results.append(self._evaluate_bundle(page, [cp.assertion])[0])
+        results.extend(self._evaluate_bundle(page, pending))
+        return results
+
+    @staticmethod
+    def _run_steps(
+        steps: List[Tuple[Page, Generator]], deadline: Optional[float] = None
+    ) -> List[List[Tuple[bool, str]]]:
+        """
+        交错推进多个 _checkpoint_steps 生成器：到期的生成器继续执行，
+        都在等待时只等到最早的一个到期，总耗时接近等待最长的那条链
+
+        Raises:
+            EvaluationTimeout: 超过 deadline 时不再推进任何生成器
+        """
+        outcomes = [None] * len(steps)
+        ready_at = {i: 0.0 for i in range(len(steps))}
+        while ready_at:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                raise EvaluationTimeout()
+            due = [i for i, ready in ready_at.items() if ready <= now]
+            if not due:
+                first = min(ready_at, key=ready_at.get)
+                wake_at = ready_at[first] if deadline is None else min(ready_at[first], deadline)
+                # 用页面的 wait_for_timeout 等待，期间 Playwright 继续处理浏览器事件
+                steps[first][0].wait_for_timeout((wake_at - now) * 1000)
+                continue
+            for i in due:
+                try:
+                    wait_ms = next(steps[i][1])
+                    ready_at[i] = time.monotonic() + wait_ms / 1000
+                except StopIteration as stop:
+                    outcomes[i] = stop.value
+                    del ready_at[i]
+        return outcomes
+
+    def _evaluate_bundle(self, page: Page, assertions: List[Any]) -> List[Tuple[bool, str]]:
+        """
+        在一次 page.evaluate 中采集一组非交互断言的观测值并逐个判定
+
+        观测项标记 fallback 时，该项改为逐个调用的方式评估，其后的断言重新编译继续；
+        整个脚本执行失败时，剩余断言全部改为逐个调用。
+        """
+        results = []
+        while len(results) < len(assertions):
+            batch = assertions[len(results):]
+            try:
+                observations = page.evaluate(CHECKPOINT_BUNDLE_SCRIPT, compile_assertions(batch))
+                if not isinstance(observations, list):
+                    raise TypeError(f"观测结果类型错误: {type(observations).__name__}")
+            except Exception as e:
+                logger.warning(f"检查点合并评估失败，改为逐个评估: {e}")
+                results.extend(self._evaluate_assertion(page, assertion) for assertion in batch)
+                break
+            for assertion, observation in zip(batch, observations):
+                if observation.get("fallback"):
+                    results.append(self._evaluate_assertion(page, assertion))
+                    break
+                results.append(self._judge_assertion(assertion, observation))
+        return results
+
     def _evaluate_assertion(self, page: Page, assertion) -> Tuple[bool, str]:
         """
-        专门处理各种非交互的断言的私有方法
+        专门处理各种非交互的断言的私有方法（逐个调用 Playwright 采集观测值）
+        """
+        if assertion is None or assertion.type not in BUNDLED_ASSERTION_TYPES:
+            return self._judge_assertion(assertion, {})
+        try:
+            return self._judge_assertion(assertion, self._observe_assertion(page, assertion))
+        except Exception as e:
+            return False, f"执行断言时发生错误: {e}"
+
+    def _observe_assertion(self, page: Page, assertion) -> Dict[str, Any]:
+        """通过 Playwright locator 采集单个断言的观测值，字段与 CHECKPOINT_BUNDLE_SCRIPT 的结果一致"""
+        observation: Dict[str, Any] = {}
+        if assertion.type == "custom_script":
+            try:
+                observation["value"] = page.evaluate(assertion_plan(assertion).item["script"])
+            except Exception as e:
+                observation["error"] = str(e)
+            return observation
+
+        locator = page.locator(assertion.selector)
+        assertion_op = assertion.assertion_type
+        try:
+            if assertion.type == "assert_style":
+                observation["value"] = locator.evaluate(
+                    """(element, prop) => {
+                        return window.getComputedStyle(element).getPropertyValue(prop);
+                    }""",
+                    assertion.css_property
+                )
+            elif assertion.type == "assert_text_content":
+                observation["text"] = locator.text_content(timeout=5000)
+            elif assertion.type == "assert_attribute":
+                observation["count"] = locator.count()
+                if observation["count"] > 0 and assertion_op in ("exists", "not_exists"):
+                    observation["has_attribute"] = locator.evaluate(
+                        """(element, attr) => {
+                            return element.hasAttribute(attr);
+                        }""",
+                        assertion.attribute
+                    )
+                elif observation["count"] > 0:
+                    observation["value"] = locator.evaluate(
+                        """(element, attr) => {
+                            return element.getAttribute(attr);
+                        }""",
+                        assertion.attribute
+                    )
+            elif assertion.type == "assert_element":
+                observation["count"] = locator.count()
+                if observation["count"] > 0 and assertion_op not in ("exists", "not_exists"):
+                    observation["text"] = locator.text_content(timeout=5000)
+        except Exception as e:
+            observation["error"] = str(e)
+        return observation
+
+    def _judge_assertion(self, assertion, observation: Dict[str, Any]) -> Tuple[bool, str]:
+        """
+        根据观测值判定断言
+
+        Args:
+            assertion: 断言配置（Pydantic模型）
+            observation: 观测值，包含 count/value/has_attribute/text/error 中的若干字段
         """
         if assertion is None:
             return True, "通过"
@@ -307,38 +697,38 @@ class SandboxService:
                 css_property = assertion.css_property
                 assertion_op = assertion.assertion_type
                 expected_value = assertion.value
-                
-                # 获取元素的实际样式值
-                actual_value = page.locator(selector).evaluate(
-                    """(element, prop) => {
-                        return window.getComputedStyle(element).getPropertyValue(prop);
-                    }""", 
-                    css_property
-                )
-                
-                # 比较样式值
-                passed = self._compare_css_values(actual_value, expected_value, assertion_op)
+
+                if observation.get("error"):
+                    return False, f"执行断言时发生错误: {observation['error']}"
+                actual_value = observation.get("value")
+
+                # 比较样式值（期望值在加载任务时已解析）
+                expected_css = assertion_plan(assertion).expected_css
+                if expected_css is None:
+                    passed = self._compare_css_values(actual_value, expected_value, assertion_op)
+                else:
+                    passed = compare_css_values(parse_css_value(actual_value), expected_css, assertion_op)
                 if not passed:
                     return False, f"元素 {selector} 的CSS属性 {css_property} 值为 '{actual_value}'，不满足 '{assertion_op} {expected_value}' 的条件"
 
             elif assertion_type == "assert_text_content":
                 selector = assertion.selector
-                locator = page.locator(selector)
                 assertion_op = assertion.assertion_type
                 expected_value = assertion.value
-                
-                try:
-                    actual_text = locator.text_content(timeout=5000)
-                    actual_text = actual_text.replace('\n', ' ').replace('\r', ' ').strip()
-                except Exception:
+
+                actual_text = observation.get("text")
+                if actual_text is None:
                     return False, f"找不到或无法获取选择器 '{selector}' 的文本内容"
+                actual_text = actual_text.replace('\n', ' ').replace('\r', ' ').strip()
                 
                 if assertion_op == 'contains':
                     if expected_value not in actual_text:
                         return False, f"元素 '{selector}' 的文本 '{actual_text}' 不包含 '{expected_value}'"
                 elif assertion_op == 'matches_regex':
-                    import re
-                    if not re.search(expected_value, actual_text):
+                    plan = assertion_plan(assertion)
+                    if plan.regex_error is not None:
+                        raise plan.regex_error
+                    if not plan.regex.search(actual_text):
                         return False, f"元素 '{selector}' 的文本 '{actual_text}' 不匹配正则表达式 '{expected_value}'"
                 elif assertion_op == 'equals':
                     # 比较时去除前后空格，增强健壮性
@@ -354,41 +744,20 @@ class SandboxService:
                 expected_value = assertion.value
                 
                 # 检查元素是否存在
-                locator = page.locator(selector)
-                count = locator.count()
-                
-                if count == 0:
+                if observation.get("count", 0) == 0:
                     return False, f"找不到匹配选择器 '{selector}' 的元素"
+                if observation.get("error"):
+                    return False, f"执行断言时发生错误: {observation['error']}"
                 
                 # 如果只是检查属性是否存在
                 if assertion_op == "exists":
-                    # 检查元素是否有这个属性
-                    has_attr = locator.evaluate(
-                        """(element, attr) => {
-                            return element.hasAttribute(attr);
-                        }""", 
-                        attribute
-                    )
-                    if not has_attr:
+                    if not observation.get("has_attribute"):
                         return False, f"元素 {selector} 没有属性 '{attribute}'"
                 elif assertion_op == "not_exists":
-                    # 检查元素是否没有这个属性
-                    has_attr = locator.evaluate(
-                        """(element, attr) => {
-                            return element.hasAttribute(attr);
-                        }""", 
-                        attribute
-                    )
-                    if has_attr:
+                    if observation.get("has_attribute"):
                         return False, f"元素 {selector} 不应该有属性 '{attribute}'，但实际存在"
                 else:
-                    # 获取属性值并比较
-                    actual_value = locator.evaluate(
-                        """(element, attr) => {
-                            return element.getAttribute(attr);
-                        }""", 
-                        attribute
-                    )
+                    actual_value = observation.get("value")
                     
                     # 如果元素没有这个属性
                     if actual_value is None:
@@ -414,12 +783,11 @@ class SandboxService:
                         if not actual_value.endswith(expected_value):
                             return False, f"元素 {selector} 的属性 '{attribute}' 值为 '{actual_value}'，不以期望值 '{expected_value}' 结尾"
                     elif assertion_op == "regex":
-                        import re
-                        try:
-                            if not re.match(expected_value, actual_value):
-                                return False, f"元素 {selector} 的属性 '{attribute}' 值为 '{actual_value}'，不匹配正则表达式 '{expected_value}'"
-                        except re.error as e:
-                            return False, f"正则表达式 '{expected_value}' 错误: {e}"
+                        plan = assertion_plan(assertion)
+                        if plan.regex_error is not None:
+                            return False, f"正则表达式 '{expected_value}' 错误: {plan.regex_error}"
+                        if not plan.regex.match(actual_value):
+                            return False, f"元素 {selector} 的属性 '{attribute}' 值为 '{actual_value}'，不匹配正则表达式 '{expected_value}'"
 
             elif assertion_type == "assert_element":
                 selector = assertion.selector
@@ -427,8 +795,7 @@ class SandboxService:
                 expected_value = assertion.value
                 
                 # 检查元素是否存在
-                locator = page.locator(selector)
-                count = locator.count()
+                count = observation.get("count", 0)
                 
                 if assertion_op == "exists":
                     if count == 0:
@@ -441,9 +808,8 @@ class SandboxService:
                     if count == 0:
                         return False, f"找不到匹配选择器 '{selector}' 的元素"
                     
-                    try:
-                        actual_text = locator.text_content(timeout=5000)
-                    except Exception:
+                    actual_text = observation.get("text")
+                    if actual_text is None:
                         return False, f"无法获取选择器 '{selector}' 的文本内容"
                     
                     if assertion_op == "equals":
@@ -456,19 +822,12 @@ class SandboxService:
                         return False, f"不支持的元素断言类型: '{assertion_op}'"
 
             elif assertion_type == "custom_script":
-                script = assertion.script
-                try:
-                    if not (script.startswith("(()") and script.endswith(")()")):
-                        # 用IIFE包装
-                        script = f"(() => {{ {script} }})()"
-                    # 执行自定义脚本
-                    result = page.evaluate(script)
-                    
-                    # 如果脚本返回false或falsy值，则断言失败
-                    if not result:
-                        return False, f"自定义脚本返回结果为 {result}，断言失败"
-                except Exception as e:
-                    return False, f"执行自定义脚本时发生错误: {e}"
+                if observation.get("error"):
+                    return False, f"执行自定义脚本时发生错误: {observation['error']}"
+                result = observation.get("value")
+                # 如果脚本返回false或falsy值，则断言失败
+                if not result:
+                    return False, f"自定义脚本返回结果为 {result}，断言失败"
 
             else:
                 return False, f"不支持的断言类型: '{assertion_type}'"
@@ -481,186 +840,30 @@ class SandboxService:
 
     def _compare_css_values(self, actual_value: str, expected_value: str, assertion_op: str) -> bool:
         """
-        比较CSS值的辅助方法
-        
+        比较CSS值的辅助方法（两侧都现场解析；检查点的期望值通常在加载时已解析，见 AssertionPlan）
+
         Args:
             actual_value: 实际的CSS值
             expected_value: 期望的CSS值
             assertion_op: 比较操作符
-            
+
         Returns:
             比较结果
         """
-        # 清理值（去除首尾空格）
-        actual_value = actual_value.strip().lower()
-        expected_value = expected_value.strip().lower()
-        
-        # 处理font-weight特殊值映射
-        font_weight_mapping = {
-            'bold': '700',
-            '700': 'bold',
-            'normal': '400',
-            '400': 'normal',
-            # 它们的计算值取决于父元素的字重
-        }
-        
-        # 如果是font-weight相关的比较，进行特殊处理
-        if assertion_op == "equals":
-            # 检查是否为font-weight值的等价比较
-            if (actual_value in font_weight_mapping and 
-                font_weight_mapping[actual_value] == expected_value) or \
-               (expected_value in font_weight_mapping and 
-                font_weight_mapping[expected_value] == actual_value):
-                return True
-        
-        # 解析单位
-        def parse_value_with_unit(value):
-            import re
-            match = re.match(r'^([+-]?(?:\d+\.?\d*|\.\d+))([a-zA-Z%]*)$', value)
-            if match:
-                num, unit = match.groups()
-                return float(num), unit.lower()  # 单位也进行小写化
-            return value, ""
-        
-        # 尝试进行颜色比较
-        norm_actual = self._normalize_color_value(actual_value)
-        norm_expected = self._normalize_color_value(expected_value)
-        is_actual_color = norm_actual.startswith(('#', 'rgba'))
-        is_expected_color = norm_expected.startswith(('#', 'rgba'))
-
-        if is_actual_color and is_expected_color:
-            if assertion_op == 'equals':
-                return norm_actual == norm_expected
-            elif assertion_op == 'not_equals':
-                return norm_actual != norm_expected
-        
-        # 数值比较需要解析单位
-        try:
-            actual_num, actual_unit = parse_value_with_unit(actual_value)
-            expected_num, expected_unit = parse_value_with_unit(expected_value)
-
-            # 检查单位是否一致（如果不一致，需要转换）
-            if actual_unit != expected_unit and actual_unit and expected_unit:
-                # 简单的单位转换（支持常见的CSS单位转换）
-                conversion_factors = {
-                    # 长度单位相对于px的转换因子
-                    'px': 1,
-                    'pt': 4/3,
-                    'pc': 16,
-                    'in': 96,
-                    'cm': 96/2.54,
-                    'mm': 96/25.4,
-                    # 百分比需要特殊处理
-                    '%': None
-                }
-
-                # 如果单位可以转换
-                if actual_unit in conversion_factors and expected_unit in conversion_factors:
-                    if actual_unit != '%' and expected_unit != '%':
-                        # 转换actual值到expected单位
-                        actual_in_px = actual_num * conversion_factors[actual_unit]
-                        actual_num = actual_in_px / conversion_factors[expected_unit]
-                        actual_unit = expected_unit
-
-            # 数值比较
-            if assertion_op == "equals":
-                return actual_num == expected_num
-            if assertion_op == "greater_than":
-                return actual_num > expected_num
-            elif assertion_op == "less_than":
-                return actual_num < expected_num
-            elif assertion_op == "greater_than_or_equal":
-                return actual_num >= expected_num
-            elif assertion_op == "less_than_or_equal":
-                return actual_num <= expected_num
-            elif assertion_op == "contains":
-                return str(expected_value) in str(actual_value)
-            elif assertion_op == "exists":
-                return actual_value != "" and actual_value != "none"
-        except (ValueError, TypeError):
-            # 如果解析失败，回退到字符串比较
-            pass
-
-        # 对于非数值比较，直接字符串比较（大小写不敏感）
-        if assertion_op == "equals":
-            return actual_value == expected_value
-        elif assertion_op == "contains":
-            return expected_value in actual_value
-        elif assertion_op == "not_equals":
-            return actual_value != expected_value
-        elif assertion_op == "not_contain":
-            return expected_value not in actual_value
-
-        # 默认返回False
-        return False
+        return compare_css_values(parse_css_value(actual_value), parse_css_value(expected_value), assertion_op)
+
     @staticmethod
     def _normalize_color_value(color_value: str) -> str:
         """
         将颜色值标准化为统一格式，便于比较
-        
+
         Args:
             color_value: 颜色值字符串
-            
+
         Returns:
             标准化后的颜色值
         """
-        # 移除空格和可能的rgba()或rgb()包装
-        color_value = color_value.strip().lower()
-        
-        # 处理十六进制颜色值
-        if color_value.startswith('#'):
-            # 扩展3位十六进制颜色值到6位
-            if len(color_value) == 4:  # #RGB格式
-                color_value = '#' + color_value[1]*2 + color_value[2]*2 + color_value[3]*2
-            return color_value
-        
-        # 处理rgb()格式
-        if color_value.startswith('rgb('):
-            # 提取rgb值
-            import re
-            match = re.search(r'rgb\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)', color_value)
-            if match:
-                r, g, b = map(int, match.groups())
-                return f"#{r:02x}{g:02x}{b:02x}"
-        
-        # 处理rgba()格式（忽略alpha通道）
-        if color_value.startswith('rgba('):
-            # 提取rgb值
-            import re
-            match = re.search(r'rgba\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*,\s*[\d.]+\s*\)', color_value)
-            if match:
-                r, g, b = map(int, match.groups())
-                return f"#{r:02x}{g:02x}{b:02x}"
-        
-        # 处理常见的颜色名称
-        color_names = {
-            'black': '#000000',
-            'white': '#ffffff',
-            'red': '#ff0000',
-            'green': '#008000',
-            'blue': '#0000ff',
-            'yellow': '#ffff00',
-            'orange': '#ffa500',
-            'purple': '#800080',
-            'gray': '#808080',
-            'pink': '#ffc0cb',
-            'brown': '#a52a2a',
-            'cyan': '#00ffff',
-            'magenta': '#ff00ff',
-            'lime': '#00ff00',
-            'maroon': '#800000',
-            'navy': '#000080',
-            'olive': '#808000',
-            'silver': '#c0c0c0',
-            'teal': '#008080',
-            'transparent': 'rgba(0,0,0,0)'
-        }
-        
-        if color_value in color_names:
-            return color_names[color_value]
-        
-        # 其他情况直接返回原值
-        return color_value
+        return normalize_color_value(color_value)
 
 
 # 默认实例
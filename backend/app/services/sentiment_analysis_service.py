@@ -1,21 +1,30 @@
 import os
 import warnings
 import logging
+from typing import List, Optional
 from app.schemas.chat import SentimentAnalysisResult
+from app.services.model_server_client import ModelServerClient, ModelServerError, get_model_server_client
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
 
 class SentimentAnalysisService:
-    def __init__(self):
+    def __init__(self, model_client: Optional[ModelServerClient] = None):
+        """
+        Args:
+            model_client: 模型服务客户端；提供时不在本进程加载模型，推理经模型服务完成
+        """
         self.model_available = False
         self.model = None
         self.tokenizer = None
         self.device = None
+        self.model_client = model_client
         
         # 检查模型文件是否存在
         model_dir = 'models/sentiment_bert'
-        if os.path.exists(model_dir):
+        if model_client is not None:
+            logger.info("情感分析使用本机模型服务，跳过模型加载")
+        elif os.path.exists(model_dir):
             try:
                 self._load_model_with_fallback(model_dir)
             except Exception as e:
@@ -91,6 +100,9 @@ class SentimentAnalysisService:
                 label="NEUTRAL",
                 confidence=1.0
             )
+
+        if self.model_client is not None:
+            return self.analyze_sentiment_batch([text])[0]
         
         # 如果模型不可用，返回中性结果
         if not self.model_available:
@@ -131,8 +143,56 @@ class SentimentAnalysisService:
             confidence=score.item()
         )
 
-# 创建单例实例
-sentiment_analysis_service = SentimentAnalysisService()
+    def analyze_sentiment_batch(self, texts: List[str]) -> List[SentimentAnalysisResult]:
+        """
+        批量情感分析（模型服务合并多个进程的请求后调用），结果与 texts 一一对应。
+        """
+        neutral = SentimentAnalysisResult(label="NEUTRAL", confidence=1.0)
+        results = [neutral] * len(texts)
+        indices = [i for i, text in enumerate(texts) if text.strip()]
+        if not indices:
+            return results
+
+        if self.model_client is not None:
+            try:
+                remote = self.model_client.sentiment([texts[i] for i in indices])
+            except ModelServerError as e:
+                # 与模型不可用时一致，返回中性结果
+                logger.warning(f"模型服务情感分析失败，返回中性结果: {e}")
+                return results
+            for i, item in zip(indices, remote):
+                results[i] = SentimentAnalysisResult(label=item["label"], confidence=item["confidence"])
+            return results
+
+        if not self.model_available:
+            return results
+
+        import torch
+
+        # 与单条分析相同的编码参数，保证批量结果一致
+        encoding = self.tokenizer(
+            [texts[i] for i in indices],
+            add_special_tokens=True,
+            max_length=128,
+            truncation=True,
+            padding='max_length',
+            return_attention_mask=True,
+            return_tensors='pt'
+        )
+        input_ids = encoding['input_ids'].to(self.device)
+        attention_mask = encoding['attention_mask'].to(self.device)
+
+        with torch.no_grad():
+            outputs = self.model(input_ids, attention_mask=attention_mask)
+            probs = torch.nn.functional.softmax(outputs.logits, dim=1)
+            scores, preds = torch.max(probs, dim=1)
+
+        for i, score, pred in zip(indices, scores.tolist(), preds.tolist()):
+            results[i] = SentimentAnalysisResult(label=self.label_map.get(pred, 'NEUTRAL'), confidence=score)
+        return results
+
+# 创建单例实例（启用模型服务时只创建客户端适配器）
+sentiment_analysis_service = SentimentAnalysisService(model_client=get_model_server_client())
 
 if __name__ == "__main__":
     sentiment_analysis_service = SentimentAnalysisService()
@@ -0,0 +1,273 @@
+"""
+静态 HTML 预检
+
+没有 JS、检查点只有 assert_element / assert_text_content / assert_attribute 的任务，
+判定只依赖解析后的 DOM，不需要布局、样式计算和脚本执行。
+这里用 BeautifulSoup（html.parser）解析 SandboxService 原本要交给浏览器的完整 HTML，
+用 soupsieve 执行 CSS 选择器，采集与 CHECKPOINT_BUNDLE_SCRIPT 相同格式的观测值，
+判定仍由 SandboxService._judge_assertion 完成，这类提交完全不需要启动 Chromium。
+
+html.parser 不实现 HTML5 的树构建算法（隐式闭合 <p>/<li>、补 <tbody>、错误嵌套的修复等），
+因此只有结构"规整"的文档才走静态路径：_StructureScanner 发现任何浏览器会改写结构的写法
+（错误嵌套、需要隐式闭合的标签、表格中的游离内容、<svg>/<template> 等）时放弃静态判定，
+交给浏览器评测。以下情况同样回退到浏览器：
+- 提交包含 JS，或 HTML 中有 <script>、on* 事件属性、<iframe> 等
+- 任一检查点需要计算样式、执行脚本或交互
+- 选择器 soupsieve 不支持（例如 :hover）
+- 需要读取 <html>/<head>/<body> 本身的文本（浏览器对标签之间空白的归属与 html.parser 不同）
+与浏览器评测的一致性由 tests/test_static_evaluator.py 中的一致性用例保证。
+"""
+
+import logging
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+
+import soupsieve
+from bs4 import BeautifulSoup, NavigableString
+from bs4.element import CData, Comment, Declaration, Doctype, ProcessingInstruction
+
+logger = logging.getLogger(__name__)
+
+# 可以在静态 DOM 上判定的检查点类型
+STATIC_ASSERTION_TYPES = ("assert_element", "assert_text_content", "assert_attribute")
+
+VOID_ELEMENTS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr",
+})
+# <head> 中允许出现的元素，其他元素会让浏览器隐式闭合 <head>
+HEAD_ELEMENTS = frozenset({"base", "link", "meta", "script", "style", "title"})
+# 浏览器按特殊规则解析内容（原始文本、外来内容、嵌入内容等）的元素
+UNSUPPORTED_ELEMENTS = frozenset({
+    "template", "noscript", "svg", "math", "iframe", "frame", "frameset", "object", "embed",
+    "xmp", "plaintext", "noembed", "noframes", "image", "isindex", "listing", "textarea", "select",
+})
+# 会隐式闭合尚未结束的 <p> 的元素
+P_CLOSING_ELEMENTS = frozenset({
+    "address", "article", "aside", "blockquote", "center", "details", "dialog", "dir", "div", "dl",
+    "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6",
+    "header", "hgroup", "hr", "main", "menu", "nav", "ol", "p", "pre", "search", "section",
+    "summary", "table", "ul",
+})
+HEADING_ELEMENTS = frozenset({"h1", "h2", "h3", "h4", "h5", "h6"})
+# 浏览器会用"收养代理"算法修复错误嵌套的格式化元素
+NESTING_FORBIDDEN = frozenset({"a", "form", "button", "nobr"})
+# 只能出现在表格结构中的元素及其允许的直接子元素
+TABLE_CHILDREN = {
+    "table": frozenset({"caption", "colgroup", "thead", "tbody", "tfoot", "script", "style"}),
+    "thead": frozenset({"tr", "script", "style"}),
+    "tbody": frozenset({"tr", "script", "style"}),
+    "tfoot": frozenset({"tr", "script", "style"}),
+    "tr": frozenset({"td", "th", "script", "style"}),
+    "colgroup": frozenset({"col"}),
+}
+TABLE_ONLY_ELEMENTS = frozenset({"caption", "colgroup", "col", "thead", "tbody", "tfoot", "tr", "td", "th"})
+# 取决于用户操作或运行时状态的伪类：soupsieve 要么不支持，要么与浏览器中的初始状态未必一致
+STATEFUL_PSEUDO_CLASS = re.compile(
+    r":(hover|active|focus|visited|target|valid|invalid|user-|in-range|out-of-range|required|optional|"
+    r"placeholder-shown|autofill|default|indeterminate|playing|paused|modal|fullscreen|open|closed|popover|"
+    r"current|past|future|host|state)",
+    re.IGNORECASE,
+)
+# textContent 不包含的节点类型
+NON_TEXT_STRINGS = (Comment, Declaration, Doctype, ProcessingInstruction, CData)
+
+
+class _StructureScanner(HTMLParser):
+    """
+    检查文档能否被 html.parser 解析成与浏览器相同的 DOM 树，同时记录是否含有脚本。
+
+    规则刻意保守：任何浏览器可能改写结构的写法都视为不规整。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.regular = True
+        self.scripted = False
+        self.stack: List[str] = []
+        self.seen = set()
+        self.body_closed = False
+        self._after_pre = False
+
+    def _reject(self, reason: str) -> None:
+        if self.regular:
+            logger.debug(f"静态预检放弃: {reason}")
+        self.regular = False
+
+    def _nearest(self, *tags: str) -> Optional[str]:
+        for tag in reversed(self.stack):
+            if tag in tags:
+                return tag
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        self._after_pre = False
+        if tag == "script" or any(name.startswith("on") for name, _ in attrs):
+            self.scripted = True
+        if tag == "meta" and any(name == "http-equiv" and (value or "").lower() == "refresh" for name, value in attrs):
+            # 页面会自行跳转
+            self.scripted = True
+        top = self.stack[-1] if self.stack else None
+
+        if tag in UNSUPPORTED_ELEMENTS:
+            return self._reject(f"<{tag}>")
+        if tag in ("html", "head", "body"):
+            expected_parent = {"html": None, "head": "html", "body": "html"}[tag]
+            if tag in self.seen or top != expected_parent or (tag == "body" and "head" not in self.seen):
+                return self._reject(f"<{tag}> 位置不规整")
+            self.seen.add(tag)
+        elif self.body_closed:
+            return self._reject(f"</body> 之后的 <{tag}>")
+        elif top is None or top == "html":
+            return self._reject(f"<body> 之外的 <{tag}>")
+        elif top == "head" and tag not in HEAD_ELEMENTS:
+            return self._reject(f"<head> 中的 <{tag}>")
+        elif top in ("title", "script", "style"):
+            return self._reject(f"<{top}> 中的 <{tag}>")
+        elif top in TABLE_CHILDREN and tag not in TABLE_CHILDREN[top]:
+            return self._reject(f"<{top}> 中的 <{tag}>")
+        elif tag in TABLE_ONLY_ELEMENTS and not (top in TABLE_CHILDREN and tag in TABLE_CHILDREN[top]):
+            return self._reject(f"表格结构之外的 <{tag}>")
+        elif tag in P_CLOSING_ELEMENTS and "p" in self.stack:
+            return self._reject(f"<p> 中的 <{tag}>")
+        elif tag in HEADING_ELEMENTS and top in HEADING_ELEMENTS:
+            return self._reject(f"<{top}> 中的 <{tag}>")
+        elif tag in NESTING_FORBIDDEN and tag in self.stack:
+            return self._reject(f"嵌套的 <{tag}>")
+        elif tag == "li" and self._nearest("li", "ul", "ol", "menu") == "li":
+            return self._reject("<li> 中的 <li>")
+        elif tag in ("dt", "dd") and self._nearest("dt", "dd", "dl") in ("dt", "dd"):
+            return self._reject(f"<dt>/<dd> 中的 <{tag}>")
+        elif tag in ("option", "optgroup") and top in ("option", "optgroup"):
+            return self._reject(f"<{top}> 中的 <{tag}>")
+
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(tag)
+            # 浏览器会丢弃紧跟在 <pre> 开始标签后的换行
+            self._after_pre = tag == "pre"
+
+    def handle_startendtag(self, tag, attrs):
+        if tag not in VOID_ELEMENTS:
+            # 浏览器忽略非空元素的自闭合写法，<div/> 仍然是开始标签
+            return self._reject(f"<{tag}/>")
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        self._after_pre = False
+        if tag in ("body", "html") and tag in self.stack:
+            # </body>、</html> 会闭合其中尚未结束的元素，两种解析器的处理一致
+            del self.stack[self.stack.index(tag):]
+            self.body_closed = True
+        elif self.stack and self.stack[-1] == tag:
+            self.stack.pop()
+        else:
+            self._reject(f"不匹配的 </{tag}>")
+
+    def handle_data(self, data):
+        if self._after_pre and data.startswith(("\n", "\r")):
+            self._reject("<pre> 之后的换行")
+        self._after_pre = False
+        if not data.strip():
+            return
+        top = self.stack[-1] if self.stack else None
+        if top is None or top in ("html", "head") or self.body_closed:
+            self._reject("<body> 之外的文本")
+        elif top in TABLE_CHILDREN:
+            self._reject(f"<{top}> 中的文本")
+
+    def unknown_decl(self, data):
+        self._reject("CDATA 或未知声明")
+
+
+def _text_content(tag) -> str:
+    """与 DOM 的 textContent 一致：包含 <script>/<style> 中的文本，不包含注释"""
+    return "".join(
+        str(node) for node in tag.descendants
+        if isinstance(node, NavigableString) and not isinstance(node, NON_TEXT_STRINGS)
+    )
+
+
+def _observe(soup: BeautifulSoup, assertion) -> Optional[Dict[str, Any]]:
+    """采集单个断言的观测值，字段与 CHECKPOINT_BUNDLE_SCRIPT 的结果一致；无法静态判定时返回 None"""
+    if STATEFUL_PSEUDO_CLASS.search(assertion.selector):
+        return None
+    try:
+        elements = soup.select(assertion.selector)
+    except (soupsieve.SelectorSyntaxError, NotImplementedError, ValueError) as e:
+        logger.debug(f"静态预检放弃: 选择器 '{assertion.selector}' 不受支持: {e}")
+        return None
+
+    observation: Dict[str, Any] = {"count": len(elements)}
+    needs_value = assertion.type == "assert_attribute"
+    needs_text = assertion.type == "assert_text_content" or (
+        assertion.type == "assert_element" and assertion.assertion_type not in ("exists", "not_exists")
+    )
+    if len(elements) != 1:
+        if needs_value:
+            observation["error"] = (
+                f"no element matches selector '{assertion.selector}'" if not elements
+                else f"strict mode violation: '{assertion.selector}' resolved to {len(elements)} elements"
+            )
+        return observation
+
+    element = elements[0]
+    if needs_value:
+        # HTML 元素的属性名不区分大小写，解析后统一为小写
+        attribute = assertion.attribute.lower()
+        observation["has_attribute"] = element.has_attr(attribute)
+        observation["value"] = element.get(attribute)
+    if needs_text:
+        if element.name in ("html", "head", "body"):
+            return None
+        observation["text"] = _text_content(element)
+    return observation
+
+
+def observe_static_document(
+    full_html: str,
+    user_code: Dict[str, str],
+    checkpoints: List[Any],
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    尝试在不启动浏览器的情况下采集全部检查点的观测值。
+
+    Args:
+        full_html: SandboxService 构建的、原本交给浏览器的完整 HTML
+        user_code: 用户提交的代码，包含 html, css, js
+        checkpoints: 检查点列表
+
+    Returns:
+        与 checkpoints 一一对应的观测值列表；任一条件不满足时返回 None，由调用方改用浏览器评测
+    """
+    if not checkpoints or (user_code.get("js") or "").strip():
+        return None
+    if any(getattr(cp, "type", None) not in STATIC_ASSERTION_TYPES for cp in checkpoints):
+        return None
+
+    # 浏览器在解析前统一换行符
+    full_html = full_html.replace("\r\n", "\n").replace("\r", "\n")
+    if "\x00" in full_html:
+        return None
+
+    scanner = _StructureScanner()
+    scanner.feed(full_html)
+    scanner.close()
+    if not scanner.regular or not {"html", "head", "body"} <= scanner.seen:
+        return None
+
+    # 模板自带的 alert 拦截脚本不影响 DOM，只检查用户 HTML 中是否含有脚本
+    user_scanner = _StructureScanner()
+    user_scanner.feed(user_code.get("html") or "")
+    user_scanner.close()
+    if user_scanner.scripted:
+        return None
+
+    soup = BeautifulSoup(full_html, "html.parser", multi_valued_attributes=None, on_duplicate_attribute="ignore")
+    observations = []
+    for cp in checkpoints:
+        observation = _observe(soup, cp)
+        if observation is None:
+            return None
+        observations.append(observation)
+    return observations
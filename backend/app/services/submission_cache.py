@@ -0,0 +1,120 @@
+"""
+SubmissionResultCache（提交评测结果缓存）
+
+学生经常重复提交相同的代码（重复点击提交、多人粘贴同一份答案），
+原来每次提交都要在 process_submission_task 中完整地启动浏览器评测一遍。
+
+这里按内容寻址缓存评测结果：
+- 键是 (topic_id, 检查点定义版本, 规范化后的 html/css/js) 的 SHA-256
+- 检查点定义版本是本次评测实际使用的检查点的哈希，test_tasks/*.json 修改并重新加载后版本随之改变，
+  旧结果不会再被命中，按 TTL 自然过期
+- 只缓存评测本身的结果，BKT 更新、快照与进度事件仍由调用方在命中后照常执行
+- 评测服务内部错误（浏览器启动失败等）与评测超时可能是临时故障，不缓存
+- Redis 不可用时视为未命中，直接评测
+"""
+
+import hashlib
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import redis
+
+from app.services.sandbox_service import EVALUATION_TIMEOUT_MESSAGE, INTERNAL_ERROR_MESSAGE, RAW_HTML_TASKS
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 评测逻辑或结果格式变化时递增，使旧版本写入的结果全部失效
+CACHE_FORMAT_VERSION = 1
+CACHE_KEY_PREFIX = f"submission_result:v{CACHE_FORMAT_VERSION}"
+
+
+def checkpoint_version(checkpoints: List[Any]) -> str:
+    """计算检查点定义的版本（规范化 JSON 的哈希）"""
+    definitions = [
+        cp.model_dump(mode="json") if hasattr(cp, "model_dump") else cp
+        for cp in checkpoints
+    ]
+    payload = json.dumps(definitions, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_code(user_code: Dict[str, str], topic_id: Optional[str] = None) -> Dict[str, str]:
+    """
+    规范化用户代码，只消除不影响评测结果的差异：统一换行符、去掉首尾空白。
+
+    raw HTML 模式的任务会把用户原始 HTML 原样交给检查点脚本（window.userOriginalHTML），不做任何改动。
+    """
+    parts = {part: user_code.get(part) or "" for part in ("html", "css", "js")}
+    if topic_id in RAW_HTML_TASKS:
+        return parts
+    return {
+        part: code.replace("\r\n", "\n").replace("\r", "\n").strip()
+        for part, code in parts.items()
+    }
+
+
+class SubmissionResultCache:
+    def __init__(self, redis_client: Optional[redis.Redis], ttl_seconds: int = 3600):
+        """
+        Args:
+            redis_client: 用于跨进程共享结果的 Redis 客户端，为 None 时不缓存
+            ttl_seconds: 结果的过期时间（秒）
+        """
+        self.redis_client = redis_client
+        self.ttl_seconds = ttl_seconds
+
+    def make_key(self, topic_id: str, checkpoints: List[Any], user_code: Dict[str, str]) -> str:
+        code = normalize_code(user_code, topic_id)
+        digest = hashlib.sha256()
+        for value in (topic_id, checkpoint_version(checkpoints), code["html"], code["css"], code["js"]):
+            encoded = value.encode("utf-8")
+            # 带长度前缀，避免不同字段的拼接产生相同的输入
+            digest.update(len(encoded).to_bytes(8, "big"))
+            digest.update(encoded)
+        return f"{CACHE_KEY_PREFIX}:{topic_id}:{digest.hexdigest()}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.redis_client is None:
+            return None
+        try:
+            raw = self.redis_client.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"SubmissionResultCache: 读取 Redis 失败，直接评测: {e}")
+            return None
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except (TypeError, ValueError):
+            return None
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        if self.redis_client is None or result.get("message") in (INTERNAL_ERROR_MESSAGE, EVALUATION_TIMEOUT_MESSAGE):
+            return
+        try:
+            self.redis_client.set(key, json.dumps(result, ensure_ascii=False), ex=self.ttl_seconds)
+        except redis.RedisError as e:
+            logger.warning(f"SubmissionResultCache: 写入 Redis 失败（忽略继续）: {e}")
+
+    def get_or_evaluate(
+        self,
+        topic_id: str,
+        checkpoints: List[Any],
+        user_code: Dict[str, str],
+        evaluate: Callable[[], Dict[str, Any]],
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        命中时返回缓存的评测结果，否则调用 evaluate() 评测并写入缓存。
+
+        Returns:
+            tuple: (评测结果, 是否命中缓存)
+        """
+        key = self.make_key(topic_id, checkpoints, user_code)
+        cached = self.get(key)
+        if cached is not None:
+            return cached, True
+        result = evaluate()
+        self.set(key, result)
+        return result, False
@@ -1,6 +1,8 @@
+import copy
 import logging
 import redis
-from typing import Dict, Any, List, Optional
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional
 from sqlalchemy.orm import Session
 from app.crud.crud_event import event as crud_event
 from app.schemas.behavior import BehaviorEvent
@@ -11,6 +13,7 @@ import numpy as np
 
 # 导入BKT模型
 from ..models.bkt import BKTModel
+from .buffered_profile import BufferedProfileRedis
 
 # 移除循环导入
 # from .behavior_interpreter_service import BehaviorInterpreterService
@@ -525,11 +528,10 @@ class UserStateService:
             from ..crud.crud_participant import participant
             from ..schemas.participant import ParticipantCreate
             
-            participant_obj = participant.get(db, obj_id=participant_id)
-            if not participant_obj:
-                create_schema = ParticipantCreate(id=participant_id, group=group)
-                participant.create(db, obj_in=create_schema)
-                is_new_user = True
+            # 幂等插入：并发的首次登录不会因主键冲突而失败
+            is_new_user = participant.create_if_not_exists(
+                db, obj_in=ParticipantCreate(id=participant_id, group=group)
+            )
 
             logger.info(f"Cache miss for {participant_id}. Attempting recovery from history.")
             self._recover_from_history_with_snapshot(participant_id, db)
@@ -783,6 +785,26 @@ class UserStateService:
         """
         self._maybe_create_snapshot(participant_id, db, background_tasks)
         
+    @contextmanager
+    def buffered_profile(self, participant_id: str) -> Iterator['UserStateService']:
+        """
+        在上下文内缓冲该参与者档案的读写：进入后第一次访问时读取一次，退出时一次性写回修改过的字段。
+        
+        Args:
+            participant_id: 参与者ID
+            
+        Yields:
+            UserStateService: 使用缓冲客户端的服务副本，只应在上下文内使用
+        """
+        buffered_client = BufferedProfileRedis(self.redis_client, f"user_profile:{participant_id}")
+        buffered_service = copy.copy(self)
+        buffered_service.redis_client = buffered_client
+        try:
+            yield buffered_service
+        finally:
+            # 与逐条处理一致：即使中途出错，已经完成的更新也会写回
+            buffered_client.commit()
+
     def save_profile(self, profile: StudentProfile):
         key = f"user_profile:{profile.participant_id}"
         self.redis_client.json().set(key, '.', profile.to_dict())
@@ -0,0 +1,227 @@
+"""
+asyncio 执行模式的 chat Worker
+
+chat_queue 的 prefork Worker（-c 2）每个进程同一时间只执行一个 generate_adaptive_response_sync，
+而一次生成的大部分时间都在等待 LLM 流式输出：进程和内存（每个进程各加载一份情感分析、聚类模型）
+都被空等占着，课堂上同时提问的人数一多只能加进程。
+
+AsyncChatWorker 在一个事件循环中同时运行多路生成：
+- 从 Redis 列表（CHAT_ASYNC_QUEUE_KEY）取任务，最多 concurrency 个生成同时进行
+- LLM 流式输出经 AsyncOpenAI 异步读取，等待增量时不占用线程
+- 翻译、情感分析、RAG、聚类等阻塞步骤交给 cpu_workers 个线程的线程池，模型在进程内只加载一份
+- 发布器由后台线程发帧，租约续期、stream_start/stream_end 等少量同步 Redis 调用放到默认线程池，
+  事件循环本身不做阻塞 I/O
+- 与 Celery 任务共用 ChatStreamPublisher 和公平调度器的租约，前端协议不变
+
+启动: python -m app.tasks.async_chat_worker（同时设置 CHAT_EXECUTION_MODE=asyncio，API 进程才会把请求推入该列表）
+"""
+
+import asyncio
+import json
+import logging
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from typing import Callable, Optional
+
+import redis
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.schemas.chat import ChatRequest
+from app.services.chat_scheduler import ChatLease, FairChatScheduler
+from app.tasks.chat_tasks import create_chat_publisher
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncChatWorker:
+    def __init__(
+        self,
+        controller,
+        redis_client: redis.Redis,
+        async_redis_client,
+        scheduler: Optional[FairChatScheduler] = None,
+        queue_key: str = settings.CHAT_ASYNC_QUEUE_KEY,
+        concurrency: int = settings.CHAT_ASYNC_CONCURRENCY,
+        cpu_workers: int = settings.CHAT_ASYNC_CPU_WORKERS,
+        session_factory: Callable = SessionLocal,
+        poll_timeout: int = 1,
+    ):
+        """
+        Args:
+            controller: DynamicController 实例，进程内所有生成共用
+            redis_client: 同步 Redis 客户端，用于发布流式帧
+            async_redis_client: 异步 Redis 客户端，用于从任务列表取任务
+            scheduler: 公平调度器，None 表示不登记租约
+            queue_key: 任务列表的键
+            concurrency: 同时进行的生成数上限
+            cpu_workers: 执行阻塞步骤的线程数
+            session_factory: 数据库会话工厂
+            poll_timeout: 每次 BLPOP 等待的秒数，决定停止时的响应速度
+        """
+        self.controller = controller
+        self.redis_client = redis_client
+        self.async_redis_client = async_redis_client
+        self.scheduler = scheduler
+        self.queue_key = queue_key
+        self.concurrency = concurrency
+        self.session_factory = session_factory
+        self.poll_timeout = poll_timeout
+        self.executor = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="chat-cpu")
+        self._stop_event = asyncio.Event()
+
+        # 统计信息
+        self.active = 0
+        self.peak_active = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    async def run(self) -> None:
+        """持续取任务并发执行，调用 stop() 后等待进行中的生成结束再返回"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        running = set()
+
+        def _on_done(task: asyncio.Task) -> None:
+            running.discard(task)
+            semaphore.release()
+
+        logger.info(f"AsyncChatWorker: 开始消费 {self.queue_key}，并发上限 {self.concurrency}")
+        while not self._stop_event.is_set():
+            await semaphore.acquire()
+            try:
+                item = await self.async_redis_client.blpop([self.queue_key], timeout=self.poll_timeout)
+            except redis.RedisError as e:
+                semaphore.release()
+                logger.error(f"AsyncChatWorker: 读取任务列表失败: {e}")
+                await asyncio.sleep(self.poll_timeout)
+                continue
+            if item is None:
+                semaphore.release()
+                continue
+            task = asyncio.create_task(self._run_entry(item[1]))
+            running.add(task)
+            task.add_done_callback(_on_done)
+
+        if running:
+            logger.info(f"AsyncChatWorker: 等待 {len(running)} 个进行中的生成结束")
+            await asyncio.gather(*running, return_exceptions=True)
+        self.executor.shutdown(wait=True)
+
+    def stop(self) -> None:
+        """停止取新任务"""
+        self._stop_event.set()
+
+    def get_stats(self) -> dict:
+        return {
+            "active": self.active,
+            "peak_active": self.peak_active,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "concurrency": self.concurrency,
+        }
+
+    async def _run_entry(self, raw) -> None:
+        try:
+            entry = json.loads(raw)
+            await self.process(entry["task_id"], entry["request"])
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"AsyncChatWorker: 任务执行失败: {e}", exc_info=True)
+
+    async def process(self, task_id: str, request_data: dict) -> None:
+        """执行一个聊天生成，与 process_chat_request 的流程一致"""
+        loop = asyncio.get_running_loop()
+        participant_id = request_data['participant_id']
+        db = self.session_factory()
+        publisher = None
+        watcher = None
+        # 公平调度：定期续期租约，被同一参与者的新消息取代时提前结束
+        lease = self.scheduler.lease(participant_id, task_id) if self.scheduler is not None else None
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        try:
+            request_obj = ChatRequest(**request_data)
+            # 帧由发布器的后台线程发送，write 只写缓冲区
+            publisher = create_chat_publisher(self.redis_client, participant_id, task_id, inline_flush=False)
+            await loop.run_in_executor(None, publisher.start, "开始")
+            if lease is not None:
+                watcher = asyncio.create_task(self._watch_lease(lease))
+
+            async with aclosing(self.controller.generate_adaptive_response_stream(
+                request=request_obj,
+                db=db,
+                executor=self.executor
+            )) as stream:
+                async for chunk in stream:
+                    publisher.write(chunk)
+                    if lease is not None and lease.cancelled:
+                        logger.info(f"AsyncChatWorker: 任务 {task_id} 已被新消息取代，提前结束")
+                        break
+
+            cancelled = lease is not None and lease.cancelled
+            await loop.run_in_executor(None, publisher.end, "已取消" if cancelled else "结束")
+            if cancelled:
+                self.cancelled += 1
+            else:
+                self.completed += 1
+            logger.info(
+                f"AsyncChatWorker: {publisher.chunks_received} 个增量合并为 {publisher.frames_published} 帧发布"
+            )
+        finally:
+            self.active -= 1
+            if watcher is not None:
+                watcher.cancel()
+            if publisher is not None:
+                await loop.run_in_executor(None, publisher.close)
+            db.close()
+            if lease is not None:
+                # 释放名额并分派下一个待调度的请求
+                await loop.run_in_executor(None, self.scheduler.complete, participant_id, task_id)
+
+    async def _watch_lease(self, lease: ChatLease) -> None:
+        # 在线程池中按间隔续期租约并检查取消标记，生成循环只读取 lease.cancelled
+        loop = asyncio.get_running_loop()
+        while not lease.cancelled:
+            await asyncio.sleep(lease.check_interval)
+            await loop.run_in_executor(None, lease.should_stop)
+
+
+def main() -> None:
+    from app.config.dependency_injection import (
+        create_dynamic_controller,
+        get_aioredis,
+        get_chat_scheduler,
+        get_redis_client,
+    )
+    from app.core.redis_connections import redis_connections
+    from app.core.worker_warmup import clear_ready, mark_ready, preload_models, warm_inference
+
+    logging.basicConfig(level=logging.INFO)
+    redis_connections.configure_role("chat_async_worker")
+    clear_ready(settings.CHAT_WORKER_READY_FILE)
+    controller = create_dynamic_controller(redis_client=get_redis_client())
+    # 单进程无需 fork：加载懒加载的模型并预热推理后再开始取任务
+    preload_models(controller)
+    mark_ready(settings.CHAT_WORKER_READY_FILE, {"warmup_ms": warm_inference(controller)})
+
+    async def _serve() -> None:
+        worker = AsyncChatWorker(
+            controller=controller,
+            redis_client=get_redis_client(),
+            async_redis_client=get_aioredis(),
+            scheduler=get_chat_scheduler() if settings.CHAT_SCHEDULER_ENABLED else None,
+        )
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+        logger.info(f"AsyncChatWorker: 已停止 {worker.get_stats()}")
+
+    asyncio.run(_serve())
+
+
+if __name__ == "__main__":
+    main()
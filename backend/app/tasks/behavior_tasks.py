@@ -1,10 +1,10 @@
 from app.celery_app import celery_app, get_user_state_service
 from app.db.database import SessionLocal
 from app.schemas.behavior import BehaviorEvent
-from app.crud.crud_participant import participant as crud_participant
-from app.schemas.participant import ParticipantCreate
+from app.config.dependency_injection import get_participant_cache
 from app.services.behavior_interpreter_service import behavior_interpreter_service
 import logging
+from typing import List
 
 logger = logging.getLogger(__name__)
 
@@ -22,11 +22,9 @@ def interpret_behavior_task(event_data: dict):
     user_state_service = get_user_state_service()
     
     try:
-        # 软修复：确保 participants 表存在该用户（若不存在则补录）
+        # 软修复：确保 participants 表存在该用户（若不存在则补录），已知用户只查缓存
         try:
-            if not crud_participant.get(db, obj_id=event.participant_id):
-                crud_participant.create(db, obj_in=ParticipantCreate(id=event.participant_id, group="experimental"))
-                logger.info(f"行为任务: 已补录 participants 行：{event.participant_id}")
+            get_participant_cache().ensure(event.participant_id, db)
         except Exception as e:
             logger.warning(f"行为任务: 补录 participants 失败（忽略继续）: {e}")
 
@@ -40,3 +38,34 @@ def interpret_behavior_task(event_data: dict):
         logger.error(f"解释参与者 {event.participant_id} 的事件时出错: {e}", exc_info=True)
     finally:
         db.close()
+
+
+@celery_app.task(name="tasks.interpret_behavior_batch")
+def interpret_behavior_batch_task(events_data: List[dict]):
+    """
+    按顺序批量解释行为事件，每个参与者的档案只读写一次
+    """
+    events = [BehaviorEvent(**event_data) for event_data in events_data]
+    logger.info(f"行为任务: 批量解释 {len(events)} 条行为事件")
+
+    db = SessionLocal()
+    user_state_service = get_user_state_service()
+
+    try:
+        # 软修复：每个参与者只检查一次
+        for participant_id in {event.participant_id for event in events}:
+            try:
+                get_participant_cache().ensure(participant_id, db)
+            except Exception as e:
+                logger.warning(f"行为任务: 补录 participants 失败（忽略继续）: {e}")
+
+        behavior_interpreter_service.interpret_events(
+            events,
+            user_state_service=user_state_service,
+            db_session=db
+        )
+        logger.info(f"行为任务: 成功批量解释 {len(events)} 条行为事件")
+    except Exception as e:
+        logger.error(f"批量解释行为事件时出错: {e}", exc_info=True)
+    finally:
+        db.close()
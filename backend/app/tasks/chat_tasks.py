@@ -1,31 +1,46 @@
+import json
 import logging
 from app.celery_app import celery_app, get_dynamic_controller
+from app.core.config import settings
 from app.db.database import SessionLocal
-from app.schemas.chat import ChatRequest,SocketResponse2
-from app.config.dependency_injection import get_redis_client
-from datetime import datetime, timezone
-import json
+from app.schemas.chat import ChatRequest
+from app.config.dependency_injection import get_redis_client, get_chat_scheduler
+from app.services.chat_stream_publisher import ChatStreamPublisher
 
 logger=logging.getLogger(__name__)
 
 
+def create_chat_publisher(redis_client, participant_id: str, taskid: str, inline_flush: bool = True) -> ChatStreamPublisher:
+    """按流式回复配置创建发布器（Celery 任务与 asyncio Worker 共用）"""
+    # 增量文本按时间窗口/字符数合并后发布，每帧带递增的 seq，并写入可续传的 Redis Stream
+    return ChatStreamPublisher(
+        redis_client,
+        participant_id,
+        taskid,
+        flush_interval_ms=settings.CHAT_STREAM_FLUSH_INTERVAL_MS,
+        flush_chars=settings.CHAT_STREAM_FLUSH_CHARS,
+        stream_ttl_seconds=settings.CHAT_STREAM_TTL_SECONDS,
+        stream_maxlen=settings.CHAT_STREAM_MAXLEN,
+        inline_flush=inline_flush,
+    )
+
+
 @celery_app.task(bind=True)
 def process_chat_request(self,request_data: dict):
     db = SessionLocal()
+    publisher = None
+    # 公平调度：后台线程定期续期短租约，被同一参与者的新消息取代时提前结束
+    lease = None
+    if settings.CHAT_SCHEDULER_ENABLED:
+        lease = get_chat_scheduler().lease(request_data['participant_id'], self.request.id).start()
     try:
         controller = get_dynamic_controller()
         # 将 db 会话传递给需要它的服务方法
         # 调用生成回复（使用同步函数）
         request_obj = ChatRequest(**request_data)
-        redis_client = get_redis_client()
+        publisher = create_chat_publisher(get_redis_client(), request_data['participant_id'], self.request.id)
         # stream_start
-        message = SocketResponse2(
-                type="stream_start",
-                taskid=self.request.id,
-                timestamp=datetime.now(timezone.utc),
-                message="开始",
-            )
-        redis_client.publish(f"ws:user:{request_data['participant_id']}",  message.model_dump_json() )    
+        publisher.start("开始")
         #streaming
         for trunk in controller.generate_adaptive_response_sync(
             request=request_obj,
@@ -33,22 +48,41 @@ def process_chat_request(self,request_data: dict):
             background_tasks=None  # Celery任务中不使用FastAPI的BackgroundTasks
         ):
         # 注意：响应结果会自动存储在Celery的result backend中
-            message = SocketResponse2(
-                type="streaming",
-                taskid=self.request.id,
-                timestamp=datetime.now(timezone.utc),
-                message=trunk,
-            )
-            redis_client.publish(f"ws:user:{request_data['participant_id']}",  message.model_dump_json() )
+            publisher.write(trunk)
+            if lease is not None and lease.should_stop():
+                logger.info(f"process_chat_request: 任务 {self.request.id} 已被新消息取代，提前结束")
+                break
         #stream_end
-        message = SocketResponse2(
-            type="stream_end",
-            taskid=self.request.id,
-            timestamp=datetime.now(timezone.utc),
-            message="结束",
+        publisher.end("已取消" if lease is not None and lease.cancelled else "结束")
+        logger.info(
+            f"process_chat_request: {publisher.chunks_received} 个增量合并为 {publisher.frames_published} 帧发布"
         )
-        redis_client.publish(f"ws:user:{request_data['participant_id']}",  message.model_dump_json() )
-        #logger.info("已public到Redis")
-        #return response.model_dump()
     finally:
-        db.close()
\ No newline at end of file
+        if publisher is not None:
+            publisher.close()
+        db.close()
+        if lease is not None:
+            # 停止续期，释放名额并分派下一个待调度的请求
+            lease.stop()
+            get_chat_scheduler().complete(request_data['participant_id'], self.request.id)
+
+
+def publish_superseded_chat(task_id: str, request_data: dict) -> None:
+    """尚未开始就被新消息取代的请求不会再执行：为它发布与提前结束时相同的取消 stream_end"""
+    create_chat_publisher(get_redis_client(), request_data['participant_id'], task_id).end("已取消")
+
+
+def dispatch_chat_task(task_id: str, request_data: dict) -> None:
+    """
+    按指定的任务ID分派聊天请求：celery 模式发送到 chat_queue，
+    asyncio 模式推入 async_chat_worker 消费的 Redis 列表
+    """
+    if settings.CHAT_EXECUTION_MODE == "asyncio":
+        entry = json.dumps({"task_id": task_id, "request": request_data}, ensure_ascii=False, default=str)
+        get_redis_client().rpush(settings.CHAT_ASYNC_QUEUE_KEY, entry)
+        return
+    process_chat_request.apply_async(
+        args=[request_data],
+        task_id=task_id,
+        queue='chat_queue'
+    )
@@ -4,30 +4,54 @@ import logging
 
 from app.celery_app import celery_app, get_user_state_service
 from app.db.database import SessionLocal
-from app.crud.crud_event import event as crud_event
-from app.crud.crud_chat_history import chat_history as crud_chat_history
+from app.db.batch_writer import batch_writer
+from app.models.event import EventLog
+from app.models.chat_history import ChatHistory
+from app.models.submission import Submission
 from app.crud.crud_progress import progress as crud_progress
-from app.crud.crud_submission import submission as crud_submission
 from app.schemas.behavior import BehaviorEvent
 from app.schemas.chat import ChatHistoryCreate
 from app.schemas.user_progress import UserProgressCreate
 from app.schemas.submission import SubmissionCreate
-from app.crud.crud_participant import participant as crud_participant
-from app.schemas.participant import ParticipantCreate
+from app.config.dependency_injection import get_participant_cache
 
 logger = logging.getLogger(__name__)
 
+# 批量写入任务的公共选项：
+# acks_late + reject_on_worker_lost 保证只有在所在批次提交成功后消息才被确认（至少一次语义）
+BATCHED_WRITE_TASK_OPTIONS = dict(
+    bind=True,
+    acks_late=True,
+    reject_on_worker_lost=True,
+    max_retries=5,
+    default_retry_delay=2,
+)
+
+
+def _event_row(behavior_event: BehaviorEvent) -> dict:
+    """将行为事件转换为 event_logs 表的一行；未提供时间戳时交给列默认值生成"""
+    row = behavior_event.model_dump(exclude_none=True)
+    row["event_type"] = behavior_event.event_type.value
+    return row
+
+def _chat_row(chat_history_in: ChatHistoryCreate) -> dict:
+    """
+    将聊天记录转换为 chat_history 表的一行
+
+    ChatHistoryCreate.timestamp 默认是 UTC 时间，而表中其它记录使用列默认值（Asia/Shanghai），
+    与 crud_chat_history.create_chat_history 一致，时间戳交给列默认值生成
+    """
+    return chat_history_in.model_dump(exclude={"timestamp"})
+
 @celery_app.task(name='app.tasks.db_tasks.update_bkt_and_snapshot_task')
 def update_bkt_and_snapshot_task(participant_id: str, topic_id: str, is_correct: bool):
     """一个专门用于更新BKT模型并可能创建快照的任务"""
     db = SessionLocal()
     user_state_service = get_user_state_service()
     try:
-        # 软修复：确保 participants 表存在该用户（若不存在则补录）
+        # 软修复：确保 participants 表存在该用户（若不存在则补录），已知用户只查缓存
         try:
-            if not crud_participant.get(db, obj_id=participant_id):
-                crud_participant.create(db, obj_in=ParticipantCreate(id=participant_id, group="experimental"))
-                logger.info(f"[update_bkt_and_snapshot_task] 已补录 participants 行：{participant_id}")
+            get_participant_cache().ensure(participant_id, db)
         except Exception as e:
             logger.warning(f"[update_bkt_and_snapshot_task] 补录 participants 失败（忽略继续）: {e}")
         # 更新BKT模型
@@ -51,11 +75,9 @@ def save_progress_task(progress_data: dict):
         # 创建用户进度记录
         progress_in = UserProgressCreate(**progress_data)
         logger.info(f"[save_progress_task] 创建进度记录对象: {progress_in}")
-        # 软修复：确保 participants 表存在该用户（若不存在则补录）
+        # 软修复：确保 participants 表存在该用户（若不存在则补录），已知用户只查缓存
         try:
-            if not crud_participant.get(db, obj_id=progress_in.participant_id):
-                crud_participant.create(db, obj_in=ParticipantCreate(id=progress_in.participant_id, group="experimental"))
-                logger.info(f"[save_progress_task] 已补录 participants 行：{progress_in.participant_id}")
+            get_participant_cache().ensure(progress_in.participant_id, db)
         except Exception as e:
             logger.warning(f"[save_progress_task] 补录 participants 失败（忽略继续）: {e}")
         result = crud_progress.create(db=db, obj_in=progress_in)
@@ -70,33 +92,30 @@ def save_progress_task(progress_data: dict):
     finally:
         db.close()
 
-@celery_app.task(name='app.tasks.db_tasks.save_code_submission_task')
-def save_code_submission_task(submission_data: dict):
+@celery_app.task(name='app.tasks.db_tasks.save_code_submission_task', **BATCHED_WRITE_TASK_OPTIONS)
+def save_code_submission_task(self, submission_data: dict):
     """一个专门用于保存代码提交记录的轻量级任务"""
-    db = SessionLocal()
     try:
-        # 创建代码提交记录
+        # 创建代码提交记录（进入批量写入缓冲区）
         submission_in = SubmissionCreate(**submission_data)
-        crud_submission.create(db=db, obj_in=submission_in)
-    finally:
-        db.close()
+        batch_writer.write(Submission, submission_in.model_dump())
+    except Exception as e:
+        logger.error(f"[save_code_submission_task] 保存代码提交时出错: {e}")
+        raise self.retry(exc=e)
 
-@celery_app.task(name='app.tasks.db_tasks.save_behavior_task')
-def save_behavior_task(behavior_data: dict):
+@celery_app.task(name='app.tasks.db_tasks.save_behavior_task', **BATCHED_WRITE_TASK_OPTIONS)
+def save_behavior_task(self, behavior_data: dict):
     """保存行为事件任务"""
     logger.info(f"[save_behavior_task] 接收到的行为数据: {behavior_data}")
     
-    db = SessionLocal()
     try:
         # 创建行为事件记录
         behavior_event = BehaviorEvent(**behavior_data)
         logger.info(f"数据库任务: 保存行为事件 - 参与者ID: {behavior_event.participant_id}, 事件类型: {behavior_event.event_type}")
         
-        # 软修复：确保 participants 表存在该用户（若不存在则补录）
+        # 软修复：确保 participants 表存在该用户（若不存在则补录），已知用户只查缓存，不占用数据库连接
         try:
-            if not crud_participant.get(db, obj_id=behavior_event.participant_id):
-                crud_participant.create(db, obj_in=ParticipantCreate(id=behavior_event.participant_id, group="experimental"))
-                logger.info(f"数据库任务: 已补录 participants 行：{behavior_event.participant_id}")
+            get_participant_cache().ensure(behavior_event.participant_id)
         except Exception as e:
             logger.warning(f"数据库任务: 补录 participants 失败（忽略继续）: {e}")
 
@@ -110,32 +129,55 @@ def save_behavior_task(behavior_data: dict):
             logger.info(f"数据库任务: 处理代码行为事件，包含 {item_count} 个项目")
             logger.info(f"数据库任务: 事件数据详情: {behavior_event.event_data}")
         
-        crud_event.create_from_behavior(db=db, obj_in=behavior_event)
+        batch_writer.write(EventLog, _event_row(behavior_event))
         logger.info(f"数据库任务: 成功保存参与者 {behavior_event.participant_id} 的行为事件")
     except Exception as e:
         logger.error(f"数据库任务: 保存行为事件时出错: {e}")
-        raise
-    finally:
-        db.close()
+        raise self.retry(exc=e)
         
-@celery_app.task(name='app.tasks.db_tasks.log_ai_event_task')
-def log_ai_event_task(event_data: dict):
+@celery_app.task(name='app.tasks.db_tasks.save_behavior_batch_task', **BATCHED_WRITE_TASK_OPTIONS)
+def save_behavior_batch_task(self, events_data: List[dict]):
+    """批量保存行为事件任务：整批作为一次写入进入缓冲区，重试时只重发失败的事件"""
+    behavior_events = [BehaviorEvent(**event_data) for event_data in events_data]
+    logger.info(f"[save_behavior_batch_task] 接收到 {len(behavior_events)} 条行为事件")
+
+    # 软修复：每个参与者只检查一次
+    for participant_id in {event.participant_id for event in behavior_events}:
+        try:
+            get_participant_cache().ensure(participant_id)
+        except Exception as e:
+            logger.warning(f"[save_behavior_batch_task] 补录 participants 失败（忽略继续）: {e}")
+
+    try:
+        errors = batch_writer.write_many(EventLog, [_event_row(event) for event in behavior_events])
+    except Exception as e:
+        logger.error(f"[save_behavior_batch_task] 批量保存行为事件时出错: {e}")
+        raise self.retry(exc=e)
+
+    failed = [event_data for event_data, error in zip(events_data, errors) if error is not None]
+    if failed:
+        first_error = next(error for error in errors if error is not None)
+        logger.error(f"[save_behavior_batch_task] {len(failed)}/{len(events_data)} 条行为事件保存失败: {first_error}")
+        raise self.retry(args=[failed], exc=first_error)
+
+@celery_app.task(name='app.tasks.db_tasks.log_ai_event_task', **BATCHED_WRITE_TASK_OPTIONS)
+def log_ai_event_task(self, event_data: dict):
     """一个专门用于记录AI交互事件的轻量级任务"""
-    db = SessionLocal()
     try:
-        # 创建AI交互事件记录
+        # 创建AI交互事件记录（进入批量写入缓冲区）
         behavior_event = BehaviorEvent(**event_data)
-        crud_event.create_from_behavior(db=db, obj_in=behavior_event)
-    finally:
-        db.close()
+        batch_writer.write(EventLog, _event_row(behavior_event))
+    except Exception as e:
+        logger.error(f"[log_ai_event_task] 记录AI交互事件时出错: {e}")
+        raise self.retry(exc=e)
 
-@celery_app.task(name='app.tasks.db_tasks.save_chat_message_task')
-def save_chat_message_task(chat_data: dict):
+@celery_app.task(name='app.tasks.db_tasks.save_chat_message_task', **BATCHED_WRITE_TASK_OPTIONS)
+def save_chat_message_task(self, chat_data: dict):
     """一个专门用于保存聊天记录的轻量级任务"""
-    db = SessionLocal()
     try:
-        # 创建聊天记录
+        # 创建聊天记录（进入批量写入缓冲区）
         chat_history_in = ChatHistoryCreate(**chat_data)
-        crud_chat_history.create(db=db, obj_in=chat_history_in)
-    finally:
-        db.close()
+        batch_writer.write(ChatHistory, _chat_row(chat_history_in))
+    except Exception as e:
+        logger.error(f"[save_chat_message_task] 保存聊天记录时出错: {e}")
+        raise self.retry(exc=e)
@@ -1,11 +1,10 @@
 from app.celery_app import celery_app, get_user_state_service
 from app.db.database import SessionLocal
 from app.schemas.submission import TestSubmissionRequest
-from app.services.sandbox_service import sandbox_service
 from app.services.content_loader import load_json_content
 from app.schemas.user_progress import UserProgressCreate
 from app.tasks.db_tasks import save_progress_task
-from app.config.dependency_injection import get_redis_client
+from app.config.dependency_injection import get_redis_client, get_submission_cache, get_submission_sandbox_service
 from app.schemas.chat import ChatRequest,SocketResponse2
 from datetime import datetime, timezone
 
@@ -32,12 +31,20 @@ def process_submission_task(self, submission_data: dict):
             logger.error(f"Failed to load test content for topic {submission_in.topic_id}: {e}")
             return {"error": f"Topic '{submission_in.topic_id}' not found or invalid."}
 
-        # 2. 执行代码评测
-        evaluation_result = sandbox_service.run_evaluation(
-            user_code=submission_in.code.model_dump(),
+        # 2. 执行代码评测（相同代码命中结果缓存时不再启动浏览器）
+        user_code = submission_in.code.model_dump()
+        evaluation_result, cache_hit = get_submission_cache().get_or_evaluate(
+            topic_id=submission_in.topic_id,
             checkpoints=checkpoints,
-            topic_id=submission_in.topic_id
+            user_code=user_code,
+            evaluate=lambda: get_submission_sandbox_service().run_evaluation(
+                user_code=user_code,
+                checkpoints=checkpoints,
+                topic_id=submission_in.topic_id
+            ),
         )
+        if cache_hit:
+            logger.info("评测结果命中缓存: topic=%s", submission_in.topic_id)
 
         # 3. 在提交 Worker 内直接更新 BKT 与快照（避免跨队列初始化问题）
         try:
@@ -0,0 +1,299 @@
+"""
+沙箱评测基准测试
+
+从 submissions 表回放真实提交（每条提交的 html/css/js 与 topic_id），对 app/data/test_tasks 中的
+每个任务评测，对比不同的沙箱引擎模式：
+- fresh：SandboxService，关闭静态预检，每次评测启动一个新的 Chromium（原来的方式）
+- static：SandboxService，开启静态预检，只有静态预检无法判定的提交才启动浏览器
+- pooled：AsyncSandboxService，并发 1，进程内共用一个浏览器（每次评测新建上下文）
+- async：AsyncSandboxService，并发 --concurrency，多个评测在一个事件循环中复用同一个浏览器
+
+每种模式输出：
+- 吞吐（evaluations/s）与单次评测耗时的 p50 / p95 / max
+- 结果（是否通过与失败详情）与 fresh 模式不一致的提交数（不应出现）
+- 评测期间本进程所有子进程（Chromium 与 Playwright 驱动）PSS 之和的峰值（/proc/<pid>/smaps_rollup，仅 Linux）
+--per-type 时另外在 pooled 引擎上逐个评测检查点，按检查点类型统计单个检查点的平均边际耗时
+（减去不含检查点时加载页面的耗时）
+
+语料来源：
+- 默认从数据库的 submissions 表读取，只保留 test_tasks 中存在的主题，每个主题最多 --per-topic 条
+- --corpus 从 JSONL 文件读取（每行 {"topic_id", "html", "css", "js"}），--export 把语料写成该格式，便于离线复现
+- --include-answers 把每个任务的参考答案也加入语料，保证每个任务至少被评测一次
+
+用法（在 backend 目录下）：python scripts/benchmark_sandbox.py --modes fresh static pooled async --per-type
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ("fresh", "static", "pooled", "async")
+
+
+def _pss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _descendant_pids(root: int) -> list:
+    """返回 root 的所有后代进程（读取 /proc/<pid>/stat 中的父进程号）"""
+    children = defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # comm 字段可能包含空格，从最后一个右括号之后开始解析
+                fields = f.read().rsplit(")", 1)[1].split()
+            children[int(fields[1])].append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    result, stack = [], [root]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+class MemorySampler:
+    """后台线程定期采样子进程 PSS 之和，记录峰值"""
+
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            total = sum(_pss_kb(pid) for pid in _descendant_pids(os.getpid()))
+            self.peak_kb = max(self.peak_kb, total)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if os.path.isdir("/proc"):
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+def load_tasks() -> tuple:
+    """加载 test_tasks 下的全部任务及其参考答案（TestTask 模型不含 answer 字段，直接读 JSON），无法解析的任务跳过并提示"""
+    from app.core.config import settings
+    from app.services.content_loader import load_json_content
+
+    tasks, answers = {}, {}
+    for path in sorted(Path(settings.DATA_DIR, "test_tasks").glob("*.json")):
+        try:
+            tasks[path.stem] = load_json_content("test_tasks", path.stem)
+        except Exception as e:
+            print(f"跳过任务 {path.stem}: {e}", file=sys.stderr)
+            continue
+        with open(path, encoding="utf-8") as f:
+            answer = json.load(f).get("answer")
+        if answer:
+            answers[path.stem] = answer
+    return tasks, answers
+
+
+def load_corpus(args, tasks: dict, answers: dict) -> list:
+    """按参数加载语料，返回 [{"topic_id", "html", "css", "js"}]"""
+    corpus = []
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = [json.loads(line) for line in f if line.strip()]
+    elif not args.answers_only:
+        from app.db.database import SessionLocal
+        from app.models.submission import Submission
+
+        per_topic = defaultdict(int)
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(Submission)
+                .filter(Submission.topic_id.in_(list(tasks)))
+                .order_by(Submission.id.desc())
+                .yield_per(500)
+            )
+            for row in rows:
+                if per_topic[row.topic_id] >= args.per_topic:
+                    continue
+                per_topic[row.topic_id] += 1
+                corpus.append({
+                    "topic_id": row.topic_id,
+                    "html": row.html_code or "",
+                    "css": row.css_code or "",
+                    "js": row.js_code or "",
+                })
+        finally:
+            db.close()
+
+    if args.include_answers or args.answers_only:
+        for topic_id, answer in answers.items():
+            corpus.append({"topic_id": topic_id, **{k: answer.get(k) or "" for k in ("html", "css", "js")}})
+
+    return [item for item in corpus if item["topic_id"] in tasks]
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _code(item: dict) -> dict:
+    return {"html": item["html"], "css": item["css"], "js": item["js"]}
+
+
+def run_sync_mode(service, corpus: list, tasks: dict) -> tuple:
+    latencies, results = [], []
+    for item in corpus:
+        start = time.perf_counter()
+        results.append(service.run_evaluation(_code(item), tasks[item["topic_id"]].checkpoints, topic_id=item["topic_id"]))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, results
+
+
+async def run_async_mode(service, corpus: list, tasks: dict) -> tuple:
+    latencies = [0.0] * len(corpus)
+
+    async def one(index: int, item: dict):
+        start = time.perf_counter()
+        result = await service.run_evaluation_async(_code(item), tasks[item["topic_id"]].checkpoints, topic_id=item["topic_id"])
+        latencies[index] = (time.perf_counter() - start) * 1000
+        return result
+
+    try:
+        results = await asyncio.gather(*(one(i, item) for i, item in enumerate(corpus)))
+    finally:
+        await service.close()
+    return latencies, list(results)
+
+
+def run_mode(mode: str, corpus: list, tasks: dict, concurrency: int) -> dict:
+    from app.services.async_sandbox_service import AsyncSandboxService
+    from app.services.sandbox_service import SandboxService
+
+    with MemorySampler() as sampler:
+        start = time.perf_counter()
+        if mode in ("fresh", "static"):
+            latencies, results = run_sync_mode(SandboxService(static_precheck=(mode == "static")), corpus, tasks)
+        else:
+            service = AsyncSandboxService(static_precheck=False, max_concurrency=1 if mode == "pooled" else concurrency)
+            latencies, results = asyncio.run(run_async_mode(service, corpus, tasks))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "evaluations": len(corpus),
+        "elapsed_s": round(elapsed, 2),
+        "evaluations_per_s": round(len(corpus) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.5), 1),
+        "p95_ms": round(_percentile(latencies, 0.95), 1),
+        "max_ms": round(max(latencies, default=0.0), 1),
+        "peak_browser_pss_mb": round(sampler.peak_kb / 1024, 1),
+        "results": results,
+    }
+
+
+async def measure_checkpoint_types(corpus: list, tasks: dict) -> dict:
+    """逐个检查点评测，按类型统计平均边际耗时（毫秒）"""
+    from app.services.async_sandbox_service import AsyncSandboxService
+
+    service = AsyncSandboxService(static_precheck=False, max_concurrency=1)
+    costs = defaultdict(list)
+    try:
+        for item in corpus:
+            code, topic_id = _code(item), item["topic_id"]
+            start = time.perf_counter()
+            await service.run_evaluation_async(code, [], topic_id=topic_id)
+            baseline = (time.perf_counter() - start) * 1000
+            for cp in tasks[topic_id].checkpoints:
+                start = time.perf_counter()
+                await service.run_evaluation_async(code, [cp], topic_id=topic_id)
+                cp_type = cp.type.value if hasattr(cp.type, "value") else str(cp.type)
+                if cp_type == "interaction_and_assert":
+                    cp_type = f"{cp_type}:{cp.action_type}"
+                costs[cp_type].append((time.perf_counter() - start) * 1000 - baseline)
+    finally:
+        await service.close()
+    return {
+        cp_type: {"count": len(values), "mean_ms": round(statistics.mean(values), 2), "p95_ms": round(_percentile(values, 0.95), 2)}
+        for cp_type, values in sorted(costs.items())
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="回放提交记录，对比沙箱引擎模式的吞吐、延迟与内存")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES), help="要运行的模式")
+    parser.add_argument("--per-topic", type=int, default=50, help="每个主题最多回放的提交数")
+    parser.add_argument("--corpus", help="从 JSONL 文件读取语料，而不是数据库")
+    parser.add_argument("--export", help="把本次使用的语料写入 JSONL 文件")
+    parser.add_argument("--include-answers", action="store_true", help="把每个任务的参考答案加入语料")
+    parser.add_argument("--answers-only", action="store_true", help="只使用参考答案（不需要数据库）")
+    parser.add_argument("--concurrency", type=int, default=8, help="async 模式的并发数")
+    parser.add_argument("--per-type", action="store_true", help="按检查点类型统计单个检查点的耗时")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出完整结果")
+    args = parser.parse_args()
+
+    tasks, answers = load_tasks()
+    corpus = load_corpus(args, tasks, answers)
+    if not corpus:
+        parser.error("语料为空：数据库中没有匹配任务的提交，可以使用 --include-answers 或 --corpus")
+    if args.export:
+        with open(args.export, "w", encoding="utf-8") as f:
+            for item in corpus:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    print(f"语料：{len(corpus)} 条提交，覆盖 {len({item['topic_id'] for item in corpus})}/{len(tasks)} 个任务", file=sys.stderr)
+
+    reports = [run_mode(mode, corpus, tasks, args.concurrency) for mode in args.modes]
+    # 以 fresh 模式（原来的评测方式）为基准，未运行时以第一个模式为基准
+    reference = next((r for r in reports if r["mode"] == "fresh"), reports[0])["results"]
+    for report in reports:
+        report["mismatches"] = sum(
+            1 for a, b in zip(reference, report["results"]) if (a["passed"], a["details"]) != (b["passed"], b["details"])
+        )
+    per_type = asyncio.run(measure_checkpoint_types(corpus, tasks)) if args.per_type else None
+
+    if args.json:
+        output = {"modes": [{k: v for k, v in r.items() if k != "results"} for r in reports]}
+        if per_type is not None:
+            output["checkpoint_types"] = per_type
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'mode':<10}{'evals/s':>10}{'p50 (ms)':>12}{'p95 (ms)':>12}{'max (ms)':>12}{'peak PSS (MB)':>16}{'mismatches':>12}")
+    for r in reports:
+        print(
+            f"{r['mode']:<10}{r['evaluations_per_s']:>10.2f}{r['p50_ms']:>12.1f}{r['p95_ms']:>12.1f}"
+            f"{r['max_ms']:>12.1f}{r['peak_browser_pss_mb']:>16.1f}{r['mismatches']:>12}"
+        )
+    if per_type is not None:
+        print(f"\n{'checkpoint type':<36}{'count':>8}{'mean (ms)':>12}{'p95 (ms)':>12}")
+        for cp_type, stats in per_type.items():
+            print(f"{cp_type:<36}{stats['count']:>8}{stats['mean_ms']:>12.2f}{stats['p95_ms']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
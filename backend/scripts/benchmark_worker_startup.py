@@ -0,0 +1,131 @@
+"""
+chat Worker 启动策略对比
+
+- fork-then-load：主进程只导入模块，fork 后每个子进程各自创建 DynamicController 并预热推理
+  （原来 init_worker_process 的方式）
+- preload-then-fork：主进程创建 DynamicController 并加载全部只读模型后再 fork，子进程只做预热推理
+  （worker_init 中的 preload_chat_worker）
+
+每种策略在独立的解释器中运行，输出：
+- 从开始到所有子进程就绪的耗时
+- 每个子进程的初始化 / 预热耗时
+- 所有子进程都存活时每个子进程的 PSS 与 USS（/proc/<pid>/smaps_rollup，仅 Linux）
+
+用法（在 backend 目录下）：python scripts/benchmark_worker_startup.py --children 2
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STRATEGIES = ("fork-then-load", "preload-then-fork")
+
+
+def _memory_kb(pid: int) -> dict:
+    """读取进程的 PSS 与 USS（KB）"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":"):
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return {}
+    return {
+        "pss_kb": fields.get("Pss", 0),
+        "uss_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def run_strategy(strategy: str, children: int) -> dict:
+    """在当前进程中按指定策略 fork 子进程，返回计时与内存数据"""
+    start = time.perf_counter()
+    from app.config.dependency_injection import create_dynamic_controller, get_redis_client
+    from app.core.worker_warmup import preload_chat_dependencies, warm_inference
+
+    def create_controller():
+        return create_dynamic_controller(redis_client=get_redis_client())
+
+    result = {"strategy": strategy, "children": children, "import_ms": round((time.perf_counter() - start) * 1000, 1)}
+    controller = None
+    if strategy == "preload-then-fork":
+        controller, result["preload_ms"] = preload_chat_dependencies(create_controller)
+
+    pids = []
+    pipes = []
+    for _ in range(children):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            child_start = time.perf_counter()
+            report = {}
+            child_controller = controller
+            if child_controller is None:
+                child_controller = create_controller()
+                report["init_ms"] = round((time.perf_counter() - child_start) * 1000, 1)
+            report["warmup_ms"] = warm_inference(child_controller)
+            report["ready_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            os.write(write_fd, (json.dumps(report) + "\n").encode())
+            os.close(write_fd)
+            # 等待父进程在所有子进程都存活时采集内存后结束
+            time.sleep(3600)
+            os._exit(0)
+        os.close(write_fd)
+        pids.append(pid)
+        pipes.append(read_fd)
+
+    reports = []
+    for read_fd in pipes:
+        with os.fdopen(read_fd) as f:
+            reports.append(json.loads(f.readline()))
+    result["all_ready_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    for pid, report in zip(pids, reports):
+        report.update(_memory_kb(pid))
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+    result["child_reports"] = reports
+    result["total_pss_kb"] = sum(r.get("pss_kb", 0) for r in reports)
+    result["total_uss_kb"] = sum(r.get("uss_kb", 0) for r in reports)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="对比 chat Worker 的两种启动策略")
+    parser.add_argument("--children", type=int, default=2, help="子进程数（对应 Celery -c）")
+    parser.add_argument("--strategy", choices=STRATEGIES, help="只运行一种策略并输出 JSON（内部使用）")
+    args = parser.parse_args()
+
+    if args.strategy:
+        print(json.dumps(run_strategy(args.strategy, args.children), ensure_ascii=False))
+        return
+
+    results = []
+    for strategy in STRATEGIES:
+        # 每种策略使用全新的解释器，避免前一种策略已加载的模块影响计时
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--strategy", strategy, "--children", str(args.children)],
+            check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        results.append(json.loads(output))
+
+    print(f"{'strategy':<20}{'all ready (ms)':>16}{'total PSS (MB)':>16}{'total USS (MB)':>16}")
+    for r in results:
+        print(
+            f"{r['strategy']:<20}{r['all_ready_ms']:>16.1f}"
+            f"{r['total_pss_kb'] / 1024:>16.1f}{r['total_uss_kb'] / 1024:>16.1f}"
+        )
+    for r in results:
+        print(f"\n{r['strategy']}:")
+        print(json.dumps(r, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
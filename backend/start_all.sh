@@ -25,11 +25,11 @@ echo "启动 Celery Workers..."
 # 启动 Chat Worker
 celery -A app.celery_app worker -l info -Q chat_queue --pool=prefork -n ai_worker@%h -c 2 &
 
-# 启动 Submission Worker
+# 启动 Submission Worker（SANDBOX_ENGINE=async 时可改用 --pool=threads -c 8：所有任务线程共用一个浏览器）
 celery -A app.celery_app worker -l info -Q submit_queue --pool=prefork -n submit_worker@%h -c 2 &
 
-# 启动 DB Writer Worker
-celery -A app.celery_app worker -l info -Q db_writer_queue --pool=gevent -n db_worker@%h -c 10 &
+# 启动 DB Writer Worker（gevent 并发数与 DB_BATCH_MAX_SIZE 一致，才能凑满一个批量写入批次）
+celery -A app.celery_app worker -l info -Q db_writer_queue --pool=gevent -n db_worker@%h -c 200 &
 
 # 启动 Behavior Worker
 celery -A app.celery_app worker -l info -Q behavior_queue --pool=prefork -n behavior_worker@%h -c 2 &
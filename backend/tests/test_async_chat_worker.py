@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+asyncio chat Worker 测试
+
+验证一个事件循环中同时执行多路生成且不超过并发上限、阻塞步骤在线程池中执行、
+租约被取代时提前结束，以及 asyncio 模式下请求推入 Redis 列表。
+"""
+
+import sys
+import os
+import asyncio
+import json
+import threading
+from unittest.mock import MagicMock, patch
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.core.config import settings
+from app.schemas.chat import SentimentAnalysisResult
+from app.services.dynamic_controller import DynamicController
+from app.tasks import async_chat_worker as worker_module
+from app.tasks import chat_tasks
+from app.tasks.async_chat_worker import AsyncChatWorker
+
+
+class FakeController:
+    """每个增量之间等待一段时间的控制器替身，记录同时进行的生成数"""
+
+    def __init__(self, chunks=3, delay=0.02):
+        self.chunks = chunks
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+
+    async def generate_adaptive_response_stream(self, request, db, executor=None):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            for i in range(self.chunks):
+                await asyncio.sleep(self.delay)
+                yield f"{request.user_message}-{i} "
+        finally:
+            self.running -= 1
+
+
+class FakePublisher:
+    def __init__(self):
+        self.chunks = []
+        self.end_message = None
+        self.chunks_received = 0
+        self.frames_published = 0
+
+    def start(self, message):
+        pass
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+
+    def end(self, message):
+        self.end_message = message
+
+    def close(self):
+        pass
+
+
+class FakeAsyncRedis:
+    """从内存列表中 BLPOP 的异步 Redis 替身，列表取空后停止 Worker"""
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self.worker = None
+
+    async def blpop(self, keys, timeout=0):
+        if self.entries:
+            return keys[0], self.entries.pop(0)
+        self.worker.stop()
+        return None
+
+
+def _entry(task_id, participant_id, message):
+    return json.dumps({
+        "task_id": task_id,
+        "request": {"participant_id": participant_id, "user_message": message},
+    })
+
+
+class TestAsyncChatWorker:
+    """AsyncChatWorker 测试"""
+
+    async def test_runs_generations_concurrently_up_to_limit(self):
+        """多路生成在同一个事件循环中并发执行，同时进行的数量不超过并发上限"""
+        controller = FakeController(chunks=3, delay=0.02)
+        fake_redis = FakeAsyncRedis([_entry(f"t{i}", f"p{i}", f"m{i}") for i in range(8)])
+        publishers = {}
+
+        def create_publisher(redis_client, participant_id, taskid, inline_flush=True):
+            assert inline_flush is False
+            publishers[taskid] = FakePublisher()
+            return publishers[taskid]
+
+        worker = AsyncChatWorker(
+            controller=controller,
+            redis_client=MagicMock(),
+            async_redis_client=fake_redis,
+            concurrency=3,
+            cpu_workers=1,
+            session_factory=MagicMock,
+        )
+        fake_redis.worker = worker
+        with patch.object(worker_module, "create_chat_publisher", side_effect=create_publisher):
+            await asyncio.wait_for(worker.run(), timeout=5)
+
+        assert controller.peak == 3
+        assert worker.get_stats()["completed"] == 8
+        assert worker.get_stats()["active"] == 0
+        assert publishers["t5"].chunks == ["m5-0 ", "m5-1 ", "m5-2 "]
+        assert publishers["t5"].end_message == "结束"
+
+    async def test_superseded_generation_stops_early(self):
+        """租约被新消息取代后，生成提前结束并发送“已取消”"""
+        controller = FakeController(chunks=50, delay=0.01)
+        scheduler = MagicMock()
+        lease = MagicMock(check_interval=0.02, cancelled=False)
+
+        def should_stop():
+            lease.cancelled = True
+            return True
+
+        lease.should_stop.side_effect = should_stop
+        scheduler.lease.return_value = lease
+        publisher = FakePublisher()
+
+        worker = AsyncChatWorker(
+            controller=controller,
+            redis_client=MagicMock(),
+            async_redis_client=None,
+            scheduler=scheduler,
+            cpu_workers=1,
+            session_factory=MagicMock,
+        )
+        with patch.object(worker_module, "create_chat_publisher", return_value=publisher):
+            await worker.process("t1", {"participant_id": "p1", "user_message": "hi"})
+
+        assert publisher.end_message == "已取消"
+        assert len(publisher.chunks) < 50
+        assert controller.running == 0
+        scheduler.complete.assert_called_once_with("p1", "t1")
+        assert worker.get_stats()["cancelled"] == 1
+
+    async def test_stream_runs_blocking_steps_in_executor(self):
+        """异步流程在线程池中执行 LLM 之前的步骤和交互记录，LLM 增量直接异步读取"""
+        llm_gateway = MagicMock()
+
+        async def fake_stream(system_prompt, messages):
+            for chunk in ("Hel", "lo"):
+                yield chunk
+
+        llm_gateway.get_stream_completion = fake_stream
+        controller = DynamicController(
+            user_state_service=MagicMock(),
+            sentiment_service=None,
+            rag_service=None,
+            prompt_generator=MagicMock(),
+            llm_gateway=llm_gateway,
+        )
+        threads = {}
+
+        def fake_prepare(request, db):
+            threads["prepare"] = threading.current_thread().name
+            return {
+                "system_prompt": "sys",
+                "messages": [{"role": "user", "content": "hi"}],
+                "context_snapshot": None,
+                "sentiment_result": SentimentAnalysisResult(label="neutral", confidence=0.0, details={}),
+                "content_title": None,
+            }
+
+        def fake_log(request, response, *args):
+            threads["log"] = threading.current_thread().name
+            threads["response"] = response.ai_response
+
+        controller._prepare_adaptive_prompt = fake_prepare
+        controller._log_ai_interaction = fake_log
+        request = MagicMock(participant_id="p1", user_message="hi")
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-cpu") as executor:
+            chunks = [chunk async for chunk in controller.generate_adaptive_response_stream(request, MagicMock(), executor)]
+
+        assert chunks == ["Hel", "lo"]
+        assert threads["prepare"].startswith("chat-cpu")
+        assert threads["log"].startswith("chat-cpu")
+        assert threads["response"] == "Hello"
+
+    def test_asyncio_mode_dispatches_to_redis_list(self):
+        """asyncio 执行模式下，dispatch_chat_task 把请求推入 Worker 消费的 Redis 列表"""
+        redis_client = MagicMock()
+        with patch.object(settings, "CHAT_EXECUTION_MODE", "asyncio"), \
+                patch.object(chat_tasks, "get_redis_client", return_value=redis_client), \
+                patch.object(chat_tasks.process_chat_request, "apply_async") as apply_async:
+            chat_tasks.dispatch_chat_task("t1", {"participant_id": "p1", "user_message": "hi"})
+
+        apply_async.assert_not_called()
+        key, entry = redis_client.rpush.call_args.args
+        assert key == settings.CHAT_ASYNC_QUEUE_KEY
+        assert json.loads(entry) == {"task_id": "t1", "request": {"participant_id": "p1", "user_message": "hi"}}
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+异步 CRUD 测试
+
+使用 aiosqlite 驱动的临时 SQLite 文件，验证 CRUDBase 的异步方法
+与同步版本行为一致、异步会话上同样启用了 WAL，以及进度接口在读写路由的异步会话上可用。
+"""
+
+import sys
+import os
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.db.base_class import Base
+from app.api.endpoints import progress as progress_endpoint
+from app.config.dependency_injection import get_async_db
+from app.db.database import (
+    create_async_db_engine,
+    create_async_session_factory,
+    create_db_engine,
+    to_async_database_url,
+)
+from app.crud.crud_participant import participant as crud_participant
+from app.crud.crud_progress import progress as crud_progress
+from app.schemas.participant import ParticipantCreate
+from app.schemas.user_progress import UserProgressCreate
+
+
+@pytest.fixture(scope="function")
+async def db(tmp_path):
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+
+    async_engine = create_async_db_engine(url)
+    session = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)()
+    try:
+        yield session
+    finally:
+        await session.close()
+        await async_engine.dispose()
+
+
+class TestAsyncCRUD:
+    """CRUDBase 异步方法测试类"""
+
+    def test_to_async_database_url(self):
+        """测试同步 URL 转换为异步驱动 URL"""
+        assert to_async_database_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+        assert to_async_database_url("mysql+pymysql://u:p@h/db") == "mysql+asyncmy://u:p@h/db"
+        assert to_async_database_url("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+
+    async def test_wal_enabled_on_async_engine(self, db):
+        """测试异步引擎的连接同样启用了 WAL"""
+        result = await db.execute(text("PRAGMA journal_mode"))
+        assert result.scalar().lower() == "wal"
+
+    async def test_create_and_get(self, db):
+        """测试异步创建与按主键查询"""
+        created = await crud_participant.create_async(db, obj_in=ParticipantCreate(id="p-async", group="control"))
+        assert created.id == "p-async"
+
+        fetched = await crud_participant.get_async(db, obj_id="p-async")
+        assert fetched is not None
+        assert fetched.group == "control"
+        assert await crud_participant.get_async(db, obj_id="missing") is None
+
+    async def test_get_multi_and_count_with_filters(self, db):
+        """测试异步分页、过滤、排序与计数"""
+        for pid in ("b", "a", "c"):
+            await crud_participant.create_async(db, obj_in=ParticipantCreate(id=pid, group="experimental"))
+        await crud_participant.create_async(db, obj_in=ParticipantCreate(id="d", group="control"))
+
+        rows = await crud_participant.get_multi_async(
+            db, filter_conditions={"group": "experimental"}, sort_by="id"
+        )
+        assert [row.id for row in rows] == ["a", "b", "c"]
+        assert await crud_participant.get_count_async(db, filter_conditions={"group": "experimental"}) == 3
+        assert await crud_participant.get_count_async(db) == 4
+
+    async def test_completed_topics_async(self, db):
+        """测试进度查询的异步版本"""
+        await crud_participant.create_async(db, obj_in=ParticipantCreate(id="p-progress", group="experimental"))
+        for topic_id in ("1_1", "1_2"):
+            await crud_progress.create_async(db, obj_in=UserProgressCreate(participant_id="p-progress", topic_id=topic_id))
+
+        topics = await crud_progress.get_completed_topics_by_user_async(db, participant_id="p-progress")
+        assert sorted(topics) == ["1_1", "1_2"]
+
+
+async def test_progress_endpoint_with_routing_session(tmp_path):
+    """测试进度接口使用读写路由的异步 Session 工厂（默认 SQLite 文件配置）时正常返回"""
+    url = f"sqlite:///{tmp_path / 'routing.db'}"
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+
+    reader = create_async_db_engine(url)
+    writer = create_async_db_engine(url, writer=True)
+    factory = create_async_session_factory(reader, writer)
+    async with factory() as db:
+        await crud_participant.create_async(db, obj_in=ParticipantCreate(id="p-route", group="experimental"))
+        await crud_progress.create_async(db, obj_in=UserProgressCreate(participant_id="p-route", topic_id="1_1"))
+
+    async def override_get_async_db():
+        async with factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(progress_endpoint.router)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/participants/p-route/progress")
+        assert response.status_code == 200
+        assert response.json()["data"]["completed_topics"] == ["1_1"]
+    finally:
+        await reader.dispose()
+        await writer.dispose()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+异步沙箱引擎测试
+
+使用模拟的 async_playwright 验证：多个评测并发时共用一个浏览器、每个评测使用独立并最终关闭的上下文、
+判定结果与同步引擎一致、超时与取消都会关闭上下文，同步接口 run_evaluation 从多个线程调用时共用后台事件循环和浏览器，
+以及 get_sandbox_service / get_submission_sandbox_service 按 SANDBOX_ENGINE 选择引擎。
+"""
+
+import sys
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.config import dependency_injection
+from app.schemas.content import AssertStyleCheckpoint, AssertTextContentCheckpoint
+from app.services.async_sandbox_service import AsyncSandboxService
+from app.services.sandbox_service import EVALUATION_TIMEOUT_MESSAGE, SandboxService
+
+CODE = {"html": "<h1>Hello</h1>", "css": "h1 { font-size: 16px; }", "js": ""}
+
+
+def make_checkpoints():
+    return [
+        AssertStyleCheckpoint(
+            name="字号", type="assert_style", feedback="字号不对",
+            selector="h1", css_property="font-size", assertion_type="equals", value="16px",
+        ),
+        AssertTextContentCheckpoint(
+            name="标题", type="assert_text_content", feedback="标题不对",
+            selector="h1", assertion_type="contains", value="Bye",
+        ),
+    ]
+
+
+OBSERVATIONS = [{"count": 1, "value": "16px"}, {"count": 1, "text": "Hello"}]
+
+
+class FakeAsyncPlaywright:
+    """模拟 async_playwright()：记录启动的浏览器与创建的上下文"""
+
+    def __init__(self, evaluate=None):
+        self.contexts = []
+        self.evaluate = evaluate or AsyncMock(return_value=OBSERVATIONS)
+        self.browser = MagicMock()
+        self.browser.is_connected.return_value = True
+        self.browser.new_context = AsyncMock(side_effect=self._new_context)
+        self.browser.close = AsyncMock()
+        self.playwright = MagicMock()
+        self.playwright.chromium.launch = AsyncMock(return_value=self.browser)
+
+    def _new_context(self):
+        context = MagicMock()
+        page = MagicMock()
+        page.set_content = AsyncMock()
+        page.route = AsyncMock()
+        page.evaluate = self.evaluate
+        context.new_page = AsyncMock(return_value=page)
+        context.close = AsyncMock()
+        self.contexts.append(context)
+        return context
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self.playwright
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+def make_service(fake, **kwargs):
+    return AsyncSandboxService(playwright_factory=fake, static_precheck=False, **kwargs)
+
+
+class TestAsyncSandboxService:
+    """AsyncSandboxService 测试"""
+
+    def test_concurrent_evaluations_share_browser(self):
+        """并发评测只启动一次浏览器，每个评测使用独立的上下文并在结束后关闭，结果与同步引擎一致"""
+        fake = FakeAsyncPlaywright()
+        service = make_service(fake)
+
+        async def run():
+            results = await asyncio.gather(*(
+                service.run_evaluation_async(CODE, make_checkpoints(), topic_id="1_1") for _ in range(5)
+            ))
+            await service.close()
+            return results
+
+        results = asyncio.run(run())
+
+        fake.playwright.chromium.launch.assert_awaited_once()
+        assert len(fake.contexts) == 5
+        assert all(context.close.await_count == 1 for context in fake.contexts)
+        fake.browser.close.assert_awaited_once()
+
+        sync_page = MagicMock()
+        sync_page.evaluate.return_value = OBSERVATIONS
+        sync_outcomes = SandboxService(playwright_manager=MagicMock())._evaluate_checkpoints(sync_page, make_checkpoints())
+        expected = SandboxService(playwright_manager=MagicMock())._summarize(make_checkpoints(), sync_outcomes)
+        assert results == [expected] * 5
+        assert expected["details"] == ["检查点 2 失败: 标题不对"]
+
+    def test_timeout_cancels_and_closes_context(self):
+        """超过时限的评测返回超时结果并关闭上下文，不影响之后的评测"""
+        async def hang(*args):
+            await asyncio.sleep(10)
+
+        fake = FakeAsyncPlaywright(evaluate=AsyncMock(side_effect=hang))
+        service = make_service(fake, timeout_seconds=0.05)
+
+        result = asyncio.run(service.run_evaluation_async(CODE, make_checkpoints(), topic_id="1_1"))
+
+        assert result == {"passed": False, "message": EVALUATION_TIMEOUT_MESSAGE, "details": []}
+        fake.contexts[0].close.assert_awaited_once()
+
+    def test_caller_cancellation_closes_context(self):
+        """调用方取消评测协程时同样关闭上下文"""
+        async def hang(*args):
+            await asyncio.sleep(10)
+
+        fake = FakeAsyncPlaywright(evaluate=AsyncMock(side_effect=hang))
+        service = make_service(fake)
+
+        async def run():
+            task = asyncio.create_task(service.run_evaluation_async(CODE, make_checkpoints(), topic_id="1_1"))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                return True
+            return False
+
+        assert asyncio.run(run()) is True
+        fake.contexts[0].close.assert_awaited_once()
+
+    def test_disconnected_browser_is_relaunched(self):
+        """浏览器断开后下一次评测重新启动"""
+        fake = FakeAsyncPlaywright()
+        service = make_service(fake)
+
+        async def run():
+            await service.run_evaluation_async(CODE, make_checkpoints(), topic_id="1_1")
+            fake.browser.is_connected.return_value = False
+            await service.run_evaluation_async(CODE, make_checkpoints(), topic_id="1_1")
+
+        asyncio.run(run())
+
+        assert fake.playwright.chromium.launch.await_count == 2
+
+    def test_sync_interface_from_threads(self):
+        """同步 run_evaluation 返回结果字典（不是协程），多个线程同时调用时共用一个浏览器，shutdown 后关闭"""
+        fake = FakeAsyncPlaywright()
+        service = make_service(fake)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(
+                lambda _: service.run_evaluation(CODE, make_checkpoints(), topic_id="1_1"), range(8)
+            ))
+        loop = service._loop
+        service.shutdown()
+
+        assert all(isinstance(result, dict) for result in results)
+        assert results[0]["details"] == ["检查点 2 失败: 标题不对"]
+        fake.playwright.chromium.launch.assert_awaited_once()
+        assert len(fake.contexts) == 8
+        fake.browser.close.assert_awaited_once()
+        assert not loop.is_running()
+
+    def test_get_sandbox_service_selects_engine(self):
+        """SANDBOX_ENGINE=async 时返回进程内共用的异步引擎"""
+        with patch.dict(os.environ, {"APP_ENV": "production"}), \
+                patch.object(dependency_injection.settings, "SANDBOX_ENGINE", "async"), \
+                patch.object(dependency_injection, "_async_sandbox_service_instance", None):
+            first = dependency_injection.get_sandbox_service()
+            assert isinstance(first, AsyncSandboxService)
+            assert dependency_injection.get_sandbox_service() is first
+
+        with patch.dict(os.environ, {"APP_ENV": "production"}), \
+                patch.object(dependency_injection.settings, "SANDBOX_ENGINE", "sync"):
+            service = dependency_injection.get_sandbox_service()
+            assert type(service) is SandboxService
+
+    def test_submission_paths_use_selected_engine(self):
+        """提交评测在 SANDBOX_ENGINE=async 时使用进程内的异步引擎，否则使用默认的同步实例"""
+        with patch.dict(os.environ, {"APP_ENV": "production"}), \
+                patch.object(dependency_injection.settings, "SANDBOX_ENGINE", "async"), \
+                patch.object(dependency_injection, "_async_sandbox_service_instance", None):
+            service = dependency_injection.get_submission_sandbox_service()
+            assert isinstance(service, AsyncSandboxService)
+            assert service is dependency_injection.get_sandbox_service()
+
+        with patch.object(dependency_injection.settings, "SANDBOX_ENGINE", "sync"):
+            assert dependency_injection.get_submission_sandbox_service() is dependency_injection.sandbox_service
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+数据库微批量写入器测试
+
+验证 BatchWriter 在并发写入时会把多行合并为少量批次提交，
+并且每个调用方都只在自己的数据落库后才返回（至少一次语义的基础）。
+"""
+
+import sys
+import os
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+import pytz
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.db.base_class import Base
+from app.db.batch_writer import BatchWriter
+from app.models.event import EventLog
+from app.models.chat_history import ChatHistory
+from app.tasks import db_tasks
+
+
+@pytest.fixture(scope="function")
+def session_factory(tmp_path):
+    """为每个测试创建独立的临时 SQLite 数据库"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'batch.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+class TestBatchWriter:
+    """BatchWriter 测试类"""
+
+    def test_concurrent_writes_are_batched(self, session_factory):
+        """测试并发写入被合并为少量批次且全部落库"""
+        writer = BatchWriter(session_factory=session_factory, max_batch_size=50, max_latency_ms=20)
+        errors = []
+
+        def worker(i: int):
+            try:
+                writer.write(EventLog, {
+                    "participant_id": f"p{i % 5}",
+                    "event_type": "code_edit",
+                    "event_data": {"i": i},
+                }, timeout=10)
+            except Exception as e:  # pragma: no cover - 仅用于收集失败信息
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(200)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert errors == []
+        assert writer.rows_flushed == 200
+        assert writer.batches_flushed < 200
+
+        db = session_factory()
+        try:
+            assert db.query(EventLog).count() == 200
+            # 未提供时间戳的行由列默认值补齐
+            assert db.query(EventLog).filter(EventLog.timestamp.is_(None)).count() == 0
+        finally:
+            db.close()
+
+    def test_mixed_models_in_one_batch(self, session_factory):
+        """测试同一批次中包含多个模型的行"""
+        writer = BatchWriter(session_factory=session_factory, max_batch_size=2, max_latency_ms=1000)
+
+        t = threading.Thread(target=writer.write, args=(EventLog, {
+            "participant_id": "p1", "event_type": "user_idle", "event_data": {}
+        }))
+        t.start()
+        writer.write(ChatHistory, {"participant_id": "p1", "role": "user", "message": "hi"}, timeout=5)
+        t.join()
+
+        db = session_factory()
+        try:
+            assert db.query(EventLog).count() == 1
+            assert db.query(ChatHistory).count() == 1
+        finally:
+            db.close()
+
+    def test_bad_row_does_not_fail_batch(self, session_factory):
+        """测试批次中的坏数据只影响它自己的调用方"""
+        writer = BatchWriter(session_factory=session_factory, max_batch_size=2, max_latency_ms=1000)
+        good_errors = []
+
+        def write_good():
+            try:
+                writer.write(ChatHistory, {"participant_id": "p1", "role": "user", "message": "ok"}, timeout=5)
+            except Exception as e:  # pragma: no cover - 仅用于收集失败信息
+                good_errors.append(e)
+
+        t = threading.Thread(target=write_good)
+        t.start()
+        # message 列不允许为空，这一行会写入失败
+        with pytest.raises(Exception):
+            writer.write(ChatHistory, {"participant_id": "p1", "role": "user", "message": None}, timeout=5)
+        t.join()
+
+        assert good_errors == []
+        db = session_factory()
+        try:
+            assert db.query(ChatHistory).count() == 1
+        finally:
+            db.close()
+
+    def test_write_timeout(self, session_factory):
+        """测试等待超时时抛出 TimeoutError"""
+        writer = BatchWriter(session_factory=session_factory, max_batch_size=100, max_latency_ms=60000)
+        with pytest.raises(TimeoutError):
+            writer.write(ChatHistory, {"participant_id": "p1", "role": "user", "message": "slow"}, timeout=0.05)
+
+
+class TestBatchedChatMessage:
+    """save_chat_message_task 批量写入测试"""
+
+    def test_chat_timestamp_uses_column_default(self, session_factory):
+        """批量写入的聊天记录与其它写入路径一样使用列默认值（Asia/Shanghai）的时间戳"""
+        writer = BatchWriter(session_factory=session_factory, max_batch_size=1, max_latency_ms=10)
+
+        with patch.object(db_tasks, "batch_writer", writer):
+            db_tasks.save_chat_message_task.run({"participant_id": "p1", "role": "user", "message": "你好"})
+
+        db = session_factory()
+        try:
+            row = db.query(ChatHistory).one()
+            shanghai_now = datetime.now(pytz.timezone("Asia/Shanghai")).replace(tzinfo=None)
+            assert abs(row.timestamp.replace(tzinfo=None) - shanghai_now) < timedelta(minutes=1)
+        finally:
+            db.close()
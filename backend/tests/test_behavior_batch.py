@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+行为事件批量接入测试
+
+验证：
+- BufferedProfileRedis 的 RedisJSON 路径语义与一次性写回，缓冲期间档案被并发修改时合并计数器而不是覆盖，
+  其他字段冲突时报告 ProfileConflictError
+- 批量解释与逐条解释得到相同的档案，且 Redis 往返次数只有一读一写；冲突时基于最新档案重新解释
+- /behavior/log/batch 每批只分派一个持久化任务、每个参与者一个解释任务
+"""
+
+import sys
+import os
+import json
+import pytest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from redis.exceptions import ResponseError, WatchError
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.api.endpoints import behavior as behavior_module
+from app.services.behavior_interpreter_service import BehaviorInterpreterService
+from app.services.buffered_profile import BufferedProfileRedis, ProfileConflictError, _merge_value, _parse_path
+from app.services.user_state_service import UserStateService, StudentProfile
+
+
+class FakeJSON:
+    """按 RedisJSON legacy path 语义实现 get / set 的简易替身，并记录往返次数"""
+
+    def __init__(self, owner):
+        self.owner = owner
+
+    def get(self, key, *paths):
+        self.owner.round_trips += 1
+        doc = self.owner.docs.get(key)
+        if doc is None:
+            return None
+        node = doc
+        for token in _parse_path(paths[0] if paths else "."):
+            try:
+                node = node[token]
+            except (KeyError, IndexError, TypeError):
+                raise ResponseError("path does not exist")
+        return json.loads(json.dumps(node))
+
+    def set(self, key, path, obj, _count=True):
+        if _count:
+            self.owner.round_trips += 1
+        self.owner.versions[key] = self.owner.versions.get(key, 0) + 1
+        value = json.loads(json.dumps(obj))
+        tokens = _parse_path(path)
+        if not tokens:
+            self.owner.docs[key] = value
+            return True
+        node = self.owner.docs[key]
+        for token in tokens[:-1]:
+            node = node[token]
+        node[tokens[-1]] = value
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """支持 WATCH / MULTI / EXEC 的 pipeline 替身：WATCH 之后 key 被修改时 execute 抛出 WatchError"""
+
+    def __init__(self, fake_json):
+        self.fake_json = fake_json
+        self.commands = []
+        self.watched = {}
+
+    def watch(self, key):
+        self.fake_json.owner.round_trips += 1
+        self.watched[key] = self.fake_json.owner.versions.get(key, 0)
+
+    def get(self, key, *paths):
+        return self.fake_json.get(key, *paths)
+
+    def multi(self):
+        self.commands = []
+
+    def set(self, key, path, obj):
+        self.commands.append((key, path, obj))
+
+    def execute(self):
+        owner = self.fake_json.owner
+        owner.round_trips += 1
+        if owner.before_execute:
+            # 模拟另一个客户端恰好在 EXEC 之前修改了档案
+            owner.before_execute.pop(0)()
+        if any(owner.versions.get(key, 0) != version for key, version in self.watched.items()):
+            self.reset()
+            raise WatchError("Watched variable changed.")
+        try:
+            return [self.fake_json.set(key, path, obj, _count=False) for key, path, obj in self.commands]
+        finally:
+            self.reset()
+
+    def reset(self):
+        self.commands = []
+        self.watched = {}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.docs = {}
+        self.versions = {}
+        self.round_trips = 0
+        self.before_execute = []
+        self._json = FakeJSON(self)
+
+    def json(self):
+        return self._json
+
+
+def _events(participant_id):
+    events = [{"participant_id": participant_id, "event_type": "code_edit", "event_data": {}} for _ in range(10)]
+    events.append({"participant_id": participant_id, "event_type": "ai_help_request", "event_data": {}})
+    events.append({"participant_id": participant_id, "event_type": "page_focus_change", "event_data": {}})
+    return events
+
+
+def _new_service(participant_id):
+    fake_redis = FakeRedis()
+    service = UserStateService(fake_redis)
+    service.save_profile(StudentProfile(participant_id, is_new_user=False))
+    fake_redis.round_trips = 0
+    return fake_redis, service
+
+
+class TestBufferedProfileRedis:
+    """BufferedProfileRedis 测试类"""
+
+    def test_paths_and_single_write_back(self):
+        """测试路径读写在内存中完成，commit 只写回修改过的最外层路径"""
+        fake_redis = FakeRedis()
+        fake_redis.docs["user_profile:p"] = {"a": {"b": 1}, "c": 0}
+        fake_redis.round_trips = 0
+
+        buffered = BufferedProfileRedis(fake_redis, "user_profile:p")
+        assert buffered.json().get("user_profile:p", ".a.b") == 1
+        with pytest.raises(ResponseError):
+            buffered.json().get("user_profile:p", ".a.missing")
+
+        buffered.json().set("user_profile:p", ".a", {})
+        buffered.json().set("user_profile:p", '.a["x y"]', 2)
+        buffered.json().set("user_profile:p", ".c", 5)
+        # WATCH + 读取
+        assert fake_redis.round_trips == 2
+
+        assert buffered.commit() == 2
+        assert fake_redis.round_trips == 3
+        assert fake_redis.docs["user_profile:p"] == {"a": {"x y": 2}, "c": 5}
+
+    def test_concurrent_update_is_merged(self):
+        """测试缓冲期间档案被其他客户端修改时，commit 合并双方的修改而不是覆盖"""
+        fake_redis = FakeRedis()
+        fake_redis.docs["user_profile:p"] = {
+            "behavior_patterns": {"code_edits": 3, "recent_events": [1, 2], "label": "a"},
+            "bkt_model": {"t1": {"mastery_prob": 0.5, "p_slip": 0.1}},
+        }
+        buffered = BufferedProfileRedis(fake_redis, "user_profile:p")
+        patterns = buffered.json().get("user_profile:p", ".behavior_patterns")
+        buffered.json().set("user_profile:p", ".behavior_patterns.code_edits", patterns["code_edits"] + 2)
+        buffered.json().set("user_profile:p", ".behavior_patterns.label", "mine")
+
+        # 另一个 Worker 在此期间更新了 BKT、计数了一次编辑并追加了一条近期事件
+        fake_redis.json().set("user_profile:p", ".bkt_model.t1", {"mastery_prob": 0.7, "p_slip": 0.1})
+        fake_redis.json().set("user_profile:p", ".behavior_patterns.code_edits", 4)
+        fake_redis.json().set("user_profile:p", ".behavior_patterns.recent_events", [1, 2, 9])
+
+        assert buffered.commit() == 2
+        doc = fake_redis.docs["user_profile:p"]
+        assert doc["bkt_model"]["t1"]["mastery_prob"] == 0.7
+        assert doc["behavior_patterns"]["code_edits"] == 6
+        assert doc["behavior_patterns"]["recent_events"] == [1, 2, 9]
+        assert doc["behavior_patterns"]["label"] == "mine"
+
+    def test_conflicting_absolute_value_is_reported(self):
+        """测试双方都修改了非计数器字段时不猜测结果，commit 抛出 ProfileConflictError 且不写回"""
+        fake_redis = FakeRedis()
+        fake_redis.docs["user_profile:p"] = {"bkt_model": {"t1": {"mastery_prob": 0.5}}}
+        buffered = BufferedProfileRedis(fake_redis, "user_profile:p")
+        buffered.json().set("user_profile:p", ".bkt_model.t1.mastery_prob", 0.6)
+
+        fake_redis.json().set("user_profile:p", ".bkt_model.t1.mastery_prob", 0.9)
+
+        with pytest.raises(ProfileConflictError):
+            buffered.commit()
+        assert fake_redis.docs["user_profile:p"]["bkt_model"]["t1"]["mastery_prob"] == 0.9
+
+    def test_merge_values(self):
+        """测试三方合并：只有计数器按增量叠加，字典逐字段合并，其他字段双方都修改时报告冲突"""
+        assert _merge_value(3, 5, 4, ("behavior_patterns", "code_edits")) == 6
+        assert _merge_value(1, 2, 3, ("behavior_patterns", "question_count_1_1")) == 4
+        assert _merge_value({"a": 1, "b": 1}, {"a": 2, "b": 1}, {"a": 1, "b": 5, "c": 0}) == {"a": 2, "b": 5, "c": 0}
+        assert _merge_value(0.5, 0.5, 0.9, ("persistence_score",)) == 0.9
+
+        with pytest.raises(ProfileConflictError):
+            _merge_value(0.5, 0.6, 0.9, ("bkt_model", "t1", "mastery_prob"))
+        with pytest.raises(ProfileConflictError):
+            _merge_value(0.2, 0.3, 0.4, ("progress_score",))
+        with pytest.raises(ProfileConflictError):
+            _merge_value([1], [1, 2], [1, 3], ("behavior_patterns", "recent_events"))
+
+    def test_other_keys_pass_through(self):
+        """测试非档案 key 直接访问真实客户端"""
+        fake_redis = FakeRedis()
+        fake_redis.docs["other"] = {"v": 1}
+        buffered = BufferedProfileRedis(fake_redis, "user_profile:p")
+        buffered.json().set("other", ".v", 2)
+        assert fake_redis.docs["other"] == {"v": 2}
+
+
+class TestBatchInterpretation:
+    """批量解释测试类"""
+
+    def test_batch_matches_sequential_with_one_read_one_write(self):
+        """测试批量解释的结果与逐条解释一致，且只有一次 WATCH 读取、一次事务写回"""
+        interpreter = BehaviorInterpreterService()
+
+        sequential_redis, sequential_service = _new_service("p-batch")
+        for event in _events("p-batch"):
+            interpreter.interpret_event(event, user_state_service=sequential_service)
+
+        batched_redis, batched_service = _new_service("p-batch")
+        interpreter.interpret_events(_events("p-batch"), user_state_service=batched_service)
+
+        sequential_patterns = sequential_redis.docs["user_profile:p-batch"]["behavior_patterns"]
+        batched_patterns = batched_redis.docs["user_profile:p-batch"]["behavior_patterns"]
+        for counter in ("code_edits", "help_requests", "focus_changes"):
+            assert batched_patterns[counter] == sequential_patterns[counter]
+        assert batched_patterns["code_edits"] == 10
+        assert len(batched_patterns["recent_events"]) == len(sequential_patterns["recent_events"])
+        assert (
+            batched_redis.docs["user_profile:p-batch"]["emotion_state"]["sentiment_confidence"]
+            == pytest.approx(sequential_redis.docs["user_profile:p-batch"]["emotion_state"]["sentiment_confidence"])
+        )
+
+        assert batched_redis.round_trips == 3
+        assert sequential_redis.round_trips > 100
+
+    def test_conflict_reinterprets_batch_on_fresh_profile(self):
+        """测试写回时近期事件被并发修改，整批事件基于最新档案重新解释，双方的修改都保留"""
+        interpreter = BehaviorInterpreterService()
+        fake_redis, service = _new_service("p-conflict")
+        key = "user_profile:p-conflict"
+        concurrent_event = {"event_type": "page_click", "timestamp": "2026-01-01T00:00:00"}
+
+        def concurrent_write():
+            patterns = fake_redis.json().get(key, ".behavior_patterns")
+            fake_redis.json().set(key, ".behavior_patterns.recent_events", patterns["recent_events"] + [concurrent_event])
+            fake_redis.json().set(key, ".behavior_patterns.code_edits", patterns.get("code_edits", 0) + 1)
+
+        fake_redis.before_execute.append(concurrent_write)
+        interpreter.interpret_events(_events("p-conflict"), user_state_service=service)
+
+        patterns = fake_redis.docs[key]["behavior_patterns"]
+        assert patterns["code_edits"] == 11
+        assert concurrent_event in patterns["recent_events"]
+        assert fake_redis.before_execute == []
+
+
+class TestBatchEndpoint:
+    """/behavior/log/batch 测试类"""
+
+    @pytest.fixture
+    def client(self):
+        app = FastAPI()
+        app.include_router(behavior_module.router, prefix="/behavior")
+        return TestClient(app)
+
+    def test_one_save_task_and_one_interpret_task_per_participant(self, client):
+        """测试整批只分派一个持久化任务，每个参与者一个解释任务"""
+        events = _events("p-1")[:3] + _events("p-2")[:2]
+        with patch.object(behavior_module.save_behavior_batch_task, "apply_async") as save_mock, \
+                patch.object(behavior_module.interpret_behavior_batch_task, "apply_async") as interpret_mock:
+            response = client.post("/behavior/log/batch", json=events)
+
+        assert response.status_code == 202
+        assert response.json()["count"] == 5
+        assert save_mock.call_count == 1
+        assert len(save_mock.call_args.kwargs["args"][0]) == 5
+        assert interpret_mock.call_count == 2
+        assert [len(call.kwargs["args"][0]) for call in interpret_mock.call_args_list] == [3, 2]
+
+    def test_rejects_oversized_batch(self, client):
+        """测试超过单批上限时返回 413"""
+        events = _events("p-1") * 100
+        with patch.object(behavior_module.save_behavior_batch_task, "apply_async") as save_mock:
+            response = client.post("/behavior/log/batch", json=events)
+        assert response.status_code == 413
+        assert save_mock.call_count == 0
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+按参与者订阅的消息路由测试
+
+模拟两个 API 进程共享一个 Redis：验证每个进程只收到连接在自己身上的参与者的消息，
+以及引用计数的订阅/退订。
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.core.redis_subscriber import ParticipantChannelRouter, channel_for
+
+
+class FakeBroker:
+    """只按精确频道投递的 Redis pub/sub 替身"""
+
+    def __init__(self):
+        self.pubsubs = []
+
+    def publish(self, channel, data):
+        receivers = 0
+        for pubsub in self.pubsubs:
+            if channel in pubsub.channels:
+                pubsub.queue.put_nowait({"type": "message", "channel": channel, "data": data})
+                receivers += 1
+        return receivers
+
+
+class FakePubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.channels = set()
+        self.queue = asyncio.Queue()
+        self.delivered = 0
+        broker.pubsubs.append(self)
+
+    async def subscribe(self, *channels):
+        self.channels.update(channels)
+
+    async def unsubscribe(self, *channels):
+        self.channels.difference_update(channels)
+
+    async def connect(self):
+        pass
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        try:
+            message = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.delivered += 1
+        return message
+
+    async def aclose(self):
+        self.broker.pubsubs.remove(self)
+
+
+class FakeRedis:
+    def __init__(self, broker):
+        self.broker = broker
+
+    def pubsub(self):
+        return FakePubSub(self.broker)
+
+
+class RecordingManager:
+    """记录转发结果的 WebSocketManager 替身"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_to_user(self, participant_id, message):
+        self.sent.append((participant_id, message))
+
+
+def _make_router(broker):
+    manager = RecordingManager()
+    router = ParticipantChannelRouter(redis_factory=lambda: FakeRedis(broker), manager=manager, poll_timeout=0.05)
+    return router, manager
+
+
+class TestParticipantChannelRouter:
+    """ParticipantChannelRouter 测试类"""
+
+    async def test_each_process_only_receives_its_own_participants(self):
+        """测试消息只投递到持有该参与者连接的进程"""
+        broker = FakeBroker()
+        router_a, manager_a = _make_router(broker)
+        router_b, manager_b = _make_router(broker)
+        tasks = [asyncio.create_task(router_a.run()), asyncio.create_task(router_b.run())]
+        try:
+            await router_a.add_participant("alice")
+            await router_b.add_participant("bob")
+
+            for i in range(10):
+                broker.publish(channel_for("alice"), f"a{i}")
+            broker.publish(channel_for("bob"), "b0")
+            # 没有任何进程持有的参与者，不应产生任何投递
+            assert broker.publish(channel_for("carol"), "c0") == 0
+
+            await asyncio.sleep(0.1)
+            assert [message for _, message in manager_a.sent] == [f"a{i}" for i in range(10)]
+            assert manager_b.sent == [("bob", "b0")]
+            assert router_a._pubsub.delivered == 10
+            assert router_b._pubsub.delivered == 1
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def test_refcounted_unsubscribe(self):
+        """测试同一参与者多个连接时，最后一个连接断开才退订"""
+        broker = FakeBroker()
+        router, _ = _make_router(broker)
+
+        await router.add_participant("alice")
+        await router.add_participant("alice")
+        await router.remove_participant("alice")
+        assert channel_for("alice") in router._pubsub.channels
+
+        await router.remove_participant("alice")
+        assert channel_for("alice") not in router._pubsub.channels
+        assert router.subscribed_participants == set()
+
+    async def test_resubscribes_after_reset(self):
+        """测试订阅连接重建后恢复在线参与者的订阅"""
+        broker = FakeBroker()
+        router, manager = _make_router(broker)
+        await router.add_participant("alice")
+        await router.reset()
+
+        task = asyncio.create_task(router.run())
+        try:
+            await asyncio.sleep(0.01)
+            broker.publish(channel_for("alice"), "after-reset")
+            await asyncio.sleep(0.1)
+            assert manager.sent == [("alice", "after-reset")]
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
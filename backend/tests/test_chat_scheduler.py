@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+chat 公平调度器测试
+
+验证请求经调度器分派、Redis 不可用时退回直接分派、租约的续期（含后台续期）与取消检查、
+脚本只访问 KEYS 中传入的键、被取代的请求收到取消通知，以及（连接到 Redis 时）按参与者轮转、
+参与者并发上限、新消息取代旧消息和未续期的租约到期后回收名额。
+"""
+
+import sys
+import os
+import json
+import time
+import uuid
+from unittest.mock import MagicMock, patch
+
+import pytest
+import redis
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.api.endpoints import chat as chat_module
+from app.core.config import settings
+from app.schemas.chat import ChatRequest
+from app.services.chat_scheduler import KEY_PREFIX, ChatLease, FairChatScheduler
+from app.tasks import chat_tasks
+
+
+class RecordingRedis:
+    """记录脚本调用传入的键，环首固定为参与者 a"""
+
+    def __init__(self, superseded=None):
+        self.script_keys = []
+        # 提交脚本返回的被取代条目
+        self.superseded = superseded or []
+
+    def register_script(self, script):
+        def run(keys=None, args=None):
+            self.script_keys.append(keys)
+            return [b"full"] if "LINDEX" in script else self.superseded
+        return run
+
+    def llen(self, key):
+        return 1
+
+    def lindex(self, key, index):
+        return b"a"
+
+
+class UnavailableRedis:
+    """所有脚本调用都抛出连接错误的 Redis 替身"""
+
+    def register_script(self, script):
+        def run(keys=None, args=None):
+            raise redis.ConnectionError("Connection refused")
+        return run
+
+
+def _request(participant_id, message="hi", mode="learning"):
+    return {"participant_id": participant_id, "user_message": message, "mode": mode}
+
+
+@pytest.fixture
+def live_redis():
+    client = redis.from_url(settings.REDIS_URL, socket_connect_timeout=0.2)
+    try:
+        client.ping()
+    except redis.RedisError:
+        pytest.skip("需要可连接的 Redis")
+    prefix = f"test_chat_sched:{uuid.uuid4().hex}:"
+    yield client, prefix
+    keys = list(client.scan_iter(f"{prefix}*"))
+    if keys:
+        client.delete(*keys)
+
+
+def _scheduler(client, prefix, dispatched, **kwargs):
+    return FairChatScheduler(
+        client,
+        dispatch=lambda task_id, request: dispatched.append((task_id, request)),
+        key_prefix=prefix,
+        **kwargs,
+    )
+
+
+class TestFairChatScheduler:
+    """FairChatScheduler 测试类"""
+
+    def test_chat_request_goes_through_scheduler(self):
+        """测试 /ai/chat2 的分派经过调度器"""
+        scheduler = MagicMock()
+        scheduler.submit.return_value = "task-1"
+        with patch.object(chat_module, "get_chat_scheduler", return_value=scheduler), \
+                patch.object(chat_module.settings, "CHAT_SCHEDULER_ENABLED", True):
+            task_id = chat_module.dispatch_chat_request(ChatRequest(participant_id="p-1", user_message="hi"))
+        assert task_id == "task-1"
+        assert scheduler.submit.call_args.args[0]["participant_id"] == "p-1"
+
+    def test_falls_back_to_direct_dispatch(self):
+        """测试调度状态不可用时直接分派，聊天功能不受影响"""
+        dispatched = []
+        scheduler = _scheduler(UnavailableRedis(), "x:", dispatched)
+        task_id = scheduler.submit(_request("p-1"))
+        assert dispatched == [(task_id, _request("p-1"))]
+
+    def test_lease_checks_cancellation_at_most_once_per_interval(self):
+        """测试租约按间隔续期，被取代后 should_stop 返回 True"""
+        scheduler = MagicMock()
+        scheduler.heartbeat.side_effect = [False, True]
+        lease = FairChatScheduler.lease(scheduler, "p-1", "t-1", check_interval=0)
+
+        assert lease.should_stop() is False
+        assert lease.should_stop() is True
+        assert lease.should_stop() is True
+        assert scheduler.heartbeat.call_count == 2
+
+        throttled = FairChatScheduler.lease(scheduler, "p-1", "t-2", check_interval=60)
+        assert throttled.should_stop() is False
+        assert scheduler.heartbeat.call_count == 2
+
+    def test_lease_renews_in_background(self):
+        """测试 start() 后台线程按 renew_interval 续期，stop() 后不再续期"""
+        scheduler = MagicMock()
+        scheduler.heartbeat.side_effect = [False, False, True] + [False] * 100
+        lease = ChatLease(scheduler, "p-1", "t-1", check_interval=60, renew_interval=0.01).start()
+
+        deadline = time.monotonic() + 5
+        while not lease.cancelled and time.monotonic() < deadline:
+            time.sleep(0.01)
+        lease.stop()
+        assert lease.cancelled is True
+        assert lease.should_stop() is True
+
+        calls = scheduler.heartbeat.call_count
+        time.sleep(0.05)
+        assert scheduler.heartbeat.call_count == calls
+
+    def test_scripts_receive_every_key(self):
+        """测试脚本访问的键都通过 KEYS 传入，默认前缀的键位于同一个哈希槽"""
+        client = RecordingRedis()
+        scheduler = FairChatScheduler(client, dispatch=lambda task_id, request: None)
+        scheduler.submit(_request("a"))
+
+        submit_keys, next_keys = client.script_keys
+        assert scheduler._cancel_key("a") in submit_keys
+        assert scheduler._queue_key("a") in next_keys
+        assert scheduler._participant_running_key("a") in next_keys
+        assert all(key.startswith("{chat_sched}:") for key in submit_keys + next_keys)
+        assert KEY_PREFIX == "{chat_sched}:"
+
+    def test_superseded_requests_are_notified(self):
+        """测试提交脚本返回的每个被取代请求都收到通知，单个通知失败不影响其余通知与新请求的分派"""
+        entries = [
+            json.dumps({"task_id": f"old-{i}", "request": _request("a", f"m{i}")}).encode() for i in range(2)
+        ]
+        notified = []
+
+        def on_superseded(task_id, request):
+            notified.append((task_id, request["user_message"]))
+            if task_id == "old-0":
+                raise redis.ConnectionError("Connection refused")
+
+        scheduler = FairChatScheduler(
+            RecordingRedis(superseded=entries), dispatch=lambda task_id, request: None, on_superseded=on_superseded
+        )
+        task_id = scheduler.submit(_request("a", "new"))
+
+        assert notified == [("old-0", "m0"), ("old-1", "m1")]
+        assert task_id not in [old for old, _ in notified]
+
+    def test_superseded_chat_gets_cancelled_stream_end(self):
+        """测试被取代的任务收到与提前结束时相同的取消 stream_end"""
+        publisher = MagicMock()
+        with patch.object(chat_tasks, "create_chat_publisher", return_value=publisher) as create, \
+                patch.object(chat_tasks, "get_redis_client"):
+            chat_tasks.publish_superseded_chat("old-1", _request("a"))
+
+        assert create.call_args.args[1:] == ("a", "old-1")
+        publisher.end.assert_called_once_with("已取消")
+
+    def test_round_robin_across_participants(self, live_redis):
+        """测试按参与者轮转分派：连发多条的参与者不会挡住其他人"""
+        client, prefix = live_redis
+        dispatched = []
+        scheduler = _scheduler(client, prefix, dispatched, max_inflight=1, per_participant_limit=1, supersede=False)
+
+        # 参与者 a 连发三条，之后 b、c 各一条
+        for message in ("a1", "a2", "a3"):
+            scheduler.submit(_request("a", message))
+        scheduler.submit(_request("b", "b1"))
+        scheduler.submit(_request("c", "c1"))
+
+        while len(dispatched) < 5:
+            task_id, request = dispatched[-1]
+            scheduler.complete(request["participant_id"], task_id)
+        # FIFO 会是 a1 a2 a3 b1 c1；轮转后 a3 排到 b、c 之后
+        assert [request["user_message"] for _, request in dispatched] == ["a1", "a2", "b1", "c1", "a3"]
+
+    def test_participant_inflight_limit(self, live_redis):
+        """测试全局还有名额时，同一参与者的第二条请求仍要等待第一条结束"""
+        client, prefix = live_redis
+        dispatched = []
+        scheduler = _scheduler(client, prefix, dispatched, max_inflight=4, per_participant_limit=1, supersede=False)
+
+        scheduler.submit(_request("a", "a1"))
+        scheduler.submit(_request("a", "a2"))
+        scheduler.submit(_request("b", "b1"))
+        assert [request["user_message"] for _, request in dispatched] == ["a1", "b1"]
+        assert scheduler.get_stats()["running"] == 2
+
+        scheduler.complete("a", dispatched[0][0])
+        assert dispatched[-1][1]["user_message"] == "a2"
+
+    def test_weighted_round_robin(self, live_redis):
+        """测试权重为 2 的参与者每轮可连续分派两条请求"""
+        client, prefix = live_redis
+        dispatched = []
+        scheduler = _scheduler(
+            client, prefix, dispatched, max_inflight=1, per_participant_limit=1, supersede=False,
+            mode_weights={"test": 2, "learning": 1},
+        )
+
+        scheduler.submit(_request("x", "x0"))
+        for message in ("t1", "t2", "t3"):
+            scheduler.submit(_request("t", message, mode="test"))
+        for message in ("l1", "l2"):
+            scheduler.submit(_request("l", message))
+
+        while len(dispatched) < 6:
+            task_id, request = dispatched[-1]
+            scheduler.complete(request["participant_id"], task_id)
+        assert [request["user_message"] for _, request in dispatched] == ["x0", "t1", "t2", "l1", "t3", "l2"]
+
+    def test_new_message_supersedes_old(self, live_redis):
+        """测试新消息取代尚未开始的旧消息，并标记正在生成的旧回答为取消"""
+        client, prefix = live_redis
+        dispatched = []
+        superseded = []
+        scheduler = _scheduler(
+            client, prefix, dispatched, max_inflight=4, per_participant_limit=1, supersede=True,
+            on_superseded=lambda task_id, request: superseded.append(task_id),
+        )
+
+        running_task = scheduler.submit(_request("a", "first"))
+        second_task = scheduler.submit(_request("a", "second"))
+        scheduler.submit(_request("a", "third"))
+        assert [request["user_message"] for _, request in dispatched] == ["first"]
+        assert scheduler.heartbeat("a", running_task) is True
+        # 未开始就被取代的请求收到通知，正在生成的请求通过取消标记结束
+        assert superseded == [second_task]
+
+        scheduler.complete("a", running_task)
+        assert [request["user_message"] for _, request in dispatched] == ["first", "third"]
+
+    def test_expired_lease_frees_slot(self, live_redis):
+        """测试 Worker 未开始续期时，分派宽限期过后名额被回收"""
+        client, prefix = live_redis
+        dispatched = []
+        scheduler = _scheduler(
+            client, prefix, dispatched, max_inflight=1, per_participant_limit=1, supersede=False,
+            lease_seconds=1, dispatch_grace_seconds=1,
+        )
+
+        scheduler.submit(_request("a", "a1"))
+        scheduler.submit(_request("b", "b1"))
+        assert [request["user_message"] for _, request in dispatched] == ["a1"]
+
+        time.sleep(1.1)
+        scheduler.pump()
+        assert [request["user_message"] for _, request in dispatched] == ["a1", "b1"]
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+流式回复合并发布器测试
+
+验证 ChatStreamPublisher 合并增量文本、按时间刷新、帧序号递增，
+以及预构造的帧与 SocketResponse2 的序列化结果兼容。
+"""
+
+import sys
+import os
+import json
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.schemas.chat import SocketResponse2
+from app.services.chat_stream_publisher import ChatStreamPublisher
+
+
+class FakeRedis:
+    """只记录 publish 调用的简易 Redis 替身"""
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        return 1
+
+
+def _frames(fake_redis):
+    return [json.loads(message) for _, message in fake_redis.published]
+
+
+class TestChatStreamPublisher:
+    """ChatStreamPublisher 测试类"""
+
+    def test_coalesces_tokens_into_few_frames(self):
+        """测试逐 token 写入时按字符数合并，文本完整且 seq 连续"""
+        fake_redis = FakeRedis()
+        publisher = ChatStreamPublisher(fake_redis, "p-1", "task-1", flush_interval_ms=10000, flush_chars=50)
+        tokens = [f"tok{i} " for i in range(200)]
+
+        publisher.start()
+        for token in tokens:
+            publisher.write(token)
+        publisher.end()
+
+        frames = _frames(fake_redis)
+        assert all(channel == "ws:user:p-1" for channel, _ in fake_redis.published)
+        assert frames[0]["type"] == "stream_start"
+        assert frames[-1]["type"] == "stream_end"
+        assert [frame["seq"] for frame in frames] == list(range(len(frames)))
+
+        streaming = [frame for frame in frames if frame["type"] == "streaming"]
+        assert "".join(frame["message"] for frame in streaming) == "".join(tokens)
+        # 第一段立即发送，之后按 50 字符（约 8 个 token）合并
+        assert streaming[0]["message"] == tokens[0]
+        assert len(streaming) * 5 <= len(tokens)
+        assert publisher.chunks_received == len(tokens)
+
+    def test_time_based_flush_when_stream_stalls(self):
+        """测试 LLM 停顿时缓冲文本按时间窗口发送"""
+        fake_redis = FakeRedis()
+        publisher = ChatStreamPublisher(fake_redis, "p-2", "task-2", flush_interval_ms=20, flush_chars=1000)
+        try:
+            publisher.start()
+            publisher.write("a")
+            publisher.write("b")
+            publisher.write("c")
+
+            deadline = time.monotonic() + 2
+            while time.monotonic() < deadline and len(fake_redis.published) < 3:
+                time.sleep(0.01)
+
+            streaming = [frame["message"] for frame in _frames(fake_redis) if frame["type"] == "streaming"]
+            assert streaming == ["a", "bc"]
+        finally:
+            publisher.close()
+
+    def test_frame_is_compatible_with_socket_response(self):
+        """测试模板帧可以被 SocketResponse2 解析，且包含非 ASCII 与转义字符"""
+        fake_redis = FakeRedis()
+        publisher = ChatStreamPublisher(fake_redis, "p-3", 'task"3', flush_interval_ms=10, flush_chars=1)
+        publisher.start()
+        publisher.write('中文 "quoted"\n')
+        publisher.end()
+
+        parsed = [SocketResponse2.model_validate_json(message) for _, message in fake_redis.published]
+        assert [frame.type for frame in parsed] == ["stream_start", "streaming", "stream_end"]
+        assert parsed[1].message == '中文 "quoted"\n'
+        assert parsed[1].taskid == 'task"3'
+        assert parsed[1].seq == 1
+        assert parsed[1].timestamp is not None
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+可续传流式回复测试
+
+验证 chat worker 把帧写入 Redis Stream、重连时按 last_seq 补发，
+以及补发期间到达的实时消息不会重复或乱序。
+"""
+
+import sys
+import os
+import json
+import asyncio
+from unittest.mock import AsyncMock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.api.endpoints import websocket as websocket_module
+from app.core.chat_stream_replay import load_missed_frames
+from app.core.websocket_manager import WebSocketManager
+from app.services.chat_stream_publisher import ChatStreamPublisher, chat_stream_key, latest_chat_stream_key
+
+
+class FakeRedis:
+    """实现 Stream / 字符串 / publish 的简易 Redis 替身（同步与异步两种接口）"""
+
+    def __init__(self):
+        self.streams = {}
+        self.values = {}
+        self.published = []
+
+    # --- 同步接口（chat worker 使用） ---
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    # --- 异步接口（API 进程使用） ---
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def xrange(self, key, min="-", max="+"):
+        return list(self.streams.get(key, []))
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        self.commands.append(lambda: self.redis.streams.setdefault(key, []).append(
+            (f"{len(self.redis.streams.get(key, [])) + 1}-0", {k: str(v) for k, v in fields.items()})
+        ))
+
+    def expire(self, key, seconds):
+        self.commands.append(lambda: None)
+
+    def set(self, key, value, ex=None):
+        self.commands.append(lambda: self.redis.values.__setitem__(key, value))
+
+    def publish(self, channel, message):
+        self.commands.append(lambda: self.redis.publish(channel, message))
+
+    def execute(self):
+        for command in self.commands:
+            command()
+        self.commands = []
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+
+def _publish_answer(fake_redis, taskid, chunks):
+    publisher = ChatStreamPublisher(
+        fake_redis, "p-1", taskid, flush_interval_ms=10000, flush_chars=1, stream_ttl_seconds=600
+    )
+    publisher.start()
+    for chunk in chunks:
+        publisher.write(chunk)
+    publisher.end()
+
+
+class TestChatStreamReplay:
+    """流式回复续传测试类"""
+
+    def test_publisher_appends_every_frame_to_stream(self):
+        """测试每一帧都按顺序写入 Stream，并记录参与者最近的任务"""
+        fake_redis = FakeRedis()
+        _publish_answer(fake_redis, "t1", ["a", "b", "c"])
+
+        entries = fake_redis.streams[chat_stream_key("t1")]
+        assert [int(fields["seq"]) for _, fields in entries] == [0, 1, 2, 3, 4]
+        assert [fields["frame"] for _, fields in entries] == [message for _, message in fake_redis.published]
+        assert fake_redis.values[latest_chat_stream_key("p-1")] == "t1"
+
+    async def test_load_missed_frames_after_last_seq(self):
+        """测试只补发 last_seq 之后的帧，并包含之后开始的新回复"""
+        fake_redis = FakeRedis()
+        _publish_answer(fake_redis, "t1", ["a", "b", "c"])
+        _publish_answer(fake_redis, "t2", ["x"])
+
+        frames, replayed = await load_missed_frames(fake_redis, "p-1", last_seq=2, taskid="t1")
+        decoded = [json.loads(frame) for frame in frames]
+        assert [(frame["taskid"], frame["seq"]) for frame in decoded] == [
+            ("t1", 3), ("t1", 4), ("t2", 0), ("t2", 1), ("t2", 2)
+        ]
+        assert replayed == {"t1": 4, "t2": 2}
+
+        frames, _ = await load_missed_frames(fake_redis, "p-unknown", last_seq=0)
+        assert frames == []
+
+    async def test_held_live_frames_are_deduplicated(self):
+        """测试补发期间暂存的实时消息按顺序发送，已补发的帧被跳过"""
+        manager = WebSocketManager()
+        websocket = FakeWebSocket()
+        await manager.connect("p-1", websocket)
+
+        manager.hold("p-1")
+        for seq in (3, 4, 5):
+            await manager.send_to_user("p-1", json.dumps({"taskid": "t1", "seq": seq}))
+        assert websocket.sent == []
+
+        await manager.release("p-1", {"t1": 4})
+        await asyncio.sleep(0.01)
+        assert [json.loads(message)["seq"] for message in websocket.sent] == [5]
+
+        await manager.send_to_user("p-1", json.dumps({"taskid": "t1", "seq": 6}))
+        await asyncio.sleep(0.01)
+        assert json.loads(websocket.sent[-1])["seq"] == 6
+        await manager.disconnect("p-1")
+
+    def test_reconnect_replays_before_live(self):
+        """测试带 last_seq 重连时，先收到错过的帧"""
+        fake_redis = FakeRedis()
+        _publish_answer(fake_redis, "t1", ["a", "b", "c"])
+
+        app = FastAPI()
+        app.include_router(websocket_module.router, prefix="/ws")
+        with patch.object(websocket_module, "get_aioredis", return_value=fake_redis), \
+                patch.object(websocket_module.channel_router, "add_participant", new=AsyncMock()), \
+                patch.object(websocket_module.channel_router, "remove_participant", new=AsyncMock()):
+            client = TestClient(app)
+            with client.websocket_connect("/ws/user/p-1?taskid=t1&last_seq=1") as ws:
+                received = [json.loads(ws.receive_text()) for _ in range(3)]
+
+        assert [frame["seq"] for frame in received] == [2, 3, 4]
+        assert received[-1]["type"] == "stream_end"
+        assert "".join(frame["message"] for frame in received if frame["type"] == "streaming") == "bc"
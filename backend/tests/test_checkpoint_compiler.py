@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+检查点合并评估测试
+
+验证连续的非交互检查点只调用一次 page.evaluate、判定文案与逐个评估一致，
+交互检查点按顺序穿插执行，以及选择器无法解析或脚本执行失败时回退到逐个评估；
+加载任务时预先编译的执行计划不可变，提交时直接使用，判定结果与现场解析一致。
+"""
+
+import sys
+import os
+import dataclasses
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.schemas.content import (
+    AssertAttributeCheckpoint,
+    AssertElementCheckpoint,
+    AssertStyleCheckpoint,
+    AssertTextContentCheckpoint,
+    CustomScriptCheckpoint,
+    InteractionAndAssertCheckpoint,
+)
+from app.services import checkpoint_compiler
+from app.services.checkpoint_compiler import CHECKPOINT_BUNDLE_SCRIPT, assertion_plan, compile_assertions
+from app.services import content_loader
+from app.services.sandbox_service import SandboxService
+
+
+def style_cp(selector="h1", value="16px"):
+    return AssertStyleCheckpoint(
+        name="字号", type="assert_style", feedback="字号不对",
+        selector=selector, css_property="font-size", assertion_type="equals", value=value,
+    )
+
+
+def text_cp(selector="h1", value="Hello"):
+    return AssertTextContentCheckpoint(
+        name="标题", type="assert_text_content", feedback="标题不对",
+        selector=selector, assertion_type="contains", value=value,
+    )
+
+
+def script_cp(script="return document.title === 'x';"):
+    return CustomScriptCheckpoint(name="脚本", type="custom_script", feedback="脚本失败", script=script)
+
+
+def bundle_calls(page):
+    return [c for c in page.evaluate.call_args_list if c.args and c.args[0] == CHECKPOINT_BUNDLE_SCRIPT]
+
+
+class TestCheckpointBundle:
+    """SandboxService 合并评估测试"""
+
+    def test_compile_assertions(self):
+        """各类断言编译成只读取所需字段的观测项，自定义脚本用 IIFE 包装"""
+        element_exists = AssertElementCheckpoint(
+            name="存在", type="assert_element", feedback="f", selector="p", assertion_type="exists",
+        )
+        attribute = AssertAttributeCheckpoint(
+            name="属性", type="assert_attribute", feedback="f", selector="a",
+            attribute="href", assertion_type="equals", value="#",
+        )
+        items = compile_assertions([style_cp(), text_cp(), element_exists, attribute, script_cp(), None])
+        assert items == [
+            {"kind": "query", "selector": "h1", "style": "font-size"},
+            {"kind": "query", "selector": "h1", "text": True},
+            {"kind": "query", "selector": "p"},
+            {"kind": "query", "selector": "a", "attribute": "href"},
+            {"kind": "script", "script": "(() => { return document.title === 'x'; })()"},
+            {"kind": "skip"},
+        ]
+
+    def test_consecutive_assertions_use_single_evaluate(self):
+        """连续的非交互检查点只往返一次，判定文案与逐个评估时相同"""
+        page = MagicMock()
+        page.evaluate.return_value = [
+            {"count": 1, "value": "16px"},
+            {"count": 1, "text": "Goodbye\nworld"},
+            {"value": False},
+        ]
+        service = SandboxService(playwright_manager=MagicMock())
+
+        results = service._evaluate_checkpoints(page, [style_cp(), text_cp(), script_cp()])
+
+        assert len(bundle_calls(page)) == 1
+        page.locator.assert_not_called()
+        assert results == [
+            (True, "通过"),
+            (False, "元素 'h1' 的文本 'Goodbye world' 不包含 'Hello'"),
+            (False, "自定义脚本返回结果为 False，断言失败"),
+        ]
+
+    def test_interaction_splits_bundles_in_order(self):
+        """交互检查点前后的断言分段合并，交互动作按原顺序执行"""
+        interaction = InteractionAndAssertCheckpoint(
+            name="点击", type="interaction_and_assert", feedback="点击后不对",
+            action_selector="button", action_type="click", assertion=text_cp(value="Clicked"),
+        )
+        page = MagicMock()
+        calls = []
+        page.locator.return_value.click.side_effect = lambda: calls.append("click")
+
+        def evaluate(script, items):
+            calls.append(len(items))
+            if len(items) == 1 and items[0].get("text"):
+                return [{"count": 1, "text": "Clicked"}]
+            return [{"count": 1, "value": "16px"} for _ in items]
+
+        page.evaluate.side_effect = evaluate
+        service = SandboxService(playwright_manager=MagicMock())
+
+        results = service._evaluate_checkpoints(page, [style_cp(), style_cp(), interaction, style_cp()])
+
+        assert calls == [2, "click", 1, 1]
+        assert results == [(True, "通过")] * 4
+
+    def test_selector_fallback_then_resume_bundle(self):
+        """选择器无法按 CSS 解析时该项改用 locator 评估，其后的断言重新合并"""
+        page = MagicMock()
+        page.evaluate.side_effect = [
+            [{"count": 1, "value": "16px"}, {"fallback": "SyntaxError: bad selector"}],
+            [{"count": 0}],
+        ]
+        page.locator.return_value.text_content.return_value = "Hello there"
+        service = SandboxService(playwright_manager=MagicMock())
+
+        results = service._evaluate_checkpoints(page, [style_cp(), text_cp("text=Hello"), text_cp("#missing")])
+
+        page.locator.assert_called_once_with("text=Hello")
+        assert len(bundle_calls(page)) == 2
+        assert results == [
+            (True, "通过"),
+            (True, "通过"),
+            (False, "找不到或无法获取选择器 '#missing' 的文本内容"),
+        ]
+
+    def test_bundle_failure_falls_back_to_per_assertion(self):
+        """合并脚本执行失败时剩余断言全部逐个评估"""
+        page = MagicMock()
+
+        def evaluate(script, *args):
+            if script == CHECKPOINT_BUNDLE_SCRIPT:
+                raise RuntimeError("Execution context was destroyed")
+            return 0
+
+        page.evaluate.side_effect = evaluate
+        page.locator.return_value.evaluate.return_value = "20px"
+        service = SandboxService(playwright_manager=MagicMock())
+
+        results = service._evaluate_checkpoints(page, [style_cp(), script_cp()])
+
+        assert results[0][0] is False
+        assert results[0][1].startswith("元素 h1 的CSS属性 font-size 值为 '20px'")
+        assert results[1] == (False, "自定义脚本返回结果为 0，断言失败")
+
+
+class TestAssertionPlan:
+    """预编译执行计划测试"""
+
+    def test_loaded_tasks_are_precompiled(self):
+        """加载任务时为每个检查点和嵌套断言生成不可变的执行计划"""
+        data_dir = Path(__file__).resolve().parents[1] / "app" / "data"
+        task = content_loader.ContentRegistry(data_dir).get("test_tasks", "6_3").model
+        for cp in task.checkpoints:
+            assert cp._plan is not None
+            if cp.type == "interaction_and_assert":
+                assert cp.assertion._plan is not None
+        plan = task.checkpoints[-1].assertion._plan
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            plan.regex = None
+        with pytest.raises(TypeError):
+            plan.item["selector"] = "#other"
+        # 交给 page.evaluate 的是副本
+        compile_assertions([task.checkpoints[-1].assertion])[0]["selector"] = "#other"
+        assert plan.item["selector"] == "#result"
+
+    def test_submission_path_does_not_recompile(self):
+        """计划编译后，判定不再包装脚本、编译正则或解析期望的 CSS 值"""
+        regex_cp = AssertAttributeCheckpoint(
+            name="链接", type="assert_attribute", feedback="f", selector="a",
+            attribute="href", assertion_type="regex", value=r"^https://",
+        )
+        checkpoints = [style_cp(value="12pt"), regex_cp, script_cp()]
+        plans = [assertion_plan(cp) for cp in checkpoints]
+        service = SandboxService(playwright_manager=MagicMock())
+
+        with patch.object(checkpoint_compiler, "wrap_custom_script", side_effect=AssertionError), \
+                patch.object(checkpoint_compiler.re, "compile", side_effect=AssertionError), \
+                patch.object(checkpoint_compiler, "parse_css_value", side_effect=AssertionError):
+            items = compile_assertions(checkpoints)
+            assert service._judge_assertion(regex_cp, {"count": 1, "value": "https://a.cn"}) == (True, "通过")
+
+        assert items[2]["script"] == "(() => { return document.title === 'x'; })()"
+        assert plans[0].expected_css.number == 12.0 and plans[0].expected_css.unit == "pt"
+        assert service._judge_assertion(checkpoints[0], {"count": 1, "value": "16px"}) == (True, "通过")
+
+    @pytest.mark.parametrize("actual,expected,op", [
+        ("16px", "12pt", "equals"), ("17px", "12pt", "greater_than"), ("bold", "700", "equals"),
+        ("rgb(255, 0, 0)", "red", "equals"), ("rgba(0, 0, 0, 0)", "transparent", "not_equals"),
+        ("Arial, sans-serif", "arial", "contains"), ("block", "flex", "not_equals"), ("50%", "10px", "greater_than"),
+        ("none", "none", "exists"), ("auto", "10px", "less_than"),
+    ])
+    def test_precompiled_css_matches_legacy(self, actual, expected, op):
+        """使用预解析期望值的判定与两侧现场解析的结果一致"""
+        service = SandboxService(playwright_manager=MagicMock())
+        cp = AssertStyleCheckpoint(
+            name="样式", type="assert_style", feedback="f",
+            selector="div", css_property="width", assertion_type=op, value=expected,
+        )
+        passed, _ = service._judge_assertion(cp, {"count": 1, "value": actual})
+        assert passed == service._compare_css_values(actual, expected, op)
+
+    def test_invalid_regex_reported_at_judge_time(self):
+        """无法编译的正则表达式不影响加载，判定时报告与原来相同的错误"""
+        cp = AssertAttributeCheckpoint(
+            name="链接", type="assert_attribute", feedback="f", selector="a",
+            attribute="href", assertion_type="regex", value="(",
+        )
+        service = SandboxService(playwright_manager=MagicMock())
+
+        passed, detail = service._judge_assertion(cp, {"count": 1, "value": "x"})
+
+        assert passed is False
+        assert detail.startswith("正则表达式 '(' 错误: missing ), unterminated subpattern")
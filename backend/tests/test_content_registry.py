@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+内容注册表测试
+
+验证启动预加载全部内容、响应体预先序列化、文件修改后按 mtime 重新加载、
+重新加载失败时保留旧版本，以及文件删除后返回 404。
+"""
+
+import sys
+import os
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.services.content_loader import ContentRegistry
+
+SOURCE_DIR = Path(__file__).resolve().parents[1] / "app" / "data"
+
+
+@pytest.fixture
+def data_dir(tmp_path: Path) -> Path:
+    """复制一个学习内容和一个测试任务到临时目录"""
+    for content_type, topic_id in (("learning_content", "1_1"), ("test_tasks", "1_1")):
+        (tmp_path / content_type).mkdir()
+        shutil.copy2(SOURCE_DIR / content_type / f"{topic_id}.json", tmp_path / content_type / f"{topic_id}.json")
+    return tmp_path
+
+
+def rewrite(path: Path, **changes):
+    """修改 JSON 文件中的字段，并把 mtime 往后推以免与上次加载落在同一时间戳"""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data.update(changes)
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class TestContentRegistry:
+    """ContentRegistry 测试"""
+
+    def test_preload_and_serialized_body(self, data_dir: Path):
+        """预加载全部文件，响应体为预先序列化的 StandardResponse"""
+        registry = ContentRegistry(data_dir, reload_interval=60)
+
+        assert registry.preload() == 2
+        entry = registry.get("test_tasks", "1_1")
+        body = json.loads(entry.rendered.body)
+        assert body["code"] == 200 and body["message"] == "success"
+        assert body["data"]["topic_id"] == "1_1"
+        assert len(body["data"]["checkpoints"]) == len(entry.model.checkpoints)
+        assert all(cp._plan is not None for cp in entry.model.checkpoints)
+        assert registry.get("test_tasks", "1_1") is entry
+
+    def test_modified_file_is_reloaded(self, data_dir: Path):
+        """检查间隔内直接返回旧条目，超过间隔且 mtime 变化后重新加载"""
+        registry = ContentRegistry(data_dir, reload_interval=60)
+        path = data_dir / "learning_content" / "1_1.json"
+        old = registry.get("learning_content", "1_1")
+
+        rewrite(path, title="新标题")
+        assert registry.get("learning_content", "1_1") is old
+
+        registry.reload_interval = 0
+        new = registry.get("learning_content", "1_1")
+        assert new.model.title == "新标题"
+        assert json.loads(new.rendered.body)["data"]["title"] == "新标题"
+        assert registry.get("learning_content", "1_1") is new
+
+    def test_broken_file_keeps_previous_version(self, data_dir: Path):
+        """修改后的文件无法加载时继续使用旧版本；首次加载失败则照常报错"""
+        registry = ContentRegistry(data_dir, reload_interval=0)
+        path = data_dir / "learning_content" / "1_1.json"
+        old = registry.get("learning_content", "1_1")
+
+        path.write_text("{", encoding="utf-8")
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        assert registry.get("learning_content", "1_1") is old
+        with pytest.raises(Exception):
+            ContentRegistry(data_dir).get("learning_content", "1_1")
+
+    def test_missing_and_deleted_files(self, data_dir: Path):
+        """不存在或被删除的文件返回 404，不支持的类型抛出 ValueError"""
+        registry = ContentRegistry(data_dir, reload_interval=0)
+        registry.get("learning_content", "1_1")
+        (data_dir / "learning_content" / "1_1.json").unlink()
+
+        for topic_id in ("1_1", "nonexistent", "../test_tasks/1_1"):
+            with pytest.raises(HTTPException) as exc_info:
+                registry.get("learning_content", topic_id)
+            assert exc_info.value.status_code == 404
+        with pytest.raises(ValueError, match="不支持的content_type"):
+            registry.get("invalid_type", "1_1")
@@ -1489,5 +1489,36 @@ class TestDynamicController:
         
         assert controller.rag_service is None
 
+    @pytest.mark.asyncio
+    async def test_blocking_steps_run_off_event_loop(self):
+        """测试档案读取、情感分析等同步步骤在线程池中执行，不阻塞事件循环"""
+        import threading
+
+        loop_thread = threading.get_ident()
+        threads = []
+        user_state_service = MagicMock()
+
+        def get_or_create_profile(participant_id, db):
+            threads.append(threading.get_ident())
+            raise RuntimeError("stop after profile")
+
+        user_state_service.get_or_create_profile.side_effect = get_or_create_profile
+        controller = DynamicController(
+            user_state_service=user_state_service,
+            sentiment_service=None,
+            rag_service=None,
+            prompt_generator=MagicMock(),
+            llm_gateway=AsyncMock()
+        )
+
+        response = await controller.generate_adaptive_response(
+            request=ChatRequest(participant_id="p-1", user_message="hi"),
+            db=MagicMock()
+        )
+
+        assert threads and threads[0] != loop_thread
+        assert "critical error" in response.ai_response
+        controller.llm_gateway.get_completion.assert_not_called()
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+本机模型服务测试
+
+验证客户端经 Unix socket 调用句向量编码与情感分析、多个线程的并发请求被合并成批、
+模型服务不可用时客户端抛出 ModelServerError，以及情感分析适配器的回退行为。
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.schemas.chat import SentimentAnalysisResult
+from app.services.model_server import ModelServer
+from app.services.model_server_client import ModelServerClient, ModelServerError
+from app.services.sentiment_analysis_service import SentimentAnalysisService
+
+
+class FakeSentimentService:
+    """按文本内容给出情感标签的替身，记录每批的大小"""
+
+    model_available = True
+
+    def __init__(self):
+        self.batches = []
+
+    def analyze_sentiment_batch(self, texts):
+        self.batches.append(len(texts))
+        return [
+            SentimentAnalysisResult(label="NEGATIVE" if "stuck" in text else "POSITIVE", confidence=0.9)
+            for text in texts
+        ]
+
+
+def fake_encode(texts, model_name):
+    # 向量第一维是文本长度，便于检查结果与请求的对应关系
+    return np.array([[len(text), 1.0, 0.0] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def model_server():
+    socket_path = os.path.join(tempfile.mkdtemp(), "model.sock")
+    sentiment = FakeSentimentService()
+    server = ModelServer(sentiment, fake_encode, socket_path=socket_path, batch_window_ms=50, max_batch_size=64)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert started.wait(5)
+    yield server, sentiment
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+
+
+class TestModelServer:
+    """ModelServer 与 ModelServerClient 测试"""
+
+    def test_encode_and_sentiment_round_trip(self, model_server):
+        """编码结果与情感分析结果按请求顺序返回"""
+        server, _ = model_server
+        client = ModelServerClient(socket_path=server.socket_path, timeout=5)
+
+        embeddings = client.encode(["a", "abc"], model_name="m")
+        assert embeddings.dtype == np.float32
+        assert embeddings.tolist() == [[1.0, 1.0, 0.0], [3.0, 1.0, 0.0]]
+
+        results = client.sentiment(["I am stuck", "done!"])
+        assert [r["label"] for r in results] == ["NEGATIVE", "POSITIVE"]
+        assert client.ping()["stats"]["encode"]["requests"] == 1
+        client.close()
+
+    def test_concurrent_requests_are_batched(self, model_server):
+        """多个线程在批处理窗口内的请求合并为一次推理"""
+        server, sentiment = model_server
+        client = ModelServerClient(socket_path=server.socket_path, timeout=5)
+        barrier = threading.Barrier(8)
+
+        def call(i):
+            barrier.wait()
+            return client.sentiment([f"stuck {i}", f"ok {i}"])
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(call, range(8)))
+
+        assert all([r["label"] for r in result] == ["NEGATIVE", "POSITIVE"] for result in results)
+        assert sum(sentiment.batches) == 16
+        assert len(sentiment.batches) < 8
+
+    def test_unavailable_server_raises(self):
+        """模型服务未启动时抛出 ModelServerError"""
+        client = ModelServerClient(socket_path=os.path.join(tempfile.mkdtemp(), "missing.sock"), timeout=1)
+        with pytest.raises(ModelServerError):
+            client.ping()
+
+    def test_sentiment_adapter_uses_client_and_falls_back(self, model_server):
+        """情感分析适配器经模型服务推理，服务不可用时返回中性结果"""
+        server, _ = model_server
+        service = SentimentAnalysisService(model_client=ModelServerClient(socket_path=server.socket_path, timeout=5))
+        assert service.model is None
+        assert service.analyze_sentiment("I am stuck").label == "NEGATIVE"
+        assert [r.label for r in service.analyze_sentiment_batch(["", "great"])] == ["NEUTRAL", "POSITIVE"]
+
+        offline = SentimentAnalysisService(
+            model_client=ModelServerClient(socket_path=os.path.join(tempfile.mkdtemp(), "missing.sock"), timeout=1)
+        )
+        assert offline.analyze_sentiment("I am stuck").label == "NEUTRAL"
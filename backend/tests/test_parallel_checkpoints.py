@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+检查点并行执行测试
+
+验证 plan_isolated_chains 按 depends_on 划分执行链（未声明依赖时保持原来的顺序执行），
+以及 SandboxService 为每条链打开独立页面、各页面的 wait 动作相互重叠、结果按原顺序返回。
+"""
+
+import sys
+import os
+import time
+from unittest.mock import MagicMock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.schemas.content import AssertElementCheckpoint, CustomScriptCheckpoint, InteractionAndAssertCheckpoint
+from app.services.checkpoint_compiler import plan_isolated_chains
+from app.services.sandbox_service import SandboxService
+
+
+def element_cp(name, selector="h1", depends_on=None):
+    return AssertElementCheckpoint(
+        name=name, type="assert_element", feedback="元素不存在",
+        selector=selector, assertion_type="exists", depends_on=depends_on,
+    )
+
+
+def interaction_cp(name, action_type="click", action_value=None, depends_on=None):
+    return InteractionAndAssertCheckpoint(
+        name=name, type="interaction_and_assert", feedback="交互后不对",
+        action_selector="button", action_type=action_type, action_value=action_value,
+        assertion=CustomScriptCheckpoint(name=f"{name}断言", type="custom_script", feedback="f", script="return true;"),
+        depends_on=depends_on,
+    )
+
+
+class TestPlanIsolatedChains:
+    """plan_isolated_chains 测试"""
+
+    def test_legacy_checkpoints_stay_sequential(self):
+        """没有声明 depends_on 的任务不拆分"""
+        checkpoints = [element_cp("a"), interaction_cp("b"), interaction_cp("c"), element_cp("d")]
+        assert plan_isolated_chains(checkpoints) is None
+
+    def test_independent_interactions_get_own_chains(self):
+        """depends_on 为空的交互各自成链，依赖者接在被依赖者所在的链后"""
+        checkpoints = [
+            element_cp("a"),
+            interaction_cp("b", depends_on=[]),
+            interaction_cp("c", depends_on=[]),
+            element_cp("d", depends_on=["b"]),
+            element_cp("e"),
+            interaction_cp("f", depends_on=["c"]),
+        ]
+        assert plan_isolated_chains(checkpoints) == [[0, 4], [1, 3], [2, 5]]
+
+    def test_unresolvable_dependencies_fall_back(self):
+        """依赖不存在、引用后面的检查点或跨越多条链时返回 None"""
+        b = interaction_cp("b", depends_on=[])
+        c = interaction_cp("c", depends_on=[])
+        assert plan_isolated_chains([b, c, element_cp("d", depends_on=["missing"])]) is None
+        assert plan_isolated_chains([element_cp("d", depends_on=["b"]), b, c]) is None
+        assert plan_isolated_chains([b, c, element_cp("d", depends_on=["b", "c"])]) is None
+        # 只有一条含交互的链时没有可重叠的内容
+        assert plan_isolated_chains([element_cp("a"), b]) is None
+
+
+class TestParallelEvaluation:
+    """SandboxService 并行执行测试"""
+
+    def test_waits_overlap_across_pages(self):
+        """两个 wait 在各自页面上执行，总等待接近最长的一个，结果按检查点原顺序返回"""
+        manager = MagicMock()
+        browser = manager.__enter__.return_value.chromium.launch.return_value
+        context = browser.new_context.return_value
+        pages = [MagicMock(name=f"page{i}") for i in range(3)]
+        context.new_page.side_effect = pages
+        waited = []
+
+        def wait_for_timeout(ms):
+            waited.append(ms)
+            time.sleep(ms / 1000)
+
+        for page in pages:
+            page.evaluate.side_effect = lambda script, items: [{"value": True} if item["kind"] == "script" else {"count": 1} for item in items]
+            page.wait_for_timeout.side_effect = wait_for_timeout
+        service = SandboxService(playwright_manager=manager, static_precheck=False, parallel_interactions=True)
+        checkpoints = [
+            element_cp("a"),
+            interaction_cp("b", action_type="wait", action_value="200", depends_on=[]),
+            interaction_cp("c", action_type="wait", action_value="300", depends_on=[]),
+            element_cp("d", selector="#missing", depends_on=["c"]),
+        ]
+        pages[2].evaluate.side_effect = lambda script, items: [{"value": True}] if items[0]["kind"] == "script" else [{"count": 0}]
+
+        result = service.run_evaluation({"html": "<h1>x</h1>", "css": "", "js": ""}, checkpoints, topic_id="1_1")
+
+        assert context.new_page.call_count == 3
+        browser.new_page.assert_not_called()
+        for page in pages:
+            page.set_content.assert_called_once()
+            assert page.set_content.call_args.kwargs["wait_until"] == "commit"
+        # 两个 wait 重叠执行，总等待时长接近较长的 300 毫秒而不是 500 毫秒
+        assert 250 <= sum(waited) <= 350
+        context.close.assert_called_once()
+        assert result["passed"] is False
+        assert result["details"] == ["检查点 4 失败: 元素不存在"]
+
+    def test_disabled_uses_single_page(self):
+        """关闭并行执行时仍在一个页面上顺序执行"""
+        manager = MagicMock()
+        browser = manager.__enter__.return_value.chromium.launch.return_value
+        browser.new_page.return_value.evaluate.side_effect = lambda script, items: [{"value": True} for _ in items]
+        service = SandboxService(playwright_manager=manager, static_precheck=False, parallel_interactions=False)
+        checkpoints = [
+            interaction_cp("b", action_type="wait", action_value="10", depends_on=[]),
+            interaction_cp("c", action_type="wait", action_value="10", depends_on=[]),
+        ]
+
+        result = service.run_evaluation({"html": "<button>x</button>", "css": "", "js": ""}, checkpoints, topic_id="1_1")
+
+        assert result["passed"] is True
+        browser.new_context.assert_not_called()
+        assert browser.new_page.return_value.wait_for_timeout.call_count >= 2
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+参与者存在性缓存测试
+
+验证 ParticipantCache 在首次接触后不再访问数据库、数据库标识变化或时间窗口结束后重新确认，
+以及 create_if_not_exists 的幂等性和 /session/initiate 的补录。
+"""
+
+import sys
+import os
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.api.endpoints import session as session_module
+from app.db.base_class import Base
+from app.models.participant import Participant
+from app.crud.crud_participant import participant as crud_participant
+from app.schemas.participant import ParticipantCreate
+from app.services import participant_cache
+from app.services.participant_cache import ParticipantCache, KNOWN_PARTICIPANTS_KEY, database_identity
+
+
+class FakeRedis:
+    """只实现集合操作与过期时间的简易 Redis 替身"""
+
+    def __init__(self):
+        self.sets = {}
+        self.ttls = {}
+
+    def sismember(self, key, value):
+        return value in self.sets.get(key, set())
+
+    def sadd(self, key, value):
+        self.sets.setdefault(key, set()).add(value)
+        return 1
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+        return 1
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.calls]
+
+
+@pytest.fixture(scope="function")
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'participants.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="function")
+def statements(engine):
+    """记录发往数据库的 SQL 语句"""
+    executed = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield executed
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+class TestParticipantCache:
+    """ParticipantCache 测试类"""
+
+    def test_create_if_not_exists_is_idempotent(self, db):
+        """测试重复补录不会报错也不会产生重复行"""
+        obj_in = ParticipantCreate(id="p-idem", group="experimental")
+        assert crud_participant.create_if_not_exists(db, obj_in=obj_in) is True
+        assert crud_participant.create_if_not_exists(db, obj_in=obj_in) is False
+
+        rows = db.query(Participant).filter(Participant.id == "p-idem").all()
+        assert len(rows) == 1
+        assert rows[0].created_at is not None
+
+    def test_zero_db_round_trips_after_first_contact(self, db, statements):
+        """测试首次接触后再次检查不访问数据库"""
+        cache = ParticipantCache(redis_client=FakeRedis())
+
+        cache.ensure("p-1", db)
+        assert len(statements) == 1
+        assert db.get(Participant, "p-1") is not None
+
+        statements.clear()
+        for _ in range(10):
+            cache.ensure("p-1", db)
+        assert statements == []
+
+    def test_shared_redis_set_skips_db_in_other_process(self, db, statements):
+        """测试另一个进程（新的进程内缓存）通过 Redis 集合命中"""
+        fake_redis = FakeRedis()
+        ParticipantCache(redis_client=fake_redis).ensure("p-2", db)
+        (key,) = fake_redis.sets
+        assert key.startswith(KNOWN_PARTICIPANTS_KEY) and fake_redis.sismember(key, "p-2")
+        assert fake_redis.ttls[key] > 0
+
+        statements.clear()
+        other_process_cache = ParticipantCache(redis_client=fake_redis)
+        other_process_cache.ensure("p-2", db)
+        assert statements == []
+
+    def test_local_lru_eviction(self, db):
+        """测试进程内 LRU 超出容量后淘汰最久未使用的参与者"""
+        cache = ParticipantCache(redis_client=None, max_local_entries=2)
+        cache.ensure("a", db)
+        cache.ensure("b", db)
+        cache.ensure("a", db)
+        cache.ensure("c", db)
+
+        assert cache.is_known("a")
+        assert cache.is_known("c")
+        assert not cache.is_known("b")
+
+    def test_database_identity_change_invalidates(self, db, statements):
+        """测试数据库标识变化（数据库被删除重建）后，两级缓存都不再命中"""
+        fake_redis = FakeRedis()
+        identity = ["db-1"]
+        cache = ParticipantCache(redis_client=fake_redis, identity=lambda: identity[0])
+        cache.ensure("p-3", db)
+
+        identity[0] = "db-2"
+        assert not cache.is_known("p-3")
+        assert not ParticipantCache(redis_client=fake_redis, identity=lambda: identity[0]).is_known("p-3")
+
+        statements.clear()
+        cache.ensure("p-3", db)
+        assert len(statements) == 1
+        assert cache.is_known("p-3")
+
+    def test_entries_expire_with_time_window(self, db):
+        """测试时间窗口结束后需要重新确认"""
+        cache = ParticipantCache(redis_client=FakeRedis(), ttl_seconds=60)
+        with patch.object(participant_cache.time, "time", return_value=1000.0):
+            cache.ensure("p-4", db)
+            assert cache.is_known("p-4")
+        with patch.object(participant_cache.time, "time", return_value=1000.0 + 60):
+            assert not cache.is_known("p-4")
+
+    def test_sqlite_identity_follows_file(self, tmp_path):
+        """测试 SQLite 数据库文件删除重建后标识改变"""
+        path = tmp_path / "identity.db"
+        url = f"sqlite:///{path}"
+        assert database_identity(url) == "missing"
+
+        path.write_bytes(b"")
+        first = database_identity(url)
+        assert first != "missing"
+        # 先创建新文件再删除旧文件，保证新文件不会复用旧的 inode
+        replacement = tmp_path / "replacement.db"
+        replacement.write_bytes(b"")
+        path.unlink()
+        replacement.rename(path)
+        assert database_identity(url) != first
+        assert database_identity("mysql+pymysql://u:p@db:3306/tutor") == "db:3306/tutor"
+
+
+class TestSessionInitiate:
+    """/session/initiate 参与者补录测试类"""
+
+    @pytest.fixture
+    def initiate(self, engine):
+        """返回调用 /session/initiate 的函数，可指定本次请求使用的参与者缓存"""
+        app = FastAPI()
+        app.include_router(session_module.router, prefix="/session")
+        client = TestClient(app)
+        # Redis 中已有用户配置：get_or_create_profile 不会再访问数据库
+        user_state_service = MagicMock()
+        user_state_service.get_or_create_profile.side_effect = (
+            lambda participant_id, db, group: (SimpleNamespace(participant_id=participant_id), False)
+        )
+
+        def post(participant_id, cache):
+            with patch.object(session_module, "SessionLocal", sessionmaker(bind=engine)), \
+                    patch.object(session_module, "get_participant_cache", return_value=cache), \
+                    patch.object(session_module, "get_redis_client"), \
+                    patch.object(session_module, "get_user_state_service", return_value=user_state_service):
+                return client.post("/session/initiate", json={"participant_id": participant_id, "group": "A"})
+
+        return post
+
+    def test_created_comes_from_insert_result(self, initiate, engine):
+        """测试只有真正插入参与者的请求返回 201；另一个请求先插入时不会因主键冲突返回 500"""
+        response = initiate("p-new", ParticipantCache(redis_client=FakeRedis()))
+        assert response.status_code == 201
+        assert response.json()["data"]["is_new_user"] is True
+
+        # 新的进程内缓存、空的 Redis：相当于并发的首次登录中落后的那个请求
+        response = initiate("p-new", ParticipantCache(redis_client=FakeRedis()))
+        assert response.status_code == 200
+        assert response.json()["data"]["is_new_user"] is False
+
+        session = sessionmaker(bind=engine)()
+        try:
+            assert session.query(Participant).filter(Participant.id == "p-new").count() == 1
+        finally:
+            session.close()
+
+    def test_known_participant_skips_db(self, initiate, statements):
+        """测试参与者缓存已确认存在时，会话初始化不访问数据库"""
+        cache = ParticipantCache(redis_client=FakeRedis())
+        initiate("p-known", cache)
+
+        statements.clear()
+        response = initiate("p-known", cache)
+        assert response.status_code == 200
+        assert statements == []
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+预渲染响应测试
+
+验证 ETag/Cache-Control 响应头、If-None-Match 命中时返回 304、按 Accept-Encoding 返回 gzip 版本，
+以及知识图谱和测试任务接口使用预渲染响应、知识图谱文件变化后重新生成。
+"""
+
+import sys
+import os
+import gzip
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.api.endpoints import content, knowledge_graph
+from app.core.prerendered_response import GZIP_MIN_SIZE, prerender_json, prerendered_response
+from app.services.content_loader import ContentRegistry
+
+BODY = json.dumps({"code": 200, "message": "success", "data": {"text": "内容" * GZIP_MIN_SIZE}}).encode("utf-8")
+DATA_DIR = Path(__file__).resolve().parents[1] / "app" / "data"
+
+
+def make_client(payload):
+    app = FastAPI()
+
+    @app.get("/payload")
+    def get_payload(request: Request):
+        return prerendered_response(request, payload)
+
+    return TestClient(app)
+
+
+class TestPrerenderedResponse:
+    """prerendered_response 测试"""
+
+    def test_etag_and_not_modified(self):
+        """响应带强 ETag 与 Cache-Control，If-None-Match 命中（含弱比较和 *）时返回空的 304"""
+        payload = prerender_json(BODY)
+        client = make_client(payload)
+
+        response = client.get("/payload", headers={"Accept-Encoding": "identity"})
+        assert response.status_code == 200
+        assert response.content == BODY
+        assert response.headers["etag"] == payload.etag
+        assert response.headers["cache-control"] == "no-cache"
+        assert response.headers["vary"] == "Accept-Encoding"
+
+        for if_none_match in (payload.etag, f'"other", W/{payload.etag}', payload.gzip_etag, "*"):
+            response = client.get("/payload", headers={"If-None-Match": if_none_match, "Accept-Encoding": "identity"})
+            assert response.status_code == 304
+            assert response.content == b""
+            assert response.headers["etag"] == payload.etag
+
+        response = client.get("/payload", headers={"If-None-Match": '"other"', "Accept-Encoding": "identity"})
+        assert response.status_code == 200
+
+    def test_gzip_negotiation(self):
+        """只在客户端接受 gzip 时返回压缩版本，压缩版本使用独立的 ETag；小响应体不压缩"""
+        payload = prerender_json(BODY)
+        client = make_client(payload)
+
+        response = client.get("/payload", headers={"Accept-Encoding": "br, gzip;q=0.8"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["etag"] == payload.gzip_etag
+        assert int(response.headers["content-length"]) == len(payload.gzip_body)
+        assert gzip.decompress(payload.gzip_body) == BODY
+        assert response.content == BODY
+
+        response = client.get("/payload", headers={"Accept-Encoding": "gzip;q=0"})
+        assert "content-encoding" not in response.headers
+        assert response.headers["etag"] == payload.etag
+
+        small = prerender_json(b'{"code":200}')
+        assert small.gzip_body is None
+        assert prerender_json(BODY, compress=False).gzip_body is None
+        assert "vary" not in make_client(small).get("/payload").headers
+
+
+class TestPrerenderedEndpoints:
+    """静态内容接口测试"""
+
+    def test_test_task_not_modified(self):
+        """测试任务接口返回注册表中的响应体，带上 ETag 再次请求得到 304"""
+        app = FastAPI()
+        app.include_router(content.router)
+        client = TestClient(app)
+
+        with patch.object(content, "content_registry", ContentRegistry(DATA_DIR)):
+            response = client.get("/test-tasks/1_1")
+            assert response.status_code == 200
+            assert response.json()["data"]["topic_id"] == "1_1"
+
+            response = client.get("/test-tasks/1_1", headers={"If-None-Match": response.headers["etag"]})
+            assert response.status_code == 304
+
+    def test_knowledge_graph_rerendered_on_change(self, tmp_path):
+        """知识图谱文件不变时复用同一个预渲染响应，文件变化后重新生成"""
+        app = FastAPI()
+        app.include_router(knowledge_graph.router, prefix="/knowledge-graph")
+        client = TestClient(app)
+        graph_file = tmp_path / "knowledge_graph.json"
+        graph_file.write_text(json.dumps({"nodes": [{"data": {"id": "a", "label": "A"}}], "edges": [], "dependent_edges": []}), encoding="utf-8")
+
+        with patch.object(knowledge_graph, "GRAPH_FILE_PATH", str(graph_file)):
+            first = client.get("/knowledge-graph")
+            cached = knowledge_graph._knowledge_graph_response
+            assert client.get("/knowledge-graph", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+            assert knowledge_graph._knowledge_graph_response is cached
+
+            graph_file.write_text(json.dumps({"nodes": [{"data": {"id": "b", "label": "B"}}], "edges": [], "dependent_edges": []}), encoding="utf-8")
+            stat = graph_file.stat()
+            os.utime(graph_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+            second = client.get("/knowledge-graph", headers={"If-None-Match": first.headers["etag"]})
+            assert second.status_code == 200
+            assert second.json()["data"]["nodes"][0]["data"]["id"] == "b"
+            assert second.headers["etag"] != first.headers["etag"]
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Redis 连接工厂测试
+
+验证按进程角色设置连接池大小、keepalive / 健康检查 / 带抖动重试的连接参数，
+以及连接池使用情况统计。
+"""
+
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+import redis
+from redis.backoff import EqualJitterBackoff
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.core.config import settings
+from app.core.redis_connections import RedisConnectionFactory, role_for_queues
+
+
+def _fake_connection():
+    connection = MagicMock()
+    connection.can_read.return_value = False
+    connection.pid = os.getpid()
+    return connection
+
+
+class TestRedisConnectionFactory:
+    """RedisConnectionFactory 测试类"""
+
+    def test_role_for_queues(self):
+        """测试 Celery 队列到进程角色的映射"""
+        assert role_for_queues({"db_writer_queue"}) == "db_writer"
+        assert role_for_queues({"chat_queue"}) == "chat_worker"
+        assert role_for_queues({"chat_queue", "db_writer_queue"}) == "db_writer"
+        assert role_for_queues(set()) == "default"
+
+    def test_pool_is_sized_by_role_and_configured(self):
+        """测试连接池上限按角色设置，并带 keepalive、健康检查与抖动重试"""
+        factory = RedisConnectionFactory(url="redis://localhost:6380/0", role="db_writer")
+        client = factory.get_client()
+        assert factory.get_client() is client
+
+        pool = client.connection_pool
+        assert isinstance(pool, redis.BlockingConnectionPool)
+        assert pool.max_connections == settings.REDIS_POOL_MAX_CONNECTIONS["db_writer"]
+        assert pool.connection_kwargs["socket_keepalive"] is True
+        assert pool.connection_kwargs["health_check_interval"] == settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS
+        assert pool.connection_kwargs["decode_responses"] is False
+
+        retry = client.get_retry()
+        assert isinstance(retry._backoff, EqualJitterBackoff)
+        assert retry._retries == settings.REDIS_RETRY_ATTEMPTS
+
+        async_client = factory.get_async_client()
+        assert async_client.connection_pool.max_connections == settings.REDIS_POOL_MAX_CONNECTIONS["db_writer"]
+        assert async_client.connection_pool.connection_kwargs["decode_responses"] is True
+        assert async_client.connection_pool.connection_kwargs["retry"] is not None
+
+    def test_configure_role_rebuilds_pool(self):
+        """测试 Worker 设置角色后按新角色重建连接池"""
+        factory = RedisConnectionFactory(url="redis://localhost:6380/0", role="api")
+        api_client = factory.get_client()
+        factory.configure_role("behavior_worker")
+
+        worker_client = factory.get_client()
+        assert worker_client is not api_client
+        assert worker_client.connection_pool.max_connections == settings.REDIS_POOL_MAX_CONNECTIONS["behavior_worker"]
+
+    def test_pool_metrics(self):
+        """测试连接池使用情况统计"""
+        factory = RedisConnectionFactory(url="redis://localhost:6380/0", role="api")
+        pool = factory.get_client().connection_pool
+        assert factory.get_metrics()["sync"] == {"created": 0, "in_use": 0, "idle": 0}
+
+        with patch.object(pool, "make_connection", side_effect=lambda: _fake_connection()) as make_mock:
+            first = pool.get_connection()
+            second = pool.get_connection()
+            # make_connection 被替换后需要自己登记连接
+            pool._connections.extend([first, second])
+            assert make_mock.call_count == 2
+            assert factory.get_metrics()["sync"] == {"created": 2, "in_use": 2, "idle": 0}
+
+            pool.release(first)
+            assert factory.get_metrics()["sync"] == {"created": 2, "in_use": 1, "idle": 1}
+
+    def test_health_check_reports_unreachable_redis(self):
+        """测试 Redis 不可达时健康检查返回失败而不是抛出异常"""
+        factory = RedisConnectionFactory(url="redis://127.0.0.1:1/0", role="api")
+        health = factory.check_health()
+        assert health["ok"] is False
+        assert "error" in health
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+沙箱网络拦截与加载时限测试
+
+验证外部请求被中止或由本地资源白名单响应（不能越出目录）、页面加载超时后仍在已有 DOM 上评估，
+以及同步引擎超过评测总时限时返回超时结果（包括页面脚本死循环、阻塞在 page.evaluate 中的情况）。
+"""
+
+import sys
+import os
+import subprocess
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from playwright.sync_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.schemas.content import CustomScriptCheckpoint, InteractionAndAssertCheckpoint
+from app.services.sandbox_network import SandboxNetworkPolicy
+from app.services import sandbox_service
+from app.services.sandbox_service import EVALUATION_TIMEOUT_MESSAGE, SandboxService, kill_processes_with_arg
+
+CODE = {"html": "<h1>Hello</h1>", "css": "", "js": "document.title = 'x';"}
+
+
+def script_cp():
+    return CustomScriptCheckpoint(name="脚本", type="custom_script", feedback="脚本失败", script="return true;")
+
+
+def make_route(url):
+    route = MagicMock()
+    route.request.url = url
+    return route
+
+
+def make_manager(page):
+    manager = MagicMock()
+    manager.__enter__.return_value.chromium.launch.return_value.new_page.return_value = page
+    return manager
+
+
+class TestSandboxNetworkPolicy:
+    """SandboxNetworkPolicy 测试"""
+
+    def test_local_assets_and_blocking(self, tmp_path):
+        """白名单前缀下存在的文件由本地响应，其余外部请求被中止"""
+        (tmp_path / "fonts").mkdir()
+        (tmp_path / "fonts" / "a.woff2").write_bytes(b"font")
+        policy = SandboxNetworkPolicy(block_external=True, local_assets={"https://cdn.example.com/": str(tmp_path)})
+
+        local = make_route("https://cdn.example.com/fonts/a.woff2?v=1")
+        policy.handle(local)
+        local.fulfill.assert_called_once_with(path=str(tmp_path / "fonts" / "a.woff2"))
+
+        for url in ("https://cdn.example.com/fonts/missing.woff2",
+                    "https://cdn.example.com/../secret.txt",
+                    "https://cdn.example.com/%2e%2e/secret.txt",
+                    "https://other.example.com/fonts/a.woff2"):
+            route = make_route(url)
+            policy.handle(route)
+            route.abort.assert_called_once_with("blockedbyclient")
+            route.fulfill.assert_not_called()
+
+    def test_longest_prefix_and_passthrough(self, tmp_path):
+        """多个前缀时最长的优先；关闭阻断时未命中的请求放行"""
+        (tmp_path / "lib").mkdir()
+        (tmp_path / "lib" / "x.js").write_text("1")
+        policy = SandboxNetworkPolicy(block_external=False, local_assets={
+            "https://cdn.example.com/": "/nonexistent",
+            "https://cdn.example.com/npm/": str(tmp_path),
+        })
+
+        assert policy.resolve_local_asset("https://cdn.example.com/npm/lib/x.js") == str(tmp_path / "lib" / "x.js")
+        route = make_route("https://cdn.example.com/other.js")
+        policy.handle(route)
+        route.continue_.assert_called_once()
+        assert SandboxNetworkPolicy(block_external=False).enabled is False
+
+
+class TestSandboxPageBudget:
+    """页面加载与评测时限测试"""
+
+    def test_route_registered_and_load_timeout_continues(self):
+        """页面注册网络拦截；加载超时后继续在已有的 DOM 上评估"""
+        page = MagicMock()
+        page.set_content.side_effect = PlaywrightTimeoutError("Timeout 100ms exceeded.")
+        page.evaluate.return_value = [{"value": True}]
+        policy = SandboxNetworkPolicy(block_external=True)
+        service = SandboxService(
+            playwright_manager=make_manager(page), static_precheck=False,
+            wait_until="domcontentloaded", page_load_timeout_ms=100, network_policy=policy,
+        )
+
+        result = service.run_evaluation(CODE, [script_cp()], topic_id="1_1")
+
+        assert result["passed"] is True
+        page.route.assert_called_once_with("**/*", policy.handle)
+        page.set_content.assert_called_once()
+        assert page.set_content.call_args.kwargs == {"wait_until": "domcontentloaded", "timeout": 100}
+
+    def test_evaluation_budget_exceeded(self):
+        """超过评测总时限时不再执行剩余检查点，返回超时结果"""
+        page = MagicMock()
+        page.evaluate.return_value = [{"value": True}]
+        page.wait_for_timeout.side_effect = lambda ms: time.sleep(ms / 1000)
+        checkpoints = [
+            InteractionAndAssertCheckpoint(
+                name=f"等待{i}", type="interaction_and_assert", feedback="等待后不对",
+                action_selector="body", action_type="wait", action_value="100", assertion=script_cp(),
+            )
+            for i in range(5)
+        ]
+        service = SandboxService(playwright_manager=make_manager(page), static_precheck=False, timeout_seconds=0.15)
+
+        started = time.monotonic()
+        result = service.run_evaluation(CODE, checkpoints, topic_id="1_1")
+
+        assert time.monotonic() - started < 0.4
+        assert result == {"passed": False, "message": EVALUATION_TIMEOUT_MESSAGE, "details": []}
+        page.set_default_timeout.assert_called_once_with(150)
+
+    def test_infinite_loop_is_killed_by_watchdog(self):
+        """死循环脚本让加载超时、page.evaluate 永不返回时，看门狗按启动标记结束浏览器并返回超时结果"""
+        browser_killed = threading.Event()
+        page = MagicMock()
+        page.set_content.side_effect = PlaywrightTimeoutError("Timeout 100ms exceeded.")
+
+        def hang(*args):
+            # 渲染进程忙于 while(true){}，直到浏览器进程被结束
+            browser_killed.wait(5)
+            raise PlaywrightError("Target page, context or browser has been closed")
+
+        page.evaluate.side_effect = hang
+        manager = make_manager(page)
+        launch = manager.__enter__.return_value.chromium.launch
+        markers = []
+
+        def kill(marker):
+            markers.append(marker)
+            browser_killed.set()
+            return 1
+
+        service = SandboxService(playwright_manager=manager, static_precheck=False, timeout_seconds=0.1)
+        code = {"html": "<script>while(true){}</script>", "css": "", "js": ""}
+
+        started = time.monotonic()
+        with patch.object(sandbox_service, "WATCHDOG_GRACE_SECONDS", 0.1), \
+                patch.object(sandbox_service, "kill_processes_with_arg", side_effect=kill):
+            result = service.run_evaluation(code, [script_cp()], topic_id="1_1")
+
+        assert time.monotonic() - started < 2
+        assert result == {"passed": False, "message": EVALUATION_TIMEOUT_MESSAGE, "details": []}
+        assert markers == [launch.call_args.kwargs["args"][-1]]
+
+    def test_watchdog_not_fired_for_normal_evaluation(self):
+        """正常结束的评测不会触发看门狗，Playwright 错误仍按内部错误返回"""
+        page = MagicMock()
+        page.evaluate.side_effect = PlaywrightError("boom")
+        service = SandboxService(playwright_manager=make_manager(page), static_precheck=False, timeout_seconds=0.1)
+        watchdogs = []
+        watchdog_class = sandbox_service.EvaluationWatchdog
+
+        def record(*args, **kwargs):
+            watchdogs.append(watchdog_class(*args, **kwargs))
+            return watchdogs[-1]
+
+        with patch.object(sandbox_service, "EvaluationWatchdog", side_effect=record):
+            result = service.run_evaluation(CODE, [script_cp()], topic_id="1_1")
+
+        # 评测结束时计时器已取消，不依赖睡眠等待时限过去
+        assert len(watchdogs) == 1
+        assert watchdogs[0]._timer.finished.is_set()
+        assert not watchdogs[0].fired
+        assert result["message"] != EVALUATION_TIMEOUT_MESSAGE
+
+    def test_kill_processes_with_arg(self):
+        """只结束命令行中带有该标记的进程"""
+        marker = "--sandbox-evaluation-id=test"
+        target = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)", marker])
+        other = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)", marker + "x"])
+        try:
+            time.sleep(0.2)
+            assert kill_processes_with_arg(marker) == 1
+            assert target.wait(timeout=5) != 0
+            assert other.poll() is None
+        finally:
+            for process in (target, other):
+                if process.poll() is None:
+                    process.kill()
+                process.wait()
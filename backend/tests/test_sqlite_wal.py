@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+SQLite WAL 与写入串行化测试
+
+模拟 docker-compose 中 API 与多个 Celery Worker 共享同一个 SQLite 文件的场景：
+多个进程同时写入、同时有进程持续读取，验证不会出现 "database is locked"；
+以及 Session 工厂把写入路由到写引擎，读后写的事务不会因快照过期而失败。
+"""
+
+import sys
+import os
+import multiprocessing
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.db.base_class import Base
+from app.db.database import (
+    create_async_db_engine,
+    create_async_session_factory,
+    create_db_engine,
+    create_session_factory,
+)
+from app.models.event import EventLog
+
+WRITER_PROCESSES = 4
+ROWS_PER_WRITER = 100
+
+
+def _write_rows(database_url: str, worker_id: int, errors) -> None:
+    """子进程：每行一个事务地写入，最大化锁竞争"""
+    engine = create_db_engine(database_url, writer=True)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    try:
+        for i in range(ROWS_PER_WRITER):
+            db = Session()
+            try:
+                db.add(EventLog(participant_id=f"w{worker_id}", event_type="code_edit", event_data={"i": i}))
+                db.commit()
+            finally:
+                db.close()
+    except Exception as e:
+        errors.put(repr(e))
+    finally:
+        engine.dispose()
+
+
+def _read_rows(database_url: str, stop, errors) -> None:
+    """子进程：持续读取，验证读取不会被写入阻塞或报错"""
+    engine = create_db_engine(database_url)
+    try:
+        while not stop.is_set():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT COUNT(*) FROM event_logs")).scalar()
+    except Exception as e:
+        errors.put(repr(e))
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def database_url(tmp_path):
+    url = f"sqlite:///{tmp_path / 'wal.db'}"
+    engine = create_db_engine(url)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    return url
+
+
+class TestSQLiteWAL:
+    """SQLite 引擎配置测试类"""
+
+    def test_pragmas_applied(self, database_url):
+        """测试连接上已启用 WAL、synchronous=NORMAL 与 busy_timeout"""
+        engine = create_db_engine(database_url)
+        try:
+            with engine.connect() as conn:
+                assert conn.execute(text("PRAGMA journal_mode")).scalar().lower() == "wal"
+                # NORMAL == 1
+                assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+                assert conn.execute(text("PRAGMA busy_timeout")).scalar() > 0
+        finally:
+            engine.dispose()
+
+    def test_multi_process_writes(self, database_url):
+        """测试多进程并发写入、同时持续读取时全部成功，没有写入丢失"""
+        ctx = multiprocessing.get_context("fork")
+        errors = ctx.Queue()
+        stop = ctx.Event()
+
+        reader = ctx.Process(target=_read_rows, args=(database_url, stop, errors))
+        writers = [
+            ctx.Process(target=_write_rows, args=(database_url, worker_id, errors))
+            for worker_id in range(WRITER_PROCESSES)
+        ]
+
+        reader.start()
+        for p in writers:
+            p.start()
+        for p in writers:
+            p.join(timeout=120)
+        stop.set()
+        reader.join(timeout=30)
+
+        collected = []
+        while not errors.empty():
+            collected.append(errors.get())
+        assert collected == []
+        assert all(p.exitcode == 0 for p in writers)
+
+        engine = create_db_engine(database_url)
+        try:
+            with engine.connect() as conn:
+                total = conn.execute(text("SELECT COUNT(*) FROM event_logs")).scalar()
+        finally:
+            engine.dispose()
+
+        assert total == WRITER_PROCESSES * ROWS_PER_WRITER
+        assert reader.exitcode == 0
+
+    def test_read_then_write_goes_through_writer(self, database_url):
+        """测试先读后写的会话在另一个连接提交之后仍能写入，写入使用写引擎"""
+        reader = create_db_engine(database_url)
+        writer = create_db_engine(database_url, writer=True)
+        other = create_db_engine(database_url, writer=True)
+        try:
+            for factory, succeeds in (
+                (sessionmaker(autocommit=False, autoflush=False, bind=reader), False),
+                (create_session_factory(reader, writer), True),
+            ):
+                db = factory()
+                try:
+                    # 读取开启读事务，随后另一个连接提交，读事务的快照过期
+                    db.query(EventLog).count()
+                    with sessionmaker(bind=other).begin() as other_db:
+                        other_db.add(EventLog(participant_id="o", event_type="code_edit", event_data={}))
+                    db.add(EventLog(participant_id="s", event_type="code_edit", event_data={}))
+                    if succeeds:
+                        db.commit()
+                        assert db.get_bind() is reader
+                    else:
+                        with pytest.raises(OperationalError):
+                            db.commit()
+                finally:
+                    db.close()
+
+            with reader.connect() as conn:
+                assert conn.execute(text("SELECT COUNT(*) FROM event_logs WHERE participant_id = 's'")).scalar() == 1
+        finally:
+            for engine in (reader, writer, other):
+                engine.dispose()
+
+    async def test_async_session_routes_writes(self, database_url):
+        """测试异步 Session 同样把写入路由到写引擎"""
+        reader = create_async_db_engine(database_url)
+        writer = create_async_db_engine(database_url, writer=True)
+        try:
+            async with create_async_session_factory(reader, writer)() as db:
+                assert db.sync_session.get_bind() is reader.sync_engine
+                db.add(EventLog(participant_id="a", event_type="code_edit", event_data={}))
+                await db.flush()
+                assert db.sync_session.get_bind() is writer.sync_engine
+                await db.commit()
+                assert db.sync_session.get_bind() is reader.sync_engine
+        finally:
+            await reader.dispose()
+            await writer.dispose()
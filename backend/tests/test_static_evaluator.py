@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+静态 HTML 预检测试
+
+CASES 是静态预检与浏览器评测之间的一致性用例：每个用例给出提交的代码、一个检查点、期望的判定结果，
+以及静态预检是否应当接手（不规整的 HTML、含脚本的提交、不支持的选择器等必须回退到浏览器）。
+- test_static_matches_expected 验证静态预检的判定（或回退）符合期望，不需要浏览器
+- test_playwright_conformance 用真实的 Chromium 评测同一批用例，结果必须与期望以及静态预检完全一致；
+  环境中没有可用的 Chromium 时跳过
+"""
+
+import sys
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.schemas.content import (
+    AssertAttributeCheckpoint,
+    AssertElementCheckpoint,
+    AssertStyleCheckpoint,
+    AssertTextContentCheckpoint,
+)
+from app.services.sandbox_service import DefaultPlaywrightManager, SandboxService
+from app.services.static_evaluator import observe_static_document
+
+CHECKPOINT_MODELS = {
+    "assert_element": AssertElementCheckpoint,
+    "assert_text_content": AssertTextContentCheckpoint,
+    "assert_attribute": AssertAttributeCheckpoint,
+    "assert_style": AssertStyleCheckpoint,
+}
+
+FULL_DOCUMENT = (
+    "<!DOCTYPE html>\n<html lang=\"zh\">\n<head>\n    <meta charset=\"UTF-8\">\n"
+    "    <title>编程学习教程</title>\n</head>\n<body>\n{body}\n</body>\n</html>"
+)
+
+# (用例名, html, js, 检查点, 期望是否通过, 静态预检是否接手)
+CASES = [
+    ("element_exists", "<h2>标题</h2>", "",
+     {"type": "assert_element", "selector": "h2", "assertion_type": "exists"}, True, True),
+    ("element_missing", "<h3>标题</h3>", "",
+     {"type": "assert_element", "selector": "h2", "assertion_type": "exists"}, False, True),
+    ("element_equals_raw_text", "<h2> 标题 </h2>", "",
+     {"type": "assert_element", "selector": "h2", "assertion_type": "equals", "value": "标题"}, False, True),
+    ("text_equals_ignores_spaces", "<h2>  前端 开发\n入门 </h2>", "",
+     {"type": "assert_text_content", "selector": "h2", "assertion_type": "equals", "value": "前端开发入门"}, True, True),
+    ("text_nested_and_entities", "<p>A &amp; <b>B</b><!-- 注释 --></p>", "",
+     {"type": "assert_text_content", "selector": "p", "assertion_type": "equals", "value": "A & B"}, True, True),
+    ("text_strict_multiple", "<p>a</p><p>b</p>", "",
+     {"type": "assert_text_content", "selector": "p", "assertion_type": "contains", "value": "a"}, False, True),
+    ("element_text_contains", "<div class=\"card\"><span>Hello</span> world</div>", "",
+     {"type": "assert_element", "selector": "div.card", "assertion_type": "contains", "value": "Hello world"}, True, True),
+    ("attribute_boolean", "<audio controls><source src=\"a.mp3\" type=\"audio/mpeg\"></audio>", "",
+     {"type": "assert_attribute", "selector": "audio", "attribute": "controls", "assertion_type": "exists"}, True, True),
+    ("attribute_equals", "<audio controls><source src=\"a.mp3\" type=\"audio/mpeg\"></audio>", "",
+     {"type": "assert_attribute", "selector": "audio source", "attribute": "type",
+      "assertion_type": "equals", "value": "audio/mpeg"}, True, True),
+    ("attribute_missing", "<video></video>", "",
+     {"type": "assert_attribute", "selector": "video", "attribute": "controls", "assertion_type": "exists"}, False, True),
+    ("attribute_case_and_duplicates", "<A HREF=\"first.html\" href=\"second.html\">链接</A>", "",
+     {"type": "assert_attribute", "selector": "a", "attribute": "href",
+      "assertion_type": "equals", "value": "first.html"}, True, True),
+    ("attribute_class_not_split", "<div class=\"a  b\"></div>", "",
+     {"type": "assert_attribute", "selector": "div.b", "attribute": "class",
+      "assertion_type": "equals", "value": "a  b"}, True, True),
+    ("explicit_tbody", "<table><tbody><tr><td>1</td></tr></tbody></table>", "",
+     {"type": "assert_element", "selector": "table > tbody > tr > td", "assertion_type": "exists"}, True, True),
+    ("full_document", FULL_DOCUMENT.format(body="<h1>你好</h1>"), "",
+     {"type": "assert_text_content", "selector": "body > h1", "assertion_type": "equals", "value": "你好"}, True, True),
+    # 以下用例浏览器会改写结构或需要执行脚本，静态预检必须回退
+    ("implied_tbody", "<table><tr><td>1</td></tr></table>", "",
+     {"type": "assert_element", "selector": "table > tbody > tr", "assertion_type": "exists"}, True, False),
+    ("p_closed_by_div", "<p><div>块</div></p>", "",
+     {"type": "assert_element", "selector": "body > div", "assertion_type": "exists"}, True, False),
+    ("li_implicitly_closed", "<ul><li>a<li>b</ul>", "",
+     {"type": "assert_element", "selector": "ul > li + li", "assertion_type": "exists"}, True, False),
+    ("misnested_inline", "<b><i>x</b></i>", "",
+     {"type": "assert_element", "selector": "b > i", "assertion_type": "exists"}, True, False),
+    ("self_closing_div", "<div/><span>x</span>", "",
+     {"type": "assert_element", "selector": "div > span", "assertion_type": "exists"}, True, False),
+    ("pre_leading_newline", "<pre>\nx</pre>", "",
+     {"type": "assert_element", "selector": "pre", "assertion_type": "equals", "value": "x"}, True, False),
+    ("js_mutates_dom", "<h2>旧</h2>", "document.querySelector('h2').textContent = '新';",
+     {"type": "assert_text_content", "selector": "h2", "assertion_type": "equals", "value": "新"}, True, False),
+    ("inline_handler", "<img src=\"missing.png\" onerror=\"this.alt='x'\">", "",
+     {"type": "assert_element", "selector": "img", "assertion_type": "exists"}, True, False),
+    ("stateful_selector", "<a href=\"#\">x</a>", "",
+     {"type": "assert_element", "selector": "a:hover", "assertion_type": "exists"}, False, False),
+    ("style_needs_browser", "<h2>标题</h2>", "",
+     {"type": "assert_style", "selector": "h2", "css_property": "display",
+      "assertion_type": "equals", "value": "block"}, True, False),
+]
+
+
+def make_checkpoint(spec: dict):
+    return CHECKPOINT_MODELS[spec["type"]](name="检查点", feedback="检查点未通过", **spec)
+
+
+def case_ids():
+    return [case[0] for case in CASES]
+
+
+@pytest.fixture(scope="module")
+def browser_service():
+    """可以启动 Chromium 时返回关闭静态预检的沙箱服务，否则跳过"""
+    try:
+        with DefaultPlaywrightManager() as p:
+            p.chromium.launch(headless=True, args=["--no-sandbox"]).close()
+    except Exception as e:
+        pytest.skip(f"Chromium 不可用: {e}")
+    return SandboxService(static_precheck=False)
+
+
+class TestStaticEvaluator:
+    """静态预检测试"""
+
+    @pytest.mark.parametrize("name,html,js,spec,expected,static", CASES, ids=case_ids())
+    def test_static_matches_expected(self, name, html, js, spec, expected, static):
+        """静态预检只接手规整、无脚本的提交，接手时判定符合期望且不启动浏览器"""
+        manager = MagicMock()
+        service = SandboxService(playwright_manager=manager, static_precheck=True)
+        checkpoints = [make_checkpoint(spec)]
+        code = {"html": html, "css": "", "js": js}
+
+        observations = observe_static_document(service._build_page_html(code, False), code, checkpoints)
+        assert (observations is not None) == static
+        if static:
+            result = service.run_evaluation(code, checkpoints, topic_id="1_1")
+            assert result["passed"] == expected, result
+            manager.__enter__.assert_not_called()
+
+    def test_raw_html_tasks_use_browser(self):
+        """raw HTML 模式的任务始终交给浏览器评测"""
+        manager = MagicMock()
+        manager.__enter__.return_value.chromium.launch.return_value.new_page.return_value.evaluate.return_value = [{"count": 1}]
+        service = SandboxService(playwright_manager=manager, static_precheck=True)
+        checkpoints = [make_checkpoint({"type": "assert_element", "selector": "h1", "assertion_type": "exists"})]
+
+        service.run_evaluation({"html": FULL_DOCUMENT.format(body="<h1>x</h1>")}, checkpoints, topic_id="1_end")
+
+        manager.__enter__.assert_called_once()
+
+    @pytest.mark.parametrize("name,html,js,spec,expected,static", CASES, ids=case_ids())
+    def test_playwright_conformance(self, browser_service, name, html, js, spec, expected, static):
+        """Chromium 的评测结果与期望一致；静态预检接手的用例，两者的结果（含反馈文案）完全相同"""
+        checkpoints = [make_checkpoint(spec)]
+        code = {"html": html, "css": "", "js": js}
+
+        browser_result = browser_service.run_evaluation(code, checkpoints, topic_id="1_1")
+
+        assert browser_result["passed"] == expected, browser_result
+        if static:
+            static_result = SandboxService(playwright_manager=MagicMock(), static_precheck=True).run_evaluation(
+                code, checkpoints, topic_id="1_1"
+            )
+            assert static_result == browser_result
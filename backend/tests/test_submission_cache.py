@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+提交评测结果缓存测试
+
+验证缓存键对无关差异（换行符、首尾空白）不敏感、检查点定义变化后不再命中、
+内部错误不缓存、Redis 不可用时直接评测，以及命中缓存时仍然更新 BKT 并发布进度。
+"""
+
+import sys
+import os
+import json
+from unittest.mock import MagicMock, patch
+
+import redis
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.schemas.content import AssertTextContentCheckpoint
+from app.services.sandbox_service import INTERNAL_ERROR_MESSAGE
+from app.services.submission_cache import SubmissionResultCache
+from app.tasks import submission_tasks
+
+
+class FakeRedis:
+    """只实现字符串读写的简易 Redis 替身，记录过期时间"""
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+        self.ttls[key] = ex
+        return True
+
+
+def make_checkpoints(value="Hello"):
+    return [AssertTextContentCheckpoint(
+        name="标题", type="assert_text_content", feedback="标题不对",
+        selector="h1", assertion_type="contains", value=value,
+    )]
+
+
+PASSED = {"passed": True, "message": "恭喜！所有测试点都通过了！", "details": []}
+
+
+class TestSubmissionResultCache:
+    """SubmissionResultCache 测试"""
+
+    def test_identical_code_hits_cache(self):
+        """换行符与首尾空白不同的相同代码命中同一条缓存"""
+        fake = FakeRedis()
+        cache = SubmissionResultCache(redis_client=fake, ttl_seconds=60)
+        evaluate = MagicMock(return_value=PASSED)
+
+        first, hit = cache.get_or_evaluate("1_1", make_checkpoints(), {"html": "<h1>Hello</h1>\r\n", "css": "", "js": ""}, evaluate)
+        assert (first, hit) == (PASSED, False)
+        second, hit = cache.get_or_evaluate("1_1", make_checkpoints(), {"html": "  <h1>Hello</h1>\n", "css": None, "js": ""}, evaluate)
+
+        assert (second, hit) == (PASSED, True)
+        evaluate.assert_called_once()
+        assert list(fake.ttls.values()) == [60]
+
+    def test_key_depends_on_topic_checkpoints_and_code(self):
+        """主题、检查点定义或代码不同时使用不同的键；raw HTML 任务不规范化代码"""
+        cache = SubmissionResultCache(redis_client=FakeRedis())
+        code = {"html": "<h1>Hello</h1>", "css": "", "js": ""}
+        key = cache.make_key("1_1", make_checkpoints(), code)
+
+        assert cache.make_key("1_1", make_checkpoints(), dict(code)) == key
+        assert cache.make_key("1_2", make_checkpoints(), code) != key
+        assert cache.make_key("1_1", make_checkpoints(value="Hi"), code) != key
+        assert cache.make_key("1_1", make_checkpoints(), {**code, "js": "x"}) != key
+        raw = {"html": "<h1>Hello</h1>", "css": "", "js": ""}
+        assert cache.make_key("1_end", [], raw) != cache.make_key("1_end", [], {**raw, "html": " <h1>Hello</h1>"})
+
+    def test_internal_error_not_cached_and_redis_errors_ignored(self):
+        """评测服务内部错误不写缓存；Redis 出错时直接评测"""
+        fake = FakeRedis()
+        cache = SubmissionResultCache(redis_client=fake)
+        error_result = {"passed": False, "message": INTERNAL_ERROR_MESSAGE, "details": ["boom"]}
+        cache.get_or_evaluate("1_1", make_checkpoints(), {"html": "x"}, lambda: error_result)
+        assert fake.values == {}
+
+        broken = MagicMock()
+        broken.get.side_effect = redis.ConnectionError("down")
+        broken.set.side_effect = redis.ConnectionError("down")
+        result, hit = SubmissionResultCache(redis_client=broken).get_or_evaluate(
+            "1_1", make_checkpoints(), {"html": "x"}, lambda: PASSED
+        )
+        assert (result, hit) == (PASSED, False)
+
+    def test_cache_hit_still_updates_bkt_and_progress(self):
+        """命中缓存时不启动浏览器，但仍然更新 BKT、记录进度并推送结果"""
+        fake = FakeRedis()
+        cache = SubmissionResultCache(redis_client=fake)
+        submission = {
+            "participant_id": "p1",
+            "topic_id": "1_1",
+            "code": {"html": "<h1>Hello</h1>", "css": "", "js": ""},
+        }
+        fake.values[cache.make_key("1_1", make_checkpoints(), submission["code"])] = json.dumps(PASSED)
+        user_state_service = MagicMock()
+        sandbox = MagicMock()
+        redis_client = MagicMock()
+        save_progress = MagicMock()
+
+        with patch.object(submission_tasks, "SessionLocal", MagicMock()), \
+                patch.object(submission_tasks, "get_user_state_service", return_value=user_state_service), \
+                patch.object(submission_tasks, "load_json_content", return_value=MagicMock(checkpoints=make_checkpoints())), \
+                patch.object(submission_tasks, "get_submission_cache", return_value=cache), \
+                patch.object(submission_tasks, "get_submission_sandbox_service", return_value=sandbox), \
+                patch.object(submission_tasks, "get_redis_client", return_value=redis_client), \
+                patch.object(submission_tasks, "save_progress_task", save_progress):
+            result = submission_tasks.process_submission_task.apply(args=[submission], task_id="task-1").result
+
+        assert result == PASSED
+        sandbox.run_evaluation.assert_not_called()
+        user_state_service.update_bkt_on_submission.assert_called_once_with(
+            participant_id="p1", topic_id="1_1", is_correct=True
+        )
+        save_progress.apply_async.assert_called_once()
+        redis_client.publish.assert_called_once()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+WebSocket 双向协议测试
+
+验证客户端可以在已建立的连接上发送聊天、代码提交和批量行为事件请求，
+每个请求收到带相同 request_id 的 ack，且分派逻辑与 HTTP 端点一致。
+"""
+
+import sys
+import os
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.api.endpoints import websocket as websocket_module
+from app.api.endpoints import behavior as behavior_module
+from app.api.endpoints import chat as chat_module
+from app.api.endpoints import submission as submission_module
+
+
+def _task(task_id):
+    task = MagicMock()
+    task.id = task_id
+    return task
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(websocket_module.router, prefix="/ws")
+    with patch.object(websocket_module.channel_router, "add_participant", new=AsyncMock()), \
+            patch.object(websocket_module.channel_router, "remove_participant", new=AsyncMock()):
+        yield TestClient(app)
+
+
+class TestWebSocketProtocol:
+    """WebSocket 请求 / ack 测试类"""
+
+    def test_chat_request_is_dispatched_and_acked(self, client):
+        """测试 chat 请求分派到 chat_queue，participant_id 以连接为准"""
+        with patch.object(chat_module.settings, "CHAT_SCHEDULER_ENABLED", False), \
+                patch.object(chat_module.process_chat_request, "apply_async", return_value=_task("chat-1")) as chat_mock:
+            with client.websocket_connect("/ws/user/p-1") as ws:
+                ws.send_text(json.dumps({
+                    "type": "chat",
+                    "request_id": "r1",
+                    "payload": {"participant_id": "someone-else", "user_message": "你好"},
+                }))
+                ack = json.loads(ws.receive_text())
+
+        assert ack == {"type": "ack", "request_id": "r1", "code": 202, "message": "accepted", "data": {"task_id": "chat-1"}}
+        assert chat_mock.call_args.kwargs["queue"] == "chat_queue"
+        assert chat_mock.call_args.kwargs["args"][0]["participant_id"] == "p-1"
+
+    def test_submission_and_behavior_batch(self, client):
+        """测试代码提交与批量行为事件按顺序处理，各自收到 ack"""
+        events = [
+            {"participant_id": "x", "event_type": "code_edit", "event_data": {"editor": "html"}},
+            {"participant_id": "x", "event_type": "page_click", "event_data": {}},
+        ]
+        with patch.object(submission_module.save_code_submission_task, "apply_async"), \
+                patch.object(submission_module.process_submission_task, "apply_async", return_value=_task("sub-1")), \
+                patch.object(behavior_module.save_behavior_batch_task, "apply_async") as save_mock, \
+                patch.object(behavior_module.interpret_behavior_batch_task, "apply_async") as interpret_mock:
+            with client.websocket_connect("/ws/user/p-1") as ws:
+                ws.send_text(json.dumps({
+                    "type": "submit_test",
+                    "request_id": "r1",
+                    "payload": {"topic_id": "1_1", "code": {"html": "<p></p>", "css": "", "js": ""}},
+                }))
+                ws.send_text(json.dumps({"type": "behavior_batch", "request_id": "r2", "payload": events}))
+                acks = [json.loads(ws.receive_text()) for _ in range(2)]
+
+        assert [ack["request_id"] for ack in acks] == ["r1", "r2"]
+        assert acks[0]["data"] == {"task_id": "sub-1"}
+        assert acks[1]["data"] == {"count": 2}
+        saved = save_mock.call_args.kwargs["args"][0]
+        assert [event["participant_id"] for event in saved] == ["p-1", "p-1"]
+        assert interpret_mock.call_count == 1
+
+    def test_invalid_requests_get_error_acks(self, client):
+        """测试非法消息返回错误 ack，连接保持可用"""
+        with client.websocket_connect("/ws/user/p-1") as ws:
+            ws.send_text("not json")
+            invalid = json.loads(ws.receive_text())
+            ws.send_text(json.dumps({"type": "chat", "request_id": "r1", "payload": {"user_message": ""}}))
+            empty_message = json.loads(ws.receive_text())
+            ws.send_text(json.dumps({"type": "ping", "request_id": "r2"}))
+            pong = json.loads(ws.receive_text())
+
+        assert invalid["code"] == 422 and invalid["request_id"] is None
+        assert empty_message["code"] == 400 and empty_message["request_id"] == "r1"
+        assert pong["code"] == 202 and pong["request_id"] == "r2"
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+WebSocket 有界发送队列测试
+
+验证每个连接的帧按入队顺序发送、慢客户端时合并排队中的 streaming 帧、
+溢出时的 close / drop 策略，以及发送失败时关闭连接。
+"""
+
+import sys
+import os
+import json
+import asyncio
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app.core.websocket_manager import WebSocketManager, OVERFLOW_CLOSE_CODE
+
+
+class SlowWebSocket:
+    """可以阻塞发送的 WebSocket 替身"""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.sent = []
+        self.closed_with = None
+        self.unblocked = asyncio.Event()
+        self.unblocked.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        await self.unblocked.wait()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("connection reset")
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=None):
+        self.closed_with = code
+
+
+def _streaming(taskid, seq, text):
+    return json.dumps({"type": "streaming", "taskid": taskid, "message": text, "seq": seq}, ensure_ascii=False)
+
+
+async def _wait_until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.005)
+
+
+class TestWebSocketSendQueue:
+    """WebSocketManager 发送队列测试类"""
+
+    async def test_frames_are_sent_in_order(self):
+        """测试并发入队的帧按入队顺序发送"""
+        manager = WebSocketManager(max_queue_size=1000, send_timeout=1)
+        websocket = SlowWebSocket(delay=0.001)
+        await manager.connect("p-1", websocket)
+
+        for seq in range(50):
+            await manager.send_to_user("p-1", _streaming("t1", seq, str(seq)))
+        await _wait_until(lambda: len(websocket.sent) == 50)
+
+        assert [json.loads(message)["seq"] for message in websocket.sent] == list(range(50))
+        await manager.disconnect("p-1", websocket)
+
+    async def test_slow_client_gets_coalesced_frames(self):
+        """测试客户端变慢时排队的 streaming 帧被合并，文本完整且队列不超过上限"""
+        manager = WebSocketManager(max_queue_size=4, send_timeout=1)
+        websocket = SlowWebSocket()
+        websocket.unblocked.clear()
+        await manager.connect("p-1", websocket)
+
+        texts = [f"片段{i};" for i in range(40)]
+        for seq, text in enumerate(texts):
+            await manager.send_to_user("p-1", _streaming("t1", seq, text))
+            assert manager.get_metrics()["queue_depth_max"] <= 4
+
+        websocket.unblocked.set()
+        await _wait_until(lambda: "".join(json.loads(m)["message"] for m in websocket.sent) == "".join(texts))
+
+        frames = [json.loads(message) for message in websocket.sent]
+        assert "".join(frame["message"] for frame in frames) == "".join(texts)
+        assert frames[-1]["seq"] == len(texts) - 1
+        assert len(frames) < len(texts)
+        metrics = manager.get_metrics()
+        assert metrics["coalesced"] > 0 and metrics["dropped"] == 0
+        assert websocket.closed_with is None
+        await manager.disconnect("p-1", websocket)
+
+    async def test_overflow_closes_connection(self):
+        """测试无法合并的消息溢出时按 close 策略关闭连接"""
+        manager = WebSocketManager(max_queue_size=3, send_timeout=1, overflow_policy="close")
+        websocket = SlowWebSocket()
+        websocket.unblocked.clear()
+        await manager.connect("p-1", websocket)
+
+        for i in range(5):
+            await manager.send_to_user("p-1", json.dumps({"type": "stream_start", "taskid": f"t{i}", "seq": 0}))
+        await _wait_until(lambda: websocket.closed_with is not None)
+
+        assert websocket.closed_with == OVERFLOW_CLOSE_CODE
+        assert manager.get_metrics()["dropped"] >= 1
+        await manager.disconnect("p-1", websocket)
+
+    async def test_overflow_drop_policy(self):
+        """测试 drop 策略下丢弃新消息但保持连接"""
+        manager = WebSocketManager(max_queue_size=2, send_timeout=1, overflow_policy="drop")
+        websocket = SlowWebSocket()
+        websocket.unblocked.clear()
+        await manager.connect("p-1", websocket)
+
+        for i in range(5):
+            await manager.send_to_user("p-1", json.dumps({"type": "stream_start", "taskid": f"t{i}", "seq": 0}))
+        websocket.unblocked.set()
+        await _wait_until(lambda: manager.get_metrics()["queue_depth_total"] == 0)
+        await asyncio.sleep(0.01)
+
+        # 队列最多保留 2 条（写任务可能已取出一条阻塞在发送上），其余被丢弃
+        dropped = manager.get_metrics()["dropped"]
+        assert dropped >= 2
+        assert len(websocket.sent) + dropped == 5
+        assert [json.loads(message)["taskid"] for message in websocket.sent] == [f"t{i}" for i in range(len(websocket.sent))]
+        assert websocket.closed_with is None
+        await manager.disconnect("p-1", websocket)
+
+    async def test_send_failure_closes_connection(self):
+        """测试发送异常时关闭连接，不再继续发送"""
+        manager = WebSocketManager(max_queue_size=10, send_timeout=1)
+        websocket = SlowWebSocket(fail=True)
+        await manager.connect("p-1", websocket)
+
+        await manager.send_to_user("p-1", _streaming("t1", 0, "a"))
+        await _wait_until(lambda: websocket.closed_with is not None)
+        assert websocket.closed_with == 1011
+        await manager.disconnect("p-1", websocket)
+
+    async def test_stale_disconnect_keeps_new_connection(self):
+        """测试旧连接的清理不会移除同一参与者的新连接"""
+        manager = WebSocketManager(max_queue_size=10, send_timeout=1)
+        old_websocket, new_websocket = SlowWebSocket(), SlowWebSocket()
+        await manager.connect("p-1", old_websocket)
+        await manager.connect("p-1", new_websocket)
+        await manager.disconnect("p-1", old_websocket)
+
+        await manager.send_to_user("p-1", _streaming("t1", 0, "a"))
+        await _wait_until(lambda: new_websocket.sent)
+        assert len(new_websocket.sent) == 1 and old_websocket.sent == []
+        await manager.disconnect("p-1", new_websocket)
+        assert manager.get_metrics()["connections"] == 0
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+chat Worker 预加载与预热测试
+
+验证主进程预加载 DynamicController 后子进程直接复用、预热推理调用各模型且失败不影响启动，
+以及就绪文件的写入与清理。
+"""
+
+import sys
+import os
+import gc
+import json
+import tempfile
+from unittest.mock import MagicMock, patch
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 在导入项目模块前设置测试环境
+os.environ["APP_ENV"] = "testing"
+os.environ["TUTOR_OPENAI_API_KEY"] = "test-key"
+os.environ["TUTOR_EMBEDDING_API_KEY"] = "test-key"
+os.environ["TUTOR_TRANSLATION_API_KEY"] = "test-key"
+
+from app import celery_app as celery_module
+from app.core import worker_warmup
+from app.core.config import settings
+
+
+class TestWorkerWarmup:
+    """预加载、预热推理与就绪文件测试"""
+
+    def test_preload_then_child_reuses_controller_and_marks_ready(self):
+        """chat Worker 主进程预加载后，子进程复用同一个 DynamicController，预热完成后写入就绪文件"""
+        controller = MagicMock()
+        controller.clustering_service = None
+        ready_file = os.path.join(tempfile.mkdtemp(), "ready")
+        create = MagicMock(return_value=controller)
+        with patch.object(celery_module, "_dynamic_controller_instance", None), \
+                patch.object(celery_module, "_user_state_service_instance", MagicMock()), \
+                patch.object(celery_module, "_detect_worker_queues", return_value={"chat_queue"}), \
+                patch.object(celery_module, "create_dynamic_controller", create), \
+                patch.object(celery_module, "get_redis_client", return_value=MagicMock()), \
+                patch.object(celery_module, "redis_connections", MagicMock()), \
+                patch.object(settings, "CHAT_WORKER_READY_FILE", ready_file):
+            try:
+                celery_module.preload_chat_worker()
+                assert gc.get_freeze_count() > 0
+            finally:
+                gc.unfreeze()
+            assert celery_module._dynamic_controller_instance is controller
+            assert not os.path.exists(ready_file)
+
+            celery_module.init_worker_process()
+
+            create.assert_called_once()
+            assert celery_module._dynamic_controller_instance is controller
+        controller.sentiment_service.analyze_sentiment.assert_called_once_with(worker_warmup.WARMUP_TEXT)
+        with open(ready_file, encoding="utf-8") as f:
+            assert json.load(f)["pid"] == os.getpid()
+
+    def test_preload_skipped_for_other_queues(self):
+        """不服务 chat_queue 的 Worker 不预加载"""
+        create = MagicMock()
+        with patch.object(celery_module, "_dynamic_controller_instance", None), \
+                patch.object(celery_module, "_detect_worker_queues", return_value={"submit_queue"}), \
+                patch.object(celery_module, "create_dynamic_controller", create):
+            celery_module.preload_chat_worker()
+            assert celery_module._dynamic_controller_instance is None
+        create.assert_not_called()
+
+    def test_warm_inference_tolerates_failures(self):
+        """某个模型预热失败时只记录日志，其余模型照常预热"""
+        controller = MagicMock()
+        controller.sentiment_service.analyze_sentiment.side_effect = RuntimeError("boom")
+        controller.clustering_service.is_loaded = True
+
+        timings = worker_warmup.warm_inference(controller)
+
+        assert "sentiment" not in timings
+        assert "clustering" in timings
+        controller.clustering_service.classify_with_strategy.assert_called_once_with([worker_warmup.WARMUP_TEXT])
+
+    def test_preload_models_skips_sentence_transformer_with_model_server(self):
+        """启用模型服务时不在本进程加载 SentenceTransformer"""
+        controller = MagicMock()
+        controller.clustering_service.is_loaded = True
+        controller.clustering_service.model_client = MagicMock()
+        assert worker_warmup.preload_models(controller) == {}
+
+    def test_mark_and_clear_ready(self):
+        """就绪文件原子写入，启动时清理"""
+        ready_file = os.path.join(tempfile.mkdtemp(), "ready")
+        worker_warmup.mark_ready(ready_file, {"warmup_ms": {"sentiment": 1.0}})
+        assert worker_warmup.is_ready(ready_file)
+        worker_warmup.clear_ready(ready_file)
+        assert not worker_warmup.is_ready(ready_file)
@@ -5,7 +5,7 @@
  * 目标：
  * - 捕获 TDD-II-07 中规定的关键事件：
  *   code_edit（Monaco 编辑器防抖 2s）、ai_help_request（立即）、test_submission（立即，包含 code）、dom_element_select（立即，iframe 支持）、user_idle（60s）、page_focus_change（visibility）
- * - 组装标准化 payload 并可靠发送到后端 /api/v1/behavior/log
+ * - 组装标准化 payload，攒批后通过已建立的 WebSocket 发送（未连接或离开页面时发送到 /api/v1/behavior/log/batch；提交与求助事件立即发送）
  * - 【已改】统一使用 fetch(..., { keepalive: true, credentials: 'omit' })，彻底不带 Cookie
  *
  * 注意：
@@ -15,6 +15,7 @@
 
 import debounce from 'https://cdn.jsdelivr.net/npm/lodash-es@4.17.21/debounce.js';
 import { getParticipantId } from './session.js';
+import websocket from './websocket_client.js';
 class BehaviorTracker {
   constructor() {
     // code_edit 防抖时长（ms）
@@ -52,6 +53,18 @@ class BehaviorTracker {
     this._clickBatch = [];
     this._clickBatchTimer = null;
 
+    // —— 事件上报批量相关：攒批后发往 /behavior/log/batch ——
+    this._eventBatchCfg = {
+      flushInterval: 3000, // 最长攒批时间（ms）
+      maxBatchSize: 50, // 达到该条数立即发送
+      // 这些事件会影响 AI 回复的即时状态，入队后立即发送
+      immediateTypes: ['test_submission', 'ai_help_request']
+    };
+    this._eventBatch = [];
+    this._eventBatchTimer = null;
+    this._pageLeaving = false;
+    this._bindEventBatchFlush();
+
     // —— Idle 追踪 & 提示 ——
     // 最近一次活动时间、一次空闲会话开始时间
     // 调整为空闲 60s 才进入“空闲”判定，避免过早打扰
@@ -131,21 +144,67 @@ class BehaviorTracker {
   }
 
   // -------------------- 核心发送函数 --------------------
-  // 使用 window.apiClient.postWithoutAuth 发送请求到后端
+  // 事件先进入缓冲区，定时或达到条数后通过 window.apiClient.postWithoutAuth 批量发送
   _sendPayload(payload) {
+    this._eventBatch.push(payload);
+    const cfg = this._eventBatchCfg;
+
+    // 页面即将离开时（其他模块在卸载回调中补发的汇总事件）不再等待计时器
+    const leaving = this._pageLeaving || document.hidden;
+    if (leaving || this._eventBatch.length >= cfg.maxBatchSize || cfg.immediateTypes.includes(payload.event_type)) {
+      this._flushEventBatch();
+      return;
+    }
+
+    // 只在没有计时器时启动；避免持续上报导致永远不 flush
+    if (!this._eventBatchTimer) {
+      this._eventBatchTimer = setTimeout(() => this._flushEventBatch(), cfg.flushInterval);
+    }
+  }
+
+  _flushEventBatch() {
+    clearTimeout(this._eventBatchTimer);
+    this._eventBatchTimer = null;
+    if (!this._eventBatch.length) return;
+
     // 检查 window.apiClient 是否存在
     if (typeof window.apiClient === 'undefined' || typeof window.apiClient.postWithoutAuth !== 'function') {
       console.error('[BehaviorTracker] window.apiClient.postWithoutAuth 不可用');
       return;
     }
 
-    // 使用 apiClient 发送 POST 请求
-    window.apiClient.postWithoutAuth('/behavior/log', payload)
+    const events = this._eventBatch.splice(0, this._eventBatch.length);
+    // 连接已建立时复用 WebSocket 发送；离开页面时连接随时可能关闭，改用 keepalive 的 HTTP 请求
+    if (!this._pageLeaving && websocket.isOpen()) {
+      websocket.request('behavior_batch', events)
+        .catch(err => {
+          console.warn('[BehaviorTracker] 通过 WebSocket 发送日志失败，改用 HTTP：', err);
+          window.apiClient.postWithoutAuth('/behavior/log/batch', events)
+            .catch(httpErr => console.warn('[BehaviorTracker] 发送日志失败：', httpErr));
+        });
+      return;
+    }
+    window.apiClient.postWithoutAuth('/behavior/log/batch', events)
       .catch(err => {
         console.warn('[BehaviorTracker] 发送日志失败：', err);
       });
   }
 
+  // 页面隐藏或关闭前发送缓冲区中剩余的事件。
+  // 在构造函数中绑定，保证先于其他模块的卸载回调执行，之后补发的事件会直接发送
+  _bindEventBatchFlush() {
+    const onLeave = () => {
+      this._pageLeaving = true;
+      this._flushEventBatch();
+    };
+    window.addEventListener('beforeunload', onLeave);
+    window.addEventListener('pagehide', onLeave);
+    document.addEventListener('visibilitychange', () => {
+      if (document.hidden) this._flushEventBatch();
+      else this._pageLeaving = false;
+    });
+  }
+
   // 公共上报接口：组装标准 payload 并发送
   logEvent(eventType, eventData = {}) {
     // 获取 participant_id（从 session.js 或 window 取）
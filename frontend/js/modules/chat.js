@@ -294,7 +294,12 @@ websocket.subscribe("stream_end", (msg) => {
       
       // 发送请求以触发后端处理，实际回复通过 WebSocket 返回
       // 等待请求返回（通常为确认/排队），错误时在 catch 中解锁按钮
-      await api_client.post('/chat/ai/chat2', requestBody);
+      // 连接已建立时直接走 WebSocket，否则退回 HTTP
+      if (websocket.isOpen()) {
+        await websocket.request('chat', requestBody);
+      } else {
+        await api_client.post('/chat/ai/chat2', requestBody);
+      }
 
 
      
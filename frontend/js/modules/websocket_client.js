@@ -15,6 +15,55 @@ class WebSocketManager {
                 this.reconnectAttempts = 0;
                 this.maxReconnectAttempts = 5;
                 this.subscribers = {};  //{type:[callbacks]}
+                // 最后收到的流式帧位置，重连时带给后端用于补发错过的帧
+                this.lastTaskId = null;
+                this.lastSeq = null;
+                // 通过 WebSocket 发出、尚未收到 ack 的请求 {request_id: {resolve, reject, timer}}
+                this.pendingRequests = {};
+                this.requestCounter = 0;
+                this.requestTimeoutMs = 10000;
+            }
+
+            isOpen() {
+                return !!this.socket && this.socket.readyState === WebSocket.OPEN;
+            }
+
+            // 在已建立的连接上发送请求（chat / submit_test / behavior_batch / ping），
+            // 收到 ack 后 resolve 为 {code, message, data}，与 HTTP 端点的返回结构一致
+            request(type, payload = null) {
+                if (!this.isOpen()) {
+                    return Promise.reject(new Error('WebSocket 未连接'));
+                }
+                const requestId = `${Date.now().toString(36)}-${++this.requestCounter}`;
+                return new Promise((resolve, reject) => {
+                    const timer = setTimeout(() => {
+                        delete this.pendingRequests[requestId];
+                        reject(new Error(`WebSocket 请求超时: ${type}`));
+                    }, this.requestTimeoutMs);
+                    this.pendingRequests[requestId] = { resolve, reject, timer };
+                    this.socket.send(JSON.stringify({ type, request_id: requestId, payload }));
+                });
+            }
+
+            _settleRequest(ack) {
+                const pending = this.pendingRequests[ack.request_id];
+                if (!pending) return;
+                delete this.pendingRequests[ack.request_id];
+                clearTimeout(pending.timer);
+                if (ack.code >= 400) {
+                    pending.reject(new Error(ack.message || `请求失败: ${ack.code}`));
+                } else {
+                    pending.resolve({ code: ack.code, message: ack.message, data: ack.data });
+                }
+            }
+
+            _rejectPendingRequests(reason) {
+                Object.keys(this.pendingRequests).forEach(requestId => {
+                    const pending = this.pendingRequests[requestId];
+                    clearTimeout(pending.timer);
+                    pending.reject(new Error(reason));
+                });
+                this.pendingRequests = {};
             }
             
             subscribe(type,callback){
@@ -35,7 +84,19 @@ class WebSocketManager {
             }
 
             _dispatch_message(rawMessage){
-                const { type, taskid, message, error, timestamp } = rawMessage;
+                if (rawMessage.type === 'ack') {
+                    this._settleRequest(rawMessage);
+                    return;
+                }
+                const { type, taskid, message, error, timestamp, seq } = rawMessage;
+                if (typeof seq === 'number') {
+                    // 同一任务中已经收到过的帧（重连补发与实时推送重叠时）直接丢弃
+                    if (taskid === this.lastTaskId && this.lastSeq !== null && seq <= this.lastSeq) {
+                        return;
+                    }
+                    this.lastTaskId = taskid;
+                    this.lastSeq = seq;
+                }
                 if (this.subscribers[type]) {
                    this.subscribers[type].forEach(callback => callback(message));
                     }else {
@@ -58,7 +119,12 @@ class WebSocketManager {
                     //const wsUrl = buildWebSocketUrl(getParticipantId());
                     // 正确编码 participantId（特别是中文字符）
                     const encodedParticipantId = encodeURIComponent(participantId);
-                    const wsUrl = buildWebSocketUrl(`/ws/user/${encodedParticipantId}`);
+                    let wsUrl = buildWebSocketUrl(`/ws/user/${encodedParticipantId}`);
+                    if (this.lastTaskId !== null && this.lastSeq !== null) {
+                        // 重连：请求补发上次断开后错过的流式帧
+                        const params = new URLSearchParams({ taskid: this.lastTaskId, last_seq: String(this.lastSeq) });
+                        wsUrl += `?${params.toString()}`;
+                    }
                     //const wsUrl = `${protocol}//localhost:8000/ws/chat/${this.userId}`;
                     //alert('WebSocket URL: ' + wsUrl);
                     this.socket = new WebSocket(wsUrl);
@@ -77,6 +143,7 @@ class WebSocketManager {
                     };
                     
                     this.socket.onclose = (event) => {
+                        this._rejectPendingRequests('WebSocket 连接已断开');
                         this._tryReconnect();
                     };
                     
@@ -1706,7 +1706,10 @@ function extendChatModuleForElementContext() {
             }
 
             // 使用封装的 apiClient 发送请求
-            const data = await window.apiClient.post('/chat/ai/chat2', requestBody);
+            // 连接已建立时直接走 WebSocket，否则退回 HTTP
+            const data = websocket.isOpen()
+                ? await websocket.request('chat', requestBody)
+                : await window.apiClient.post('/chat/ai/chat2', requestBody);
 
             // if (data.code === 200 && data.data && typeof data.data.ai_response === 'string') {
             //     // 添加AI回复到UI
@@ -162,7 +162,12 @@ function extendChatModuleForSmartHints(topicId) {
             }
 
             // 使用封装的 apiClient 发送请求
-            await window.apiClient.post('/chat/ai/chat2', requestBody);
+            // 连接已建立时直接走 WebSocket，否则退回 HTTP
+            if (websocket.isOpen()) {
+                await websocket.request('chat', requestBody);
+            } else {
+                await window.apiClient.post('/chat/ai/chat2', requestBody);
+            }
         } catch (error) {
             console.error('[ChatModule] 发送消息时出错:', error);
             this.addMessageToUI('ai', `抱歉，我无法回答你的问题。错误信息: ${error.message}`);
@@ -675,7 +680,10 @@ function setupSubmitLogic() {
             };
 
             // 提交测试并等待响应
-            const result = await window.apiClient.post('/submission/submit-test2', submissionData);
+            // 连接已建立时直接走 WebSocket，否则退回 HTTP；两者返回结构相同
+            const result = websocket.isOpen()
+                ? await websocket.request('submit_test', submissionData)
+                : await window.apiClient.post('/submission/submit-test2', submissionData);
 
             // 保存订阅回调的引用，以便后续取消订阅
             let submissionCallback = (msg) => {